@@ -0,0 +1,234 @@
+"""
+Benchmarks the Figures pipeline and API at synthetic data scale tiers
+
+The unit tests build a handful of rows, so they do not show how the pipeline
+behaves with thousands of courses and millions of enrollments. Each tier in
+`TIERS` describes a data volume that `devsite.load_data` generates in bulk.
+The benchmark stages then run the pipeline code paths over the tier's data and
+record each stage's wall time and database query count and time.
+
+Results are compared with the baselines stored in `BASELINES_FILE`. Query
+counts are deterministic for a tier's data, so any increase is reported as a
+regression. Wall times vary between runs and hosts, so they are reported as a
+regression only when they exceed the baseline by more than a tolerance and by
+more than a minimum number of seconds. The minimum keeps stages that take a few
+milliseconds from being reported because of timing noise.
+
+Run the benchmarks with the ``benchmark_figures`` devsite management command.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from collections import OrderedDict
+import json
+import os
+import timeit
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+
+from figures.helpers import utc_yesterday
+from figures.log import QueryStats, wrap_connection
+from figures.models import EnrollmentData, LearnerCourseGradeMetrics
+from figures.pipeline.course_daily_metrics import CourseDailyMetricsLoader
+from figures.pipeline.enrollment_metrics_next import update_enrollment_data_for_course
+from figures.pipeline.site_daily_metrics import SiteDailyMetricsLoader
+from figures.pipeline.site_monthly_metrics import fill_month
+from figures.sites import default_site
+from figures.views import LearnerMetricsViewSetV2
+
+from devsite.load_data import LOAD_DATA_PREFIX
+
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'benchmark_baselines.json')
+
+# Wall times may exceed the baseline by this fraction before they are reported
+DEFAULT_TOLERANCE = 0.5
+
+# Wall times within this many seconds of the baseline are never reported
+DEFAULT_MIN_SLOWDOWN = 0.1
+
+BENCHMARK_STAFF_USERNAME = 'benchmark_staff'
+
+TIERS = OrderedDict([
+    ('tiny', dict(courses=5, learners=200, enrollments_per_course=50,
+                  modules_per_enrollment=5)),
+    ('small', dict(courses=50, learners=5000, enrollments_per_course=200,
+                   modules_per_enrollment=10)),
+    ('medium', dict(courses=200, learners=50000, enrollments_per_course=1000,
+                    modules_per_enrollment=20)),
+    ('large', dict(courses=1000, learners=250000, enrollments_per_course=1000,
+                   modules_per_enrollment=50)),
+])
+
+
+def tier_course_ids():
+    """Return the ids of the generated courses
+    """
+    return [str(course_id) for course_id in CourseOverview.objects.filter(
+        org=LOAD_DATA_PREFIX).order_by('id').values_list('id', flat=True)]
+
+
+def measure(func, *args):
+    """Call `func` and return its wall time and database query count and time
+    """
+    stats = QueryStats()
+    start_time = timeit.default_timer()
+    with wrap_connection(stats):
+        func(*args)
+    return dict(elapsed=timeit.default_timer() - start_time,
+                queries=stats.count,
+                query_time=stats.time)
+
+
+def bench_course_daily_metrics(site, course_ids, date_for):
+    for course_id in course_ids:
+        CourseDailyMetricsLoader(course_id).load(date_for=date_for, force_update=True)
+
+
+def bench_site_daily_metrics(site, course_ids, date_for):
+    SiteDailyMetricsLoader().load(site=site, date_for=date_for, force_update=True)
+
+
+def bench_enrollment_data(site, course_ids, date_for):
+    for course_id in course_ids:
+        update_enrollment_data_for_course(course_id)
+
+
+def bench_site_monthly_metrics(site, course_ids, date_for):
+    fill_month(site=site, month_for=date_for, overwrite=True)
+
+
+def bench_learner_metrics_api(site, course_ids, date_for):
+    staff_user, _created = get_user_model().objects.get_or_create(
+        username=BENCHMARK_STAFF_USERNAME,
+        defaults=dict(is_staff=True, is_superuser=True))
+    request = APIRequestFactory().get('/figures/api/learner-metrics/')
+    force_authenticate(request, user=staff_user)
+    # The paginated response builds its page links from the request host
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        response = LearnerMetricsViewSetV2.as_view({'get': 'list'})(request)
+        response.render()
+
+
+def clear_enrollment_data(course_ids):
+    """Delete the generated courses' enrollment data so it is collected again
+    """
+    for course_id in course_ids:
+        EnrollmentData.objects.filter(course_id=course_id).delete()
+        LearnerCourseGradeMetrics.objects.filter(course_id=course_id).delete()
+
+
+# Stages run in this order. Each is called with the site, the generated course
+# ids and the date to collect metrics for
+STAGES = OrderedDict([
+    ('course_daily_metrics', bench_course_daily_metrics),
+    ('site_daily_metrics', bench_site_daily_metrics),
+    ('enrollment_data', bench_enrollment_data),
+    ('site_monthly_metrics', bench_site_monthly_metrics),
+    ('learner_metrics_api', bench_learner_metrics_api),
+])
+
+
+def run_benchmarks(stages=None, site=None, date_for=None, warmup=False, verbose=True):
+    """Run the benchmark stages over the generated data
+
+    The first run over newly generated data also fills the tables Figures
+    keeps between pipeline runs, like the daily activity collections and the
+    first enrollments, and the caches. Set `warmup` to run the stages once
+    before they are measured, as the baselines are.
+
+    Returns an ordered dict of the measurements for each stage
+    """
+    site = site or default_site()
+    date_for = date_for or utc_yesterday()
+    course_ids = tier_course_ids()
+    stages = [name for name in STAGES.keys() if not stages or name in stages]
+    if warmup:
+        clear_enrollment_data(course_ids)
+        for name in stages:
+            STAGES[name](site, course_ids, date_for)
+    clear_enrollment_data(course_ids)
+    results = OrderedDict()
+    for name in stages:
+        func = STAGES[name]
+        results[name] = measure(func, site, course_ids, date_for)
+        if verbose:
+            print('{}: {elapsed:.3f} s, {queries} queries, {query_time:.3f} s in queries'.format(
+                name, **results[name]))
+    return results
+
+
+def load_baselines(path=BASELINES_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baselines_file:
+        return json.load(baselines_file)
+
+
+def save_baseline(tier, results, path=BASELINES_FILE):
+    """Store the results as the tier's baseline for this database vendor
+    """
+    baselines = load_baselines(path)
+    baselines.setdefault(connection.vendor, {})[tier] = dict(
+        (name, dict(elapsed=round(values['elapsed'], 3),
+                    queries=values['queries']))
+        for name, values in results.items())
+    with open(path, 'w') as baselines_file:
+        json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+        baselines_file.write('\n')
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE,
+            min_slowdown=DEFAULT_MIN_SLOWDOWN):
+    """Compare the benchmark results with the baseline
+
+    A stage is slower when its wall time exceeds the baseline by more than the
+    `tolerance` fraction and by more than `min_slowdown` seconds.
+
+    Returns a list of dicts, one for each stage, with the measurements, the
+    baseline values and a `status` of 'ok', 'regression' or 'new' when the
+    stage has no baseline
+    """
+    rows = []
+    for name, values in results.items():
+        row = dict(stage=name, elapsed=values['elapsed'], queries=values['queries'],
+                   baseline_elapsed=None, baseline_queries=None, status='new')
+        if name in baseline:
+            row['baseline_elapsed'] = baseline[name]['elapsed']
+            row['baseline_queries'] = baseline[name]['queries']
+            baseline_elapsed = baseline[name]['elapsed']
+            slower = (values['elapsed'] > baseline_elapsed * (1 + tolerance) and
+                      values['elapsed'] - baseline_elapsed > min_slowdown)
+            more_queries = values['queries'] > baseline[name]['queries']
+            row['status'] = 'regression' if slower or more_queries else 'ok'
+        rows.append(row)
+    return rows
+
+
+def format_report(rows):
+    """Return the comparison rows as a text table
+    """
+    header = '{:<22} {:>10} {:>10} {:>8} {:>9} {:>9}  {}'.format(
+        'stage', 'elapsed', 'baseline', 'change', 'queries', 'baseline', 'status')
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        if row['baseline_elapsed']:
+            change = '{:+.0%}'.format(row['elapsed'] / row['baseline_elapsed'] - 1)
+        else:
+            change = '-'
+        lines.append('{:<22} {:>10.3f} {:>10} {:>8} {:>9} {:>9}  {}'.format(
+            row['stage'],
+            row['elapsed'],
+            '-' if row['baseline_elapsed'] is None else '{:.3f}'.format(
+                row['baseline_elapsed']),
+            change,
+            row['queries'],
+            '-' if row['baseline_queries'] is None else row['baseline_queries'],
+            row['status']))
+    return '\n'.join(lines)
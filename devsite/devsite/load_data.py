@@ -0,0 +1,554 @@
+"""
+Bulk generates synthetic platform data for benchmarks and load testing
+
+`devsite.seed` creates the demo data one row at a time through the models,
+which is far too slow for realistic volumes. This module writes users, course
+overviews, enrollments, StudentModule records, certificates and Figures
+metrics with `bulk_create` in large batches.
+
+Values are drawn from a `random.Random` seeded by the caller, so the same
+arguments generate the same data. Generated users, courses and sites are named
+with the `LOAD_DATA_PREFIX` so they can be found and removed.
+
+The data can be shaped like production data:
+
+* Course sizes follow a power law. The course at rank `r`, starting at 1,
+  enrolls `enrollments_per_course / r ** zipf_exponent` learners. So a few
+  courses are large and most are small. An exponent of zero gives every course
+  the same size
+* With a daily activity rate, the number of days each enrollment is active is
+  drawn from a binomial distribution over the days since the learner enrolled
+* A fraction of the enrollments complete their course and get a certificate
+
+The Figures metrics are computed from the generated data for a window of days
+ending yesterday, as if the daily pipeline had run on each of those days. The
+window starts on the first of a month so that the monthly active user counts
+are complete.
+
+Run it against a throwaway database. For example, set ``DATABASE_URL`` in the
+devsite ``.env`` file to ``sqlite:////tmp/figures-load.sqlite3`` and run the
+migrations first.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+import math
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.sites.models import Site
+from django.db.models import Max
+from django.utils.timezone import utc
+
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from student.models import CourseEnrollment, UserProfile
+
+from organizations.models import Organization, OrganizationCourse
+
+from figures.compat import GeneratedCertificate, StudentModule
+from figures.helpers import as_course_key, is_multisite
+from figures.models import (
+    CourseDailyMetrics,
+    CourseMauMetrics,
+    EnrollmentData,
+    LearnerCourseGradeMetrics,
+    SiteDailyMetrics,
+    SiteMauMetrics,
+    SiteMonthlyMetrics,
+)
+from figures.pipeline.course_daily_metrics import calc_average_days_from_totals
+from figures.pipeline.daily_metrics_sweep import certificate_counts_by_day
+from figures.sites import default_site
+from six.moves import range
+
+if is_multisite():
+    from organizations.models import UserOrganizationMapping
+
+
+LOAD_DATA_PREFIX = 'load'
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Grades are generated as a fraction of these
+POINTS_POSSIBLE = 100.0
+MIN_SECTIONS = 5
+MAX_SECTIONS = 20
+
+
+def bulk_insert(model, objs, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert the model instances from the iterable `objs` in batches
+
+    Only one batch is held in memory at a time. Django splits each batch
+    into as many inserts as the database needs. Returns the number of rows
+    inserted
+    """
+    objs = iter(objs)
+    count = 0
+    while True:
+        batch = list(islice(objs, batch_size))
+        if not batch:
+            return count
+        model.objects.bulk_create(batch)
+        count += len(batch)
+
+
+def load_data_org(site_index):
+    """Return the organization of the generated site's courses
+
+    The first site's courses keep the plain prefix, which the benchmarks use
+    to find them
+    """
+    if site_index == 0:
+        return LOAD_DATA_PREFIX
+    return '{}{}'.format(LOAD_DATA_PREFIX, site_index)
+
+
+def load_data_course_id(index, org=LOAD_DATA_PREFIX):
+    return 'course-v1:{}+LD{:05d}+Run'.format(org, index)
+
+
+def random_datetime(rng, start, end):
+    """Return a datetime between `start` and `end`, drawn from `rng`
+    """
+    seconds = max(int((end - start).total_seconds()), 1)
+    return start + timedelta(seconds=rng.randint(0, seconds - 1))
+
+
+def course_sizes(count, max_size, zipf_exponent):
+    """Return the enrollment counts for `count` courses, largest first
+    """
+    return [max(1, int(round(max_size / float(rank) ** zipf_exponent)))
+            for rank in range(1, count + 1)]
+
+
+def active_day_count(rng, days, rate):
+    """Draw the number of days out of `days` that a learner is active
+
+    The count is binomial. It is drawn from the normal approximation, so the
+    draw costs the same for any number of days
+    """
+    mean = days * rate
+    count = int(round(rng.gauss(mean, math.sqrt(mean * (1 - rate)))))
+    return min(max(count, 0), days)
+
+
+def active_datetimes(rng, created, end, rate, modules_per_enrollment):
+    """Return the modified times of an enrollment's StudentModule records
+
+    The learner is active on a binomially distributed number of the days
+    between `created` and `end`. There is a record for each active day, and
+    at least `modules_per_enrollment` records if the learner is active at all
+    """
+    first_day = created.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = max((end - first_day).days, 1)
+    active_days = sorted(rng.sample(range(days), active_day_count(rng, days, rate)))
+    modified = []
+    for i in range(max(modules_per_enrollment, len(active_days)) if active_days else 0):
+        day_start = first_day + timedelta(days=active_days[i % len(active_days)])
+        modified.append(random_datetime(rng,
+                                        max(day_start, created),
+                                        min(day_start + timedelta(days=1), end)))
+    return modified
+
+
+def generate_sites(count):
+    """Return the sites and organizations for the generated data
+
+    The first site is the default site. In multisite mode, each site gets an
+    organization through which Figures maps courses and users to the site.
+    In standalone mode all data belongs to the default site and there is no
+    organization.
+
+    Returns a list of `(site, organization)` tuples
+    """
+    if not is_multisite():
+        return [(default_site(), None)]
+    sites = []
+    for i in range(count):
+        if i == 0:
+            site = default_site()
+        else:
+            site, _created = Site.objects.get_or_create(
+                domain='{}.example.com'.format(load_data_org(i)),
+                defaults=dict(name='Load Site {}'.format(i)))
+        org, _created = Organization.objects.get_or_create(
+            short_name=load_data_org(i),
+            defaults=dict(name='Load Organization {}'.format(i), active=True))
+        org.sites.add(site)
+        sites.append((site, org))
+    return sites
+
+
+def generate_users(count, start, organization=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Create `count` learners with profiles, joined on `start`
+
+    The learners are added to the organization if one is given
+
+    Returns the new user ids
+    """
+    user_model = get_user_model()
+    prefix = LOAD_DATA_PREFIX + '_user_'
+    first_index = user_model.objects.filter(username__startswith=prefix).count()
+    last_id = user_model.objects.aggregate(Max('id'))['id__max'] or 0
+    password = make_password(None)
+    names = ['{}{}'.format(prefix, i) for i in range(first_index, first_index + count)]
+    bulk_insert(user_model, (
+        user_model(username=name,
+                   email='{}@example.com'.format(name),
+                   password=password,
+                   date_joined=start) for name in names), batch_size)
+    # bulk_create does not set the primary keys on all databases
+    user_ids = list(user_model.objects.filter(
+        id__gt=last_id, username__startswith=prefix).order_by('id').values_list('id', flat=True))
+    bulk_insert(UserProfile, (UserProfile(user_id=user_id, name='Learner {}'.format(user_id))
+                              for user_id in user_ids), batch_size)
+    if organization:
+        bulk_insert(UserOrganizationMapping, (
+            UserOrganizationMapping(user_id=user_id, organization=organization, is_active=True)
+            for user_id in user_ids), batch_size)
+    return user_ids
+
+
+def generate_course_overviews(count, start, org=LOAD_DATA_PREFIX, organization=None,
+                              batch_size=DEFAULT_BATCH_SIZE):
+    """Create `count` course overviews that started on `start`
+
+    The courses are added to the organization if one is given
+
+    Returns the new course ids
+    """
+    first_index = CourseOverview.objects.filter(org=org).count()
+    course_ids = [load_data_course_id(i, org=org)
+                  for i in range(first_index, first_index + count)]
+    bulk_insert(CourseOverview, (
+        CourseOverview(id=as_course_key(course_id),
+                       version=CourseOverview.VERSION,
+                       display_name='Load Course {}'.format(course_id),
+                       org=org,
+                       display_org_with_default=org,
+                       number=as_course_key(course_id).course,
+                       created=start,
+                       start=start,
+                       enrollment_start=start) for course_id in course_ids), batch_size)
+    if organization:
+        bulk_insert(OrganizationCourse, (
+            OrganizationCourse(course_id=course_id, organization=organization, active=True)
+            for course_id in course_ids), batch_size)
+    return course_ids
+
+
+def generate_course_activity(course_id, user_ids, modules_per_enrollment, start, end,
+                             rng, activity_rate=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Enroll the users in the course and create their StudentModule records
+
+    Each enrollment is created between `start` and `end`. Without an
+    `activity_rate`, each enrollment gets `modules_per_enrollment` StudentModule
+    records modified between its enrollment and `end`. See `active_datetimes`
+    for the records with an `activity_rate`.
+
+    Returns a tuple of the StudentModule record count and a list of
+    `(user_id, created, active_dates)` tuples for the enrollments
+    """
+    course_key = as_course_key(course_id)
+    enrolled = [(user_id, random_datetime(rng, start, end)) for user_id in user_ids]
+    bulk_insert(CourseEnrollment, (
+        CourseEnrollment(user_id=user_id,
+                         course_id=course_key,
+                         created=created,
+                         is_active=True,
+                         mode='audit') for user_id, created in enrolled), batch_size)
+
+    activity = []
+    for user_id, created in enrolled:
+        if activity_rate is None:
+            modified = [random_datetime(rng, created, end)
+                        for _ in range(modules_per_enrollment)]
+        else:
+            modified = active_datetimes(rng, created, end, activity_rate,
+                                        modules_per_enrollment)
+        activity.append((user_id, created, modified))
+
+    sm_count = bulk_insert(StudentModule, (
+        StudentModule(student_id=user_id,
+                      course_id=course_key,
+                      created=created,
+                      modified=when)
+        for user_id, created, modified in activity for when in modified), batch_size)
+    return sm_count, [(user_id, created, set(when.date() for when in modified))
+                      for user_id, created, modified in activity]
+
+
+def generate_certificates(course_id, enrollments, completion_rate, end, rng,
+                          batch_size=DEFAULT_BATCH_SIZE):
+    """Create certificates for a `completion_rate` fraction of the enrollments
+
+    Returns a dict of the certificate created datetimes by user id
+    """
+    completed = {}
+    for user_id, created, _active_dates in enrollments:
+        if rng.random() < completion_rate:
+            completed[user_id] = random_datetime(rng, created, end)
+    course_key = as_course_key(course_id)
+    bulk_insert(GeneratedCertificate, (
+        GeneratedCertificate(user_id=user_id, course_id=course_key, created_date=created_date)
+        for user_id, created_date in completed.items()), batch_size)
+    return completed
+
+
+def generate_enrollment_metrics(site, course_id, enrollments, completed, date_for, rng,
+                                batch_size=DEFAULT_BATCH_SIZE):
+    """Create the enrollment data and grade metrics records for the course
+
+    Learners who completed the course worked all of its sections. The others
+    worked a random number of them.
+
+    Returns a dict of the progress by user id
+    """
+    sections_possible = rng.randint(MIN_SECTIONS, MAX_SECTIONS)
+    grades = {}
+    for user_id, _created, _active_dates in enrollments:
+        if user_id in completed:
+            grades[user_id] = sections_possible
+        else:
+            grades[user_id] = rng.randint(0, sections_possible - 1)
+
+    def grade_values(user_id):
+        progress = grades[user_id] / float(sections_possible)
+        return dict(points_possible=POINTS_POSSIBLE,
+                    points_earned=round(POINTS_POSSIBLE * progress, 2),
+                    sections_worked=grades[user_id],
+                    sections_possible=sections_possible)
+
+    bulk_insert(EnrollmentData, (
+        EnrollmentData(site=site,
+                       user_id=user_id,
+                       course_id=course_id,
+                       date_for=date_for,
+                       date_enrolled=created.date(),
+                       is_enrolled=True,
+                       is_completed=user_id in completed,
+                       progress_percent=grades[user_id] / float(sections_possible),
+                       **grade_values(user_id))
+        for user_id, created, _active_dates in enrollments), batch_size)
+    bulk_insert(LearnerCourseGradeMetrics, (
+        LearnerCourseGradeMetrics(site=site,
+                                  user_id=user_id,
+                                  course_id=course_id,
+                                  date_for=date_for,
+                                  **grade_values(user_id))
+        for user_id, _created, _active_dates in enrollments), batch_size)
+    return dict((user_id, grades[user_id] / float(sections_possible)) for user_id in grades)
+
+
+def cumulative_totals(values_by_date, dates):
+    """Return the running totals of the values up to and including each date
+
+    Values dated before the first date are included in the totals
+    """
+    total = sum(value for when, value in values_by_date.items() if when < dates[0])
+    totals = {}
+    for when in dates:
+        total += values_by_date.get(when, 0)
+        totals[when] = total
+    return totals
+
+
+def month_to_date_counts(users_by_date, dates):
+    """Return the number of distinct users active in the month up to each date
+    """
+    counts = {}
+    month_users = set()
+    for when in dates:
+        if when.day == 1:
+            month_users = set()
+        month_users.update(users_by_date.get(when, ()))
+        counts[when] = len(month_users)
+    return counts
+
+
+def generate_course_metrics(site, course_id, enrollments, progress, dates,
+                            batch_size=DEFAULT_BATCH_SIZE):
+    """Create the daily and MAU metrics records for the course over the dates
+
+    Average progress is taken over the learners enrolled as of each date, using
+    their current progress. The certificate counts and days to complete totals
+    are read from the course's generated certificates with
+    `certificate_counts_by_day`, so they follow the daily pipeline's rules and
+    the pipeline can carry the totals forward.
+
+    Returns a dict of the sets of active user ids by date, for the site metrics
+    """
+    enrolled_counts = Counter()
+    progress_sums = defaultdict(float)
+    active_users = defaultdict(set)
+    for user_id, created, active_dates in enrollments:
+        enrolled_counts[created.date()] += 1
+        progress_sums[created.date()] += progress.get(user_id, 0.0)
+        for when in active_dates:
+            active_users[when].add(user_id)
+    # Read back from the generated certificates with the pipeline's own rules
+    certificate_counts = dict(zip(dates, certificate_counts_by_day([course_id], dates)[course_id]))
+
+    enrollment_counts = cumulative_totals(enrolled_counts, dates)
+    progress_totals = cumulative_totals(progress_sums, dates)
+    mau = month_to_date_counts(active_users, dates)
+
+    def course_daily_metrics(when):
+        average_progress = None
+        if enrollment_counts[when]:
+            average_progress = '{:.2f}'.format(
+                progress_totals[when] / enrollment_counts[when])
+        totals = certificate_counts[when]
+        return CourseDailyMetrics(site=site,
+                                  date_for=when,
+                                  course_id=course_id,
+                                  enrollment_count=enrollment_counts[when],
+                                  active_learners_today=len(active_users.get(when, ())),
+                                  average_progress=average_progress,
+                                  average_days_to_complete=int(round(
+                                      calc_average_days_from_totals(totals))),
+                                  num_learners_completed=totals['num_learners_completed'],
+                                  days_to_complete_sum=totals['days_sum'],
+                                  days_to_complete_count=totals['days_count'])
+
+    bulk_insert(CourseDailyMetrics, (course_daily_metrics(when) for when in dates), batch_size)
+    bulk_insert(CourseMauMetrics, (
+        CourseMauMetrics(site=site, course_id=course_id, date_for=when, mau=mau[when])
+        for when in dates), batch_size)
+    return dict((when, active_users[when]) for when in dates if when in active_users)
+
+
+def generate_site_metrics(site, user_count, course_count, enrollment_counts, active_users,
+                          dates, batch_size=DEFAULT_BATCH_SIZE):
+    """Create the daily, monthly and MAU metrics records for the site over the dates
+
+    `enrollment_counts` has the site's total enrollments as of each date and
+    `active_users` the sets of active user ids by date
+    """
+    mau = month_to_date_counts(active_users, dates)
+    records = []
+    cumulative_active_user_count = 0
+    for when in dates:
+        todays_active_user_count = len(active_users.get(when, ()))
+        cumulative_active_user_count += todays_active_user_count
+        records.append(SiteDailyMetrics(
+            site=site,
+            date_for=when,
+            cumulative_active_user_count=cumulative_active_user_count,
+            todays_active_user_count=todays_active_user_count,
+            total_user_count=user_count,
+            course_count=course_count,
+            total_enrollment_count=enrollment_counts[when],
+            mau=mau[when]))
+    bulk_insert(SiteDailyMetrics, records, batch_size)
+    bulk_insert(SiteMauMetrics, (SiteMauMetrics(site=site, date_for=when, mau=mau[when])
+                                 for when in dates), batch_size)
+    # The month's count as of its last date in the window
+    month_counts = dict((when.replace(day=1), mau[when]) for when in dates)
+    bulk_insert(SiteMonthlyMetrics, (
+        SiteMonthlyMetrics(site=site, month_for=month_for, active_user_count=count)
+        for month_for, count in sorted(month_counts.items())), batch_size)
+    return len(records) + len(dates) + len(month_counts)
+
+
+def metrics_dates(start, end, metrics_days):
+    """Return the dates to create metrics for
+
+    The dates end the day before `end`. They go back `metrics_days` days and
+    then to the first of that month, but not before `start`
+    """
+    last_date = (end - timedelta(days=1)).date()
+    first_date = (last_date - timedelta(days=metrics_days - 1)).replace(day=1)
+    first_date = max(first_date, start.date())
+    return [first_date + timedelta(days=i) for i in range((last_date - first_date).days + 1)]
+
+
+def generate_load_data(courses, learners, enrollments_per_course,
+                       modules_per_enrollment, sites=1, zipf_exponent=0.0,
+                       activity_rate=None, completion_rate=0.0, metrics_days=0,
+                       days_back=365, end=None, seed=0,
+                       batch_size=DEFAULT_BATCH_SIZE, verbose=True):
+    """Generate sites, learners, courses, activity, certificates and metrics
+
+    Each site gets `courses` courses and `learners` new users. The largest
+    course on a site enrolls `enrollments_per_course` of the site's learners
+    and the other course sizes fall off with `zipf_exponent`. Activity runs
+    from `days_back` days before `end`, which defaults to the start of today
+    (UTC), so that yesterday has data for the daily pipeline.
+
+    More than one site needs multisite mode. Certificates are created when
+    `completion_rate` is set. Figures metrics are created for `metrics_days`
+    days when it is set. See the module docstring.
+
+    Returns a dict with the `course_ids` and the created record counts
+    """
+    rng = random.Random(seed)
+    if end is None:
+        end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0,
+                                        tzinfo=utc)
+    start = end - timedelta(days=days_back)
+    dates = metrics_dates(start, end, metrics_days) if metrics_days else []
+
+    counts = dict(sites=0, users=0, courses=0, enrollments=0, student_modules=0,
+                  certificates=0, metrics=0)
+    all_course_ids = []
+    for site_index, (site, organization) in enumerate(generate_sites(sites)):
+        user_ids = generate_users(learners, start, organization=organization,
+                                  batch_size=batch_size)
+        course_ids = generate_course_overviews(courses, start,
+                                               org=load_data_org(site_index),
+                                               organization=organization,
+                                               batch_size=batch_size)
+        sizes = course_sizes(len(course_ids), min(enrollments_per_course, len(user_ids)),
+                             zipf_exponent)
+        site_enrollment_counts = Counter()
+        site_active_users = defaultdict(set)
+        for i, (course_id, size) in enumerate(zip(course_ids, sizes)):
+            sm_count, enrollments = generate_course_activity(
+                course_id,
+                rng.sample(user_ids, size),
+                modules_per_enrollment,
+                start,
+                end,
+                rng,
+                activity_rate=activity_rate,
+                batch_size=batch_size)
+            completed = {}
+            if completion_rate:
+                completed = generate_certificates(course_id, enrollments, completion_rate,
+                                                  end, rng, batch_size=batch_size)
+            if dates:
+                progress = generate_enrollment_metrics(site, course_id, enrollments,
+                                                       completed, dates[-1], rng,
+                                                       batch_size=batch_size)
+                active_users = generate_course_metrics(site, course_id, enrollments,
+                                                       progress, dates,
+                                                       batch_size=batch_size)
+                site_enrollment_counts.update(cumulative_totals(
+                    Counter(created.date() for _user_id, created, _dates in enrollments),
+                    dates))
+                for when, users in active_users.items():
+                    site_active_users[when].update(users)
+                counts['metrics'] += 2 * len(enrollments) + 2 * len(dates)
+            counts['enrollments'] += len(enrollments)
+            counts['student_modules'] += sm_count
+            counts['certificates'] += len(completed)
+            if verbose:
+                print('[{} of {}] {}: {} enrollments, {} StudentModule records, '
+                      '{} certificates'.format(i + 1, len(course_ids), course_id,
+                                               len(enrollments), sm_count, len(completed)))
+        if dates:
+            counts['metrics'] += generate_site_metrics(site, len(user_ids), len(course_ids),
+                                                       site_enrollment_counts,
+                                                       site_active_users, dates,
+                                                       batch_size=batch_size)
+        counts['sites'] += 1
+        counts['users'] += len(user_ids)
+        counts['courses'] += len(course_ids)
+        all_course_ids.extend(course_ids)
+    counts['course_ids'] = all_course_ids
+    return counts
@@ -0,0 +1,145 @@
+"""
+This command compares the StudentModule activity filters Figures used with
+date part lookups (``modified__year``, ``modified__month``, ``modified__day``)
+against the half open range filters in `figures.time_windows`
+
+It seeds a StudentModule table (with ``--seed``), then for each day, month and
+month as of day window prints the database query plan and the average run time
+of a count query for both filters. Run it against MySQL to see the plans the
+LMS database uses.
+
+The range filters read only the window from the ``modified`` index. Django
+rewrites a ``__year`` lookup into a range, so at best the date part filters
+read the whole year from the index and evaluate the month and day functions on
+every row. Without the ``__year`` lookup they scan the table.
+
+Example:
+
+    ./manage.py benchmark_activity_queries --seed 1000000 --date-for 2020-06-15
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from datetime import datetime, timedelta
+import random
+import timeit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from figures.compat import StudentModule
+from figures.helpers import as_date
+from figures.time_windows import (
+    day_window,
+    filter_day,
+    filter_month,
+    filter_month_as_of_day,
+)
+
+
+SEED_BATCH_SIZE = 10000
+SEED_USER_COUNT = 1000
+SEED_COURSE_IDS = ['course-v1:BenchX+BM{}+Run'.format(i) for i in range(20)]
+
+
+def date_part_day(queryset, date_for):
+    date_for = as_date(date_for)
+    return queryset.filter(modified__year=date_for.year,
+                           modified__month=date_for.month,
+                           modified__day=date_for.day)
+
+
+def date_part_month(queryset, date_for):
+    date_for = as_date(date_for)
+    return queryset.filter(modified__year=date_for.year,
+                           modified__month=date_for.month)
+
+
+def date_part_month_as_of_day(queryset, date_for):
+    date_for = as_date(date_for)
+    return queryset.filter(modified__year=date_for.year,
+                           modified__month=date_for.month,
+                           modified__day__lte=date_for.day)
+
+
+QUERIES = [
+    ('day', date_part_day, filter_day),
+    ('month', date_part_month, filter_month),
+    ('month as of day', date_part_month_as_of_day, filter_month_as_of_day),
+]
+
+
+def explain(queryset):
+    """Return the database query plan rows for the queryset
+    """
+    sql, params = queryset.query.sql_with_params()
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return cursor.fetchall()
+
+
+def seed_student_modules(count, date_for, days_back):
+    """Bulk create `count` StudentModule records modified in the `days_back`
+    days up to `date_for`
+    """
+    users = []
+    for i in range(SEED_USER_COUNT):
+        user, _ = get_user_model().objects.get_or_create(
+            username='benchmark_user_{}'.format(i))
+        users.append(user)
+    end = day_window(date_for)[1]
+    created = 0
+    while created < count:
+        batch = []
+        for _ in range(min(SEED_BATCH_SIZE, count - created)):
+            modified = end - timedelta(seconds=random.randint(1, days_back * 86400))
+            batch.append(StudentModule(student=random.choice(users),
+                                       course_id=random.choice(SEED_COURSE_IDS),
+                                       created=modified,
+                                       modified=modified))
+        StudentModule.objects.bulk_create(batch)
+        created += len(batch)
+        print('Seeded {} of {} StudentModule records'.format(created, count))
+
+
+class Command(BaseCommand):
+    help = 'Compares date part and half open range StudentModule activity queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed',
+                            type=int,
+                            default=0,
+                            help='Number of StudentModule records to create first')
+        parser.add_argument('--days-back',
+                            type=int,
+                            default=365,
+                            help='Seeded records are modified over this many days')
+        parser.add_argument('--date-for',
+                            help='Day to query. Defaults to today')
+        parser.add_argument('--repeat',
+                            type=int,
+                            default=5,
+                            help='Number of times to run each query')
+
+    def handle(self, *args, **options):
+        if options['date_for']:
+            date_for = as_date(options['date_for'])
+        else:
+            date_for = datetime.utcnow().date()
+        if options['seed']:
+            seed_student_modules(options['seed'], date_for, options['days_back'])
+
+        print('Database vendor: {}'.format(connection.vendor))
+        print('StudentModule records: {}'.format(StudentModule.objects.count()))
+        for name, date_part_filter, range_filter in QUERIES:
+            for label, filter_func in [('date part', date_part_filter),
+                                       ('range', range_filter)]:
+                queryset = filter_func(StudentModule.objects.all(), date_for)
+                elapsed = timeit.timeit(queryset.count, number=options['repeat'])
+                print('\n{} window, {} filter'.format(name, label))
+                print('count={}, avg seconds={:.4f}'.format(
+                    queryset.count(), elapsed / options['repeat']))
+                for row in explain(queryset):
+                    print('  {}'.format(row))
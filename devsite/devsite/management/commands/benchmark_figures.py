@@ -0,0 +1,99 @@
+"""
+This command benchmarks the Figures pipeline and API at a synthetic data scale
+tier and compares the results with the stored baselines
+
+With ``--generate``, the tier's data is created first. The stages are run once
+before they are measured, so that caches and the tables Figures keeps between
+pipeline runs are filled. Run it against a throwaway database, since the
+benchmark recollects the generated courses' enrollment data. Baselines are
+stored for each tier and database vendor. See `devsite.benchmarks` and
+`devsite.load_data`
+
+Examples:
+
+    ./manage.py benchmark_figures --tier small --generate
+    ./manage.py benchmark_figures --tier small --stages course_daily_metrics enrollment_data
+    ./manage.py benchmark_figures --tier small --save-baseline
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from devsite import benchmarks
+from devsite.load_data import generate_load_data
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the Figures pipeline and API with synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tier',
+                            choices=list(benchmarks.TIERS.keys()),
+                            default='tiny',
+                            help='Data scale tier')
+        parser.add_argument('--generate',
+                            action='store_true',
+                            default=False,
+                            help='Generate the tier data before running the benchmarks')
+        parser.add_argument('--no-warmup',
+                            action='store_true',
+                            default=False,
+                            help=('Measure the first run of the stages. The results '
+                                  'are not comparable with the baselines'))
+        parser.add_argument('--seed',
+                            type=int,
+                            default=0,
+                            help='Random seed for the generated data')
+        parser.add_argument('--stages',
+                            nargs='+',
+                            choices=list(benchmarks.STAGES.keys()),
+                            help='Stages to run. Defaults to all stages')
+        parser.add_argument('--baselines',
+                            default=benchmarks.BASELINES_FILE,
+                            help='Baselines JSON file')
+        parser.add_argument('--save-baseline',
+                            action='store_true',
+                            default=False,
+                            help='Store the results as the baseline for the tier')
+        parser.add_argument('--tolerance',
+                            type=float,
+                            default=benchmarks.DEFAULT_TOLERANCE,
+                            help='Fraction wall times may exceed the baseline by')
+        parser.add_argument('--min-slowdown',
+                            type=float,
+                            default=benchmarks.DEFAULT_MIN_SLOWDOWN,
+                            help='Seconds wall times may exceed the baseline by')
+        parser.add_argument('--fail-on-regression',
+                            action='store_true',
+                            default=False,
+                            help='Exit with an error if a stage regressed')
+
+    def handle(self, *args, **options):
+        tier = options['tier']
+        if options['generate']:
+            print('Generating "{}" tier data: {}'.format(tier, benchmarks.TIERS[tier]))
+            counts = generate_load_data(seed=options['seed'], **benchmarks.TIERS[tier])
+            counts.pop('course_ids')
+            print('Generated {}'.format(counts))
+
+        print('Running "{}" tier benchmarks on {}'.format(tier, connection.vendor))
+        results = benchmarks.run_benchmarks(
+            stages=options['stages'],
+            warmup=not options['no_warmup'])
+        if options['save_baseline']:
+            benchmarks.save_baseline(tier, results, path=options['baselines'])
+            print('Saved the baseline to {}'.format(options['baselines']))
+            return
+
+        baseline = benchmarks.load_baselines(options['baselines']).get(
+            connection.vendor, {}).get(tier, {})
+        rows = benchmarks.compare(results, baseline,
+                                  tolerance=options['tolerance'],
+                                  min_slowdown=options['min_slowdown'])
+        print(benchmarks.format_report(rows))
+        regressions = [row['stage'] for row in rows if row['status'] == 'regression']
+        if regressions and options['fail_on_regression']:
+            raise CommandError('Regressions in stages: {}'.format(', '.join(regressions)))
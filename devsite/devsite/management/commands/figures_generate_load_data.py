@@ -0,0 +1,102 @@
+"""
+This command bulk generates synthetic platform data and Figures metrics to
+reproduce production scale on a development machine
+
+The same arguments and seed generate the same data. Run it against a
+throwaway database. See `devsite.load_data` for how the data are shaped
+
+Examples:
+
+    ./manage.py figures_generate_load_data --courses 200 --learners 20000
+    ./manage.py figures_generate_load_data --sites 5 --max-enrollments 5000 --seed 7
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+from django.core.management.base import BaseCommand, CommandError
+
+from figures.helpers import is_multisite
+
+from devsite.load_data import DEFAULT_BATCH_SIZE, generate_load_data
+
+
+class Command(BaseCommand):
+    help = 'Bulk generates synthetic data for load testing Figures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sites',
+                            type=int,
+                            default=1,
+                            help='Number of sites. More than one needs multisite mode')
+        parser.add_argument('--courses',
+                            type=int,
+                            default=20,
+                            help='Number of courses for each site')
+        parser.add_argument('--learners',
+                            type=int,
+                            default=1000,
+                            help='Number of learners for each site')
+        parser.add_argument('--max-enrollments',
+                            type=int,
+                            default=500,
+                            help='Number of enrollments in the largest course of each site')
+        parser.add_argument('--zipf-exponent',
+                            type=float,
+                            default=1.0,
+                            help=('Power law exponent for the course sizes. Zero gives '
+                                  'every course the maximum number of enrollments'))
+        parser.add_argument('--modules-per-enrollment',
+                            type=int,
+                            default=5,
+                            help='Minimum StudentModule records for each active enrollment')
+        parser.add_argument('--activity-rate',
+                            type=float,
+                            default=0.05,
+                            help='Chance that an enrolled learner is active on a given day')
+        parser.add_argument('--completion-rate',
+                            type=float,
+                            default=0.2,
+                            help='Fraction of the enrollments that earn a certificate')
+        parser.add_argument('--days-back',
+                            type=int,
+                            default=365,
+                            help='Number of days of activity, ending yesterday')
+        parser.add_argument('--metrics-days',
+                            type=int,
+                            default=30,
+                            help=('Number of days of Figures metrics, ending yesterday. '
+                                  'Zero skips the metrics'))
+        parser.add_argument('--seed',
+                            type=int,
+                            default=0,
+                            help='Random seed for the generated data')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=DEFAULT_BATCH_SIZE,
+                            help='Number of records held in memory for each bulk insert')
+
+    def handle(self, *args, **options):
+        if options['sites'] > 1 and not is_multisite():
+            raise CommandError('More than one site needs multisite mode')
+        for name in ['activity_rate', 'completion_rate']:
+            if not 0 <= options[name] <= 1:
+                raise CommandError('--{} must be between 0 and 1'.format(
+                    name.replace('_', '-')))
+
+        print('Generating load data with seed {}'.format(options['seed']))
+        counts = generate_load_data(courses=options['courses'],
+                                    learners=options['learners'],
+                                    enrollments_per_course=options['max_enrollments'],
+                                    modules_per_enrollment=options['modules_per_enrollment'],
+                                    sites=options['sites'],
+                                    zipf_exponent=options['zipf_exponent'],
+                                    activity_rate=options['activity_rate'],
+                                    completion_rate=options['completion_rate'],
+                                    metrics_days=options['metrics_days'],
+                                    days_back=options['days_back'],
+                                    seed=options['seed'],
+                                    batch_size=options['batch_size'])
+        counts.pop('course_ids')
+        print('Generated {}'.format(counts))
+        print('Done.')
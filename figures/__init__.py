@@ -1,2 +1,4 @@
 '''
 '''
+
+default_app_config = 'figures.apps.FiguresConfig'
@@ -0,0 +1,558 @@
+"""Collects and queries the daily learner activity fact table
+
+Figures metrics for active learners and monthly active users (MAU) used to
+each query StudentModule. This module fills the `LearnerDailyActivity` table
+with a single range scan of each day's StudentModule records, then the
+metrics aggregate over that table. This caps the StudentModule reads to one
+indexed slice per day, regardless of the number of metrics.
+
+A learner is active in a course on a day if any of their StudentModule
+records for the course were modified on the day.
+
+Each collected day's new active enrollments are added to
+`MonthlyActiveEnrollment`. Site and course monthly active users (MAU) are
+counted from that table, so their cost is proportional to one day of
+activity instead of growing through the month.
+
+In the optional approximate mode, the pipeline also stores a HyperLogLog
+sketch of the day's active users per site and per course. Active user counts
+for any range of days or union of courses are then estimated by merging the
+sketches. See `figures.hll`. In the optional active user bitmaps mode, the pipeline
+stores a compressed bitmap of the day's active user ids the same way, and
+exact counts for any range of days are computed by ORing the bitmaps. See
+`figures.bitmaps`
+
+Days are collected by the pipeline. The daily pipeline tasks collect the
+pipeline day before running the site pipelines, and the pipeline functions
+pass ``collect=True`` to collect any days they need that have not been
+collected yet. Days that are over are collected once and recorded in
+`DailyActivityCollection`.
+
+Reads never collect, since API requests must not write to the database. A
+read for a range with days not yet collected, which always includes the
+current day, queries StudentModule instead of the activity table.
+"""
+
+from __future__ import absolute_import
+from datetime import date, datetime
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+
+from figures.bitmaps import UserBitmap, union_bitmaps
+from figures.compat import StudentModule, bulk_create
+from figures.helpers import (
+    as_course_key,
+    as_date,
+    as_datetime,
+    days_from,
+    days_in_month,
+    is_multisite,
+    next_day,
+)
+from figures.hll import DEFAULT_PRECISION, HyperLogLog, merge_sketches
+from figures.log import record_rows
+from figures.models import (
+    DailyActiveUserBitmap,
+    DailyActiveUserSketch,
+    DailyActivityCollection,
+    LearnerDailyActivity,
+    MonthlyActiveEnrollment,
+)
+from figures.sites import get_course_keys_for_site, get_site_for_course
+from figures.time_windows import filter_day, window_filter
+
+
+DEFAULT_DAILY_ACTIVITY_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def daily_activity_batch_size():
+    """Returns the number of LearnerDailyActivity records created per query
+
+    Override by setting ``DAILY_ACTIVITY_BATCH_SIZE`` in the Figures settings
+    """
+    batch_size = settings.ENV_TOKENS['FIGURES'].get('DAILY_ACTIVITY_BATCH_SIZE',
+                                                    DEFAULT_DAILY_ACTIVITY_BATCH_SIZE)
+    return max(1, int(batch_size))
+
+
+def approximate_active_users_enabled():
+    """Returns True if the approximate active users mode is enabled
+
+    Enable by setting ``APPROXIMATE_ACTIVE_USERS`` to True in the Figures
+    settings
+    """
+    return bool(settings.ENV_TOKENS['FIGURES'].get('APPROXIMATE_ACTIVE_USERS', False))
+
+
+def active_user_bitmaps_enabled():
+    """Returns True if the active user bitmaps mode is enabled
+
+    Enable by setting ``ACTIVE_USER_BITMAPS`` to True in the Figures settings
+    """
+    return bool(settings.ENV_TOKENS['FIGURES'].get('ACTIVE_USER_BITMAPS', False))
+
+
+def active_user_sketch_precision():
+    """Returns the precision of new active user sketches
+
+    Override by setting ``ACTIVE_USER_SKETCH_PRECISION`` in the Figures
+    settings. See `figures.hll`
+    """
+    return int(settings.ENV_TOKENS['FIGURES'].get('ACTIVE_USER_SKETCH_PRECISION',
+                                                  DEFAULT_PRECISION))
+
+
+def _site_id_for_course(course_id):
+    try:
+        site = get_site_for_course(course_id)
+    except AssertionError:
+        # `get_site_for_course` asserts the course maps to exactly one site.
+        # We don't want one misconfigured course to fail the collection for
+        # every site
+        logger.warning('Could not find the site for course %s', course_id)
+        return None
+    return site.id if site else None
+
+
+def collect_daily_activity(date_for):
+    """Replace the LearnerDailyActivity records for the day
+
+    Reads the day's StudentModule records with a single range scan of the
+    `modified` index. The day's new active enrollments are added to
+    `MonthlyActiveEnrollment`. Returns the number of records created.
+
+    If the day is over, the collection is recorded in `DailyActivityCollection`
+    and the day's active user sketches and bitmaps are built, if enabled. The
+    current day is still changing, so it gets no sketches or bitmaps
+    """
+    date_for = as_date(date_for)
+    day_is_over = date_for < datetime.utcnow().date()
+    rows = filter_day(StudentModule.objects.all(), date_for).order_by().values_list(
+        'course_id', 'student_id').distinct()
+    site_ids = dict()
+    records = []
+    for course_id, user_id in rows.iterator():
+        course_id = str(course_id)
+        if course_id not in site_ids:
+            site_ids[course_id] = _site_id_for_course(course_id)
+        records.append(LearnerDailyActivity(site_id=site_ids[course_id],
+                                            course_id=course_id,
+                                            user_id=user_id,
+                                            date_for=date_for))
+    try:
+        with transaction.atomic():
+            LearnerDailyActivity.objects.filter(date_for=date_for).delete()
+            bulk_create(LearnerDailyActivity, records,
+                        batch_size=daily_activity_batch_size())
+            MonthlyActiveEnrollment.objects.add_daily_activity(
+                date_for, batch_size=daily_activity_batch_size())
+            if day_is_over and approximate_active_users_enabled():
+                build_daily_sketches(date_for)
+            if day_is_over and active_user_bitmaps_enabled():
+                build_daily_bitmaps(date_for)
+            if day_is_over:
+                DailyActivityCollection.objects.update_or_create(
+                    date_for=date_for,
+                    defaults=dict(record_count=len(records)))
+    except IntegrityError:
+        # Another process collected the day at the same time
+        logger.info('Daily activity for %s was collected by another process',
+                    date_for)
+    else:
+        record_rows(written=len(records))
+    return len(records)
+
+
+def ensure_daily_activity(start_date, end_date=None):
+    """Collect the days from `start_date` through `end_date` not yet collected
+
+    Future days are skipped. This writes to the database, so only the pipeline
+    calls it
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date) if end_date else start_date
+    end_date = min(end_date, datetime.utcnow().date())
+    collected = set(DailyActivityCollection.objects.filter(
+        date_for__gte=start_date,
+        date_for__lte=end_date).values_list('date_for', flat=True))
+    date_for = start_date
+    while date_for <= end_date:
+        if date_for not in collected:
+            collect_daily_activity(date_for)
+        date_for = days_from(date_for, 1)
+
+
+def daily_activity_collected(start_date, end_date=None):
+    """Return True if every day from `start_date` through `end_date` is collected
+
+    The current day is never complete, so a range including it or a later
+    day is not collected
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date) if end_date else start_date
+    if end_date >= datetime.utcnow().date():
+        return False
+    collected_count = DailyActivityCollection.objects.filter(
+        date_for__gte=start_date,
+        date_for__lte=end_date).count()
+    return collected_count == (end_date - start_date).days + 1
+
+
+def student_module_activity(start_date, end_date=None, site=None, course_ids=None):
+    """Return the StudentModule queryset for the days and filters
+
+    This is the read only counterpart of `daily_activity`, for days not yet
+    collected. The records are filtered on the `modified` datetime range, so
+    the database can use the index. As with `daily_activity`, `site` only
+    filters the records in multisite mode
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date) if end_date else start_date
+    qs = StudentModule.objects.filter(**window_filter((as_datetime(start_date),
+                                                       as_datetime(next_day(end_date)))))
+    if site and is_multisite():
+        qs = qs.filter(course_id__in=get_course_keys_for_site(site))
+    if course_ids is not None:
+        qs = qs.filter(course_id__in=[as_course_key(course_id) for course_id in course_ids])
+    return qs
+
+
+def daily_activity(start_date, end_date=None, site=None, course_ids=None, collect=False):
+    """Return the LearnerDailyActivity queryset for the days and filters
+
+    If `collect` is True, the days from `start_date` through `end_date` (or
+    just `start_date`) are collected first if needed. See
+    `ensure_daily_activity`. Only the pipeline collects. Otherwise the
+    records are read as they are
+
+    Like `figures.sites.get_student_modules_for_site`, `site` only filters
+    the records in multisite mode. In standalone mode, all courses belong to
+    the site.
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date) if end_date else start_date
+    if collect:
+        ensure_daily_activity(start_date, end_date)
+    qs = LearnerDailyActivity.objects.filter(date_for__gte=start_date,
+                                             date_for__lte=end_date)
+    if site and is_multisite():
+        qs = qs.filter(site=site)
+    if course_ids is not None:
+        qs = qs.filter(course_id__in=[str(course_id) for course_id in course_ids])
+    return qs
+
+
+def active_user_ids(start_date, end_date=None, site=None, course_ids=None, collect=False):
+    """Return a queryset of the distinct ids of users active in the days
+
+    Reads the activity table if the days are collected, or if `collect` is
+    True and they are collected first. Otherwise reads StudentModule. See
+    `student_module_activity`
+    """
+    if collect or daily_activity_collected(start_date, end_date):
+        return daily_activity(start_date, end_date, site=site, course_ids=course_ids,
+                              collect=collect).order_by().values_list(
+            'user_id', flat=True).distinct()
+    return student_module_activity(start_date, end_date, site=site,
+                                   course_ids=course_ids).order_by().values_list(
+        'student_id', flat=True).distinct()
+
+
+def _month_days(month_for, as_of_date=None):
+    """Return the first day of the month and `as_of_date` or the last day
+    """
+    month_for = as_date(month_for)
+    first_day = date(year=month_for.year, month=month_for.month, day=1)
+    if as_of_date:
+        last_day = as_date(as_of_date)
+    else:
+        last_day = date(year=month_for.year, month=month_for.month,
+                        day=days_in_month(first_day))
+    return first_day, last_day
+
+
+def monthly_active_enrollments(site, month_for, as_of_date=None, course_ids=None,
+                               collect=False):
+    """Return a queryset of the `MonthlyActiveEnrollment` records for the month
+
+    If `as_of_date` is given, only enrollments active on or before the day are
+    included. Otherwise the whole month is included.
+
+    If `collect` is True, the days in the month through `as_of_date` are
+    collected first if needed. Only the pipeline collects. As with
+    `daily_activity`, `site` only filters the records in multisite mode
+    """
+    first_day, last_day = _month_days(month_for, as_of_date)
+    if collect:
+        ensure_daily_activity(first_day, last_day)
+    qs = MonthlyActiveEnrollment.objects.filter(month_for=first_day)
+    if as_of_date:
+        qs = qs.filter(Q(first_active__lte=last_day) | Q(first_active__isnull=True))
+    if is_multisite():
+        qs = qs.filter(site=site)
+    if course_ids is not None:
+        qs = qs.filter(course_id__in=[str(course_id) for course_id in course_ids])
+    return qs
+
+
+def monthly_active_user_ids(site, month_for, as_of_date=None, course_ids=None,
+                            collect=False):
+    """Return a queryset of the distinct ids of users active in the month
+
+    Reads `MonthlyActiveEnrollment` if the month's days through `as_of_date`
+    are collected, or if `collect` is True and they are collected first.
+    Otherwise reads StudentModule. See `monthly_active_enrollments` for the
+    arguments
+    """
+    first_day, last_day = _month_days(month_for, as_of_date)
+    if collect or daily_activity_collected(first_day, last_day):
+        return monthly_active_enrollments(
+            site, month_for, as_of_date=as_of_date, course_ids=course_ids,
+            collect=collect).order_by().values_list('user_id', flat=True).distinct()
+    return student_module_activity(first_day, last_day, site=site,
+                                   course_ids=course_ids).order_by().values_list(
+        'student_id', flat=True).distinct()
+
+
+def monthly_active_user_counts_by_course(site, month_for, as_of_date=None, course_ids=None,
+                                         collect=False):
+    """Return a dict of the number of distinct users active in each course
+
+    Counts all the courses with one grouped query instead of a query for each
+    course. Courses with no active users in the month are not included. Reads
+    the same tables as `monthly_active_user_ids`. See
+    `monthly_active_enrollments` for the arguments
+    """
+    first_day, last_day = _month_days(month_for, as_of_date)
+    if collect or daily_activity_collected(first_day, last_day):
+        return dict(monthly_active_enrollments(
+            site, month_for, as_of_date=as_of_date, course_ids=course_ids,
+            collect=collect).order_by().values('course_id').annotate(
+            count=Count('user_id', distinct=True)).values_list('course_id', 'count'))
+    return dict((str(course_id), count) for course_id, count in student_module_activity(
+        first_day, last_day, site=site, course_ids=course_ids).order_by().values(
+        'course_id').annotate(count=Count('student_id', distinct=True)).values_list(
+        'course_id', 'count'))
+
+
+def _daily_activity_groups(date_for):
+    """Return the ids of the users active on the day for each summary key
+
+    The keys are ``(site_id, course_id)`` for each course, ``(site_id, '')``
+    for each site and ``(None, '')`` for all of the day's activity. The
+    ``(None, '')`` key is always included, so its summary record also
+    records that the day's summaries were built
+    """
+    groups = {(None, ''): []}
+    for site_id, course_id, user_id in LearnerDailyActivity.objects.filter(
+            date_for=date_for).values_list('site_id', 'course_id', 'user_id').iterator():
+        keys = [(None, ''), (site_id, course_id)]
+        if site_id:
+            keys.append((site_id, ''))
+        for key in keys:
+            groups.setdefault(key, []).append(user_id)
+    return groups
+
+
+def _replace_daily_summaries(model_class, date_for, records):
+    with transaction.atomic():
+        model_class.objects.filter(date_for=date_for).delete()
+        bulk_create(model_class, records, batch_size=daily_activity_batch_size())
+    return len(records)
+
+
+def _ensure_daily_summaries(model_class, build_func, start_date, end_date=None):
+    """Build the summaries for the days that are over and don't have them
+
+    A summary of the current day would be treated as complete once the day is
+    over, so the current day is collected but not summarized
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date) if end_date else start_date
+    today = datetime.utcnow().date()
+    ensure_daily_activity(start_date, min(end_date, today))
+    end_date = min(end_date, days_from(today, -1))
+    built = set(model_class.objects.filter(
+        site__isnull=True,
+        course_id='',
+        date_for__gte=start_date,
+        date_for__lte=end_date).values_list('date_for', flat=True))
+    date_for = start_date
+    while date_for <= end_date:
+        if date_for not in built:
+            build_func(date_for)
+        date_for = days_from(date_for, 1)
+
+
+def _missing_summary_days(model_class, start_date, end_date=None):
+    """Return the days from `start_date` through `end_date` without summaries
+
+    The current day is still changing, so it is always missing. Future days
+    have no activity and are skipped
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date) if end_date else start_date
+    today = datetime.utcnow().date()
+    built = set(model_class.objects.filter(
+        site__isnull=True,
+        course_id='',
+        date_for__gte=start_date,
+        date_for__lte=end_date,
+        date_for__lt=today).values_list('date_for', flat=True))
+    missing = []
+    date_for = start_date
+    while date_for <= min(end_date, today):
+        if date_for not in built:
+            missing.append(date_for)
+        date_for = days_from(date_for, 1)
+    return missing
+
+
+def _missing_days_user_ids(model_class, site, start_date, end_date=None, course_ids=None):
+    """Return the ids of the users active on the days without summaries
+
+    The summaries are only built by the pipeline, so reads get the activity
+    of the other days from StudentModule. The range from the first to the
+    last missing day is read with one query. Including days with summaries
+    does not change a union of the users
+    """
+    missing = _missing_summary_days(model_class, start_date, end_date)
+    if not missing:
+        return []
+    return student_module_activity(missing[0], missing[-1], site=site,
+                                   course_ids=course_ids).order_by().values_list(
+        'student_id', flat=True).distinct()
+
+
+def _daily_summaries(model_class, site, start_date, end_date=None, course_ids=None):
+    """Return the day summary records for the site, or for the courses
+
+    As with `daily_activity`, `site` only filters the records in multisite
+    mode. In standalone mode, the records of all the activity are used
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date) if end_date else start_date
+    qs = model_class.objects.filter(date_for__gte=start_date,
+                                    date_for__lte=end_date)
+    if course_ids is not None:
+        qs = qs.filter(course_id__in=[str(course_id) for course_id in course_ids])
+        if is_multisite():
+            qs = qs.filter(site=site)
+    elif is_multisite():
+        qs = qs.filter(site=site, course_id='')
+    else:
+        qs = qs.filter(site__isnull=True, course_id='')
+    return qs
+
+
+def build_daily_sketches(date_for):
+    """Replace the active user sketches for the day
+
+    Builds the sketches from the day's LearnerDailyActivity records. Returns
+    the number of sketches created
+    """
+    date_for = as_date(date_for)
+    precision = active_user_sketch_precision()
+    records = []
+    for (site_id, course_id), user_ids in _daily_activity_groups(date_for).items():
+        sketch = HyperLogLog(precision)
+        sketch.update(user_ids)
+        records.append(DailyActiveUserSketch(site_id=site_id,
+                                             course_id=course_id,
+                                             date_for=date_for,
+                                             precision=precision,
+                                             registers=sketch.to_bytes()))
+    return _replace_daily_summaries(DailyActiveUserSketch, date_for, records)
+
+
+def ensure_daily_sketches(start_date, end_date=None):
+    """Build the active user sketches for the days that don't have them
+
+    The activity for the days is collected first if needed. Days collected
+    before the approximate mode was enabled have their sketches built from
+    the LearnerDailyActivity records, without reading StudentModule. This
+    writes to the database, so only the pipeline calls it
+    """
+    _ensure_daily_summaries(DailyActiveUserSketch, build_daily_sketches,
+                            start_date, end_date)
+
+
+def approximate_active_user_count(site, start_date, end_date=None, course_ids=None):
+    """Return the estimated number of distinct users active in the days
+
+    Merges the day sketches for the site, or for the courses if `course_ids`
+    is given. Sketches are not built here. The users active on days without
+    sketches, which always includes the current day, are read from
+    StudentModule and added to the merged sketch
+    """
+    qs = _daily_summaries(DailyActiveUserSketch, site, start_date, end_date,
+                          course_ids=course_ids)
+    sketch = merge_sketches(rec.sketch for rec in qs.iterator())
+    sketch.update(_missing_days_user_ids(DailyActiveUserSketch, site, start_date, end_date,
+                                         course_ids=course_ids))
+    return sketch.count()
+
+
+def build_daily_bitmaps(date_for):
+    """Replace the active user bitmaps for the day
+
+    Builds the bitmaps from the day's LearnerDailyActivity records. Returns
+    the number of bitmaps created
+    """
+    date_for = as_date(date_for)
+    records = []
+    for (site_id, course_id), user_ids in _daily_activity_groups(date_for).items():
+        bitmap = UserBitmap.from_ids(user_ids)
+        records.append(DailyActiveUserBitmap(site_id=site_id,
+                                             course_id=course_id,
+                                             date_for=date_for,
+                                             user_count=bitmap.count(),
+                                             bits=bitmap.to_bytes()))
+    return _replace_daily_summaries(DailyActiveUserBitmap, date_for, records)
+
+
+def ensure_daily_bitmaps(start_date, end_date=None):
+    """Build the active user bitmaps for the days that don't have them
+
+    Like `ensure_daily_sketches`, days already collected are built from the
+    LearnerDailyActivity records. Only the pipeline calls it
+    """
+    _ensure_daily_summaries(DailyActiveUserBitmap, build_daily_bitmaps,
+                            start_date, end_date)
+
+
+def active_user_bitmap(site, start_date, end_date=None, course_ids=None):
+    """Return the bitmap of the users active in the days
+
+    ORs the day bitmaps for the site, or for the courses if `course_ids` is
+    given. Bitmaps are not built here. The users active on days without
+    bitmaps, which always includes the current day, are read from
+    StudentModule and added to the bitmap
+    """
+    qs = _daily_summaries(DailyActiveUserBitmap, site, start_date, end_date,
+                          course_ids=course_ids)
+    bitmap = union_bitmaps(rec.bitmap for rec in qs.iterator())
+    return bitmap | UserBitmap.from_ids(_missing_days_user_ids(
+        DailyActiveUserBitmap, site, start_date, end_date, course_ids=course_ids))
+
+
+def bitmap_active_user_count(site, start_date, end_date=None, course_ids=None):
+    """Return the exact number of distinct users active in the days
+
+    Counts the users in `active_user_bitmap`. A single day's site or course
+    count is read from the stored `user_count` without decompressing the
+    bitmap, if the day's bitmaps are built
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date) if end_date else start_date
+    if (start_date == end_date and (course_ids is None or len(course_ids) == 1) and
+            not _missing_summary_days(DailyActiveUserBitmap, start_date)):
+        counts = list(_daily_summaries(DailyActiveUserBitmap, site, start_date,
+                                       course_ids=course_ids).values_list('user_count', flat=True))
+        return counts[0] if counts else 0
+    return active_user_bitmap(site, start_date, end_date, course_ids=course_ids).count()
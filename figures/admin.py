@@ -45,6 +45,55 @@ class CourseDailyMetricsAdmin(admin.ModelAdmin):
         'date_for')
 
 
+@admin.register(figures.models.CourseFirstEnrollment)
+class CourseFirstEnrollmentAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the CourseFirstEnrollment model
+    """
+    list_display = ('id', 'site', 'course_id', 'first_enrollment')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('course_id', AllValuesDropdownFilter))
+
+
+@admin.register(figures.models.LearnerDailyActivity)
+class LearnerDailyActivityAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the LearnerDailyActivity model
+    """
+    list_display = ('id', 'date_for', 'site', 'course_id', 'user')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('course_id', AllValuesDropdownFilter))
+
+
+@admin.register(figures.models.DailyActivityCollection)
+class DailyActivityCollectionAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the DailyActivityCollection model
+    """
+    list_display = ('id', 'date_for', 'record_count', 'modified')
+
+
+@admin.register(figures.models.DailyActiveUserSketch)
+class DailyActiveUserSketchAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the DailyActiveUserSketch model
+    """
+    list_display = ('id', 'date_for', 'site', 'course_id', 'precision')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('course_id', AllValuesDropdownFilter))
+    exclude = ('registers',)
+
+
+@admin.register(figures.models.DailyActiveUserBitmap)
+class DailyActiveUserBitmapAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the DailyActiveUserBitmap model
+    """
+    list_display = ('id', 'date_for', 'site', 'course_id', 'user_count')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('course_id', AllValuesDropdownFilter))
+    exclude = ('bits',)
+
+
 @admin.register(figures.models.SiteDailyMetrics)
 class SiteDailyMetricsAdmin(admin.ModelAdmin):
     """Defines the admin interface for the SiteDailyMetrics model
@@ -106,6 +155,20 @@ class EnrollmentDataAdmin(UserRelatedMixin, admin.ModelAdmin):
         'is_completed')
 
 
+@admin.register(figures.models.EnrollmentDataBackfill)
+class EnrollmentDataBackfillAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the EnrollmentDataBackfill model
+    """
+    list_display = ('id', 'site', 'course_id', 'min_enrollment_id',
+                    'max_enrollment_id', 'last_enrollment_id', 'status',
+                    'processed_count', 'total_count', 'throughput', 'eta',
+                    'started', 'finished')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('course_id', AllValuesDropdownFilter),
+        'status')
+
+
 @admin.register(figures.models.LearnerCourseGradeMetrics)
 class LearnerCourseGradeMetricsAdmin(UserRelatedMixin, admin.ModelAdmin):
     """Defines the admin interface for the LearnerCourseGradeMetrics model
@@ -154,3 +217,43 @@ class CourseMauMetricsAdmin(admin.ModelAdmin):
         ('site', RelatedOnlyDropdownFilter),
         ('course_id', AllValuesDropdownFilter),
         'date_for')
+
+
+class PipelineStageInline(admin.TabularInline):
+    """Lists a pipeline run's stages on the PipelineRun admin page
+    """
+    model = figures.models.PipelineStage
+    fields = ('stage', 'site', 'course_id', 'status', 'elapsed', 'rows_read',
+              'rows_written', 'query_count', 'query_time', 'grade_calls')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(figures.models.PipelineRun)
+class PipelineRunAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the PipelineRun model
+    """
+    list_display = ('id', 'name', 'site', 'date_for', 'status', 'started',
+                    'finished', 'elapsed')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('name', AllValuesDropdownFilter),
+        'status')
+    inlines = [PipelineStageInline]
+
+
+@admin.register(figures.models.PipelineStage)
+class PipelineStageAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the PipelineStage model
+
+    Sort by the elapsed column to find the slowest stages
+    """
+    list_display = ('id', 'run', 'stage', 'site', 'course_id', 'status',
+                    'started', 'elapsed', 'rows_read', 'rows_written',
+                    'query_count', 'query_time', 'grade_calls')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('course_id', AllValuesDropdownFilter),
+        ('stage', AllValuesDropdownFilter),
+        'status')
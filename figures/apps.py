@@ -58,3 +58,13 @@ class FiguresConfig(AppConfig):
                 }
             },
         }
+
+    def ready(self):
+        """Connect Figures signal receivers
+        """
+        from figures.signals import (
+            connect_sites_cache_receivers,
+            connect_stale_enrollment_receivers,
+        )
+        connect_sites_cache_receivers()
+        connect_stale_enrollment_receivers()
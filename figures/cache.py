@@ -0,0 +1,217 @@
+"""Caches lookups Figures makes many times per API request and pipeline run
+
+Initially this caches the site and course mappings in `figures.sites`. In
+multisite mode, these query the organizations tables and are called for each
+course in the pipeline, serializers and views.
+
+Cached values are looked up in this order:
+
+1. The memo, if the lookup is inside a `memo` scope. Figures API views and
+   pipeline tasks run in a memo scope, so each mapping is looked up at most
+   once per request or task
+2. An in-process least recently used (LRU) cache
+3. The Django cache backend, so that processes and workers share the values
+4. The `compute` function passed to `FiguresCache.get_or_set`
+
+Invalidation is done by incrementing a generation number stored in the Django
+cache backend. The generation is part of every cache key, so incrementing it
+orphans all the cached values for every process sharing the backend. The
+receivers in `figures.signals` invalidate the sites cache when organizations,
+organization courses, course overviews or sites change.
+
+Values also expire after the timeout, so changes made without signals (such as
+`QuerySet.update` or changes made directly to the database) are picked up.
+
+Configure with these Figures ENV_TOKENS settings:
+
+* ``SITES_CACHE_TIMEOUT``: Seconds a value is cached. Set to zero to disable
+  caching
+* ``SITES_CACHE_LRU_SIZE``: Maximum number of values in the in-process cache
+* ``SITES_CACHE_BACKEND``: Django cache alias. Deployments running more than
+  one process should use a shared backend, like memcached or redis, so that
+  invalidation reaches every process
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import threading
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+DEFAULT_SITES_CACHE_TIMEOUT = 300
+DEFAULT_SITES_CACHE_LRU_SIZE = 1024
+DEFAULT_SITES_CACHE_BACKEND = 'default'
+
+# Distinguishes a cached `None` from a cache miss
+_MISSING = object()
+
+
+def sites_cache_timeout():
+    return int(settings.ENV_TOKENS['FIGURES'].get('SITES_CACHE_TIMEOUT',
+                                                  DEFAULT_SITES_CACHE_TIMEOUT))
+
+
+def sites_cache_lru_size():
+    return int(settings.ENV_TOKENS['FIGURES'].get('SITES_CACHE_LRU_SIZE',
+                                                  DEFAULT_SITES_CACHE_LRU_SIZE))
+
+
+def sites_cache_backend():
+    return caches[settings.ENV_TOKENS['FIGURES'].get('SITES_CACHE_BACKEND',
+                                                     DEFAULT_SITES_CACHE_BACKEND)]
+
+
+class LRUCache(object):
+    """Thread safe in-process cache that evicts the least recently used value
+
+    Values expire `timeout` seconds after they are set
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires, value = item
+            if expires < time():
+                return default
+            # Move to the most recently used end
+            self._data[key] = item
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time() + timeout, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FiguresCache(object):
+    """Cache with in-process LRU, Django cache backend and per-scope memo layers
+
+    See the module docstring for details
+    """
+    def __init__(self, namespace, timeout=sites_cache_timeout,
+                 lru_size=sites_cache_lru_size, backend=sites_cache_backend):
+        self.namespace = namespace
+        self._timeout = timeout
+        self._backend = backend
+        self._lru_size = lru_size
+        self._lru_cache = None
+        self._local = threading.local()
+
+    @property
+    def _lru(self):
+        # Created on first use so settings are not read at import time
+        if self._lru_cache is None:
+            self._lru_cache = LRUCache(maxsize=self._lru_size())
+        return self._lru_cache
+
+    @property
+    def generation_key(self):
+        return 'figures:{}:generation'.format(self.namespace)
+
+    def _get_memo(self):
+        return getattr(self._local, 'memo', None)
+
+    @contextmanager
+    def memo(self):
+        """Memoize lookups made inside this scope
+
+        Nested scopes share the outermost scope's memo
+        """
+        if self._get_memo() is not None:
+            yield
+            return
+        self._local.memo = dict()
+        try:
+            yield
+        finally:
+            self._local.memo = None
+
+    def generation(self):
+        """Return the current generation, which is part of every cache key
+        """
+        memo = self._get_memo()
+        if memo is not None and self.generation_key in memo:
+            return memo[self.generation_key]
+        backend = self._backend()
+        gen = backend.get(self.generation_key)
+        if gen is None:
+            backend.add(self.generation_key, 1, None)
+            gen = backend.get(self.generation_key, 1)
+        if memo is not None:
+            memo[self.generation_key] = gen
+        return gen
+
+    def get_or_set(self, name, key, compute):
+        """Return the cached value for the lookup, calling `compute` on a miss
+
+        `name` identifies the lookup and `key` its arguments. Both need to be
+        strings that are valid cache keys.
+        """
+        timeout = self._timeout()
+        if timeout <= 0:
+            return compute()
+        cache_key = 'figures:{}:{}:{}:{}'.format(
+            self.namespace, self.generation(), name, key)
+        memo = self._get_memo()
+        if memo is not None and cache_key in memo:
+            return memo[cache_key]
+
+        value = self._lru.get(cache_key, _MISSING)
+        if value is _MISSING:
+            backend = self._backend()
+            value = backend.get(cache_key, _MISSING)
+            if value is _MISSING:
+                value = compute()
+                backend.set(cache_key, value, timeout)
+            self._lru.set(cache_key, value, timeout)
+        if memo is not None:
+            memo[cache_key] = value
+        return value
+
+    def invalidate(self):
+        """Invalidate the cached values for every process sharing the backend
+        """
+        backend = self._backend()
+        try:
+            backend.incr(self.generation_key)
+        except ValueError:
+            # The generation is not set or was evicted. We can't reuse a
+            # generation that may have keys cached, so start a new sequence
+            backend.set(self.generation_key, int(time()), None)
+        self._lru.clear()
+        memo = self._get_memo()
+        if memo is not None:
+            memo.clear()
+
+
+sites_cache = FiguresCache(namespace='sites')
+
+
+def with_sites_memo(func):
+    """Decorator to run the function in a `sites_cache` memo scope
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with sites_cache.memo():
+            return func(*args, **kwargs)
+    return wrapper
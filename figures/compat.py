@@ -24,8 +24,10 @@ TODO: Consider wrapping edx-platform's `get_course_by_id` in a function as it
 # pylint: disable=ungrouped-imports,useless-suppression,wrong-import-position
 
 from __future__ import absolute_import
+from django.db import connections, router, transaction
 from django.http import Http404
 from figures.helpers import as_course_key
+from figures.log import record_grade_call
 
 
 class UnsuportedOpenedXRelease(Exception):
@@ -78,42 +80,92 @@ else:  # Assume Hawthorn or greater
 # from here
 from student.models import CourseAccessRole, CourseEnrollment  # noqa pylint: disable=unused-import,import-error
 from openedx.core.djangoapps.content.course_overviews.models import CourseOverview  # noqa pylint: disable=unused-import,import-error
+from openedx.core.djangoapps.content.block_structure.api import get_course_in_cache  # noqa pylint: disable=unused-import,import-error
+
+# The LMS sends this when a learner's course grade changes
+try:
+    from openedx.core.djangoapps.signals.signals import COURSE_GRADE_CHANGED  # noqa pylint: disable=unused-import,import-error
+except ImportError:
+    COURSE_GRADE_CHANGED = None
+
+# Django 1.11 added subquery expressions. Ginkgo runs on Django 1.8, so callers
+# check for `None` and fall back to an extra query
+try:
+    from django.db.models import OuterRef, Subquery  # noqa pylint: disable=unused-import
+except ImportError:
+    OuterRef = Subquery = None
+
+# Django 1.9 added `transaction.on_commit`. Ginkgo runs on Django 1.8, so
+# callers check for `None` and run the function immediately
+try:
+    from django.db.transaction import on_commit  # noqa pylint: disable=unused-import
+except ImportError:
+    on_commit = None
 
 
-def course_grade(learner, course):
+def course_grade(learner, course, collected_block_structure=None):
     """
     Compatibility function to retrieve course grades
 
     Returns the course grade for the specified learner and course
+
+    If the course's `collected_block_structure` is given, then the grade
+    factory does not retrieve it again from the block structure cache
+
+    Each call is counted in the pipeline ledger. See `figures.pipeline.ledger`
     """
+    record_grade_call()
     if RELEASE_LINE == 'ginkgo':
-        return CourseGradeFactory().create(learner, course)
+        return CourseGradeFactory().create(
+            learner, course, collected_block_structure=collected_block_structure)
     else:  # Assume Hawthorn or greater
-        return CourseGradeFactory().read(learner, course)
-
+        return CourseGradeFactory().read(
+            learner, course, collected_block_structure=collected_block_structure)
 
-def course_grade_from_course_id(learner, course_id):
-    """Get the edx-platform's course grade for this enrollment
 
-    IMPORTANT: Do not use in API calls as this is an expensive operation.
-    Only use in async or pipeline.
+def course_for_grades(course_id):
+    """Load the course from the modulestore, ready to retrieve course grades
 
     We handle the exception so that we return a specific `CourseNotFound`
     instead of the non-specific `Http404`
     edx-platform `get_course_by_id` function raises a generic `Http404` if it
     cannot find a course in modulestore. We trap this and raise our own
     `CourseNotFound` exception as it is more specific.
-
-    TODO: Consider optional kwarg param or Figures setting to log performance.
-          Bonus points: Make id a decorator
     """
     try:
         course = get_course_by_id(course_key=as_course_key(course_id))
     except Http404:
         raise CourseNotFound('{}'.format(str(course_id)))
-    course._field_data_cache = {}  # pylint: disable=protected-access
     course.set_grading_policy(course.grading_policy)
-    return course_grade(learner, course)
+    return course
+
+
+def course_grade_from_course(learner, course, collected_block_structure=None):
+    """Get the course grade for a course loaded with `course_for_grades`
+
+    This lets the caller load the course once and get the grades of each
+    learner. The course's field data cache is cleared first so that data from
+    the previous learner are not used
+    """
+    course._field_data_cache = {}  # pylint: disable=protected-access
+    return course_grade(learner, course,
+                        collected_block_structure=collected_block_structure)
+
+
+def course_grade_from_course_id(learner, course_id):
+    """Get the edx-platform's course grade for this enrollment
+
+    IMPORTANT: Do not use in API calls as this is an expensive operation.
+    Only use in async or pipeline.
+
+    This loads the course from the modulestore each time it is called. To get
+    the grades of multiple learners in a course, load the course once with
+    `course_for_grades` and call `course_grade_from_course` for each learner
+
+    TODO: Consider optional kwarg param or Figures setting to log performance.
+          Bonus points: Make id a decorator
+    """
+    return course_grade_from_course(learner, course_for_grades(course_id))
 
 
 def chapter_grade_values(chapter_grades):
@@ -134,3 +186,42 @@ def chapter_grade_values(chapter_grades):
         # TODO: improve clarity, add a message
         # This may be what
         raise TypeError
+
+
+def bulk_create(model_class, objs, batch_size=None):
+    """Insert a list of model instances, `batch_size` rows per query
+
+    The Django versions Figures supports use an explicit `batch_size` for
+    `bulk_create` as given, even when the database cannot take that many rows
+    in one insert. SQLite fails with "too many terms in compound SELECT" for
+    more than 500 rows. So we cap the batch size at the database's maximum, as
+    Django does when no batch size is given
+    """
+    if objs and batch_size:
+        fields = [field for field in model_class._meta.concrete_fields
+                  if not field.auto_created]
+        connection = connections[router.db_for_write(model_class)]
+        batch_size = min(batch_size, max(connection.ops.bulk_batch_size(fields, objs), 1))
+    return model_class.objects.bulk_create(objs, batch_size=batch_size)
+
+
+def bulk_update(model_class, objs, fields, batch_size=None):
+    """Update the given fields on a list of saved model instances
+
+    Django 2.2 added `QuerySet.bulk_update`. Ginkgo (Django 1.8) and Hawthorn
+    (Django 1.11) do not have it, so for those we save each object, updating
+    only the given fields, inside a single transaction.
+
+    Like Django's `bulk_update`, this does not call `save()` or `pre_save`, so
+    callers need to set auto-updated fields, like `modified`, themselves and
+    include them in `fields`
+    """
+    if not objs:
+        return
+    manager = model_class.objects
+    if hasattr(manager, 'bulk_update'):
+        manager.bulk_update(objs, fields, batch_size=batch_size)
+    else:
+        with transaction.atomic():
+            for obj in objs:
+                obj.save(update_fields=fields)
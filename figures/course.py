@@ -21,14 +21,15 @@ to query back and forth with `user_id` and `course_id`.
 """
 from __future__ import absolute_import
 from django.db.models import Q
+from figures.activity import active_user_ids
 from figures.compat import CourseEnrollment, StudentModule
 from figures.helpers import (
     as_course_key,
-    as_date,
 )
 from figures.sites import (
     get_site_for_course,
 )
+from figures.time_windows import day_window, window_filter
 
 
 class Course(object):
@@ -91,26 +92,22 @@ class Course(object):
         """Returns StudentModule queryset active on the date
         Active is if there was a `created` or `modified` field for the given date
 
-        NOTE: We need to do this instead of simplly `modified__date=date_for`
-        because we still have to support Django 1.8/Ginkgo
+        The fields are filtered on the day's datetime range so the database can
+        use their indexes. See `figures.time_windows`
         """
-        date_for = as_date(date_for)
-        q_created = Q(created__year=date_for.year,
-                      created__month=date_for.month,
-                      created__day=date_for.day)
-        q_modified = Q(modified__year=date_for.year,
-                       modified__month=date_for.month,
-                       modified__day=date_for.day)
+        window = day_window(date_for)
+        q_created = Q(**window_filter(window, 'created'))
+        q_modified = Q(**window_filter(window, 'modified'))
         return self.student_modules.filter(q_created | q_modified)
 
     def enrollments_active_on_date(self, date_for):
         """Return CourseEnrollment queryset for enrollments active on the date
 
-        Looks for student modules modified on the specified date and returns
-        matching CourseEnrollment records
+        Looks for learners active in the course on the specified date with
+        `figures.activity.active_user_ids` and returns matching
+        CourseEnrollment records
         """
-        sm = self.student_modules_active_on_date(date_for)
-        user_ids = sm.values('student_id').distinct()
+        user_ids = active_user_ids(date_for, course_ids=[self.course_id])
         return CourseEnrollment.objects.filter(course_id=self.course_key,
                                                user_id__in=user_ids)
 
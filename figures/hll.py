@@ -0,0 +1,177 @@
+"""HyperLogLog sketches for approximate distinct counts
+
+A HyperLogLog (HLL) sketch estimates the number of distinct values added to
+it from a fixed number of small registers. Two sketches are merged by taking
+the maximum of each register, and the merged sketch estimates the number of
+distinct values added to either. This lets Figures store one sketch of active
+users per site, course and day, then answer distinct user counts for any range
+of days or union of courses by merging the sketches instead of querying the
+activity records.
+
+The relative standard error is about ``1.04 / sqrt(2 ** precision)``. The
+default precision of 12 uses 4096 registers, one byte each, for an error of
+about 1.6%. Serialized sketches are zlib compressed, so sketches with few
+values take much less space than that.
+
+This is a plain Python implementation on top of `array`, with no extra
+dependencies. It only hashes integers, such as user ids.
+
+Reference: Flajolet et al., "HyperLogLog: the analysis of a near-optimal
+cardinality estimation algorithm", 2007
+"""
+
+from __future__ import absolute_import
+from array import array
+import math
+import zlib
+
+
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+DEFAULT_PRECISION = 12
+
+_MASK64 = (1 << 64) - 1
+
+
+def hash64(value):
+    """Return a well mixed 64 bit hash of an integer
+
+    Uses the SplitMix64 finalizer. Python's `hash` of an int is the int
+    itself, which does not spread the bits HyperLogLog relies on
+    """
+    z = (int(value) + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def _alpha(num_registers):
+    if num_registers == 16:
+        return 0.673
+    elif num_registers == 32:
+        return 0.697
+    elif num_registers == 64:
+        return 0.709
+    return 0.7213 / (1.0 + 1.079 / num_registers)
+
+
+def _to_bytes(registers):
+    # `tostring` was renamed `tobytes` in Python 3
+    if hasattr(registers, 'tobytes'):
+        return registers.tobytes()
+    return registers.tostring()
+
+
+class HyperLogLog(object):
+    """HyperLogLog sketch of a set of integers
+    """
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError('HyperLogLog precision must be from {} to {}'.format(
+                MIN_PRECISION, MAX_PRECISION))
+        self.precision = precision
+        self.num_registers = 1 << precision
+        if registers is None:
+            registers = array('B', [0]) * self.num_registers
+        elif len(registers) != self.num_registers:
+            raise ValueError('Expected {} registers, got {}'.format(
+                self.num_registers, len(registers)))
+        self.registers = registers
+
+    def __len__(self):
+        return self.count()
+
+    def add(self, value):
+        """Add an integer to the sketch
+        """
+        hashed = hash64(value)
+        width = 64 - self.precision
+        index = hashed >> width
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        """Add each of the integers to the sketch
+        """
+        for value in values:
+            self.add(value)
+
+    def count(self):
+        """Return the estimated number of distinct values added
+        """
+        m = self.num_registers
+        estimate = _alpha(m) * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+    def reduce(self, precision):
+        """Return a copy of this sketch at a lower precision
+
+        The equivalent of the sketch we would have had if the values were
+        added at the lower precision
+        """
+        if precision > self.precision:
+            raise ValueError('Cannot increase HyperLogLog precision')
+        if precision == self.precision:
+            return self.copy()
+        shift = self.precision - precision
+        reduced = HyperLogLog(precision)
+        for index, rank in enumerate(self.registers):
+            if not rank:
+                continue
+            # The low bits of the old index become the leading bits of the
+            # remaining hash at the lower precision
+            dropped = index & ((1 << shift) - 1)
+            if dropped:
+                rank = shift - dropped.bit_length() + 1
+            else:
+                rank += shift
+            new_index = index >> shift
+            if rank > reduced.registers[new_index]:
+                reduced.registers[new_index] = rank
+        return reduced
+
+    def merge(self, other):
+        """Merge the other sketch into this one
+
+        Sketches must have the same precision. Use `reduce` first otherwise
+        """
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog sketches of precision {} and {}'.format(
+                self.precision, other.precision))
+        self.registers = array('B', map(max, self.registers, other.registers))
+        return self
+
+    def copy(self):
+        return HyperLogLog(self.precision, array('B', self.registers))
+
+    def to_bytes(self):
+        """Return the compressed registers
+        """
+        return zlib.compress(_to_bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data, precision):
+        """Return the sketch for the compressed registers from `to_bytes`
+        """
+        return cls(precision, array('B', bytearray(zlib.decompress(bytes(data)))))
+
+
+def merge_sketches(sketches):
+    """Return a new sketch merging the sketches
+
+    Sketches with different precisions are reduced to the lowest one.
+    Returns an empty sketch at the default precision if there are no sketches
+    """
+    sketches = list(sketches)
+    if not sketches:
+        return HyperLogLog()
+    precision = min(sketch.precision for sketch in sketches)
+    merged = HyperLogLog(precision)
+    for sketch in sketches:
+        merged.merge(sketch.reduce(precision) if sketch.precision != precision else sketch)
+    return merged
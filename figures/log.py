@@ -1,14 +1,35 @@
 """Provides logging and instrumentation functionality for Figures
 
+The pipeline stage counters here are kept free of Django model imports so
+that low level modules, like `figures.compat`, can report to the pipeline
+ledger. See `figures.pipeline.ledger`
+
+`instrument_queries` counts the database queries run by a block,
+their total time and the statements slower than a threshold, with the Figures
+function that ran them. It is enabled with the ``QUERY_INSTRUMENTATION``
+Figures setting, which defaults to Django's ``DEBUG`` setting. The Figures
+Celery tasks, management commands and API views are instrumented. The API
+views also return the query count and time in a ``Server-Timing`` header.
 """
 
 from contextlib import contextmanager
+from functools import wraps
 import logging
+import sys
+import threading
 import timeit
 
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Statements that take at least this many seconds are logged
+DEFAULT_SLOW_QUERY_THRESHOLD = 0.1
 
 default_logger = logging.getLogger(__name__)
 
+_local = threading.local()
+
 
 @contextmanager
 def log_exec_time(description, logger=None):
@@ -36,3 +57,201 @@ def log_exec_time(description, logger=None):
     msg = '{}: {} s'.format(description, elapsed)
 
     logger.info(msg)
+
+
+def active_stages():
+    """Return the list of pipeline stages being recorded in this thread
+
+    The innermost stage is last. See `figures.pipeline.ledger.pipeline_stage`
+    """
+    if not hasattr(_local, 'stages'):
+        _local.stages = []
+    return _local.stages
+
+
+def record_rows(read=0, written=0):
+    """Add to the rows read and written by the pipeline stages being recorded
+    """
+    for stage in active_stages():
+        stage.rows_read += read
+        stage.rows_written += written
+
+
+def record_grade_call():
+    """Count a course grade retrieval in the pipeline stages being recorded
+    """
+    for stage in active_stages():
+        stage.grade_calls += 1
+
+
+def query_instrumentation_enabled():
+    """Return True if `instrument_queries` blocks are instrumented
+
+    Uses the ``QUERY_INSTRUMENTATION`` Figures setting. If it is not set, then
+    queries are instrumented when Django's ``DEBUG`` setting is on
+    """
+    return bool(settings.ENV_TOKENS['FIGURES'].get('QUERY_INSTRUMENTATION',
+                                                   settings.DEBUG))
+
+
+def slow_query_threshold():
+    """Return the seconds a statement takes before it is logged as slow
+    """
+    return settings.ENV_TOKENS['FIGURES'].get('SLOW_QUERY_THRESHOLD',
+                                              DEFAULT_SLOW_QUERY_THRESHOLD)
+
+
+def figures_caller():
+    """Return the innermost Figures function in the call stack
+
+    Returns a string with the module, function name and line number, or None
+    if the stack has no Figures code outside of this module
+    """
+    frame = sys._getframe(1)  # pylint: disable=protected-access
+    while frame:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith('figures.') and module != __name__:
+            return '{}.{}:{}'.format(module, frame.f_code.co_name, frame.f_lineno)
+        frame = frame.f_back
+    return None
+
+
+class QueryStats(object):
+    """Database execute wrapper that counts the queries and their time
+
+    Statements that take at least `threshold` seconds are kept in
+    `slow_queries` as dicts with the `sql`, the `time` and the Figures
+    `caller`. If `threshold` is None, no statements are kept.
+
+    See https://docs.djangoproject.com/en/2.2/topics/db/instrumentation/
+    """
+    def __init__(self, threshold=None):
+        self.threshold = threshold
+        self.count = 0
+        self.time = 0.0
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start_time = timeit.default_timer()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = timeit.default_timer() - start_time
+            self.count += 1
+            self.time += elapsed
+            if self.threshold is not None and elapsed >= self.threshold:
+                self.slow_queries.append(dict(sql=sql,
+                                              time=elapsed,
+                                              caller=figures_caller()))
+
+
+class InstrumentedCursor(object):
+    """Cursor proxy that passes its statements through an execute wrapper
+
+    Used on Django versions without `connection.execute_wrapper`
+    """
+    def __init__(self, cursor, wrapper):
+        self.cursor = cursor
+        self.wrapper = wrapper
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _execute(self, sql, params, many, context):
+        if many:
+            return self.cursor.executemany(sql, params)
+        return self.cursor.execute(sql, params)
+
+    def execute(self, sql, params=None):
+        return self.wrapper(self._execute, sql, params, False, {})
+
+    def executemany(self, sql, param_list):
+        return self.wrapper(self._execute, sql, param_list, True, {})
+
+
+@contextmanager
+def wrap_connection(wrapper, using=DEFAULT_DB_ALIAS):
+    """Pass the connection's statements in the block through `wrapper`
+
+    `wrapper` is called like a Django execute wrapper. Django 2.0+ provides
+    `connection.execute_wrapper`. For older Django versions, like the one in
+    Ginkgo, the connection's cursors are wrapped instead
+    """
+    connection = connections[using]
+    if hasattr(connection, 'execute_wrapper'):
+        with connection.execute_wrapper(wrapper):
+            yield
+        return
+
+    patched = [name for name in ('cursor', 'chunked_cursor') if hasattr(connection, name)]
+    originals = dict((name, getattr(connection, name)) for name in patched)
+    # Cursor methods already replaced by an enclosing block
+    nested = [name for name in patched if name in vars(connection)]
+
+    def wrapped(name):
+        def cursor(*args, **kwargs):
+            return InstrumentedCursor(originals[name](*args, **kwargs), wrapper)
+        return cursor
+
+    for name in patched:
+        setattr(connection, name, wrapped(name))
+    try:
+        yield
+    finally:
+        for name in patched:
+            if name in nested:
+                setattr(connection, name, originals[name])
+            else:
+                delattr(connection, name)
+
+
+@contextmanager
+def instrument_queries(label, logger=None):
+    """Context handler to log the database queries run in a block
+
+    Logs the query count and time when the block exits, and a warning for
+    each statement slower than the ``SLOW_QUERY_THRESHOLD`` setting with the
+    Figures function that ran it. Yields the `QueryStats`, or None when query
+    instrumentation is not enabled. See `query_instrumentation_enabled`
+
+    Example:
+
+    ```
+    with instrument_queries('Serialize course data') as stats:
+        data = GeneralCourseDataSerializer(courses, many=True).data
+    ```
+    """
+    if not query_instrumentation_enabled():
+        yield None
+        return
+    logger = logger if logger else default_logger
+    stats = QueryStats(threshold=slow_query_threshold())
+    try:
+        with wrap_connection(stats):
+            yield stats
+    finally:
+        logger.info('{}: {} queries in {:.3f} s'.format(label, stats.count, stats.time))
+        for query in stats.slow_queries:
+            logger.warning('{}: slow query {:.3f} s in {}: {}'.format(
+                label, query['time'], query['caller'], query['sql']))
+
+
+def with_query_instrumentation(func):
+    """Decorator to run the function in an `instrument_queries` block
+    """
+    label = '{}.{}'.format(func.__module__, func.__name__)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with instrument_queries(label):
+            return func(*args, **kwargs)
+    return wrapper
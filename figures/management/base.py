@@ -7,10 +7,23 @@ from django.contrib.sites.models import Site
 from django.core.management.base import BaseCommand
 
 from figures import helpers
+from figures.log import instrument_queries
 from figures.sites import get_sites
 
 
-class BaseBackfillCommand(BaseCommand):
+class BaseFiguresCommand(BaseCommand):
+    '''Base class for Figures management commands
+
+    Logs the command's database queries when query instrumentation is enabled.
+    See `figures.log.instrument_queries`
+    '''
+    def execute(self, *args, **options):
+        label = 'Figures command {}'.format(self.__module__.rsplit('.', 1)[-1])
+        with instrument_queries(label):
+            return super(BaseFiguresCommand, self).execute(*args, **options)
+
+
+class BaseBackfillCommand(BaseFiguresCommand):
     '''Base class for Figures backfill management commands with common options.
     '''
     def get_site_ids(self, identifier=None):
@@ -8,21 +8,40 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 from textwrap import dedent
+from time import time
 
 from dateutil.rrule import rrule, DAILY
 
-from django.core.management.base import BaseCommand, CommandError
+from django.core.management.base import CommandError
 
 from figures.helpers import as_date
+from figures.management.base import BaseFiguresCommand
+from figures.management.parallel import run_jobs
 from figures.sites import Site
-from figures.pipeline.backfill import backfill_daily_metrics_for_site_and_date
+from figures.pipeline.backfill import (
+    backfill_course_daily_metrics_for_date_range,
+    backfill_course_daily_metrics_for_site_id_and_date,
+    backfill_daily_metrics_for_site_and_date,
+    backfill_daily_metrics_for_site_and_date_range,
+    backfill_site_daily_metrics_for_date_range,
+    date_ranges,
+)
+from figures.pipeline.ledger import pipeline_run
+from figures.pipeline.site_daily_metrics import SiteDailyMetricsLoader
 
 
-class Command(BaseCommand):
+# Split a date range into this many ranges per worker. Later days have more
+# courses, so smaller ranges spread the work more evenly across the workers
+DATE_RANGES_PER_WORKER = 4
+
+
+class Command(BaseFiguresCommand):
     '''Populate Figures daily metrics models (``CourseDailyMetrics`` and ``SiteDailyMetrics``).
     Note that correctly populating cumulative user and course count for ``SiteDailyMetrics``
     relies on running this sequentially forward from the first date for which StudentModule records
     are present.
+
+    A date range is backfilled in a single pass over the site's data unless ``--per-day`` is set.
     '''
 
     help = dedent(__doc__).strip()
@@ -43,6 +62,93 @@ class Command(BaseCommand):
                                                         logdir=logdir,
                                                         force_update=force_update)
 
+    def do_range_backfill(self, site, start_date, end_date, **kwargs):
+        """Backfill the date range in a single pass and print the results
+        """
+        print('Generating daily metrics for dates: {} to {}'.format(
+            start_date.isoformat(), end_date.isoformat()))
+        results = backfill_daily_metrics_for_site_and_date_range(
+            site,
+            start_date,
+            end_date,
+            process_sdm=not kwargs.get('skip_sdm', False),
+            force_update=kwargs.get('force_update', False))
+        print('Finished. CDMs created: {}, updated: {}, skipped: {}, errors: {}'.format(
+            results['cdms_created'], results['cdms_updated'],
+            results['cdms_skipped'], len(results['cdm_errors'])))
+        if 'sdms_created' in results:
+            print('SDMs created: {}, updated: {}, skipped: {}'.format(
+                results['sdms_created'], results['sdms_updated'], results['sdms_skipped']))
+        print('CDM processing time: {}, SDM processing time: {}'.format(
+            results['cdms_elapsed'], results['sdm_elapsed']))
+        return results
+
+    def do_parallel_range_backfill(self, site, start_date, end_date, workers, **kwargs):
+        """Backfill the date range's CDMs in worker processes, then the SDMs
+
+        Each worker process fills the CDMs for a part of the date range in a
+        single pass. The SDMs are not filled if any part failed
+        """
+        print('Generating daily metrics for dates: {} to {} with {} workers'.format(
+            start_date.isoformat(), end_date.isoformat(), workers))
+        force_update = kwargs.get('force_update', False)
+        jobs = [(site.id, start.isoformat(), end.isoformat(), force_update) for start, end
+                in date_ranges(start_date, end_date, workers * DATE_RANGES_PER_WORKER)]
+        run = run_jobs(backfill_course_daily_metrics_for_date_range,
+                       jobs,
+                       workers=workers,
+                       label='date ranges')
+        results = dict(cdms_created=0, cdms_updated=0, cdms_skipped=0, cdm_errors=[],
+                       cdms_elapsed=run['elapsed'], sdm_elapsed=0.0)
+        for _job, job_results in run['results']:
+            for key in ['cdms_created', 'cdms_updated', 'cdms_skipped']:
+                results[key] += job_results[key]
+            results['cdm_errors'] += job_results['cdm_errors']
+        print('Finished. CDMs created: {}, updated: {}, skipped: {}, errors: {}'.format(
+            results['cdms_created'], results['cdms_updated'],
+            results['cdms_skipped'], len(results['cdm_errors'])))
+        self.check_job_errors(run)
+        if not kwargs.get('skip_sdm', False):
+            results.update(backfill_site_daily_metrics_for_date_range(
+                site, start_date, end_date, force_update=force_update))
+            print('SDMs created: {}, updated: {}, skipped: {}'.format(
+                results['sdms_created'], results['sdms_updated'], results['sdms_skipped']))
+        print('CDM processing time: {}, SDM processing time: {}'.format(
+            results['cdms_elapsed'], results['sdm_elapsed']))
+        return results
+
+    def do_parallel_backfill(self, site, dates, workers, **kwargs):
+        """Backfill each day's CDMs in worker processes, then the SDMs
+
+        The SDMs are filled in date order after all the days' CDMs, because
+        each day's cumulative counts build on the day before. The SDMs are not
+        filled if any day failed
+        """
+        force_update = kwargs.get('force_update', False)
+        jobs = [(site.id, date_for.isoformat(), kwargs.get('logdir'), force_update)
+                for date_for in dates]
+        run = run_jobs(backfill_course_daily_metrics_for_site_id_and_date,
+                       jobs,
+                       workers=workers,
+                       label='days')
+        self.check_job_errors(run)
+        if not kwargs.get('skip_sdm', False):
+            start_time = time()
+            for date_for in dates:
+                SiteDailyMetricsLoader().load(site=site,
+                                              date_for=date_for,
+                                              force_update=force_update)
+            print('SDM processing time: {}'.format(time() - start_time))
+        return run
+
+    def check_job_errors(self, run):
+        """Raise a CommandError if any of the worker process jobs failed
+        """
+        if run['errors']:
+            raise CommandError(
+                '{} jobs failed. SiteDailyMetrics were not updated. Fix the errors '
+                'and run the backfill again'.format(len(run['errors'])))
+
     def get_site(self, options):
         """Return a Site object matching the command line arg
 
@@ -88,13 +194,39 @@ class Command(BaseCommand):
                             help='Update records if they already exist')
         parser.add_argument('--logdir', default=None,
                             help='altnerate path to output log files')
+        parser.add_argument('--per-day', action='store_true',
+                            help=('Backfill a date range one day at a time instead of '
+                                  'in a single pass. Writes a log file for each day'))
+        parser.add_argument('--workers', type=int, default=None,
+                            help=('Number of local processes to fill CourseDailyMetrics '
+                                  'for a date range with. Default is to run in this process'))
 
     def handle(self, *args, **options):
         site = self.get_site(options)
         dates = self.get_dates(options)
+        with pipeline_run('backfill_figures_daily_metrics', site=site):
+            self.backfill(site, dates, options)
+
+    def backfill(self, site, dates, options):
+        """Backfill the dates with the method the options call for
+        """
         backfill_options = ['skip_sdm', 'force_update', 'logdir']
         extra_args = dict((key, options[key]) for key in backfill_options)
-        # import pdb; pdb.set_trace()
+
+        workers = options.get('workers')
+        parallel = bool(workers and workers > 1 and len(dates) > 1)
+
+        if options['date_range'] and not options.get('per_day'):
+            if parallel:
+                self.do_parallel_range_backfill(site, dates[0], dates[-1], workers,
+                                                **extra_args)
+            else:
+                self.do_range_backfill(site, dates[0], dates[-1], **extra_args)
+            return
+
+        if parallel:
+            self.do_parallel_backfill(site, dates, workers, **extra_args)
+            return
 
         for date_for in dates:
             print('Generating daily metrics for date: {}'.format(date_for.isoformat()))
@@ -20,6 +20,35 @@ backfill_figures_enrollment_data --sites heres-a-site.com another-site.com
 To specify courses, use the `--courses` paramter, followed by a space delimited
 list of course id string. Example:
 
+```
+backfill_figures_enrollment_data --courses course-v1:SomeOrg+SomeNum+SomeRun
+```
+
+### Resuming and sharding
+
+Each course backfill records its progress in an `EnrollmentDataBackfill`
+record, checkpointing the last enrollment processed. Running the command again
+for the same courses resumes unfinished backfills from their checkpoint. Use
+`--restart` to start over.
+
+To split each course's backfill across Celery workers, use `--shard-size`
+with `--use-celery`. Each course's enrollments are split into enrollment id
+ranges of that size and each range is run as its own task:
+
+```
+backfill_figures_enrollment_data --sites heres-a-site.com --use-celery --shard-size 50000
+```
+
+To run the backfills in local processes instead of Celery workers, use
+`--workers`. With `--shard-size`, a course's enrollment id ranges are also
+spread across the processes:
+
+```
+backfill_figures_enrollment_data --sites heres-a-site.com --workers 8 --shard-size 50000
+```
+
+Use `--status` to report the progress, throughput and estimated time remaining
+of the backfills for the sites or courses without running them.
 
 ### Important
 
@@ -40,15 +69,29 @@ from __future__ import absolute_import
 import argparse
 from textwrap import dedent
 from django.contrib.sites.models import Site
-from django.core.management.base import BaseCommand, CommandError
+from django.core.management.base import CommandError
 
 from figures.compat import CourseOverview
+from figures.course import Course
 from figures.helpers import as_course_key
+from figures.management.base import BaseFiguresCommand
+from figures.management.parallel import run_jobs
+from figures.models import EnrollmentDataBackfill
+from figures.pipeline.backfill import enrollment_id_ranges
 from figures.sites import site_course_ids
 from figures.tasks import backfill_enrollment_data_for_course
 
 
-class Command(BaseCommand):
+def run_backfill(course_id, backfill_id):
+    """Run the course's `EnrollmentDataBackfill` in a worker process
+
+    Returns the backfill id for the parent process to report on
+    """
+    backfill_enrollment_data_for_course(course_id, backfill_id=backfill_id)
+    return backfill_id
+
+
+class Command(BaseFiguresCommand):
     """Backfill Figures EnrollmentData model.
 
     This Django managmenet command provides a basic CLI to create and update
@@ -116,23 +159,107 @@ class Command(BaseCommand):
                 course_ids.append(str(course_overview.id))
         return course_ids
 
-    def update_enrollments(self, course_ids, use_celery):
+    def update_enrollments(self, course_ids, use_celery, shard_size=None, resume=True,
+                           workers=None):
         """This method calls the Celery task in delay or immediate mode
 
-        TODO: If running as Celery tasks, improve the function, collect the
-        task ids, return them to the caller (Currently it is the `handle`
-        function) and report on processing state. Allow the user to quit and
-        the tasks keep running.
+        Creates or, if `resume` is True, resumes an `EnrollmentDataBackfill` for
+        each course, or for each of the course's enrollment id ranges if
+        `shard_size` is given, and runs the task for it.
+
+        If `workers` is greater than one, the backfills are run in that many
+        local processes instead.
+
+        Run the command with `--status` to report on the progress of the
+        backfills running in Celery workers.
         """
+        if workers and workers > 1 and not use_celery:
+            return self.update_enrollments_in_workers(course_ids,
+                                                      workers=workers,
+                                                      shard_size=shard_size,
+                                                      resume=resume)
         for course_id in course_ids:
             print('Updating enrollment data for course "{}"'.format(str(course_id)))
-            if use_celery:
-                # Call the Celery task with delay
-                backfill_enrollment_data_for_course.delay(str(course_id))
-
+            site = Course(course_id).site
+            if shard_size:
+                id_ranges = enrollment_id_ranges(course_id, shard_size)
             else:
-                # Call the Celery task immediately
-                backfill_enrollment_data_for_course(str(course_id))
+                id_ranges = [(None, None)]
+            for min_enrollment_id, max_enrollment_id in id_ranges:
+                backfill = EnrollmentDataBackfill.objects.for_range(
+                    site=site,
+                    course_id=course_id,
+                    min_enrollment_id=min_enrollment_id,
+                    max_enrollment_id=max_enrollment_id,
+                    resume=resume)
+                if use_celery:
+                    # Call the Celery task with delay
+                    backfill_enrollment_data_for_course.delay(str(course_id),
+                                                              backfill_id=backfill.id)
+                else:
+                    # Call the Celery task immediately
+                    backfill_enrollment_data_for_course(str(course_id),
+                                                        backfill_id=backfill.id)
+                    backfill.refresh_from_db()
+                    self.print_backfill(backfill)
+
+    def update_enrollments_in_workers(self, course_ids, workers, shard_size=None,
+                                      resume=True):
+        """Run the courses' backfills in local worker processes
+
+        Creates or resumes the backfills here, runs them across the workers,
+        then prints each backfill's progress. Returns the `run_jobs` results
+        """
+        jobs = []
+        for course_id in course_ids:
+            site = Course(course_id).site
+            if shard_size:
+                id_ranges = enrollment_id_ranges(course_id, shard_size)
+            else:
+                id_ranges = [(None, None)]
+            for min_enrollment_id, max_enrollment_id in id_ranges:
+                backfill = EnrollmentDataBackfill.objects.for_range(
+                    site=site,
+                    course_id=course_id,
+                    min_enrollment_id=min_enrollment_id,
+                    max_enrollment_id=max_enrollment_id,
+                    resume=resume)
+                jobs.append((str(course_id), backfill.id))
+        print('Running {} enrollment data backfills with {} workers'.format(
+            len(jobs), workers))
+        run = run_jobs(run_backfill, jobs, workers=workers, label='backfills')
+        for backfill in EnrollmentDataBackfill.objects.filter(
+                id__in=[backfill_id for _course_id, backfill_id in jobs]).order_by(
+                'course_id', 'min_enrollment_id', 'id'):
+            self.print_backfill(backfill)
+        return run
+
+    def print_backfill(self, backfill):
+        """Print the progress of an `EnrollmentDataBackfill`
+        """
+        throughput = backfill.throughput
+        eta = backfill.eta
+        print('  [{id}] {course_id} ids [{min_id}, {max_id}) {status}: '
+              '{processed} of {total} enrollments, {throughput} enrollments/sec, '
+              'ETA {eta}'.format(
+                  id=backfill.id,
+                  course_id=backfill.course_id,
+                  min_id=backfill.min_enrollment_id,
+                  max_id=backfill.max_enrollment_id,
+                  status=backfill.status,
+                  processed=backfill.processed_count,
+                  total=backfill.total_count,
+                  throughput='-' if throughput is None else '{:.1f}'.format(throughput),
+                  eta='-' if eta is None else '{:.0f}s'.format(eta)))
+
+    def print_status(self, course_ids):
+        """Print the progress of the backfills for the courses
+        """
+        backfills = EnrollmentDataBackfill.objects.filter(
+            course_id__in=[str(course_id) for course_id in course_ids]).order_by(
+            'course_id', 'min_enrollment_id', 'id')
+        for backfill in backfills:
+            self.print_backfill(backfill)
 
     def add_arguments(self, parser):
         """
@@ -160,6 +287,24 @@ class Command(BaseCommand):
                             action='store_true',
                             default=False,
                             help='Run with Celery worker. Default is to run in immediate mode')
+        parser.add_argument('--shard-size',
+                            type=int,
+                            default=None,
+                            help=('Split each course into enrollment id ranges of this size '
+                                  'and run a task for each range'))
+        parser.add_argument('--workers',
+                            type=int,
+                            default=None,
+                            help=('Run the backfills in this many local processes. '
+                                  'Ignored with --use-celery'))
+        parser.add_argument('--restart',
+                            action='store_true',
+                            default=False,
+                            help='Start new backfills instead of resuming unfinished ones')
+        parser.add_argument('--status',
+                            action='store_true',
+                            default=False,
+                            help='Report backfill progress without running backfills')
 
     def handle(self, *args, **options):
 
@@ -175,17 +320,20 @@ class Command(BaseCommand):
             course_ids = self.get_course_ids_from_courses_param(options)
 
         use_celery = options['use_celery']
-
-        # Would it benefit to implement a generator method to yield the course id?
-        if course_ids:
-            self.update_enrollments(course_ids, use_celery=use_celery)
-
-        elif sites:
+        run_kwargs = dict(use_celery=use_celery,
+                          shard_size=options.get('shard_size'),
+                          resume=not options.get('restart', False),
+                          workers=options.get('workers'))
+
+        if not course_ids:
+            if not sites:
+                raise CommandError('You need to provide at least one site or course to update')
             for site in sites:
-                course_ids = site_course_ids(site)
-                self.update_enrollments(course_ids, use_celery=use_celery)
+                course_ids += list(site_course_ids(site))
 
+        if options.get('status'):
+            self.print_status(course_ids)
         else:
-            raise CommandError('You need to provide at least one site or course to update')
+            self.update_enrollments(course_ids, **run_kwargs)
 
         print('DONE: Backfill Figures EnrollmentData')
@@ -14,10 +14,11 @@ from textwrap import dedent
 import warnings
 
 from django.core.management import call_command
-from django.core.management.base import BaseCommand
 
+from figures.management.base import BaseFiguresCommand
 
-class Command(BaseCommand):
+
+class Command(BaseFiguresCommand):
     """Pending Deprecation: Populate Figures metrics models
     """
     help = dedent(__doc__).strip()
@@ -29,6 +30,10 @@ class Command(BaseCommand):
                             help='overwrite existing data in SiteMonthlyMetrics')
         parser.add_argument('--site',
                             help='backfill a specific site. provide id or domain name')
+        parser.add_argument('--workers',
+                            type=int,
+                            default=None,
+                            help='Number of local processes to backfill daily metrics with')
 
     def handle(self, *args, **options):
         '''
@@ -48,10 +53,14 @@ class Command(BaseCommand):
             overwrite=options['overwrite'],
             site=options['site']
         )
+        extra_options = {}
+        if options.get('workers'):
+            extra_options['workers'] = options['workers']
         call_command(
             'backfill_figures_daily_metrics',
             overwrite=options['overwrite'],
-            site=options['site']
+            site=options['site'],
+            **extra_options
         )
 
         print('DONE: Backfill Figures Metrics')
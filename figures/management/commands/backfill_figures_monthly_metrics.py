@@ -10,19 +10,19 @@ from textwrap import dedent
 from django.contrib.sites.models import Site
 
 from figures.pipeline.backfill import backfill_monthly_metrics_for_site
+from figures.pipeline.ledger import pipeline_run
 from figures.management.base import BaseBackfillCommand
 
-assert 0, "This command needs to be reworked both for performance and correctness"
-
 
 def backfill_site(site, overwrite, use_raw_sql):
 
     print('Backfilling monthly metrics for site id={} domain={}'.format(
         site.id,
         site.domain))
-    backfilled = backfill_monthly_metrics_for_site(site=site,
-                                                   overwrite=overwrite,
-                                                   use_raw_sql=use_raw_sql)
+    with pipeline_run('backfill_figures_monthly_metrics', site=site):
+        backfilled = backfill_monthly_metrics_for_site(site=site,
+                                                       overwrite=overwrite,
+                                                       use_raw_sql=use_raw_sql)
     if backfilled:
         for rec in backfilled:
             obj = rec['obj']
@@ -44,8 +44,8 @@ class Command(BaseBackfillCommand):
         '''
         parser.add_argument(
             '--use_raw_sql',
-            help=('Use raw SQL for query performance with large number of StudentModules, '
-                  'where supported.'),
+            help=('Deprecated. The backfill reads the StudentModule records in a single '
+                  'pass and no longer needs raw SQL.'),
             default=False,
             action="store_true"
         )
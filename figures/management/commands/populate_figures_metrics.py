@@ -14,10 +14,11 @@ from textwrap import dedent
 import warnings
 
 from django.core.management import call_command
-from django.core.management.base import BaseCommand
 
+from figures.management.base import BaseFiguresCommand
 
-class Command(BaseCommand):
+
+class Command(BaseFiguresCommand):
     '''Populate Figures metrics models
     '''
     help = dedent(__doc__).strip()
@@ -41,6 +42,10 @@ class Command(BaseCommand):
                             default=False,
                             help=('Run with Celery workflows (Warning: This is still under' +
                                   ' development and likely to get stuck/hung jobs'))
+        parser.add_argument('--workers',
+                            type=int,
+                            default=None,
+                            help='Number of local processes to run the backfill with')
         parser.add_argument('--mau',
                             action='store_true',
                             default=False,
@@ -65,13 +70,17 @@ class Command(BaseCommand):
         if options['mau']:
             call_command('run_figures_mau_metrics', no_delay=options['no_delay'])
         else:
+            extra_options = {}
+            if options.get('workers'):
+                extra_options['workers'] = options['workers']
             call_command(
                 'backfill_figures_daily_metrics',
                 no_delay=options['no_delay'],
                 date_start=options['date'],
                 date_end=options['date'],
                 overwrite=options['force_update'],
-                experimental=options['experimental']
+                experimental=options['experimental'],
+                **extra_options
             )
 
         # TODO: improve this message to say 'today' when options['date'] is None
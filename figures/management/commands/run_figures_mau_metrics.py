@@ -7,14 +7,13 @@ from __future__ import absolute_import
 
 from textwrap import dedent
 
-from django.core.management.base import BaseCommand
-
+from figures.management.base import BaseFiguresCommand
 from figures.tasks import (
     populate_all_mau
 )
 
 
-class Command(BaseCommand):
+class Command(BaseFiguresCommand):
     """Task runner to kick off Figures celery tasks
     """
     help = dedent(__doc__).strip()
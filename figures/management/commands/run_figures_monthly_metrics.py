@@ -9,14 +9,13 @@ from __future__ import absolute_import
 
 from textwrap import dedent
 
-from django.core.management.base import BaseCommand
-
+from figures.management.base import BaseFiguresCommand
 from figures.tasks import (
     run_figures_monthly_metrics
 )
 
 
-class Command(BaseCommand):
+class Command(BaseFiguresCommand):
     """Task runner to kick off Figures celery tasks
     """
     help = dedent(__doc__).strip()
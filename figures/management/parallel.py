@@ -0,0 +1,97 @@
+"""Runs management command jobs across local processes
+
+Backfills are often run from a single large host without a healthy Celery
+cluster. `run_jobs` distributes a command's jobs, like sites, courses or date
+ranges, across a pool of local worker processes. Then it gathers the results
+and errors and reports the progress and throughput.
+
+Each job is a tuple of arguments for the job function. The job function and
+its arguments must be picklable, so use module level functions that take ids
+and strings rather than model instances.
+
+The database connections are closed before the pool is started. Each worker
+process then opens its own connections instead of sharing the parent's.
+"""
+
+from __future__ import absolute_import, print_function
+from contextlib import closing
+import multiprocessing
+from time import time
+import traceback
+
+from django.db import connections
+
+
+def close_db_connections():
+    """Close this process's database connections
+
+    Django opens new connections when they are next used
+    """
+    for conn in connections.all():
+        conn.close()
+
+
+def _run_job(func_and_job):
+    """Call the job function, returning the result or the error
+
+    Exceptions are returned as formatted tracebacks rather than raised, so one
+    failed job does not stop the other jobs
+    """
+    func, job = func_and_job
+    try:
+        return job, func(*job), None
+    except Exception:  # pylint: disable=broad-except
+        return job, None, traceback.format_exc()
+
+
+def run_jobs(func, jobs, workers=None, label='jobs', stdout=None):
+    """Run `func(*job)` for each job, in `workers` processes
+
+    If `workers` is not greater than one, the jobs are run one after the other
+    in this process.
+
+    Prints a line for each finished job and the overall throughput to
+    `stdout`, which defaults to `print`. Pass a management command's
+    `self.stdout.write` to write to the command's output.
+
+    Returns a dict with the `results` as a list of ``(job, result)`` tuples,
+    the `errors` as a list of ``(job, traceback)`` tuples, the `elapsed`
+    seconds and the `throughput` in jobs per second. Results are in the order
+    the jobs finished.
+    """
+    stdout = stdout or print
+    jobs = list(jobs)
+    results = []
+    errors = []
+    start_time = time()
+
+    def report(job, result, error):
+        if error:
+            errors.append((job, error))
+        else:
+            results.append((job, result))
+        finished = len(results) + len(errors)
+        stdout('[{} of {}] {} {}'.format(finished, len(jobs),
+                                         'FAILED' if error else 'finished',
+                                         ', '.join(str(arg) for arg in job)))
+        if error:
+            stdout(error)
+
+    if workers and workers > 1 and len(jobs) > 1:
+        close_db_connections()
+        pool = multiprocessing.Pool(processes=min(workers, len(jobs)),
+                                    initializer=close_db_connections)
+        with closing(pool):
+            for job, result, error in pool.imap_unordered(
+                    _run_job, [(func, job) for job in jobs]):
+                report(job, result, error)
+        pool.join()
+    else:
+        for job in jobs:
+            report(*_run_job((func, job)))
+
+    elapsed = time() - start_time
+    throughput = len(jobs) / elapsed if elapsed else 0.0
+    stdout('Processed {} {} in {:.1f}s with {} errors, {:.2f} {}/sec'.format(
+        len(jobs), label, elapsed, len(errors), throughput, label))
+    return dict(results=results, errors=errors, elapsed=elapsed, throughput=throughput)
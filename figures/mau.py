@@ -1,19 +1,27 @@
 """
 This module provides MAU metrics retrieval functionality
+
+The site and course MAU functions count the distinct users in the
+`MonthlyActiveEnrollment` table, which the pipeline adds each day's new active
+enrollments to. See `figures.activity`. Reads, like the live MAU functions
+for the API, never collect the activity. For a month with days not yet
+collected, which includes the current month, they count StudentModule
+records instead. The pipeline passes ``collect=True``.
+
+The StudentModule functions, `get_mau_from_student_modules` and
+`mau_1g_for_month_as_of_day`, query the StudentModule queryset they are given
 """
 
 from __future__ import absolute_import
-from datetime import datetime, timedelta
-from django.utils.timezone import utc
-
-from figures.compat import RELEASE_LINE
+from datetime import date, datetime
 
-from figures.models import CourseMauMetrics, SiteMauMetrics
-from figures.sites import (
-    get_course_keys_for_site,
-    get_student_modules_for_site,
-    get_student_modules_for_course_in_site,
+from figures.activity import (
+    monthly_active_user_counts_by_course,
+    monthly_active_user_ids,
 )
+from figures.models import CourseMauMetrics, SiteMauMetrics
+from figures.sites import get_course_keys_for_site
+from figures.time_windows import filter_month, filter_month_as_of_day
 
 
 def get_mau_from_student_modules(student_modules, year, month):
@@ -25,21 +33,31 @@ def get_mau_from_student_modules(student_modules, year, month):
     the specified month
 
     """
-    qs = student_modules.filter(modified__year=year,
-                                modified__month=month)
+    qs = filter_month(student_modules, date(year=year, month=month, day=1))
     return qs.values_list('student__id', flat=True).distinct()
 
 
-def get_mau_from_site_course(site, course_id, year, month):
+def get_mau_from_activity(site, year, month, course_id=None, collect=False):
+    """Return the distinct ids of users active in the site in year and month
+
+    If `course_id` is given, only activity in the course is included. If
+    `collect` is True, the month's activity is collected first if needed.
+    See `figures.activity.monthly_active_user_ids`
+    """
+    course_ids = [course_id] if course_id else None
+    return monthly_active_user_ids(site=site,
+                                   month_for=date(year=year, month=month, day=1),
+                                   course_ids=course_ids,
+                                   collect=collect)
+
+
+def get_mau_from_site_course(site, course_id, year, month, collect=False):
     """Convenience function to get the distinct active users for a given course
     in a site
 
     """
-    student_modules = get_student_modules_for_course_in_site(site=site,
-                                                             course_id=course_id)
-    return get_mau_from_student_modules(student_modules=student_modules,
-                                        year=year,
-                                        month=month)
+    return get_mau_from_activity(site=site, year=year, month=month, course_id=course_id,
+                                 collect=collect)
 
 
 def retrieve_live_site_mau_data(site):
@@ -47,11 +65,8 @@ def retrieve_live_site_mau_data(site):
     Used this when we need to retrieve unique active users for the
     whole site
     """
-    student_modules = get_student_modules_for_site(site)
     today = datetime.utcnow()
-    users = get_mau_from_student_modules(student_modules=student_modules,
-                                         year=today.year,
-                                         month=today.month)
+    users = get_mau_from_activity(site=site, year=today.year, month=today.month)
     return dict(
         count=users.count(),
         month_for=today.date(),
@@ -64,11 +79,11 @@ def retrieve_live_course_mau_data(site, course_id):
     Used this when we need to retrieve unique active users for a given course
     in the site
     """
-    student_modules = get_student_modules_for_course_in_site(site, course_id)
     today = datetime.utcnow()
-    users = get_mau_from_student_modules(student_modules=student_modules,
-                                         year=today.year,
-                                         month=today.month)
+    users = get_mau_from_activity(site=site,
+                                  year=today.year,
+                                  month=today.month,
+                                  course_id=course_id)
     return dict(
         count=users.count(),
         month_for=today.date(),
@@ -90,52 +105,26 @@ def mau_1g_for_month_as_of_day(sm_queryset, date_for):
 
     Retrieves records based on date of the `StudentModule.modified` field
     Returns a queryset of distinct user ids
-    """
 
-    # TODO: Remove this `if` branch after dropping Ginkgo support.
-    if RELEASE_LINE == 'ginkgo':
-        # Django 1.8 appears not to support 'lte' on the 'day' of a datetime
-        # Therefore we have to get records within a range
-        start_date = datetime(year=date_for.year,
-                              month=date_for.month,
-                              day=1).replace(tzinfo=utc)
-        # We do this in case 'date_for' is at the end of the month and get
-        # the 'day_after' as midnight of the next day so we can use '__lt'. If
-        # we simply used '__lte', then we exclude any events that happened on
-        # the 'date_for' in hours after the 'date_for' hours.
-
-        # temporary var as we don't know
-        day_after_temp = date_for + timedelta(days=1)
-        day_after = datetime(year=day_after_temp.year,
-                             month=day_after_temp.month,
-                             day=day_after_temp.day).replace(tzinfo=utc)
-
-        # We don't use 'dict(modified__range=[start_date, date_for])' because
-        # doing "__lt" for 0:00 hour tne next day means we don't have to worry
-        # about fractions of a second on the last second of the last day
-        filter_args = dict(modified__gte=start_date, modified__lt=day_after)
-    else:
-        filter_args = dict(modified__year=date_for.year,
-                           modified__month=date_for.month,
-                           modified__day__lte=date_for.day)
-
-    month_sm = sm_queryset.filter(**filter_args)
+    The records are filtered on a range from the start of the month to
+    midnight after "date_for", so the database can use the `modified` index.
+    See `figures.time_windows`
+    """
+    month_sm = filter_month_as_of_day(sm_queryset, date_for)
     return month_sm.values('student__id').distinct()
 
 
-def site_mau_1g_for_month_as_of_day(site, date_for):
+def site_mau_1g_for_month_as_of_day(site, date_for, collect=False):
     """Get the MAU for the given site, as of the "date_for" in the month
 
-    This is a conenvience function. It gets the student modules for the site,
-    then calls
-
-        `figures.mau.mau_for_month_as_of_day(...)`
+    Counts the users in `MonthlyActiveEnrollment` first active in the month
+    on or before "date_for". If `collect` is True, the month's activity
+    through "date_for" is collected first if needed
 
     Returns a queryset with distinct user ids
     """
-    site_sm = get_student_modules_for_site(site)
-    return mau_1g_for_month_as_of_day(sm_queryset=site_sm,
-                                      date_for=date_for)
+    return monthly_active_user_ids(site=site, month_for=date_for, as_of_date=date_for,
+                                   collect=collect)
 
 
 def store_mau_metrics(site, overwrite=False):
@@ -145,31 +134,26 @@ def store_mau_metrics(site, overwrite=False):
     today = datetime.utcnow()
 
     # get site data
-    student_modules = get_student_modules_for_site(site)
-    site_mau = get_mau_from_student_modules(student_modules=student_modules,
-                                            year=today.year,
-                                            month=today.month)
+    site_mau = get_mau_from_activity(site=site, year=today.year, month=today.month,
+                                     collect=True)
 
     # store site data
     site_mau_obj, _created = SiteMauMetrics.save_metrics(site=site,
                                                          date_for=today.date(),
                                                          data=dict(mau=site_mau.count()),
                                                          overwrite=overwrite)
-    course_mau_objects = []
-    for course_key in get_course_keys_for_site(site):
-        course_student_modules = student_modules.filter(course_id=course_key)
-        course_mau = get_mau_from_student_modules(
-            student_modules=course_student_modules,
-            year=today.year,
-            month=today.month)
-        course_mau_obj, _created = CourseMauMetrics.save_metrics(
-                site=site,
-                course_id=str(course_key),
-                date_for=today.date(),
-                data=dict(mau=course_mau.count()),
-                overwrite=overwrite)
-
-        course_mau_objects.append(course_mau_obj)
+    # store the course data, counted with one grouped query for the site
+    course_ids = [str(course_key) for course_key in get_course_keys_for_site(site)]
+    course_mau = monthly_active_user_counts_by_course(site=site,
+                                                      month_for=today.date(),
+                                                      course_ids=course_ids,
+                                                      collect=True)
+    results = CourseMauMetrics.objects.save_metrics_for_courses(
+        site=site,
+        date_for=today.date(),
+        mau_by_course=dict((course_id, course_mau.get(course_id, 0))
+                           for course_id in course_ids),
+        overwrite=overwrite)
 
     return dict(smo=site_mau_obj,
-                cmos=course_mau_objects)
+                cmos=results['created'] + results['updated'] + results['skipped'])
@@ -29,6 +29,12 @@ import math
 from django.contrib.auth import get_user_model
 from django.db.models import Avg, Max, Sum
 
+from figures.activity import (
+    active_user_bitmaps_enabled,
+    approximate_active_user_count,
+    approximate_active_users_enabled,
+    bitmap_active_user_count,
+)
 from figures.compat import (
     GeneratedCertificate,
     chapter_grade_values,
@@ -53,6 +59,7 @@ from figures.models import (
     SiteMonthlyMetrics,
 )
 import figures.sites
+from figures.time_windows import window_filter
 
 #
 # Helpers (consider moving to the ``helpers`` module
@@ -274,19 +281,34 @@ def get_active_users_for_time_period(site, start_date, end_date, course_ids=None
     This is determined by finding the unique user ids for StudentModule records
     modified in a time period
 
-    We don't do this only because it raises timezone warnings
-        modified__range=(as_date(start_date), as_date(end_date)),
+    If the Figures ``ACTIVE_USER_BITMAPS`` setting is enabled, the count is
+    taken from the daily active user bitmaps for the site (or the courses).
+    See `figures.activity.bitmap_active_user_count`. Otherwise, if the
+    ``APPROXIMATE_ACTIVE_USERS`` setting is enabled, the count is estimated
+    by merging the daily active user sketches. See
+    `figures.activity.approximate_active_user_count`. In both modes, days the
+    pipeline has not built the bitmaps or sketches for are read from
+    StudentModule
     """
+    if active_user_bitmaps_enabled():
+        return bitmap_active_user_count(site=site,
+                                        start_date=start_date,
+                                        end_date=end_date,
+                                        course_ids=course_ids)
+    if approximate_active_users_enabled():
+        return approximate_active_user_count(site=site,
+                                             start_date=start_date,
+                                             end_date=end_date,
+                                             course_ids=course_ids)
+
     # Get list of learners for the site
 
     user_ids = figures.sites.get_user_ids_for_site(site)
-    filter_args = dict(
-        modified__gt=as_datetime(prev_day(start_date)),
-        modified__lt=as_datetime(next_day(end_date)),
-        student_id__in=user_ids,
-    )
+    filter_args = window_filter((as_datetime(as_date(start_date)),
+                                 as_datetime(next_day(as_date(end_date)))))
+    filter_args['student_id__in'] = user_ids
     if course_ids:
-        filter_args['course_ids__in'] = course_ids
+        filter_args['course_id__in'] = course_ids
 
     return StudentModule.objects.filter(
         **filter_args).values('student__id').distinct().count()
@@ -522,19 +544,29 @@ def get_course_num_learners_completed_for_time_period(site, start_date, end_date
 
 def get_course_mau_history_metrics(site, course_id, date_for, months_back):
     """Quick copy/modification of 'get_monthly_history_metric' for Course MAU
+
+    If the Figures ``ACTIVE_USER_BITMAPS`` setting is enabled, each month's
+    count is taken from the course's daily active user bitmaps, and from
+    StudentModule for the days without bitmaps
     """
     date_for = as_date(date_for)
     history = []
 
-    for year, month, _ in previous_months_iterator(month_for=date_for,
-                                                   months_back=months_back,):
+    for year, month, last_day in previous_months_iterator(month_for=date_for,
+                                                          months_back=months_back,):
 
         period = '{year}/{month}'.format(year=year, month=str(month).zfill(2))
-        active_users = get_mau_from_site_course(site=site,
-                                                course_id=course_id,
-                                                year=year,
-                                                month=month)
-        history.append(dict(period=period, value=active_users.count(),))
+        if active_user_bitmaps_enabled():
+            value = bitmap_active_user_count(site=site,
+                                             start_date=datetime.date(year, month, 1),
+                                             end_date=datetime.date(year, month, last_day),
+                                             course_ids=[course_id])
+        else:
+            value = get_mau_from_site_course(site=site,
+                                             course_id=course_id,
+                                             year=year,
+                                             month=month).count()
+        history.append(dict(period=period, value=value,))
 
     if history:
         # use the last entry
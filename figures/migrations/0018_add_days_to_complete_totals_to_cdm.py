@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0017_add_monthly_active_enrollment_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursedailymetrics',
+            name='days_to_complete_count',
+            field=models.IntegerField(null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='coursedailymetrics',
+            name='days_to_complete_sum',
+            field=models.BigIntegerField(null=True, blank=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django import VERSION as DJANGO_VERSION
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+    if DJANGO_VERSION[0:2] == (1,8):
+        dependencies = [
+            ('sites', '0001_initial'),
+            ('figures', '0018_add_days_to_complete_totals_to_cdm'),
+        ]
+    else:  # Assuming 1.11+
+        dependencies = [
+            ('sites', '0002_alter_domain_unique'),
+            ('figures', '0018_add_days_to_complete_totals_to_cdm'),
+        ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentDataBackfill',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, verbose_name='created', editable=False)),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, verbose_name='modified', editable=False)),
+                ('course_id', models.CharField(max_length=255, db_index=True)),
+                ('min_enrollment_id', models.IntegerField(null=True, blank=True)),
+                ('max_enrollment_id', models.IntegerField(null=True, blank=True)),
+                ('last_enrollment_id', models.IntegerField(null=True, blank=True)),
+                ('status', models.CharField(default='PENDING', max_length=32, choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')])),
+                ('total_count', models.IntegerField(null=True, blank=True)),
+                ('processed_count', models.IntegerField(default=0)),
+                ('elapsed', models.FloatField(default=0.0)),
+                ('started', models.DateTimeField(null=True, blank=True)),
+                ('finished', models.DateTimeField(null=True, blank=True)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, blank=True, to='sites.Site', null=True)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django import VERSION as DJANGO_VERSION
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+    if DJANGO_VERSION[0:2] == (1,8):
+        dependencies = [
+            ('sites', '0001_initial'),
+            ('figures', '0019_add_enrollment_data_backfill_model'),
+        ]
+    else:  # Assuming 1.11+
+        dependencies = [
+            ('sites', '0002_alter_domain_unique'),
+            ('figures', '0019_add_enrollment_data_backfill_model'),
+        ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseFirstEnrollment',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, verbose_name='created', editable=False)),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, verbose_name='modified', editable=False)),
+                ('course_id', models.CharField(max_length=255, db_index=True)),
+                ('first_enrollment', models.DateTimeField()),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sites.Site')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='coursefirstenrollment',
+            unique_together=set([('site', 'course_id')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def clear_daily_activity_collections(apps, schema_editor):
+    """Have the collected days collected again so they are added to
+    MonthlyActiveEnrollment
+    """
+    DailyActivityCollection = apps.get_model('figures', 'DailyActivityCollection')
+    DailyActivityCollection.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0021_add_learner_daily_activity_models'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlyactiveenrollment',
+            name='first_active',
+            field=models.DateField(null=True, blank=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='monthlyactiveenrollment',
+            index_together=set([('site', 'month_for')]),
+        ),
+        migrations.RunPython(clear_daily_activity_collections,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django import VERSION as DJANGO_VERSION
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    if DJANGO_VERSION[0:2] == (1,8):
+        dependencies = [
+            ('sites', '0001_initial'),
+            ('figures', '0022_add_monthly_active_enrollment_first_active'),
+        ]
+    else:  # Assuming 1.11+
+        dependencies = [
+            ('sites', '0002_alter_domain_unique'),
+            ('figures', '0022_add_monthly_active_enrollment_first_active'),
+        ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActiveUserSketch',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('course_id', models.CharField(default='', max_length=255, blank=True)),
+                ('date_for', models.DateField(db_index=True)),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('registers', models.BinaryField()),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sites.Site', null=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyactiveusersketch',
+            unique_together=set([('site', 'course_id', 'date_for')]),
+        ),
+    ]
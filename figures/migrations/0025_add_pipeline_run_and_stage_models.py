@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django import VERSION as DJANGO_VERSION
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+    if DJANGO_VERSION[0:2] == (1,8):
+        dependencies = [
+            ('sites', '0001_initial'),
+            ('figures', '0024_add_daily_active_user_bitmap_model'),
+        ]
+    else:  # Assuming 1.11+
+        dependencies = [
+            ('sites', '0002_alter_domain_unique'),
+            ('figures', '0024_add_daily_active_user_bitmap_model'),
+        ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineRun',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, verbose_name='created', editable=False)),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, verbose_name='modified', editable=False)),
+                ('name', models.CharField(max_length=255, db_index=True)),
+                ('date_for', models.DateField(null=True, blank=True)),
+                ('status', models.CharField(default='RUNNING', max_length=32, choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')])),
+                ('started', models.DateTimeField(null=True, blank=True)),
+                ('finished', models.DateTimeField(null=True, blank=True)),
+                ('elapsed', models.FloatField(null=True, blank=True)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, blank=True, to='sites.Site', null=True)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PipelineStage',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, verbose_name='created', editable=False)),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, verbose_name='modified', editable=False)),
+                ('course_id', models.CharField(default='', max_length=255, db_index=True, blank=True)),
+                ('stage', models.CharField(max_length=255, db_index=True)),
+                ('status', models.CharField(default='RUNNING', max_length=32, choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')])),
+                ('started', models.DateTimeField(db_index=True, null=True, blank=True)),
+                ('finished', models.DateTimeField(null=True, blank=True)),
+                ('elapsed', models.FloatField(null=True, blank=True)),
+                ('rows_read', models.IntegerField(default=0)),
+                ('rows_written', models.IntegerField(default=0)),
+                ('query_count', models.IntegerField(null=True, blank=True)),
+                ('query_time', models.FloatField(null=True, blank=True)),
+                ('grade_calls', models.IntegerField(default=0)),
+                ('run', models.ForeignKey(related_name='stages', on_delete=django.db.models.deletion.CASCADE, blank=True, to='figures.PipelineRun', null=True)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, blank=True, to='sites.Site', null=True)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -5,21 +5,27 @@ TODO: Create a base "SiteModel" or a "SiteModelMixin"
 
 from __future__ import absolute_import
 from datetime import datetime, date
+from functools import reduce
+import operator
 from time import time
 import six
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import F
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Min, Q
 from django.utils.encoding import python_2_unicode_compatible
+from django.utils.timezone import now
 
 from jsonfield import JSONField
 
 from model_utils.models import TimeStampedModel
 
-from figures.compat import CourseEnrollment
-from figures.helpers import as_course_key, utc_yesterday
+from figures.compat import CourseEnrollment, bulk_create, bulk_update
+from figures.helpers import as_course_key, as_date, utc_yesterday
+from figures.bitmaps import UserBitmap
+from figures.hll import HyperLogLog
+from figures.log import record_rows
 from figures.progress import EnrollmentProgress
 
 
@@ -68,6 +74,13 @@ class CourseDailyMetrics(TimeStampedModel):
     # for the course as of the "date_for"
     num_learners_completed = models.IntegerField()
 
+    # Running totals from which `average_days_to_complete` is calculated. They
+    # let the pipeline add the certificates created since the previous record
+    # instead of going over all of the course's certificates each day.
+    # Records created before Figures collected these have `None` values
+    days_to_complete_sum = models.BigIntegerField(blank=True, null=True)
+    days_to_complete_count = models.IntegerField(blank=True, null=True)
+
     class Meta:
         unique_together = ('course_id', 'date_for',)
         ordering = ('-date_for', 'course_id',)
@@ -199,6 +212,180 @@ class SiteMonthlyMetrics(TimeStampedModel):
                                                            defaults=defaults)
 
 
+class CourseFirstEnrollmentManager(models.Manager):
+    """Model manager for CourseFirstEnrollment
+    """
+    def refresh_for_site(self, site, course_ids, rebuild=False):
+        """Return the first enrollment timestamps for the site's courses
+
+        Returns a dict of course id string to the `created` datetime of the
+        course's first enrollment. Courses without enrollments are not in the
+        dict.
+
+        Courses that are not yet indexed have their first enrollment
+        timestamps retrieved with a single `MIN(created) GROUP BY course_id`
+        query and saved. Courses already indexed are not queried again, as
+        the first enrollment does not change once a course has enrollments.
+        Set `rebuild` to True to query and update every course, for example
+        after enrollments were deleted.
+        """
+        course_ids = set(str(course_id) for course_id in course_ids)
+        indexed = dict()
+        if not rebuild:
+            indexed = dict((course_id, first_enrollment) for course_id, first_enrollment
+                           in self.filter(site=site).values_list('course_id',
+                                                                 'first_enrollment')
+                           if course_id in course_ids)
+        missing = course_ids - set(indexed.keys())
+        if not missing:
+            return indexed
+
+        rows = CourseEnrollment.objects.filter(
+            course_id__in=[as_course_key(course_id) for course_id in missing]).order_by(
+            ).values('course_id').annotate(first_enrollment=Min('created'))
+        found = dict((str(row['course_id']), row['first_enrollment']) for row in rows)
+        if not found:
+            return indexed
+        if rebuild:
+            for course_id, first_enrollment in found.items():
+                self.update_or_create(site=site,
+                                      course_id=course_id,
+                                      defaults=dict(first_enrollment=first_enrollment))
+        else:
+            try:
+                with transaction.atomic():
+                    self.bulk_create([
+                        CourseFirstEnrollment(site=site,
+                                              course_id=course_id,
+                                              first_enrollment=first_enrollment)
+                        for course_id, first_enrollment in found.items()])
+            except IntegrityError:
+                # Another process indexed some of these courses first
+                for course_id, first_enrollment in found.items():
+                    self.get_or_create(site=site,
+                                       course_id=course_id,
+                                       defaults=dict(first_enrollment=first_enrollment))
+        indexed.update(found)
+        return indexed
+
+
+@python_2_unicode_compatible
+class CourseFirstEnrollment(TimeStampedModel):
+    """Index of when each course's first enrollment was created
+
+    This lets the site daily metrics pipeline and backfill find the courses
+    with enrollments on or before a date without querying each course's
+    enrollments. See `CourseFirstEnrollmentManager.refresh_for_site`
+    """
+    # TODO: Review the most appropriate on_delete behaviour
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255, db_index=True)
+    first_enrollment = models.DateTimeField()
+
+    objects = CourseFirstEnrollmentManager()
+
+    class Meta:
+        unique_together = ('site', 'course_id')
+
+    def __str__(self):
+        return "id:{}, site:{}, course_id:{}, first_enrollment:{}".format(
+            self.id, self.site.domain, self.course_id, self.first_enrollment)
+
+
+@python_2_unicode_compatible
+class LearnerDailyActivity(models.Model):
+    """Daily activity fact table. One record per learner active in a course
+
+    A learner is active on a day if any of their StudentModule records for
+    the course were modified on the day. The records for a day are filled
+    from a single scan of the day's StudentModule records. Figures metrics for
+    active learners and monthly active users aggregate over this table
+    instead of querying StudentModule. See `figures.activity`
+
+    `site` is null for courses not mapped to a site
+    """
+    site = models.ForeignKey(Site, null=True, on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    date_for = models.DateField(db_index=True)
+
+    class Meta:
+        unique_together = ('site', 'course_id', 'user', 'date_for')
+        index_together = [('site', 'date_for'), ('course_id', 'date_for')]
+
+    def __str__(self):
+        return "id:{}, site_id:{}, course_id:{}, user_id:{}, date_for:{}".format(
+            self.id, self.site_id, self.course_id, self.user_id, self.date_for)
+
+
+@python_2_unicode_compatible
+class DailyActivityCollection(TimeStampedModel):
+    """Records the days for which `LearnerDailyActivity` has been collected
+
+    Only days that are over are recorded, as the activity for the current
+    day is still changing
+    """
+    date_for = models.DateField(unique=True)
+    record_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return "id:{}, date_for:{}, record_count:{}".format(
+            self.id, self.date_for, self.record_count)
+
+
+@python_2_unicode_compatible
+class DailyActiveUserSketch(models.Model):
+    """HyperLogLog sketch of the users active on a day
+
+    There is a record per site per day with a blank `course_id`, a record
+    per course per day and a record with no site and a blank `course_id` for
+    all the activity on the day. These are built from `LearnerDailyActivity`
+    when the approximate active users mode is enabled. See `figures.activity`
+    and `figures.hll`
+    """
+    site = models.ForeignKey(Site, null=True, on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255, blank=True, default='')
+    date_for = models.DateField(db_index=True)
+    precision = models.PositiveSmallIntegerField()
+    registers = models.BinaryField()
+
+    class Meta:
+        unique_together = ('site', 'course_id', 'date_for')
+
+    def __str__(self):
+        return "id:{}, site_id:{}, course_id:{}, date_for:{}".format(
+            self.id, self.site_id, self.course_id, self.date_for)
+
+    @property
+    def sketch(self):
+        return HyperLogLog.from_bytes(self.registers, self.precision)
+
+
+class DailyActiveUserBitmap(models.Model):
+    """Compressed bitmap of the ids of the users active on a day
+
+    Has the same records per site, course and day as `DailyActiveUserSketch`.
+    These are built from `LearnerDailyActivity` when the active user bitmaps
+    mode is enabled. See `figures.activity` and `figures.bitmaps`
+    """
+    site = models.ForeignKey(Site, null=True, on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255, blank=True, default='')
+    date_for = models.DateField(db_index=True)
+    user_count = models.PositiveIntegerField()
+    bits = models.BinaryField()
+
+    class Meta:
+        unique_together = ('site', 'course_id', 'date_for')
+
+    def __str__(self):
+        return "id:{}, site_id:{}, course_id:{}, date_for:{}".format(
+            self.id, self.site_id, self.course_id, self.date_for)
+
+    @property
+    def bitmap(self):
+        return UserBitmap.from_bytes(self.bits)
+
+
 class EnrollmentDataManager(models.Manager):
     """Custom model manager for EnrollmentData
 
@@ -219,10 +406,15 @@ class EnrollmentDataManager(models.Manager):
         except EnrollmentData.DoesNotExist:
             return None
 
-    def set_enrollment_data(self, site, user, course_id, course_enrollment=None):
+    def set_enrollment_data(self, site, user, course_id, course_enrollment=None,
+                            course_progress=None):
         """
         This is an expensive call as it needs to call CourseGradeFactory if
         there is not already a LearnerCourseGradeMetrics record for the learner
+
+        Pass a `figures.progress.CourseProgress` instance as `course_progress`
+        when setting data for multiple enrollments in the same course, so the
+        course is only loaded once
         """
         if not course_enrollment:
             # For now, let it raise a `CourseEnrollment.DoesNotExist
@@ -254,7 +446,10 @@ class EnrollmentDataManager(models.Manager):
                 sections_worked=lcgm.sections_worked
             )
         else:
-            ep = EnrollmentProgress(user=user, course_id=course_id)
+            if course_progress:
+                ep = course_progress.enrollment_progress(user)
+            else:
+                ep = EnrollmentProgress(user=user, course_id=course_id)
             # TODO: If we get progress worked and there is no LCGM, then we have
             # a bug OR there was progress after the last daily metrics collection
             progress_data = dict(
@@ -275,11 +470,15 @@ class EnrollmentDataManager(models.Manager):
             defaults=defaults)
         return obj, created
 
-    def update_metrics(self, site, course_enrollment, force_update=False):
+    def update_metrics(self, site, course_enrollment, force_update=False,
+                       course_progress=None):
         """
         This is an expensive call as it needs to call CourseGradeFactory if
         there is not already a LearnerCourseGradeMetrics record for the learner
 
+        Pass a `figures.progress.CourseProgress` instance as `course_progress`
+        when updating multiple enrollments in the same course, so the course is
+        only loaded once
         """
         date_for = utc_yesterday()
 
@@ -300,8 +499,11 @@ class EnrollmentDataManager(models.Manager):
             # We do the update
             start_time = time()
             # get the progress data
-            ep = EnrollmentProgress(user=course_enrollment.user,
-                                    course_id=str(course_enrollment.course_id))
+            if course_progress:
+                ep = course_progress.enrollment_progress(course_enrollment.user)
+            else:
+                ep = EnrollmentProgress(user=course_enrollment.user,
+                                        course_id=str(course_enrollment.course_id))
             defaults = dict(
                 date_for=date_for,
                 is_completed=ep.is_completed(),
@@ -407,6 +609,185 @@ class EnrollmentData(TimeStampedModel):
         )
 
 
+class EnrollmentDataBackfillManager(models.Manager):
+    """Model manager for EnrollmentDataBackfill
+    """
+    def for_range(self, site, course_id, min_enrollment_id=None,
+                  max_enrollment_id=None, resume=True):
+        """Return the backfill for the course's enrollment id range
+
+        If `resume` is True, returns the most recent backfill for the range
+        that has not completed, so it picks up from its last checkpoint.
+        Otherwise, or if there is no such backfill, a new one is created
+        """
+        lookup = dict(course_id=str(course_id),
+                      min_enrollment_id=min_enrollment_id,
+                      max_enrollment_id=max_enrollment_id)
+        if resume:
+            backfill = self.filter(**lookup).exclude(
+                status=EnrollmentDataBackfill.COMPLETED).order_by('-id').first()
+            if backfill:
+                return backfill
+        return self.create(site=site, **lookup)
+
+
+@python_2_unicode_compatible
+class EnrollmentDataBackfill(TimeStampedModel):
+    """Tracks the progress of an EnrollmentData backfill for a course
+
+    A backfill processes the course's stale enrollments in enrollment id order
+    and records the id of the last enrollment processed after each batch is
+    written. If the backfill is interrupted, for example by a worker restart,
+    running it again starts after `last_enrollment_id` instead of reprocessing
+    the whole course.
+
+    `min_enrollment_id` (inclusive) and `max_enrollment_id` (exclusive) limit
+    the backfill to a range of enrollment ids so that a course's backfill can
+    be split across Celery workers. `None` means the range is unbounded.
+
+    See `figures.pipeline.backfill.backfill_enrollment_data`
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+        )
+
+    # TODO: Review the most appropriate on_delete behaviour
+    site = models.ForeignKey(Site, blank=True,
+                             null=True,
+                             on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255, db_index=True)
+    min_enrollment_id = models.IntegerField(null=True, blank=True)
+    max_enrollment_id = models.IntegerField(null=True, blank=True)
+    last_enrollment_id = models.IntegerField(null=True, blank=True)
+    status = models.CharField(max_length=32, choices=STATUS_CHOICES, default=PENDING)
+
+    # Number of enrollments in the range when the backfill last started plus
+    # those processed before then. This is an upper bound on the stale
+    # enrollments until the backfill completes
+    total_count = models.IntegerField(null=True, blank=True)
+    processed_count = models.IntegerField(default=0)
+
+    # seconds spent processing, summed over each run of the backfill
+    elapsed = models.FloatField(default=0.0)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    objects = EnrollmentDataBackfillManager()
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return '{} {} [{}, {}) {}'.format(
+            self.id, self.course_id, self.min_enrollment_id,
+            self.max_enrollment_id, self.status)
+
+    @property
+    def throughput(self):
+        """Enrollments processed per second
+        """
+        if not self.elapsed:
+            return None
+        return self.processed_count / self.elapsed
+
+    @property
+    def eta(self):
+        """Estimated seconds to process the remaining enrollments
+        """
+        if self.total_count is None or not self.throughput:
+            return None
+        return max(self.total_count - self.processed_count, 0) / self.throughput
+
+
+# Number of queued enrollments `StaleEnrollmentManager.remove` deletes per query
+STALE_ENROLLMENT_REMOVE_BATCH_SIZE = 500
+
+
+class StaleEnrollmentManager(models.Manager):
+    """Model manager for StaleEnrollment
+    """
+    def mark(self, user_id, course_id, changed=None):
+        """Queue the enrollment, or update its change time if already queued
+
+        This is called for each StudentModule save, so when the enrollment is
+        already queued it costs a single update query. All of it runs in its
+        own savepoint, so a failure here does not break the caller's
+        transaction
+        """
+        lookup = dict(user_id=user_id, course_id=str(course_id))
+        changed = changed or now()
+        with transaction.atomic():
+            if self.filter(**lookup).update(changed=changed):
+                return
+            try:
+                with transaction.atomic():
+                    self.create(changed=changed, **lookup)
+            except IntegrityError:
+                # Another process queued the enrollment since our update
+                self.filter(**lookup).update(changed=changed)
+
+    def course_ids(self, course_ids=None):
+        """Return the set of course ids with queued enrollments
+
+        If `course_ids` is given, only those courses are checked
+        """
+        queryset = self.order_by()
+        if course_ids is not None:
+            queryset = queryset.filter(course_id__in=[str(cid) for cid in course_ids])
+        return set(queryset.values_list('course_id', flat=True).distinct())
+
+    def remove(self, stale_enrollments):
+        """Remove the queued enrollments unless they changed since they were read
+
+        An enrollment that changed again while its enrollment data was being
+        updated keeps its new change time and stays in the queue
+        """
+        stale_enrollments = list(stale_enrollments)
+        batch_size = STALE_ENROLLMENT_REMOVE_BATCH_SIZE
+        for i in range(0, len(stale_enrollments), batch_size):
+            conditions = [Q(id=rec.id, changed=rec.changed)
+                          for rec in stale_enrollments[i:i + batch_size]]
+            self.filter(reduce(operator.or_, conditions)).delete()
+
+
+@python_2_unicode_compatible
+class StaleEnrollment(models.Model):
+    """Queue of enrollments whose enrollment data needs to be updated
+
+    The daily pipeline otherwise finds the enrollments to update by scanning
+    StudentModule for the previous day's activity in every course. Instead,
+    receivers in `figures.signals` add an enrollment here when one of its
+    StudentModule records is saved or its course grade changes. There is one
+    record per learner and course, with the time of the latest change, however
+    many times the enrollment changed.
+
+    The queue is drained by
+    `figures.pipeline.enrollment_metrics_next.update_stale_enrollment_data_for_course`
+    Enable the queue by setting ``ENABLE_STALE_ENROLLMENT_QUEUE`` to True in
+    the Figures settings
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255, db_index=True)
+    changed = models.DateTimeField(db_index=True)
+
+    objects = StaleEnrollmentManager()
+
+    class Meta:
+        unique_together = ('user', 'course_id')
+
+    def __str__(self):
+        return "id:{}, user_id:{}, course_id:{}, changed:{}".format(
+            self.id, self.user_id, self.course_id, self.changed)
+
+
 class LearnerCourseGradeMetricsManager(models.Manager):
     """Custom model manager for LearnerCourseGradeMetrics model
     """
@@ -588,14 +969,62 @@ class LearnerCourseGradeMetrics(TimeStampedModel):
 class MonthlyActiveEnrollmentManager(models.Manager):
     """Model manager for MonthlyActiveEnrollment
 
-    TODO:
-    * Add query convenience methods to get aggregate metrics,
-        * mau_for_site_and_month(self, site, month_for or year and month)
-        * mau_for_course_and_month(self, course, month_for or year and month)
-        * current month site MAU
-        * current month course MAU
+    The site and course MAU queries are in `figures.activity`
     """
 
+    def add_daily_activity(self, date_for, batch_size=None):
+        """Add the day's LearnerDailyActivity records to the month
+
+        Only the (site, course, user) enrollments not already active in the
+        month are created, in bulk. Enrollments first active in the month
+        after `date_for`, which happens when days are collected out of order,
+        have `first_active` moved back to `date_for`.
+
+        Activity for courses not mapped to a site is skipped. This is only
+        called when the pipeline collects the day's activity. See
+        `figures.activity.collect_daily_activity`
+
+        Returns the number of records created
+        """
+        date_for = as_date(date_for)
+        month_for = date(year=date_for.year, month=date_for.month, day=1)
+        day_activity = LearnerDailyActivity.objects.filter(date_for=date_for,
+                                                           site__isnull=False)
+        existing = dict()
+        for mae_id, site_id, course_id, user_id, first_active in self.filter(
+                month_for=month_for,
+                user_id__in=day_activity.values('user_id')).values_list(
+                'id', 'site_id', 'course_id', 'user_id', 'first_active'):
+            existing[(site_id, course_id, user_id)] = (mae_id, first_active)
+
+        to_create = []
+        moved_ids = []
+        for key in day_activity.values_list('site_id', 'course_id', 'user_id'):
+            if key not in existing:
+                to_create.append(MonthlyActiveEnrollment(site_id=key[0],
+                                                         course_id=key[1],
+                                                         user_id=key[2],
+                                                         month_for=month_for,
+                                                         first_active=date_for))
+            elif existing[key][1] and existing[key][1] > date_for:
+                moved_ids.append(existing[key][0])
+
+        if moved_ids:
+            self.filter(id__in=moved_ids).update(first_active=date_for)
+        if to_create:
+            try:
+                with transaction.atomic():
+                    bulk_create(self.model, to_create, batch_size=batch_size)
+            except IntegrityError:
+                # Another process added some of these enrollments first
+                for obj in to_create:
+                    self.get_or_create(site_id=obj.site_id,
+                                       course_id=obj.course_id,
+                                       user_id=obj.user_id,
+                                       month_for=month_for,
+                                       defaults=dict(first_active=date_for))
+        return len(to_create)
+
     def add_mae(self, site_id, course_id, user_id, date_for=None, overwrite=False):
         """
         We use 'date_for' instead of 'month_for' to enforce the day of month for
@@ -630,17 +1059,24 @@ class MonthlyActiveEnrollment(TimeStampedModel):
 
     An enrollment is a unique user+course pair
 
+    The daily pipeline adds each day's new active enrollments from the daily
+    learner activity table. See `MonthlyActiveEnrollmentManager.add_daily_activity`
     """
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     course_id = models.CharField(max_length=255, db_index=True)
     month_for = models.DateField(db_index=True)
+    # The first day in the month the enrollment was active. This lets us count
+    # the MAU as of any day in the month. Null for records created before this
+    # field was added, which are counted for every day in the month
+    first_active = models.DateField(null=True, blank=True)
 
     objects = MonthlyActiveEnrollmentManager()
 
     class Meta:
         ordering = ['-month_for', 'site', 'course_id']
         unique_together = ['site', 'course_id', 'user', 'month_for']
+        index_together = [('site', 'month_for')]
 
     def __str__(self):
         return "id:{}, site:{} course_id:{} user:{} month_for:{},".format(
@@ -686,6 +1122,88 @@ class PipelineError(TimeStampedModel):
         return "{}, {}, {}".format(self.id, self.created, self.error_type)
 
 
+class PipelineRun(TimeStampedModel):
+    """Records a run of a Figures pipeline task, backfill or management command
+
+    A run has a `PipelineStage` record for each unit of work done in it, like
+    collecting the CourseDailyMetrics for a course. `site` is set for runs of a
+    single site and `date_for` for runs collecting a single day.
+
+    See `figures.pipeline.ledger`
+    """
+    RUNNING = 'RUNNING'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = (
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+        )
+
+    name = models.CharField(max_length=255, db_index=True)
+    # TODO: Review the most appropriate on_delete behaviour
+    site = models.ForeignKey(Site, blank=True,
+                             null=True,
+                             on_delete=models.CASCADE)
+    date_for = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=32, choices=STATUS_CHOICES, default=RUNNING)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # seconds from start to finish
+    elapsed = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return '{} {} {}'.format(self.id, self.name, self.status)
+
+
+class PipelineStage(TimeStampedModel):
+    """Records the cost of one stage of a pipeline run
+
+    A stage is a unit of pipeline work for a site or a course, like updating a
+    course's EnrollmentData records. The row counts, database queries and
+    course grade retrievals include those of any stages nested in it.
+
+    See `figures.pipeline.ledger`
+    """
+    RUNNING = PipelineRun.RUNNING
+    COMPLETED = PipelineRun.COMPLETED
+    FAILED = PipelineRun.FAILED
+
+    STATUS_CHOICES = PipelineRun.STATUS_CHOICES
+
+    run = models.ForeignKey(PipelineRun, blank=True,
+                            null=True,
+                            related_name='stages',
+                            on_delete=models.CASCADE)
+    # TODO: Review the most appropriate on_delete behaviour
+    site = models.ForeignKey(Site, blank=True,
+                             null=True,
+                             on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255, blank=True, default='', db_index=True)
+    stage = models.CharField(max_length=255, db_index=True)
+    status = models.CharField(max_length=32, choices=STATUS_CHOICES, default=RUNNING)
+    started = models.DateTimeField(null=True, blank=True, db_index=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # seconds from start to finish
+    elapsed = models.FloatField(null=True, blank=True)
+    rows_read = models.IntegerField(default=0)
+    rows_written = models.IntegerField(default=0)
+    query_count = models.IntegerField(null=True, blank=True)
+    # seconds spent in database queries
+    query_time = models.FloatField(null=True, blank=True)
+    grade_calls = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return '{} {} {} {}'.format(self.id, self.stage, self.course_id, self.status)
+
+
 class BaseDateMetricsModel(TimeStampedModel):
     # TODO: Review the most appropriate on_delete behaviour
     site = models.ForeignKey(Site, default=default_site, on_delete=models.CASCADE)
@@ -766,6 +1284,49 @@ class CourseMauMetricsManager(models.Manager):
         )
         return queryset.order_by('-modified').first()
 
+    def save_metrics_for_courses(self, site, date_for, mau_by_course, overwrite=False):
+        """Save the MAU records for many of the site's courses in bulk
+
+        `mau_by_course` is a dict of course id strings to MAU counts. New
+        records are created with one bulk insert. Existing records are skipped
+        unless `overwrite` is True, then they are updated with one bulk update
+
+        Returns a dict with the lists of `created`, `updated` and `skipped`
+        records
+        """
+        results = dict(created=[], updated=[], skipped=[])
+        update_time = now()
+        existing = dict((obj.course_id, obj) for obj in self.filter(
+            site=site, date_for=date_for, course_id__in=list(mau_by_course.keys())))
+        for course_id, mau in mau_by_course.items():
+            obj = existing.get(course_id)
+            if obj is None:
+                results['created'].append(self.model(site=site,
+                                                     course_id=course_id,
+                                                     date_for=date_for,
+                                                     mau=mau))
+            elif overwrite:
+                obj.mau = mau
+                obj.modified = update_time
+                results['updated'].append(obj)
+            else:
+                results['skipped'].append(obj)
+        try:
+            with transaction.atomic():
+                self.bulk_create(results['created'])
+        except IntegrityError:
+            # Another process saved some of these records first
+            results['created'] = [
+                self.model.save_metrics(site=site,
+                                        course_id=obj.course_id,
+                                        date_for=date_for,
+                                        data=dict(mau=obj.mau),
+                                        overwrite=overwrite)[0]
+                for obj in results['created']]
+        bulk_update(self.model, results['updated'], ['mau', 'modified'])
+        record_rows(written=len(results['created']) + len(results['updated']))
+        return results
+
 
 @python_2_unicode_compatible
 class CourseMauMetrics(BaseDateMetricsModel):
@@ -4,27 +4,48 @@ Initially developed to support API performance improvements
 """
 
 from __future__ import absolute_import
+from itertools import groupby
+import logging
+from operator import attrgetter
 import os
 from time import time
 from datetime import datetime
-from dateutil.rrule import rrule, MONTHLY
 from dateutil.relativedelta import relativedelta
 
 from django.conf import settings
-from django.utils.timezone import utc
-
-from figures.compat import CourseNotFound
-from figures.course import Course
-from figures.helpers import as_date
-from figures.models import EnrollmentData
+from django.contrib.sites.models import Site
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.timezone import now, utc
+
+from figures.compat import CourseEnrollment, CourseNotFound
+from figures.helpers import as_course_key, as_date, utc_yesterday
+from figures.log import record_rows
+from figures.models import CourseFirstEnrollment, EnrollmentData, EnrollmentDataBackfill
+from figures.progress import CourseProgress
 from figures.sites import (
     get_course_enrollments_for_site,
     get_course_keys_for_site,
-    get_student_modules_for_site
+    get_student_modules_for_site,
+    UnlinkedCourseError,
+)
+from figures.pipeline.course_daily_metrics import (
+    CourseDailyMetricsLoader,
+    get_excluded_user_ids_by_course,
+)
+from figures.pipeline.enrollment_metrics_next import (
+    enrollment_data_batch_size,
+    EnrollmentDataWriter,
+    stale_course_enrollments,
 )
-from figures.pipeline.course_daily_metrics import CourseDailyMetricsLoader
+from figures.pipeline.daily_metrics_sweep import (
+    site_first_enrollments,
+    sweep_course_daily_metrics,
+    sweep_site_daily_metrics,
+)
+from figures.pipeline.ledger import pipeline_stage
 from figures.pipeline.site_daily_metrics import SiteDailyMetricsLoader
-from figures.pipeline.site_monthly_metrics import fill_month
+from figures.pipeline.site_monthly_metrics import fill_months
 
 # Backfill is done irregularly on an as-needed basis and not part of regularly
 # scheduled operations.
@@ -36,6 +57,8 @@ from figures.pipeline.site_monthly_metrics import fill_month
 # does. Therefore we initally declar the following to write backfill logs
 DEFAULT_FIGURES_BACKFILL_LOG_DIR = '/edx/app/edxapp/figures/logs/'
 
+logger = logging.getLogger(__name__)
+
 
 class InvalidDataError(Exception):
     """Raised when wrong data are used, like cross-site data processing
@@ -54,44 +77,93 @@ def figures_backfill_log_dir():
 
 
 # This function called just by mgmt command, backfill_figures_monthly_metrics.py
-def backfill_monthly_metrics_for_site(site, overwrite=False, use_raw_sql=False):
+def backfill_monthly_metrics_for_site(site, overwrite=False,
+                                      use_raw_sql=False):  # pylint: disable=unused-argument
     """Backfill specified months' historical site metrics for the specified site
+
+    Fills every month from the month of the site's first StudentModule record
+    through last month with a single pass over the site's StudentModule
+    records. See `figures.pipeline.site_monthly_metrics.fill_months`
+
+    `use_raw_sql` is no longer used. The single pass reads the records in id
+    ranges, so it does not need the raw SQL statement
     """
     site_sm = get_student_modules_for_site(site)
-    if not site_sm:
+    first_created = site_sm.aggregate(first_created=Min('created'))['first_created']
+    if not first_created:
         return None
 
-    first_created = site_sm.order_by('created').first().created
-
     start_month = datetime(year=first_created.year,
                            month=first_created.month,
                            day=1,
                            tzinfo=utc)
     last_month = datetime.utcnow().replace(tzinfo=utc) - relativedelta(months=1)
+    if last_month < start_month:
+        return []
+    with pipeline_stage('site_monthly_metrics', site=site):
+        results = fill_months(site=site,
+                              start_month=start_month,
+                              end_month=last_month,
+                              student_modules=site_sm,
+                              overwrite=overwrite)
     backfilled = []
-    for dt in rrule(freq=MONTHLY, dtstart=start_month, until=last_month):
-        obj, created = fill_month(site=site,
-                                  month_for=dt,
-                                  student_modules=site_sm,
-                                  overwrite=overwrite,
-                                  use_raw=use_raw_sql)
+    for obj, created in results:
+        dt = datetime(year=obj.month_for.year, month=obj.month_for.month, day=1, tzinfo=utc)
         backfilled.append(dict(obj=obj, created=created, dt=dt))
-
     return backfilled
 
 
+def backfill_enrollment_data_for_course(site, course_id, course_enrollments=None):
+    """Fill EnrollmentData records for the enrollments in a course
+
+    If `course_enrollments` is not given, then all the course's enrollments are
+    processed.
+
+    Learners without a LearnerCourseGradeMetrics record need their progress
+    retrieved from the platform's grades. The course and its block structure
+    are loaded once for all of these learners. See
+    `figures.progress.CourseProgress`
+
+    The only exception it handles is `figures.compat.CourseNotFound`. All other
+    exceptions are passed through this function to its caller.
+    """
+    if course_enrollments is None:
+        course_enrollments = CourseEnrollment.objects.filter(
+            course_id=as_course_key(course_id)).select_related('user')
+    course_progress = CourseProgress(course_id)
+    enrollment_data = []
+    errors = []
+    for rec in course_enrollments:
+        try:
+            obj, created = EnrollmentData.objects.set_enrollment_data(
+                site=site,
+                user=rec.user,
+                course_id=rec.course_id,
+                course_enrollment=rec,
+                course_progress=course_progress)
+            enrollment_data.append((obj, created))
+        except CourseNotFound:
+            msg = ('CourseNotFound for course "{course}". '
+                   ' CourseEnrollment ID={ce_id}')
+            errors.append(msg.format(course=str(rec.course_id),
+                                     ce_id=rec.id))
+
+    return dict(results=enrollment_data, errors=errors)
+
+
 def backfill_enrollment_data_for_site(site):
     """Convenience function to fill EnrollmentData records
 
     This backfills EnrollmentData records for existing CourseEnrollment
     and LearnerCourseGradeMetrics records.
 
+    The site's enrollments are processed course by course with
+    `backfill_enrollment_data_for_course`, so each course is loaded from the
+    modulestore at most once.
+
     The only exception it handles is `figures.compat.CourseNotFound`. All other
     exceptions are passed through this function to its caller.
 
-    Potential improvements: iterate by course id within site, have a function
-    specific to a course. more queries, but breaks up the work
-
     TODO: move the contents of this function to
       `figures.tasks.update_enrollment_data`
 
@@ -105,23 +177,130 @@ def backfill_enrollment_data_for_site(site):
     """
     enrollment_data = []
     errors = []
-    site_course_enrollments = get_course_enrollments_for_site(site)
-    for rec in site_course_enrollments:
-        try:
-            obj, created = EnrollmentData.objects.set_enrollment_data(
-                site=site,
-                user=rec.user,
-                course_id=rec.course_id)
-            enrollment_data.append((obj, created))
-        except CourseNotFound:
-            msg = ('CourseNotFound for course "{course}". '
-                   ' CourseEnrollment ID={ce_id}')
-            errors.append(msg.format(course=str(rec.course_id),
-                                     ce_id=rec.id))
+    site_course_enrollments = get_course_enrollments_for_site(site).select_related(
+        'user').order_by('course_id', 'id')
+    for course_id, course_enrollments in groupby(site_course_enrollments,
+                                                 key=attrgetter('course_id')):
+        results = backfill_enrollment_data_for_course(
+            site=site,
+            course_id=course_id,
+            course_enrollments=course_enrollments)
+        enrollment_data.extend(results['results'])
+        errors.extend(results['errors'])
 
     return dict(results=enrollment_data, errors=errors)
 
 
+def backfill_enrollment_data(backfill, batch_size=None):
+    """Run an `EnrollmentDataBackfill`, checkpointing after each batch
+
+    Updates EnrollmentData and LearnerCourseGradeMetrics records for the stale
+    enrollments in the backfill's course and enrollment id range. See
+    `figures.pipeline.enrollment_metrics_next.stale_course_enrollments`
+
+    Enrollments are read in id order, `batch_size` at a time, so memory use
+    does not grow with the size of the course. Each batch's records are
+    written in the same transaction that saves the id of the batch's last
+    enrollment as the backfill's checkpoint. If the backfill was interrupted,
+    it starts after the checkpoint.
+
+    Returns the backfill with its counts and elapsed time updated. If an
+    exception is raised, the backfill is saved as failed and the exception is
+    passed through to the caller. Running it again resumes it.
+    """
+    if not backfill.site:
+        raise UnlinkedCourseError('No site found for course "{}"'.format(
+            backfill.course_id))
+    batch_size = batch_size or enrollment_data_batch_size()
+    min_enrollment_id = backfill.min_enrollment_id
+    if backfill.last_enrollment_id is not None:
+        min_enrollment_id = backfill.last_enrollment_id + 1
+
+    def remaining_enrollment_ids():
+        qs = CourseEnrollment.objects.filter(course_id=as_course_key(backfill.course_id))
+        if min_enrollment_id is not None:
+            qs = qs.filter(id__gte=min_enrollment_id)
+        if backfill.max_enrollment_id is not None:
+            qs = qs.filter(id__lt=backfill.max_enrollment_id)
+        return qs.order_by('id').values_list('id', flat=True)
+
+    # An upper bound, as enrollments with current data are skipped
+    backfill.total_count = backfill.processed_count + remaining_enrollment_ids().count()
+    backfill.status = EnrollmentDataBackfill.RUNNING
+    backfill.started = backfill.started or now()
+    backfill.finished = None
+    backfill.save()
+
+    with pipeline_stage('enrollment_data_backfill',
+                        site=backfill.site,
+                        course_id=backfill.course_id):
+        course_progress = CourseProgress(backfill.course_id)
+        writer = EnrollmentDataWriter(site=backfill.site,
+                                      course_id=backfill.course_id,
+                                      date_for=utc_yesterday(),
+                                      batch_size=batch_size)
+        try:
+            while True:
+                chunk_ids = list(remaining_enrollment_ids()[:batch_size])
+                if not chunk_ids:
+                    break
+                start_time = time()
+                batch = []
+                for ce in stale_course_enrollments(backfill.course_id,
+                                                   min_enrollment_id=chunk_ids[0],
+                                                   max_enrollment_id=chunk_ids[-1] + 1):
+                    collect_start = time()
+                    progress = course_progress.enrollment_progress(ce.user)
+                    batch.append((ce, progress, time() - collect_start))
+                record_rows(read=len(batch))
+                with transaction.atomic():
+                    for ce, progress, collect_elapsed in batch:
+                        writer.add(ce, progress, collect_elapsed=collect_elapsed)
+                    writer.flush()
+                    backfill.last_enrollment_id = chunk_ids[-1]
+                    backfill.processed_count += len(batch)
+                    backfill.elapsed += time() - start_time
+                    backfill.save()
+                min_enrollment_id = chunk_ids[-1] + 1
+                # We only need the checkpoint, so don't hold on to the records
+                writer.results = []
+                msg = ('EnrollmentDataBackfill {id} "{course_id}": processed {processed}'
+                       ' of at most {total}, {throughput:.1f} enrollments/sec, ETA {eta:.0f}s')
+                logger.info(msg.format(id=backfill.id,
+                                       course_id=backfill.course_id,
+                                       processed=backfill.processed_count,
+                                       total=backfill.total_count,
+                                       throughput=backfill.throughput or 0.0,
+                                       eta=backfill.eta or 0.0))
+        except Exception:
+            backfill.status = EnrollmentDataBackfill.FAILED
+            backfill.save()
+            raise
+
+    backfill.total_count = backfill.processed_count
+    backfill.status = EnrollmentDataBackfill.COMPLETED
+    backfill.finished = now()
+    backfill.save()
+    return backfill
+
+
+def enrollment_id_ranges(course_id, shard_size):
+    """Split the course's enrollment ids into half open ranges
+
+    Returns a list of (min_enrollment_id, max_enrollment_id) tuples spanning
+    `shard_size` enrollment ids each, for running a course's
+    `EnrollmentDataBackfill` across multiple workers. Returns an empty list if
+    the course has no enrollments
+    """
+    id_range = CourseEnrollment.objects.filter(
+        course_id=as_course_key(course_id)).aggregate(
+        min_id=Min('id'), max_id=Max('id'))
+    if id_range['min_id'] is None:
+        return []
+    return [(start, start + shard_size) for start in
+            range(id_range['min_id'], id_range['max_id'] + 1, shard_size)]
+
+
 def get_courses_first_enrollment_timestamps(site, as_strings=False):
     """Return dict of course_id and first enrolled on date
     key is the course_id, value is the date of the first enrollment
@@ -134,12 +313,18 @@ def get_courses_first_enrollment_timestamps(site, as_strings=False):
 
     The `as_strings` param is used to make it easier to serialize the data to
     file
+
+    The value is `None` for courses without enrollments. The timestamps come
+    from the `CourseFirstEnrollment` index. See
+    `figures.models.CourseFirstEnrollmentManager.refresh_for_site`
     """
+    course_keys = get_course_keys_for_site(site)
+    first_enrollments = CourseFirstEnrollment.objects.refresh_for_site(site, course_keys)
     data = dict()
-    for course_key in get_course_keys_for_site(site):
-        created = Course(course_key).first_enrollment_timestamp()
+    for course_key in course_keys:
+        created = first_enrollments.get(str(course_key))
         if as_strings:
-            data[str(course_key)] = created.isoformat()
+            data[str(course_key)] = created.isoformat() if created else None
         else:
             data[course_key] = created
     return data
@@ -174,7 +359,8 @@ def backfill_daily_metrics_for_site_and_date(site,
                                              date_for,
                                              process_sdm=True,
                                              logdir=None,
-                                             force_update=False):
+                                             force_update=False,
+                                             excluded_user_ids=None):
     """To be run by Django management command or in Django shell
 
     To note, this function was originally an ad-hoc script.
@@ -199,12 +385,20 @@ def backfill_daily_metrics_for_site_and_date(site,
     day. This is a bit of combined feature of Figures pipeline code and a
     limitation in that there's not a ready way to extract historical progress
     for a learner "on this date in the past".
+
+    ## On course staff
+
+    Course staff are excluded from the course enrollment counts.
+    `excluded_user_ids` is the dict returned by
+    `figures.pipeline.course_daily_metrics.get_excluded_user_ids_by_course`. If
+    not provided, it is retrieved once for all the courses to backfill.
     """
     date_for = as_date(date_for)
     date_for_str = date_for.isoformat()
 
     if logdir is None:
         logdir = figures_backfill_log_dir()
+    sdm_elapsed = 0.0
 
     filename = 'backfill-for-site-{site_id}-date-{date_for}.log'.format(
         site_id=site.id, date_for=date_for_str)
@@ -212,6 +406,8 @@ def backfill_daily_metrics_for_site_and_date(site,
 
     course_ids = courses_enrolled_on_or_before(site, date_for)
     course_id_count = len(course_ids)
+    if excluded_user_ids is None:
+        excluded_user_ids = get_excluded_user_ids_by_course(course_ids)
 
     # The log file has the site id and date for as identifiers
     # We have the log file in append mode so that we don't overwrite the existing
@@ -227,8 +423,11 @@ def backfill_daily_metrics_for_site_and_date(site,
             logfile.write('[{} of {}] date_for: {}, {}\n'.format(
                 i+1, course_id_count, date_for_str, str(course_id)))
 
-            cdm_obj, _created = CourseDailyMetricsLoader(
-                str(course_id)).load(date_for=date_for, force_update=force_update)
+            with pipeline_stage('course_daily_metrics', site=site, course_id=course_id):
+                cdm_obj, _created = CourseDailyMetricsLoader(
+                    str(course_id),
+                    excluded_user_ids=excluded_user_ids.get(str(course_id))).load(
+                        date_for=date_for, force_update=force_update)
             logfile.write('-- wrote CDM id: {}\n'.format(cdm_obj.id))
 
             # We flush so we can tail the log file for progress
@@ -245,9 +444,10 @@ def backfill_daily_metrics_for_site_and_date(site,
             logfile.write('START: backfill site {} for date {}: \n'.format(
                 site.domain, date_for_str))
             start_time = time()
-            sdm_obj, _created = SiteDailyMetricsLoader().load(site=site,
-                                                              date_for=date_for,
-                                                              force_update=force_update)
+            with pipeline_stage('site_daily_metrics', site=site):
+                sdm_obj, _created = SiteDailyMetricsLoader().load(site=site,
+                                                                  date_for=date_for,
+                                                                  force_update=force_update)
             logfile.write('-- wrote SDM id: {}\n'.format(sdm_obj.id))
             sdm_elapsed = time() - start_time
             logfile.write('\nEND: backfill site. date_for: {}, elapsed: {}\n'.format(
@@ -259,3 +459,143 @@ def backfill_daily_metrics_for_site_and_date(site,
         courses_processed=course_id_count,
         cdms_elapsed=cdms_elapsed,
         sdm_elapsed=sdm_elapsed)
+
+
+def backfill_daily_metrics_for_site_and_date_range(site,
+                                                   start_date,
+                                                   end_date,
+                                                   process_sdm=True,
+                                                   force_update=False):
+    """Backfill the site's daily metrics for a range of dates in a single pass
+
+    This fills the same `CourseDailyMetrics` and `SiteDailyMetrics` records
+    as calling `backfill_daily_metrics_for_site_and_date` for each day in the
+    range. Instead of recomputing each day from scratch, the site's
+    enrollments, certificates and learner activity for the range are read
+    once. See `figures.pipeline.daily_metrics_sweep`
+
+    Returns a dict with the numbers of records created, updated and skipped,
+    the CDM validation errors and the elapsed times
+    """
+    first_enrollments = site_first_enrollments(site)
+
+    start_time = time()
+    with pipeline_stage('course_daily_metrics', site=site):
+        cdm_results = sweep_course_daily_metrics(site,
+                                                 start_date,
+                                                 end_date,
+                                                 force_update=force_update,
+                                                 first_enrollments=first_enrollments)
+    cdms_elapsed = time() - start_time
+    results = dict(
+        cdms_created=len(cdm_results['created']),
+        cdms_updated=len(cdm_results['updated']),
+        cdms_skipped=len(cdm_results['skipped']),
+        cdm_errors=cdm_results['errors'],
+        cdms_elapsed=cdms_elapsed,
+        sdm_elapsed=0.0)
+    for error in cdm_results['errors']:
+        logger.error('Backfill CDM validation failed for course "%s": %s',
+                     error['course_id'], error['error'])
+
+    if process_sdm:
+        results.update(backfill_site_daily_metrics_for_date_range(
+            site,
+            start_date,
+            end_date,
+            force_update=force_update,
+            first_enrollments=first_enrollments))
+    return results
+
+
+def backfill_site_daily_metrics_for_date_range(site,
+                                               start_date,
+                                               end_date,
+                                               force_update=False,
+                                               first_enrollments=None):
+    """Backfill the site's SiteDailyMetrics records for a range of dates
+
+    Run after the range's CourseDailyMetrics records are filled. The records
+    have cumulative counts, so the range is filled in order in one process
+
+    Returns a dict with the numbers of records created, updated and skipped
+    and the elapsed time
+    """
+    start_time = time()
+    with pipeline_stage('site_daily_metrics', site=site):
+        sdm_results = sweep_site_daily_metrics(site,
+                                               start_date,
+                                               end_date,
+                                               force_update=force_update,
+                                               first_enrollments=first_enrollments)
+    return dict(sdms_created=len(sdm_results['created']),
+                sdms_updated=len(sdm_results['updated']),
+                sdms_skipped=len(sdm_results['skipped']),
+                sdm_elapsed=time() - start_time)
+
+
+def backfill_course_daily_metrics_for_site_id_and_date(site_id,
+                                                       date_for,
+                                                       logdir=None,
+                                                       force_update=False):
+    """Backfill the site's CourseDailyMetrics records for one day
+
+    Takes the site id instead of the site and skips the SiteDailyMetrics
+    record, so the management command can run days in separate worker
+    processes and then fill the SiteDailyMetrics records in order
+    """
+    return backfill_daily_metrics_for_site_and_date(Site.objects.get(id=site_id),
+                                                    date_for,
+                                                    process_sdm=False,
+                                                    logdir=logdir,
+                                                    force_update=force_update)
+
+
+def backfill_course_daily_metrics_for_date_range(site_id,
+                                                 start_date,
+                                                 end_date,
+                                                 force_update=False):
+    """Backfill the site's CourseDailyMetrics records for a range of dates
+
+    This is the CourseDailyMetrics part of
+    `backfill_daily_metrics_for_site_and_date_range`. It takes the site id and
+    returns just the record counts and errors, so the management command can
+    run date ranges in separate worker processes
+    """
+    start_time = time()
+    site = Site.objects.get(id=site_id)
+    with pipeline_stage('course_daily_metrics', site=site):
+        cdm_results = sweep_course_daily_metrics(site,
+                                                 as_date(start_date),
+                                                 as_date(end_date),
+                                                 force_update=force_update)
+    for error in cdm_results['errors']:
+        logger.error('Backfill CDM validation failed for course "%s": %s',
+                     error['course_id'], error['error'])
+    return dict(
+        cdms_created=len(cdm_results['created']),
+        cdms_updated=len(cdm_results['updated']),
+        cdms_skipped=len(cdm_results['skipped']),
+        cdm_errors=cdm_results['errors'],
+        cdms_elapsed=time() - start_time)
+
+
+def date_ranges(start_date, end_date, num_ranges):
+    """Split the dates from `start_date` to `end_date` into contiguous ranges
+
+    Returns a list of up to `num_ranges` (start_date, end_date) tuples of
+    nearly equal numbers of days, with both ends included
+    """
+    start_date = as_date(start_date)
+    num_days = (as_date(end_date) - start_date).days + 1
+    if num_days < 1:
+        return []
+    num_ranges = max(1, min(num_ranges, num_days))
+    ranges = []
+    first = 0
+    for i in range(num_ranges):
+        last = (num_days * (i + 1)) // num_ranges
+        ranges.append((start_date + relativedelta(days=first),
+                       start_date + relativedelta(days=last - 1)))
+        first = last
+    return ranges
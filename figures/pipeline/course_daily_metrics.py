@@ -15,19 +15,29 @@ from __future__ import absolute_import
 import logging
 
 from dateutil.relativedelta import relativedelta
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Count, IntegerField, Max
+from django.utils.timezone import now
 
 from student.roles import CourseCcxCoachRole, CourseInstructorRole, CourseStaffRole  # noqa pylint: disable=import-error
 
-from figures.compat import (CourseEnrollment,
+from figures.activity import active_user_ids, daily_activity
+from figures.compat import (bulk_create,
+                            bulk_update,
+                            CourseAccessRole,
+                            CourseEnrollment,
                             CourseOverview,
                             GeneratedCertificate,
-                            StudentModule)
+                            OuterRef,
+                            Subquery)
 from figures.helpers import as_course_key, as_datetime, is_past_date, next_day
+from figures.log import record_rows
 import figures.metrics
 from figures.models import CourseDailyMetrics
 from figures.pipeline.enrollment_metrics import bulk_calculate_course_progress_data
 from figures.pipeline.enrollment_metrics_next import (
+    bulk_calculate_course_progress as bulk_calculate_course_progress_next,
     calculate_course_progress as calculate_course_progress_next
 )
 
@@ -38,53 +48,161 @@ from figures.pipeline.helpers import pipeline_date_for_rule
 
 logger = logging.getLogger(__name__)
 
+# Course roles for which enrollments are excluded from the enrollment count
+EXCLUDED_COURSE_ROLES = [
+    CourseStaffRole.ROLE,
+    CourseInstructorRole.ROLE,
+    CourseCcxCoachRole.ROLE,
+]
+
+# Default number of records written per query by the bulk loader
+DEFAULT_BULK_BATCH_SIZE = 500
+
 
 # Extraction helper methods
 
 
-def get_enrolled_in_exclude_admins(course_id, date_for=None):
+def course_locator_for_enrollments(course_id):
+    """Return the course key used to query a course's enrollments and roles
+
+    CCX course enrollments and roles are retrieved for the CCX's course locator
+    """
+    if getattr(course_id, 'ccx', None):
+        return course_id.to_course_locator()
+    return as_course_key(course_id)
+
+
+def get_excluded_user_ids_by_course(course_ids):
+    """Return a dict of the user ids to exclude from each course's learners
+
+    The course staff, instructor and CCX coach role holders of all the courses
+    are retrieved in a single `CourseAccessRole` query. The dict is keyed by
+    course id string. Each value is a set of user ids, empty if the course has
+    no role holders.
+
+    The pipeline builds this once for a site's courses and reuses it for each
+    course instead of querying the roles of each course.
+    """
+    locators = dict((str(course_id), course_locator_for_enrollments(course_id))
+                    for course_id in course_ids)
+    user_ids_by_locator = dict()
+    roles = CourseAccessRole.objects.filter(
+        course_id__in=list(locators.values()),
+        role__in=EXCLUDED_COURSE_ROLES).values_list('course_id', 'user_id')
+    for locator, user_id in roles:
+        user_ids_by_locator.setdefault(str(locator), set()).add(user_id)
+    return dict((course_id, user_ids_by_locator.get(str(locator), set()))
+                for course_id, locator in locators.items())
+
+
+def get_excluded_user_ids_for_site(site):
+    """Return `get_excluded_user_ids_by_course` for all of the site's courses
+    """
+    return get_excluded_user_ids_by_course(figures.sites.site_course_ids(site))
+
+
+def get_enrolled_in_exclude_admins(course_id, date_for=None, excluded_user_ids=None):
     """
     Copied over from CourseEnrollmentManager.num_enrolled_in_exclude_admins method
     and modified to filter on date LT
 
     If no date is provided then the date is not used as a filter
 
+    `excluded_user_ids` are the course's staff, instructor and CCX coach user
+    ids, as returned for the course by `get_excluded_user_ids_by_course`. If
+    not provided, they are retrieved for this course
     """
-    course_locator = as_course_key(course_id)
+    course_locator = course_locator_for_enrollments(course_id)
 
-    if getattr(course_id, 'ccx', None):
-        course_locator = course_id.to_course_locator()
-
-    staff = CourseStaffRole(course_locator).users_with_role()
-    admins = CourseInstructorRole(course_locator).users_with_role()
-    coaches = CourseCcxCoachRole(course_locator).users_with_role()
+    if excluded_user_ids is None:
+        excluded_user_ids = get_excluded_user_ids_by_course(
+            [course_id])[str(course_id)]
     filter_args = dict(course_id=course_locator, is_active=1)
 
     if date_for:
         filter_args.update(dict(created__lt=as_datetime(next_day(date_for))))
 
     return CourseEnrollment.objects.filter(**filter_args).exclude(
-        user__in=staff).exclude(user__in=admins).exclude(user__in=coaches)
+        user_id__in=list(excluded_user_ids))
 
 
 def get_active_learner_ids_today(course_id, date_for):
     """Get unique user ids for learners who are active today for the given
     course and date
 
-    Note: When Figures no longer has to support Django 1.8, we can simplify
-    this date check:
-        https://docs.djangoproject.com/en/1.9/ref/models/querysets/#date
+    Reads the daily activity table, collecting the day first if needed. See
+    `figures.activity`
     """
-    date_for_as_datetime = as_datetime(date_for)
-    return StudentModule.objects.filter(
-        course_id=as_course_key(course_id),
-        modified__year=date_for_as_datetime.year,
-        modified__month=date_for_as_datetime.month,
-        modified__day=date_for_as_datetime.day,
-        ).values_list('student__id', flat=True).distinct()
+    return active_user_ids(date_for, course_ids=[course_id], collect=True)
+
 
+def certificate_enrollment_rows(course_ids, date_for, since=None, with_created_date=False):
+    """Yield (course_id, user_id, days, enrollment_count) for course certificates
 
-def get_days_to_complete(course_id, date_for):
+    Matches each `GeneratedCertificate` created up to `date_for` to the
+    learner's `CourseEnrollment` for the course. `days` is the whole number of
+    days from enrollment to certificate, or `None` if there is no enrollment.
+    `enrollment_count` is the number of enrollments matching the certificate.
+
+    If `since` is given, only certificates created after `since` are included.
+    This is the incremental mode, used to fold the day's new certificates into
+    previously collected totals.
+
+    If `with_created_date` is True, the certificate's `created_date` is added
+    to the end of each tuple.
+
+    On Django 1.11 and greater, the enrollments are joined to the certificates
+    as subqueries, so this is a single query regardless of the number of
+    certificates. On Ginkgo (Django 1.8), the enrollments of the certificate
+    holders are retrieved with a second query and matched in Python.
+    """
+    course_keys = [as_course_key(course_id) for course_id in course_ids]
+    certificates = GeneratedCertificate.objects.filter(
+        course_id__in=course_keys,
+        created_date__lte=as_datetime(date_for)).order_by('id')
+    if since:
+        certificates = certificates.filter(created_date__gt=as_datetime(since))
+
+    if Subquery is not None:
+        enrollments = CourseEnrollment.objects.filter(
+            course_id=OuterRef('course_id'),
+            user_id=OuterRef('user_id'))
+        rows = certificates.annotate(
+            enrolled=Subquery(enrollments.order_by('id').values('created')[:1]),
+            enrollment_count=Subquery(
+                enrollments.order_by().values('user_id').annotate(
+                    count=Count('id')).values('count'),
+                output_field=IntegerField())).values_list(
+            'course_id', 'user_id', 'created_date', 'enrolled', 'enrollment_count')
+    else:
+        enrolled = dict()
+        for course_key, user_id, created in CourseEnrollment.objects.filter(
+                course_id__in=course_keys,
+                user_id__in=certificates.values('user_id')).order_by('id').values_list(
+                'course_id', 'user_id', 'created'):
+            enrolled.setdefault((str(course_key), user_id), []).append(created)
+        rows = []
+        for course_key, user_id, created_date in certificates.values_list(
+                'course_id', 'user_id', 'created_date'):
+            enrollment_dates = enrolled.get((str(course_key), user_id), [])
+            rows.append((course_key,
+                         user_id,
+                         created_date,
+                         enrollment_dates[0] if enrollment_dates else None,
+                         len(enrollment_dates)))
+
+    for course_key, user_id, created_date, enrollment_created, enrollment_count in rows:
+        if enrollment_created is None:
+            days = None
+        else:
+            days = (created_date - enrollment_created).days
+        if with_created_date:
+            yield str(course_key), user_id, days, enrollment_count or 0, created_date
+        else:
+            yield str(course_key), user_id, days, enrollment_count or 0
+
+
+def get_days_to_complete(course_id, date_for, since=None):
     """Return a dict with a list of days to complete and errors
 
     NOTE: This is a work in progress, as it has issues to resolve:
@@ -92,8 +210,9 @@ def get_days_to_complete(course_id, date_for):
     * This means if a learner starts at midnight and finished just before
       midnight, then 0 days will be given
 
-    NOTE: This has limited scaling. We ought to test it with
-    1k, 10k, 100k cert records
+    The certificates and their enrollments are retrieved together. See
+    `certificate_enrollment_rows`. If `since` is given, then only certificates
+    created after `since` are included
 
     TODO: change to use start_date, end_date with defaults that
     start_date is open and end_date is today
@@ -101,38 +220,8 @@ def get_days_to_complete(course_id, date_for):
     TODO: Consider collecting the total seconds rather than days
     This will improve accuracy, but may actually not be that important
     TODO: Analyze the error based on number of completions
-
-    When we have to support scale, we can look into optimization
-    techinques.
     """
-    certificates = GeneratedCertificate.objects.filter(
-        course_id=as_course_key(course_id),
-        created_date__lte=as_datetime(date_for))
-
-    days = []
-    errors = []
-    for cert in certificates:
-        ce = CourseEnrollment.objects.filter(
-            course_id=as_course_key(course_id),
-            user=cert.user)
-        # How do we want to handle multiples?
-        if ce.count() > 1:
-            errors.append(
-                dict(msg='Multiple CE records',
-                     course_id=course_id,
-                     user_id=cert.user.id,
-                     ))
-        try:
-            days.append((cert.created_date - ce[0].created).days)
-        except IndexError:
-            # sometimes a course enrollment is deleted after the cert is generated.  why, who knows?
-            # in which case just leave out that data
-            errors.append(
-                dict(msg='No CourseEnrollment matching user course certificate',
-                     course_id=course_id,
-                     user_id=cert.user.id,
-                     ))
-    return dict(days=days, errors=errors)
+    return bulk_get_days_to_complete([course_id], date_for, since=since)[str(course_id)]
 
 
 def calc_average_days_to_complete(days):
@@ -143,14 +232,63 @@ def calc_average_days_to_complete(days):
         return 0.0
 
 
+def fold_days_to_complete_totals(days_to_complete, previous=None):
+    """Return running totals for a `get_days_to_complete` dict
+
+    If `previous` totals are given, they are added to the returned totals
+    """
+    totals = dict(days_sum=sum(days_to_complete['days']),
+                  days_count=len(days_to_complete['days']),
+                  error_count=len(days_to_complete['errors']))
+    if previous:
+        for key in totals:
+            totals[key] += previous.get(key, 0)
+    return totals
+
+
+def get_days_to_complete_totals(course_id, date_for, since=None, previous=None):
+    """Return the running totals used to calculate average days to complete
+
+    Returns a dict with the sum of the days to complete (`days_sum`), the
+    number of certificates they were collected for (`days_count`) and the
+    number of certificates with enrollment errors (`error_count`)
+
+    If `previous` totals are given, then the totals for the certificates
+    created after `since` are added to them. This lets the caller keep the
+    totals up to date by only querying the certificates created since they
+    were last collected
+    """
+    return fold_days_to_complete_totals(
+        get_days_to_complete(course_id, date_for, since=since), previous)
+
+
+def record_days_to_complete_totals(cdm):
+    """Return the running totals stored on a CourseDailyMetrics record
+
+    Returns `None` if there is no record or the record was created before
+    Figures stored the totals
+    """
+    if cdm is None or cdm.days_to_complete_sum is None or cdm.days_to_complete_count is None:
+        return None
+    return dict(days_sum=cdm.days_to_complete_sum,
+                days_count=cdm.days_to_complete_count)
+
+
+def calc_average_days_from_totals(totals):
+    """Return the average days to complete from `get_days_to_complete_totals`
+    """
+    if totals['days_count']:
+        return float(totals['days_sum']) / float(totals['days_count'])
+    else:
+        return 0.0
+
+
 def get_average_days_to_complete(course_id, date_for):
 
-    days_to_complete = get_days_to_complete(course_id, date_for)
     # TODO: Track any errors in getting days to complete
-    # This is in days_to_complete['errors']
-    average_days_to_complete = calc_average_days_to_complete(
-        days_to_complete['days'])
-    return average_days_to_complete
+    # This is in the totals' `error_count`
+    return calc_average_days_from_totals(
+        get_days_to_complete_totals(course_id, date_for))
 
 
 def get_num_learners_completed(course_id, date_for):
@@ -167,6 +305,135 @@ def get_num_learners_completed(course_id, date_for):
         created_date__lt=as_datetime(next_day(date_for)))
     return certificates.count()
 
+
+# Bulk extraction helper methods
+#
+# These are the multiple course versions of the extraction helpers above. Each
+# takes a list of course ids and runs a fixed number of `GROUP BY course_id`
+# queries regardless of how many courses are in the list. Each returns a dict
+# keyed by course id string.
+
+
+def bulk_get_enrolled_counts_exclude_admins(course_ids, date_for, excluded_user_ids=None):
+    """Return the enrollment count excluding course staff for each course
+
+    Same counts as calling `get_enrolled_in_exclude_admins(...).count()` for
+    each course. `excluded_user_ids` is the dict returned by
+    `get_excluded_user_ids_by_course`. It is retrieved for the courses if not
+    provided. Staff are typically a handful of users per course, so rather than
+    excluding them course by course, we count their enrollments in one more
+    query and subtract them from the grouped enrollment counts.
+    """
+    if excluded_user_ids is None:
+        excluded_user_ids = get_excluded_user_ids_by_course(course_ids)
+    locators = dict((str(course_id), course_locator_for_enrollments(course_id))
+                    for course_id in course_ids)
+    enrollments = CourseEnrollment.objects.filter(
+        course_id__in=list(locators.values()),
+        is_active=1,
+        created__lt=as_datetime(next_day(date_for))).order_by()
+    counts_by_locator = dict(
+        (str(rec['course_id']), rec['count']) for rec in
+        enrollments.values('course_id').annotate(count=Count('id')))
+
+    staff_user_ids = dict()
+    for course_id, locator in locators.items():
+        staff_user_ids.setdefault(str(locator), set()).update(
+            excluded_user_ids.get(course_id, ()))
+
+    all_staff_user_ids = set().union(*staff_user_ids.values())
+    if all_staff_user_ids:
+        staff_enrollments = enrollments.filter(
+            user_id__in=list(all_staff_user_ids)).values_list('course_id', 'user_id')
+        for locator, user_id in staff_enrollments:
+            if user_id in staff_user_ids.get(str(locator), ()):
+                counts_by_locator[str(locator)] -= 1
+
+    return dict((course_id, counts_by_locator.get(str(locator), 0))
+                for course_id, locator in locators.items())
+
+
+def bulk_get_active_learner_counts(course_ids, date_for):
+    """Return the count of distinct learners active on `date_for` for each course
+
+    Reads the daily activity table, collecting the day first if needed. See
+    `figures.activity`
+    """
+    course_keys = [as_course_key(course_id) for course_id in course_ids]
+    active = daily_activity(date_for, course_ids=course_keys, collect=True).order_by().values(
+        'course_id').annotate(count=Count('user_id', distinct=True))
+    counts = dict((str(rec['course_id']), rec['count']) for rec in active)
+    return dict((str(key), counts.get(str(key), 0)) for key in course_keys)
+
+
+def bulk_get_num_learners_completed(course_ids, date_for):
+    """Return the number of certificates generated up to `date_for` for each course
+    """
+    course_keys = [as_course_key(course_id) for course_id in course_ids]
+    certificates = GeneratedCertificate.objects.filter(
+        course_id__in=course_keys,
+        created_date__lt=as_datetime(next_day(date_for))).order_by().values(
+        'course_id').annotate(count=Count('id'))
+    counts = dict((str(rec['course_id']), rec['count']) for rec in certificates)
+    return dict((str(key), counts.get(str(key), 0)) for key in course_keys)
+
+
+def bulk_get_days_to_complete(course_ids, date_for, since=None):
+    """Return the `get_days_to_complete` dict for each course
+
+    The certificates and their enrollments for all the courses are retrieved
+    together. See `certificate_enrollment_rows`
+    """
+    results = dict((str(as_course_key(course_id)), dict(days=[], errors=[]))
+                   for course_id in course_ids)
+    for course_id, user_id, days, enrollment_count in certificate_enrollment_rows(
+            course_ids, date_for, since=since):
+        # How do we want to handle multiples?
+        if enrollment_count > 1:
+            results[course_id]['errors'].append(
+                dict(msg='Multiple CE records',
+                     course_id=course_id,
+                     user_id=user_id,
+                     ))
+        if days is None:
+            # sometimes a course enrollment is deleted after the cert is generated.  why, who knows?
+            # in which case just leave out that data
+            results[course_id]['errors'].append(
+                dict(msg='No CourseEnrollment matching user course certificate',
+                     course_id=course_id,
+                     user_id=user_id,
+                     ))
+        else:
+            results[course_id]['days'].append(days)
+    return results
+
+
+def bulk_get_days_to_complete_totals(course_ids, date_for, previous_records=None):
+    """Return the `get_days_to_complete_totals` dict for each course
+
+    `previous_records` is a dict of each course's previous CourseDailyMetrics
+    record, keyed by course id string. For courses whose previous record has
+    running totals, only the certificates created after the previous record's
+    date are retrieved and added to those totals. Courses are grouped by the
+    date of their previous record, so this is one query for each distinct date,
+    which is usually the day before `date_for`
+    """
+    previous_records = previous_records or dict()
+    by_since = dict()
+    for course_id in course_ids:
+        cdm = previous_records.get(str(course_id))
+        since = cdm.date_for if record_days_to_complete_totals(cdm) else None
+        by_since.setdefault(since, []).append(str(course_id))
+
+    totals = dict()
+    for since, since_course_ids in by_since.items():
+        days_to_complete = bulk_get_days_to_complete(since_course_ids, date_for, since=since)
+        for course_id in since_course_ids:
+            totals[course_id] = fold_days_to_complete_totals(
+                days_to_complete[course_id],
+                record_days_to_complete_totals(previous_records.get(course_id)))
+    return totals
+
 # Formal extractor classes
 
 
@@ -194,7 +461,8 @@ class CourseDailyMetricsExtractor(object):
     BUT, we will then need to find a transform
     """
 
-    def extract(self, course_id, date_for, ed_next=False, **_kwargs):
+    def extract(self, course_id, date_for, ed_next=False, previous_record=None,
+                excluded_user_ids=None, **_kwargs):
         """Extracts (collects) aggregated course level data
 
         Args:
@@ -204,6 +472,12 @@ class CourseDailyMetricsExtractor(object):
             ed_next (bool, optional): "Enrollment Data Next" flag. If set to `True`
                 then we collect metrics with our updated workflow. See here:
                 https://github.com/appsembler/figures/issues/428
+            previous_record (CourseDailyMetrics, optional): The course's most
+                recent record before `date_for`. If it has days to complete
+                running totals, then only the certificates created since that
+                record are used to update them
+            excluded_user_ids (set, optional): User ids of the course's staff.
+                See `get_excluded_user_ids_by_course`
 
         Returns:
             dict with aggregate course level metrics
@@ -229,7 +503,7 @@ class CourseDailyMetricsExtractor(object):
         # retrieving the core quersets
 
         course_enrollments = get_enrolled_in_exclude_admins(
-            course_id, date_for,)
+            course_id, date_for, excluded_user_ids=excluded_user_ids)
 
         data = dict(date_for=date_for, course_id=course_id)
 
@@ -291,8 +565,16 @@ class CourseDailyMetricsExtractor(object):
                                             date_for=date_for,
                                             course_id=course_id))
 
-        data['average_days_to_complete'] = get_average_days_to_complete(
-            course_id, date_for,)
+        previous_totals = record_days_to_complete_totals(previous_record)
+        days_to_complete_totals = get_days_to_complete_totals(
+            course_id,
+            date_for,
+            since=previous_record.date_for if previous_totals else None,
+            previous=previous_totals)
+        data['average_days_to_complete'] = calc_average_days_from_totals(
+            days_to_complete_totals)
+        data['days_to_complete_sum'] = days_to_complete_totals['days_sum']
+        data['days_to_complete_count'] = days_to_complete_totals['days_count']
 
         data['num_learners_completed'] = get_num_learners_completed(
             course_id, date_for,)
@@ -302,17 +584,25 @@ class CourseDailyMetricsExtractor(object):
 
 class CourseDailyMetricsLoader(object):
 
-    def __init__(self, course_id):
+    def __init__(self, course_id, excluded_user_ids=None):
         self.course_id = course_id
+        # Optional precomputed course staff user ids to exclude from learners
+        self.excluded_user_ids = excluded_user_ids
         # TODO: Consider adding extractor as optional param
         self.extractor = CourseDailyMetricsExtractor()
         self.site = figures.sites.get_site_for_course(self.course_id)
 
     def get_data(self, date_for, ed_next=False):
+        previous_record = CourseDailyMetrics.latest_previous_record(
+            site=self.site,
+            course_id=str(self.course_id),
+            date_for=date_for)
         return self.extractor.extract(
             course_id=self.course_id,
             date_for=date_for,
-            ed_next=ed_next)
+            ed_next=ed_next,
+            previous_record=previous_record,
+            excluded_user_ids=self.excluded_user_ids)
 
     @transaction.atomic
     def save_metrics(self, date_for, data):
@@ -330,6 +620,9 @@ class CourseDailyMetricsLoader(object):
         )
         if data['average_progress'] is not None:
             defaults['average_progress'] = str(data['average_progress'])
+        for key in ['days_to_complete_sum', 'days_to_complete_count']:
+            if data.get(key) is not None:
+                defaults[key] = data[key]
 
         cdm, created = CourseDailyMetrics.objects.update_or_create(
             course_id=str(self.course_id),
@@ -338,6 +631,7 @@ class CourseDailyMetricsLoader(object):
             defaults=defaults
         )
         cdm.clean_fields()
+        record_rows(written=1)
         return (cdm, created,)
 
     def load(self, date_for=None, ed_next=False, force_update=False, **_kwargs):
@@ -368,3 +662,237 @@ class CourseDailyMetricsLoader(object):
 
         data = self.get_data(date_for=date_for, ed_next=ed_next)
         return self.save_metrics(date_for=date_for, data=data)
+
+
+class BulkCourseDailyMetricsExtractor(object):
+    """Extracts CourseDailyMetrics data for a set of courses at once
+
+    This is the multiple course version of `CourseDailyMetricsExtractor`. The
+    enrollment, active learner, certificate and days to complete data for all
+    the courses are each retrieved with a single grouped query, so the number of
+    queries does not grow with the number of courses.
+
+    Average progress is also retrieved with a single grouped query when
+    `ed_next` is `True`. The original progress calculator,
+    `bulk_calculate_course_progress_data` works per course, so it is still
+    called for each course when `ed_next` is `False`.
+    """
+
+    def extract(self, course_ids, date_for, ed_next=False, previous_records=None,
+                excluded_user_ids=None, **_kwargs):
+        """Extracts (collects) aggregated course level data for each course
+
+        `previous_records` is an optional dict of each course's most recent
+        CourseDailyMetrics record before `date_for`, keyed by course id string.
+        See `bulk_get_days_to_complete_totals`
+
+        `excluded_user_ids` is an optional dict of each course's staff user ids
+        as returned by `get_excluded_user_ids_by_course`
+
+        Returns a dict keyed by course id string. Each value is a dict with the
+        same structure as returned by `CourseDailyMetricsExtractor.extract`
+        """
+        course_ids = [str(course_id) for course_id in course_ids]
+        if not course_ids:
+            return dict()
+
+        enrollment_counts = bulk_get_enrolled_counts_exclude_admins(
+            course_ids, date_for, excluded_user_ids=excluded_user_ids)
+        active_learner_counts = bulk_get_active_learner_counts(course_ids, date_for)
+        num_learners_completed = bulk_get_num_learners_completed(course_ids, date_for)
+        days_to_complete_totals = bulk_get_days_to_complete_totals(
+            course_ids, date_for, previous_records=previous_records)
+        average_progress = self.get_average_progress(course_ids, date_for, ed_next)
+
+        results = dict()
+        for course_id in course_ids:
+            results[course_id] = dict(
+                date_for=date_for,
+                course_id=course_id,
+                enrollment_count=enrollment_counts[course_id],
+                active_learners_today=active_learner_counts[course_id],
+                average_progress=average_progress.get(course_id),
+                average_days_to_complete=calc_average_days_from_totals(
+                    days_to_complete_totals[course_id]),
+                num_learners_completed=num_learners_completed[course_id],
+                days_to_complete_sum=days_to_complete_totals[course_id]['days_sum'],
+                days_to_complete_count=days_to_complete_totals[course_id]['days_count'],
+            )
+        return results
+
+    def get_average_progress(self, course_ids, date_for, ed_next):
+        """Returns a dict of average progress keyed by course id string
+
+        Follows the same rules as `CourseDailyMetricsExtractor.extract`. No
+        progress is calculated for dates before yesterday. If the progress
+        calculation fails for a course, then that course's value is `None`
+        """
+        if is_past_date(date_for + relativedelta(days=1)):  # more than 1 day in past
+            return dict()
+
+        if ed_next:
+            try:
+                progress_data = bulk_calculate_course_progress_next(course_ids)
+                return dict((course_id, rec['average_progress'])
+                            for course_id, rec in progress_data.items())
+            except Exception:  # pylint: disable=broad-except
+                msg = ('FIGURES:FAIL bulk_calculate_course_progress_next'
+                       ' date_for={date_for}, course_count={course_count}')
+                logger.exception(msg.format(date_for=date_for,
+                                            course_count=len(course_ids)))
+                return dict()
+
+        average_progress = dict()
+        for course_id in course_ids:
+            try:
+                progress_data = bulk_calculate_course_progress_data(course_id=course_id,
+                                                                    date_for=date_for)
+                average_progress[course_id] = progress_data['average_progress']
+            except Exception:  # pylint: disable=broad-except
+                msg = ('FIGURES:FAIL bulk_calculate_course_progress_data'
+                       ' date_for={date_for}, course_id="{course_id}"')
+                logger.exception(msg.format(date_for=date_for, course_id=course_id))
+        return average_progress
+
+
+class BulkCourseDailyMetricsLoader(object):
+    """Loads CourseDailyMetrics records for a set of courses in a site
+
+    This is the multiple course version of `CourseDailyMetricsLoader`. Data are
+    extracted with `BulkCourseDailyMetricsExtractor`. New records are written
+    with `bulk_create` and existing records are updated with a bulk update, in
+    batches of `batch_size` records.
+
+    Unlike `CourseDailyMetricsLoader`, the site is passed in rather than looked
+    up for each course. If no course ids are passed in, then all the site's
+    courses are loaded. `excluded_user_ids` is an optional precomputed
+    `get_excluded_user_ids_by_course` dict, so callers processing a site in
+    batches can retrieve the site's course staff once.
+    """
+    def __init__(self, site, course_ids=None, extractor=None, batch_size=None,
+                 excluded_user_ids=None):
+        self.site = site
+        if course_ids is None:
+            course_ids = figures.sites.site_course_ids(site)
+        self.course_ids = [str(course_id) for course_id in course_ids]
+        self.extractor = extractor or BulkCourseDailyMetricsExtractor()
+        self.batch_size = batch_size or DEFAULT_BULK_BATCH_SIZE
+        self.excluded_user_ids = excluded_user_ids
+
+    def get_previous_records(self, course_ids, date_for):
+        """Return each course's most recent record before `date_for`
+
+        Returns a dict keyed by course id. Courses without an earlier record
+        are not in the dict
+        """
+        latest_dates = dict(CourseDailyMetrics.objects.filter(
+            site=self.site,
+            course_id__in=course_ids,
+            date_for__lt=date_for).order_by().values('course_id').annotate(
+            latest=Max('date_for')).values_list('course_id', 'latest'))
+        if not latest_dates:
+            return dict()
+        return dict((cdm.course_id, cdm) for cdm in CourseDailyMetrics.objects.filter(
+            site=self.site,
+            course_id__in=list(latest_dates.keys()),
+            date_for__in=set(latest_dates.values()))
+            if cdm.date_for == latest_dates[cdm.course_id])
+
+    def get_data(self, course_ids, date_for, ed_next=False):
+        return self.extractor.extract(
+            course_ids=course_ids,
+            date_for=date_for,
+            ed_next=ed_next,
+            previous_records=self.get_previous_records(course_ids, date_for),
+            excluded_user_ids=self.excluded_user_ids)
+
+    @transaction.atomic
+    def save_metrics(self, date_for, data, existing=None):
+        """Validates and writes CourseDailyMetrics records for the extracted data
+
+        `data` is the dict returned by `get_data`. `existing` is a dict of
+        the existing CourseDailyMetrics records for `date_for`, keyed by course
+        id. Records failing validation are not saved. Their course ids and
+        validation errors are returned in the `errors` list
+
+        NOTE: Records created with `bulk_create` do not have their `id` set
+        on all databases
+        """
+        existing = existing or dict()
+        to_create = []
+        to_update = []
+        errors = []
+        for course_id, rec in data.items():
+            fields = dict(
+                enrollment_count=rec['enrollment_count'],
+                active_learners_today=rec['active_learners_today'],
+                average_days_to_complete=int(round(rec['average_days_to_complete'])),
+                num_learners_completed=rec['num_learners_completed'],
+            )
+            if rec['average_progress'] is not None:
+                fields['average_progress'] = str(rec['average_progress'])
+            for key in ['days_to_complete_sum', 'days_to_complete_count']:
+                if rec.get(key) is not None:
+                    fields[key] = rec[key]
+
+            cdm = existing.get(course_id)
+            if cdm is None:
+                cdm = CourseDailyMetrics(site=self.site,
+                                         course_id=course_id,
+                                         date_for=date_for,
+                                         **fields)
+            else:
+                for key, val in fields.items():
+                    setattr(cdm, key, val)
+            try:
+                cdm.clean_fields()
+            except ValidationError as e:
+                errors.append(dict(course_id=course_id, error=e.message_dict))
+                continue
+            if cdm.pk:
+                to_update.append(cdm)
+            else:
+                to_create.append(cdm)
+
+        bulk_create(CourseDailyMetrics, to_create, batch_size=self.batch_size)
+        update_time = now()
+        for cdm in to_update:
+            cdm.modified = update_time
+        bulk_update(CourseDailyMetrics, to_update,
+                    ['enrollment_count',
+                     'active_learners_today',
+                     'average_days_to_complete',
+                     'num_learners_completed',
+                     'average_progress',
+                     'days_to_complete_sum',
+                     'days_to_complete_count',
+                     'modified'],
+                    batch_size=self.batch_size)
+        record_rows(written=len(to_create) + len(to_update))
+        return dict(created=to_create, updated=to_update, errors=errors)
+
+    def load(self, date_for=None, ed_next=False, force_update=False, **_kwargs):
+        """Load the CourseDailyMetrics records for the courses and date
+
+        Existing records are only updated if `force_update` is True. Otherwise
+        their courses are skipped and no data are extracted for them.
+
+        Returns a dict with lists of the `created`, `updated` and `skipped`
+        records and the validation `errors`
+        """
+        date_for = pipeline_date_for_rule(date_for)
+        existing = dict(
+            (cdm.course_id, cdm) for cdm in CourseDailyMetrics.objects.filter(
+                course_id__in=self.course_ids, date_for=date_for))
+        if force_update:
+            course_ids = self.course_ids
+            skipped = []
+        else:
+            course_ids = [cid for cid in self.course_ids if cid not in existing]
+            skipped = list(existing.values())
+            existing = dict()
+
+        data = self.get_data(course_ids=course_ids, date_for=date_for, ed_next=ed_next)
+        results = self.save_metrics(date_for=date_for, data=data, existing=existing)
+        results['skipped'] = skipped
+        return results
@@ -0,0 +1,334 @@
+"""Backfill daily metrics for a range of dates in a single pass
+
+`figures.pipeline.backfill.backfill_daily_metrics_for_site_and_date` fills one
+day. Filling a range with it recomputes every course's counts from scratch for
+each day, so a one year backfill reads the site's enrollments and certificates
+365 times.
+
+The functions in this module read the data for the whole range once. The
+enrollment created dates, certificate dates, learner activity and user join
+dates are sorted, then each day's cumulative counts are read off the sorted
+lists. The CourseDailyMetrics and SiteDailyMetrics records are then written in
+bulk.
+
+The counts are the same as the daily pipeline's for the same data. As with the
+daily backfill, average progress is only calculated for yesterday. See
+`figures.pipeline.course_daily_metrics.CourseDailyMetricsExtractor`
+"""
+
+from __future__ import absolute_import
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from dateutil.rrule import rrule, DAILY
+from django.db.models import Count, Sum
+from django.utils.timezone import now
+
+from figures.activity import daily_activity, ensure_daily_activity
+from figures.compat import CourseEnrollment, bulk_update
+from figures.helpers import as_date, as_datetime, is_multisite, next_day, prev_day
+from figures.log import record_rows
+from figures.models import (
+    CourseDailyMetrics,
+    CourseFirstEnrollment,
+    MonthlyActiveEnrollment,
+    SiteDailyMetrics,
+)
+from figures.pipeline.course_daily_metrics import (
+    BulkCourseDailyMetricsExtractor,
+    BulkCourseDailyMetricsLoader,
+    bulk_get_enrolled_counts_exclude_admins,
+    calc_average_days_from_totals,
+    certificate_enrollment_rows,
+    course_locator_for_enrollments,
+    get_excluded_user_ids_by_course,
+)
+from figures.pipeline.helpers import pipeline_date_for_rule
+from figures.sites import get_users_for_site, site_course_ids
+
+
+def sweep_dates(start_date, end_date):
+    """Return the list of dates from `start_date` through `end_date`
+
+    The end date follows the pipeline rule. Today is replaced with yesterday and
+    future dates raise `DateForCannotBeFutureError`. See
+    `figures.pipeline.helpers.pipeline_date_for_rule`
+    """
+    start_date = as_date(start_date)
+    end_date = pipeline_date_for_rule(end_date)
+    return [dt.date() for dt in rrule(freq=DAILY, dtstart=start_date, until=end_date)]
+
+
+def site_first_enrollments(site):
+    """Return the first enrollment date of each of the site's courses
+
+    Returns a dict of course id string to date. Courses without enrollments are
+    not in the dict. See `figures.models.CourseFirstEnrollmentManager`
+    """
+    first_enrollments = CourseFirstEnrollment.objects.refresh_for_site(
+        site, site_course_ids(site))
+    return dict((course_id, as_date(created))
+                for course_id, created in first_enrollments.items())
+
+
+def enrollment_counts_by_day(course_ids, dates, excluded_user_ids):
+    """Return each course's enrollment count excluding staff for each day
+
+    Counts the enrollments before the first day with the grouped count query
+    used by the daily pipeline, then reads the enrollments created in the range
+    once. Returns a dict of course id to a list of counts, one per day
+    """
+    start_date = dates[0]
+    counts = bulk_get_enrolled_counts_exclude_admins(
+        course_ids, prev_day(start_date), excluded_user_ids=excluded_user_ids)
+    course_ids_by_locator = dict()
+    for course_id in course_ids:
+        course_ids_by_locator.setdefault(
+            str(course_locator_for_enrollments(course_id)), []).append(course_id)
+    staff_user_ids = dict()
+    for locator, locator_course_ids in course_ids_by_locator.items():
+        staff_user_ids[locator] = set().union(
+            *[excluded_user_ids.get(course_id, set()) for course_id in locator_course_ids])
+
+    enrolled_dates = dict((course_id, []) for course_id in course_ids)
+    rows = CourseEnrollment.objects.filter(
+        course_id__in=[course_locator_for_enrollments(course_id) for course_id in course_ids],
+        is_active=1,
+        created__gte=as_datetime(start_date),
+        created__lt=as_datetime(next_day(dates[-1]))).values_list(
+        'course_id', 'user_id', 'created')
+    for locator, user_id, created in rows.iterator():
+        locator = str(locator)
+        if user_id in staff_user_ids.get(locator, ()):
+            continue
+        for course_id in course_ids_by_locator.get(locator, []):
+            enrolled_dates[course_id].append(as_date(created))
+
+    results = dict()
+    for course_id in course_ids:
+        enrolled = sorted(enrolled_dates[course_id])
+        results[course_id] = [counts[course_id] + bisect_right(enrolled, date_for)
+                              for date_for in dates]
+    return results
+
+
+def certificate_counts_by_day(course_ids, dates):
+    """Return each course's certificate and days to complete totals for each day
+
+    Reads the courses' certificates and their enrollments once. Returns a dict
+    of course id to a list of dicts, one per day, with the number of
+    certificates created through the end of the day (`num_learners_completed`)
+    and the `days_sum` and `days_count` running totals of the days to
+    complete. As in the daily pipeline, the days to complete totals include the
+    certificates created up to the start of the day
+    """
+    completed = dict((course_id, []) for course_id in course_ids)
+    days_to_complete = dict((course_id, []) for course_id in course_ids)
+    for course_id, _user_id, days, _count, created_date in certificate_enrollment_rows(
+            course_ids, next_day(dates[-1]), with_created_date=True):
+        completed[course_id].append(created_date)
+        if days is not None:
+            days_to_complete[course_id].append((created_date, days))
+
+    results = dict()
+    for course_id in course_ids:
+        completed_dates = sorted(completed[course_id])
+        days_rows = sorted(days_to_complete[course_id])
+        days_dates = [created_date for created_date, _ in days_rows]
+        days_sums = [0]
+        for _, days in days_rows:
+            days_sums.append(days_sums[-1] + days)
+        course_results = []
+        for date_for in dates:
+            days_count = bisect_right(days_dates, as_datetime(date_for))
+            course_results.append(dict(
+                num_learners_completed=bisect_left(completed_dates,
+                                                   as_datetime(next_day(date_for))),
+                days_sum=days_sums[days_count],
+                days_count=days_count))
+        results[course_id] = course_results
+    return results
+
+
+def sweep_course_daily_metrics(site, start_date, end_date, force_update=False,
+                               ed_next=False, excluded_user_ids=None,
+                               first_enrollments=None):
+    """Fill the site's CourseDailyMetrics records for a range of dates
+
+    Like the daily backfill, each day has records for the courses with
+    enrollments created on or before the day. Existing records are skipped
+    unless `force_update` is True.
+
+    Returns a dict with the lists of `created`, `updated` and `skipped`
+    records and the validation `errors`
+    """
+    dates = sweep_dates(start_date, end_date)
+    results = dict(created=[], updated=[], skipped=[], errors=[])
+    if not dates:
+        return results
+    if first_enrollments is None:
+        first_enrollments = site_first_enrollments(site)
+    course_ids = [course_id for course_id, first in first_enrollments.items()
+                  if first <= dates[-1]]
+    if not course_ids:
+        return results
+    if excluded_user_ids is None:
+        excluded_user_ids = get_excluded_user_ids_by_course(course_ids)
+
+    enrollment_counts = enrollment_counts_by_day(course_ids, dates, excluded_user_ids)
+    certificate_counts = certificate_counts_by_day(course_ids, dates)
+    active_counts = dict(
+        ((rec['course_id'], rec['date_for']), rec['count']) for rec in
+        daily_activity(dates[0], dates[-1], course_ids=course_ids,
+                       collect=True).order_by().values(
+            'course_id', 'date_for').annotate(count=Count('user_id', distinct=True)))
+    existing = dict(
+        ((cdm.date_for, cdm.course_id), cdm) for cdm in CourseDailyMetrics.objects.filter(
+            course_id__in=course_ids, date_for__gte=dates[0], date_for__lte=dates[-1]))
+
+    extractor = BulkCourseDailyMetricsExtractor()
+    loader = BulkCourseDailyMetricsLoader(site=site, course_ids=course_ids)
+    for index, date_for in enumerate(dates):
+        day_existing = dict()
+        data = dict()
+        day_course_ids = []
+        for course_id in course_ids:
+            if first_enrollments[course_id] > date_for:
+                continue
+            cdm = existing.get((date_for, course_id))
+            if cdm is not None:
+                if not force_update:
+                    results['skipped'].append(cdm)
+                    continue
+                day_existing[course_id] = cdm
+            day_course_ids.append(course_id)
+        if not day_course_ids:
+            continue
+        average_progress = extractor.get_average_progress(day_course_ids, date_for, ed_next)
+        for course_id in day_course_ids:
+            totals = certificate_counts[course_id][index]
+            data[course_id] = dict(
+                date_for=date_for,
+                course_id=course_id,
+                enrollment_count=enrollment_counts[course_id][index],
+                active_learners_today=active_counts.get((course_id, date_for), 0),
+                average_progress=average_progress.get(course_id),
+                average_days_to_complete=calc_average_days_from_totals(totals),
+                num_learners_completed=totals['num_learners_completed'],
+                days_to_complete_sum=totals['days_sum'],
+                days_to_complete_count=totals['days_count'],
+            )
+        day_results = loader.save_metrics(date_for=date_for, data=data, existing=day_existing)
+        for key in ['created', 'updated', 'errors']:
+            results[key].extend(day_results[key])
+    return results
+
+
+def monthly_active_counts_by_day(site, dates):
+    """Return the site's month to date active user count for each day
+
+    The same counts as `figures.mau.site_mau_1g_for_month_as_of_day`, read
+    from `MonthlyActiveEnrollment` with one query for the range
+    """
+    first_day = date(dates[0].year, dates[0].month, 1)
+    ensure_daily_activity(first_day, dates[-1])
+    qs = MonthlyActiveEnrollment.objects.filter(month_for__gte=first_day,
+                                                month_for__lte=dates[-1])
+    if is_multisite():
+        qs = qs.filter(site=site)
+    # Each user's first active day in each month. Records from before Figures
+    # tracked the first active day count for the whole month
+    first_active = dict()
+    for month_for, user_id, active in qs.values_list('month_for', 'user_id', 'first_active'):
+        active = active or month_for
+        key = (month_for, user_id)
+        if key not in first_active or active < first_active[key]:
+            first_active[key] = active
+    by_month = dict()
+    for (month_for, _user_id), active in first_active.items():
+        by_month.setdefault(month_for, []).append(active)
+    for month_dates in by_month.values():
+        month_dates.sort()
+    return [bisect_right(by_month.get(date(date_for.year, date_for.month, 1), []), date_for)
+            for date_for in dates]
+
+
+def sweep_site_daily_metrics(site, start_date, end_date, force_update=False,
+                             first_enrollments=None):
+    """Fill the site's SiteDailyMetrics records for a range of dates
+
+    Run after the range's CourseDailyMetrics records are filled, since the
+    total enrollment count is their sum. The cumulative active user count
+    continues from the site's latest record before the range. Existing records
+    are skipped unless `force_update` is True, and the cumulative count then
+    continues from the existing record.
+
+    Returns a dict with the lists of `created`, `updated` and `skipped`
+    records
+    """
+    dates = sweep_dates(start_date, end_date)
+    results = dict(created=[], updated=[], skipped=[])
+    if not dates:
+        return results
+    if first_enrollments is None:
+        first_enrollments = site_first_enrollments(site)
+    first_enrollment_dates = sorted(first_enrollments.values())
+
+    site_users = get_users_for_site(site)
+    user_count = site_users.filter(date_joined__lt=as_datetime(dates[0])).count()
+    joined_dates = sorted(as_date(joined) for joined in site_users.filter(
+        date_joined__gte=as_datetime(dates[0]),
+        date_joined__lt=as_datetime(next_day(dates[-1]))).values_list(
+        'date_joined', flat=True).iterator())
+    active_counts = dict(
+        (rec['date_for'], rec['count']) for rec in
+        daily_activity(dates[0], dates[-1], site=site, collect=True).order_by().values(
+            'date_for').annotate(count=Count('user_id', distinct=True)))
+    enrollment_counts = dict(CourseDailyMetrics.objects.filter(
+        site=site, date_for__gte=dates[0], date_for__lte=dates[-1]).order_by().values(
+        'date_for').annotate(total=Sum('enrollment_count')).values_list('date_for', 'total'))
+    mau_counts = monthly_active_counts_by_day(site, dates)
+    existing = dict((sdm.date_for, sdm) for sdm in SiteDailyMetrics.objects.filter(
+        site=site, date_for__gte=dates[0], date_for__lte=dates[-1]))
+
+    previous = SiteDailyMetrics.latest_previous_record(site=site, date_for=dates[0])
+    cumulative = (previous.cumulative_active_user_count or 0) if previous else 0
+    to_create = []
+    to_update = []
+    for index, date_for in enumerate(dates):
+        sdm = existing.get(date_for)
+        if sdm is not None and not force_update:
+            results['skipped'].append(sdm)
+            cumulative = sdm.cumulative_active_user_count or 0
+            continue
+        todays_active_user_count = active_counts.get(date_for, 0)
+        cumulative += todays_active_user_count
+        fields = dict(
+            cumulative_active_user_count=cumulative,
+            todays_active_user_count=todays_active_user_count,
+            total_user_count=user_count + bisect_right(joined_dates, date_for),
+            course_count=bisect_right(first_enrollment_dates, date_for),
+            total_enrollment_count=enrollment_counts.get(date_for) or 0,
+            mau=mau_counts[index],
+        )
+        if sdm is None:
+            to_create.append(SiteDailyMetrics(site=site, date_for=date_for, **fields))
+        else:
+            for key, val in fields.items():
+                setattr(sdm, key, val)
+            sdm.modified = now()
+            to_update.append(sdm)
+
+    SiteDailyMetrics.objects.bulk_create(to_create)
+    bulk_update(SiteDailyMetrics, to_update,
+                ['cumulative_active_user_count',
+                 'todays_active_user_count',
+                 'total_user_count',
+                 'course_count',
+                 'total_enrollment_count',
+                 'mau',
+                 'modified'])
+    record_rows(written=len(to_create) + len(to_update))
+    results['created'] = to_create
+    results['updated'] = to_update
+    return results
@@ -30,20 +30,196 @@ This module provides
 
 """
 from decimal import Decimal
-from django.db.models import Avg
+from time import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, DateField, DateTimeField, Max
+from django.utils.timezone import now
+
+from figures.compat import (bulk_create,
+                            bulk_update,
+                            CourseEnrollment,
+                            OuterRef,
+                            StudentModule,
+                            Subquery)
 from figures.course import Course
-from figures.enrollment import is_enrollment_data_out_of_date
-from figures.helpers import utc_yesterday
-from figures.models import EnrollmentData
+from figures.helpers import as_course_key, as_datetime, utc_yesterday
+from figures.log import record_rows
+from figures.models import EnrollmentData, LearnerCourseGradeMetrics, StaleEnrollment
+from figures.progress import CourseProgress
 from figures.sites import UnlinkedCourseError
 
 
-def update_enrollment_data_for_course(course_id):
+DEFAULT_ENROLLMENT_DATA_BATCH_SIZE = 500
+
+# Fields written by `EnrollmentDataWriter`
+ENROLLMENT_DATA_FIELDS = [
+    'date_for',
+    'is_completed',
+    'progress_percent',
+    'points_possible',
+    'points_earned',
+    'sections_possible',
+    'sections_worked',
+    'is_enrolled',
+    'date_enrolled',
+    'collect_elapsed',
+]
+
+LCGM_FIELDS = [
+    'site',
+    'points_possible',
+    'points_earned',
+    'sections_worked',
+    'sections_possible',
+    'collect_elapsed',
+]
+
+
+def stale_enrollment_queue_enabled():
+    """Returns True if the stale enrollment queue is enabled
+
+    When it is enabled, changed enrollments are queued as they change and the
+    daily pipeline updates only the queued enrollments' data. See
+    `figures.models.StaleEnrollment`. Enable by setting
+    ``ENABLE_STALE_ENROLLMENT_QUEUE`` to True in the Figures settings
+    """
+    return bool(settings.ENV_TOKENS['FIGURES'].get('ENABLE_STALE_ENROLLMENT_QUEUE', False))
+
+
+def enrollment_data_batch_size():
+    """Number of enrollments `EnrollmentDataWriter` writes at a time
+
+    Override by setting ``ENROLLMENT_DATA_BATCH_SIZE`` in the Figures
+    ENV_TOKENS
+    """
+    batch_size = settings.ENV_TOKENS['FIGURES'].get(
+        'ENROLLMENT_DATA_BATCH_SIZE',
+        DEFAULT_ENROLLMENT_DATA_BATCH_SIZE)
+    return max(1, int(batch_size))
+
+
+class EnrollmentDataWriter(object):
+    """Writes EnrollmentData and LearnerCourseGradeMetrics records in bulk
+
+    This is the bulk version of the writes in
+    `EnrollmentDataManager.update_metrics`. The progress of each of a course's
+    enrollments is added with `add`. When `batch_size` enrollments have been
+    added, they are written with a query each to find the existing
+    EnrollmentData and LearnerCourseGradeMetrics records, then `bulk_create`
+    for the new records and a bulk update for the existing records.
+
+    Call `flush` after adding the last enrollment to write the remaining
+    records. `results` is the list of (EnrollmentData, created) tuples of the
+    records written. Created records do not have their `id` set on all
+    databases.
+    """
+    def __init__(self, site, course_id, date_for, batch_size=None):
+        self.site = site
+        self.course_id = str(course_id)
+        self.date_for = date_for
+        self.batch_size = batch_size or enrollment_data_batch_size()
+        self.results = []
+        self._pending = []
+
+    def add(self, course_enrollment, progress, collect_elapsed=None):
+        """Add the `EnrollmentProgress` for the enrollment to be written
+        """
+        self._pending.append((course_enrollment, progress, collect_elapsed))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    @transaction.atomic
+    def flush(self):
+        """Write the records for the enrollments added since the last flush
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        user_ids = [ce.user_id for ce, _, _ in pending]
+        existing_ed = dict((rec.user_id, rec) for rec in EnrollmentData.objects.filter(
+            site=self.site,
+            course_id=self.course_id,
+            user_id__in=user_ids))
+        existing_lcgm = dict(
+            (rec.user_id, rec) for rec in LearnerCourseGradeMetrics.objects.filter(
+                course_id=self.course_id,
+                date_for=self.date_for,
+                user_id__in=user_ids))
+
+        update_time = now()
+        ed_to_create, ed_to_update = [], []
+        lcgm_to_create, lcgm_to_update = [], []
+        for ce, progress, collect_elapsed in pending:
+            ed_fields = dict(
+                date_for=self.date_for,
+                is_completed=progress.is_completed(),
+                progress_percent=progress.progress_percent(),
+                points_possible=progress.progress.get('points_possible', 0),
+                points_earned=progress.progress.get('points_earned', 0),
+                sections_possible=progress.progress.get('sections_possible', 0),
+                sections_worked=progress.progress.get('sections_worked', 0),
+                is_enrolled=ce.is_active,
+                date_enrolled=ce.created,
+                collect_elapsed=collect_elapsed,
+            )
+            lcgm_fields = dict(
+                site=self.site,
+                points_possible=ed_fields['points_possible'],
+                points_earned=ed_fields['points_earned'],
+                sections_worked=ed_fields['sections_worked'],
+                sections_possible=ed_fields['sections_possible'],
+                collect_elapsed=collect_elapsed,
+            )
+            ed_rec = existing_ed.get(ce.user_id)
+            if ed_rec:
+                for key, val in ed_fields.items():
+                    setattr(ed_rec, key, val)
+                ed_rec.modified = update_time
+                ed_to_update.append(ed_rec)
+            else:
+                ed_rec = EnrollmentData(site=self.site,
+                                        user_id=ce.user_id,
+                                        course_id=self.course_id,
+                                        **ed_fields)
+                ed_to_create.append(ed_rec)
+            self.results.append((ed_rec, ce.user_id not in existing_ed))
+
+            lcgm = existing_lcgm.get(ce.user_id)
+            if lcgm:
+                for key, val in lcgm_fields.items():
+                    setattr(lcgm, key, val)
+                lcgm.modified = update_time
+                lcgm_to_update.append(lcgm)
+            else:
+                lcgm_to_create.append(LearnerCourseGradeMetrics(user_id=ce.user_id,
+                                                                course_id=self.course_id,
+                                                                date_for=self.date_for,
+                                                                **lcgm_fields))
+
+        bulk_create(EnrollmentData, ed_to_create, batch_size=self.batch_size)
+        bulk_update(EnrollmentData, ed_to_update, ENROLLMENT_DATA_FIELDS + ['modified'],
+                    batch_size=self.batch_size)
+        bulk_create(LearnerCourseGradeMetrics, lcgm_to_create, batch_size=self.batch_size)
+        bulk_update(LearnerCourseGradeMetrics, lcgm_to_update, LCGM_FIELDS + ['modified'],
+                    batch_size=self.batch_size)
+        record_rows(written=len(pending) + len(lcgm_to_create) + len(lcgm_to_update))
+
+
+def update_enrollment_data_for_course(course_id, batch_size=None):
     """Updates Figures per-enrollment data for enrollments in the course
     Checks for and creates new `LearnerCourseGradeMetrics` records and updates
     `EnrollmentData` records
 
-    Return results are a list of the results returned by `update_enrollment_data`
+    Return results are a list of (EnrollmentData, created) tuples for the
+    course's active enrollments, like those returned by
+    `EnrollmentDataManager.update_metrics`
+
+    Enrollments with EnrollmentData already collected for the date are
+    skipped. The course and its block structure are loaded once for the other
+    enrollments. See `figures.progress.CourseProgress`. Their records are
+    written in bulk. See `EnrollmentDataWriter`
 
     TODO: Add check if the course data actually exists in Mongo
     """
@@ -55,11 +231,96 @@ def update_enrollment_data_for_course(course_id):
     # Any updated student module records? if so, then get the unique enrollments
     # for each enrollment, check if LGCM is out of date or up to date
     active_enrollments = the_course.enrollments_active_on_date(date_for)
-    return [EnrollmentData.objects.update_metrics(the_course.site, ce)
-            for ce in active_enrollments]
+    up_to_date = dict((rec.user_id, rec) for rec in EnrollmentData.objects.filter(
+        course_id=str(course_id),
+        user_id__in=active_enrollments.values('user_id'),
+        date_for__gte=date_for))
+
+    results = []
+    course_progress = CourseProgress(course_id)
+    writer = EnrollmentDataWriter(site=the_course.site,
+                                  course_id=course_id,
+                                  date_for=date_for,
+                                  batch_size=batch_size)
+    for ce in active_enrollments.select_related('user'):
+        if ce.user_id in up_to_date:
+            results.append((up_to_date[ce.user_id], False))
+            continue
+        start_time = time()
+        progress = course_progress.enrollment_progress(ce.user)
+        writer.add(ce, progress, collect_elapsed=time() - start_time)
+    writer.flush()
+    results += writer.results
+    record_rows(read=len(results))
+    return results
+
+
+def update_stale_enrollment_data_for_course(course_id, batch_size=None):
+    """Updates the enrollment data for the course's queued stale enrollments
+
+    This is the queue driven counterpart to `update_enrollment_data_for_course`.
+    Instead of looking for enrollments active yesterday, it updates the
+    enrollments queued in `StaleEnrollment` since the queue was last drained.
+    Courses without queued enrollments cost nothing, and the queue can be
+    drained more often than once a day. The records are dated with the same
+    rule as `update_enrollment_data_for_course`, UTC yesterday, so both paths
+    write the same `date_for`.
+
+    Queued enrollments are removed once their records are written, unless they
+    changed again in the meantime. Queued records for learners who are not
+    enrolled in the course are removed without writing enrollment data.
+
+    Return results are a list of (EnrollmentData, created) tuples for the
+    updated enrollments
+    """
+    date_for = utc_yesterday()
+    the_course = Course(course_id)
+    if not the_course.site:
+        raise UnlinkedCourseError('No site found for course "{}"'.format(course_id))
+
+    stale_enrollments = list(StaleEnrollment.objects.filter(course_id=str(course_id)))
+    if not stale_enrollments:
+        return []
+    enrollments = CourseEnrollment.objects.filter(
+        course_id=as_course_key(course_id),
+        user_id__in=[rec.user_id for rec in stale_enrollments]).select_related('user')
+
+    course_progress = CourseProgress(course_id)
+    writer = EnrollmentDataWriter(site=the_course.site,
+                                  course_id=course_id,
+                                  date_for=date_for,
+                                  batch_size=batch_size)
+    for ce in enrollments:
+        start_time = time()
+        progress = course_progress.enrollment_progress(ce.user)
+        writer.add(ce, progress, collect_elapsed=time() - start_time)
+    writer.flush()
+    StaleEnrollment.objects.remove(stale_enrollments)
+    record_rows(read=len(stale_enrollments))
+    return writer.results
 
 
-def stale_course_enrollments(course_id):
+def _is_stale(last_modified, ed_date_for):
+    """Same check as `figures.enrollment.is_enrollment_data_out_of_date`
+
+    `last_modified` is the enrollment's latest `StudentModule.modified` and
+    `ed_date_for` is its `EnrollmentData.date_for`, `None` if it has no
+    EnrollmentData record
+    """
+    return ed_date_for is None or last_modified >= as_datetime(ed_date_for)
+
+
+def _enrollments_in_id_range(enrollments, min_enrollment_id, max_enrollment_id):
+    """Filter enrollments to the half open id range and order them by id
+    """
+    if min_enrollment_id is not None:
+        enrollments = enrollments.filter(id__gte=min_enrollment_id)
+    if max_enrollment_id is not None:
+        enrollments = enrollments.filter(id__lt=max_enrollment_id)
+    return enrollments.select_related('user').order_by('id')
+
+
+def stale_course_enrollments(course_id, min_enrollment_id=None, max_enrollment_id=None):
     """Find missing/out of date EnrollmentData records for the course
 
     The `EnrollmentData` model holds the most recent data about the enrollment.
@@ -69,8 +330,20 @@ def stale_course_enrollments(course_id):
        OR
        Figures `EnrollmentData` backfill was run
 
-    Maybe... We might want to add query methods to EnrollmentDataManager to
-    get out of date `EnrollmentData` records for a course.
+    An enrollment is stale if it has `StudentModule` records and either has no
+    `EnrollmentData` record or has `StudentModule` records modified on or after
+    the `EnrollmentData.date_for`. This is the same check as
+    `figures.enrollment.is_enrollment_data_out_of_date`, but done for all the
+    course's enrollments at once.
+
+    On Django 1.11 and greater, each enrollment is annotated with its latest
+    `StudentModule.modified` and its `EnrollmentData.date_for` as subqueries,
+    so this is a single query. On Ginkgo (Django 1.8), these are retrieved
+    with one grouped query each and matched to the enrollments in Python.
+
+    Enrollments are yielded in id order. `min_enrollment_id` (inclusive) and
+    `max_enrollment_id` (exclusive) limit the enrollments to an id range. See
+    `figures.pipeline.backfill.backfill_enrollment_data`
 
     NOTE: Naming this function was a bit of a challenge. What I used before:
 
@@ -81,15 +354,52 @@ def stale_course_enrollments(course_id):
     Since we are in the context of Figures and figures doesn't modifity the platform,
     we should be save with saying "stale_course_enrollments" for brevity
     """
-    course = Course(course_id)
+    course_key = as_course_key(course_id)
+    if Subquery is not None:
+        last_modified = StudentModule.objects.filter(
+            course_id=course_key,
+            student_id=OuterRef('user_id')).order_by().values('student_id').annotate(
+            last_modified=Max('modified')).values('last_modified')
+        ed_date_for = EnrollmentData.objects.filter(
+            course_id=str(course_key),
+            user_id=OuterRef('user_id')).values('date_for')[:1]
+        enrollments = CourseEnrollment.objects.filter(course_id=course_key).annotate(
+            sm_last_modified=Subquery(last_modified, output_field=DateTimeField()),
+            ed_date_for=Subquery(ed_date_for, output_field=DateField())).filter(
+            sm_last_modified__isnull=False)
+        enrollments = _enrollments_in_id_range(enrollments,
+                                               min_enrollment_id,
+                                               max_enrollment_id)
+        for enrollment in enrollments:
+            if _is_stale(enrollment.sm_last_modified, enrollment.ed_date_for):
+                yield enrollment
+    else:
+        last_modified = dict(StudentModule.objects.filter(
+            course_id=course_key).order_by().values('student_id').annotate(
+            last_modified=Max('modified')).values_list('student_id', 'last_modified'))
+        ed_dates = dict(EnrollmentData.objects.filter(
+            course_id=str(course_key)).values_list('user_id', 'date_for'))
+        enrollments = CourseEnrollment.objects.filter(
+            course_id=course_key,
+            user_id__in=list(last_modified.keys()))
+        enrollments = _enrollments_in_id_range(enrollments,
+                                               min_enrollment_id,
+                                               max_enrollment_id)
+        for enrollment in enrollments:
+            if _is_stale(last_modified[enrollment.user_id], ed_dates.get(enrollment.user_id)):
+                yield enrollment
 
-    # If we have a course with no activity, nothing can be out of date.
-    # As such if the course has no student modules, the loop won't execute
 
-    # We are only interested in enrollments with activity
-    for enrollment in course.enrollments_with_student_modules():
-        if is_enrollment_data_out_of_date(enrollment):
-            yield enrollment
+def _rounded_average_progress(average_progress):
+    """Round the SQL AVG of `progress_percent` as stored in CourseDailyMetrics
+    """
+    # This is a bit of a hack. When we overhaul progress data, we should really
+    # have None for progress if there's no data. But check how SQL AVG performs
+    if average_progress is None:
+        return 0.0
+    else:
+        rounded_val = Decimal(average_progress).quantize(Decimal('.00'))
+        return float(rounded_val)
 
 
 def calculate_course_progress(course_id):
@@ -97,12 +407,22 @@ def calculate_course_progress(course_id):
     """
     results = EnrollmentData.objects.filter(course_id=str(course_id)).aggregate(
         average_progress=Avg('progress_percent'))
-
-    # This is a bit of a hack. When we overhaul progress data, we should really
-    # have None for progress if there's no data. But check how SQL AVG performs
-    if results['average_progress'] is None:
-        results['average_progress'] = 0.0
-    else:
-        rounded_val = Decimal(results['average_progress']).quantize(Decimal('.00'))
-        results['average_progress'] = float(rounded_val)
+    results['average_progress'] = _rounded_average_progress(results['average_progress'])
     return results
+
+
+def bulk_calculate_course_progress(course_ids):
+    """Return average progress percentage for each of the given courses
+
+    This is the multiple course version of `calculate_course_progress`. It
+    runs a single `GROUP BY course_id` query.
+
+    Returns a dict keyed by course id string. Each value is a dict with the
+    same structure as returned by `calculate_course_progress`
+    """
+    course_ids = [str(course_id) for course_id in course_ids]
+    averages = EnrollmentData.objects.filter(course_id__in=course_ids).order_by(
+        ).values('course_id').annotate(average_progress=Avg('progress_percent'))
+    found = dict((rec['course_id'], rec['average_progress']) for rec in averages)
+    return dict((course_id, dict(average_progress=_rounded_average_progress(
+        found.get(course_id)))) for course_id in course_ids)
@@ -0,0 +1,231 @@
+"""Records pipeline runs and their stages in the pipeline ledger
+
+The ledger shows where the pipeline time goes. A `PipelineRun` record is
+written for each run of a pipeline task, backfill or management command, and
+a `PipelineStage` record for each unit of work in it, like updating a
+course's EnrollmentData records. Each stage records its elapsed time, the rows
+read and written, the database queries and their time and the number of
+course grade retrievals.
+
+Use the context managers to record a run and its stages:
+
+```
+with pipeline_run('populate_daily_metrics_next', date_for=date_for):
+    for site in sites:
+        with pipeline_stage('site_daily_metrics', site=site):
+            ...
+```
+
+Pipeline code reports the rows it reads and writes with
+`figures.log.record_rows`. Course grade retrievals are counted by
+`figures.compat.course_grade`.
+
+Set ``PIPELINE_LEDGER`` to ``False`` in the Figures ENV_TOKENS to stop writing
+ledger records. The context managers still run the code they wrap.
+
+Ledger records are kept for ``PIPELINE_LEDGER_RETENTION_DAYS`` days, 30 by
+default. The daily pipeline removes older records with `prune_pipeline_ledger`
+after each run. Set it to ``None`` to keep the records.
+"""
+
+from __future__ import absolute_import
+from contextlib import contextmanager
+from datetime import timedelta
+import logging
+import threading
+import timeit
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Sum
+from django.utils.timezone import now
+
+from figures.helpers import as_date
+from figures.log import QueryStats, active_stages, wrap_connection
+from figures.models import PipelineRun, PipelineStage
+
+
+DEFAULT_PIPELINE_LEDGER = True
+
+DEFAULT_PIPELINE_LEDGER_RETENTION_DAYS = 30
+
+# Number of ledger records `prune_pipeline_ledger` deletes per query
+PIPELINE_LEDGER_PRUNE_BATCH_SIZE = 1000
+
+# Ledger stage rows can be grouped by these fields in `slowest`
+SLOWEST_GROUP_FIELDS = dict(site='site_id', course='course_id', stage='stage')
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def pipeline_ledger_enabled():
+    """Return True if pipeline runs and stages are saved to the ledger
+    """
+    return bool(settings.ENV_TOKENS['FIGURES'].get('PIPELINE_LEDGER',
+                                                   DEFAULT_PIPELINE_LEDGER))
+
+
+def pipeline_ledger_retention_days():
+    """Return the number of days ledger records are kept, None to keep them
+    """
+    days = settings.ENV_TOKENS['FIGURES'].get('PIPELINE_LEDGER_RETENTION_DAYS',
+                                              DEFAULT_PIPELINE_LEDGER_RETENTION_DAYS)
+    return None if days is None else int(days)
+
+
+def _active_runs():
+    if not hasattr(_local, 'runs'):
+        _local.runs = []
+    return _local.runs
+
+
+def current_run():
+    """Return the innermost `PipelineRun` being recorded in this thread, if any
+    """
+    runs = _active_runs()
+    return runs[-1] if runs else None
+
+
+def _save(obj):
+    """Save the ledger record without letting a failure stop the pipeline
+    """
+    if not pipeline_ledger_enabled():
+        return
+    try:
+        obj.save()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Unable to save pipeline ledger record %s', obj)
+
+
+@contextmanager
+def pipeline_run(name, site=None, date_for=None):
+    """Record a pipeline run in the ledger
+
+    Yields the `PipelineRun`. It is saved when the run starts, so that the
+    stages recorded in the block are linked to it, and again with the status
+    and elapsed time when the block exits
+    """
+    run = PipelineRun(name=name,
+                      site=site,
+                      date_for=as_date(date_for) if date_for else None,
+                      started=now())
+    _save(run)
+    _active_runs().append(run)
+    start_time = timeit.default_timer()
+    try:
+        yield run
+    except Exception:
+        run.status = PipelineRun.FAILED
+        raise
+    else:
+        run.status = PipelineRun.COMPLETED
+    finally:
+        _active_runs().remove(run)
+        run.finished = now()
+        run.elapsed = timeit.default_timer() - start_time
+        _save(run)
+
+
+@contextmanager
+def pipeline_stage(stage, site=None, course_id=None):
+    """Record a stage of the current pipeline run in the ledger
+
+    Yields the `PipelineStage`. Its rows read and written can be set in the
+    block or reported with `figures.log.record_rows`. The stage is saved
+    when the block exits. If `site` is not given, the run's site is used
+    """
+    run = current_run()
+    if run and not run.pk:
+        run = None
+    if site is None and run:
+        site = run.site
+    stage_obj = PipelineStage(run=run,
+                              site=site,
+                              course_id=str(course_id) if course_id else '',
+                              stage=stage,
+                              started=now())
+    stats = QueryStats()
+    active_stages().append(stage_obj)
+    start_time = timeit.default_timer()
+    try:
+        with wrap_connection(stats):
+            yield stage_obj
+    except Exception:
+        stage_obj.status = PipelineStage.FAILED
+        raise
+    else:
+        stage_obj.status = PipelineStage.COMPLETED
+    finally:
+        active_stages().remove(stage_obj)
+        stage_obj.finished = now()
+        stage_obj.elapsed = timeit.default_timer() - start_time
+        stage_obj.query_count = stats.count
+        stage_obj.query_time = stats.time
+        _save(stage_obj)
+
+
+def slowest(group_by='stage', days=7, limit=20, site=None):
+    """Return the ledger stage totals for the slowest sites, courses or stages
+
+    Groups the stages started in the last `days` days by `group_by`, which is
+    one of 'site', 'course' or 'stage', and orders the groups by their total
+    elapsed time, slowest first.
+
+    Returns a list of dicts with the group `key`, the stage count, the total,
+    maximum and mean elapsed time and the totals of the rows read and written,
+    the query count and time and the grade calls
+    """
+    field = SLOWEST_GROUP_FIELDS[group_by]
+    qs = PipelineStage.objects.filter(started__gte=now() - timedelta(days=days))
+    if site is not None:
+        qs = qs.filter(site=site)
+    if group_by == 'course':
+        qs = qs.exclude(course_id='')
+    rows = qs.order_by().values(field).annotate(
+        stage_count=Count('id'),
+        total_elapsed=Sum('elapsed'),
+        max_elapsed=Max('elapsed'),
+        mean_elapsed=Avg('elapsed'),
+        total_rows_read=Sum('rows_read'),
+        total_rows_written=Sum('rows_written'),
+        total_query_count=Sum('query_count'),
+        total_query_time=Sum('query_time'),
+        total_grade_calls=Sum('grade_calls'),
+    ).order_by('-total_elapsed')[:limit]
+    results = []
+    for rec in rows:
+        rec['key'] = rec.pop(field)
+        results.append(rec)
+    return results
+
+
+def _delete_in_batches(queryset, batch_size):
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        queryset.model.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+def prune_pipeline_ledger(retention_days=None):
+    """Delete the ledger runs and stages started before the retention period
+
+    `retention_days` defaults to `pipeline_ledger_retention_days`. Records are
+    deleted in batches, so that a large backlog of stages does not become one
+    long running delete. Returns the number of runs and stages deleted
+    """
+    if retention_days is None:
+        retention_days = pipeline_ledger_retention_days()
+        if retention_days is None:
+            return 0
+    cutoff = now() - timedelta(days=retention_days)
+    batch_size = PIPELINE_LEDGER_PRUNE_BATCH_SIZE
+    deleted = _delete_in_batches(PipelineStage.objects.filter(started__lt=cutoff),
+                                 batch_size)
+    # Any stages still linked to the old runs are deleted with them
+    deleted += _delete_in_batches(PipelineRun.objects.filter(started__lt=cutoff),
+                                  batch_size)
+    return deleted
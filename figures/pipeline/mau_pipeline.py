@@ -2,31 +2,36 @@
 
 Course MAU is the total count of unique active learners for the requested month
 
-* Retrieves filtered StudentModule records from edx-platform
+* Retrieves the distinct active users from the daily learner activity table
 * Calculates MAU values for all courses (TBD filtering)
 * Stores calculated values in Figures MAU metric models
 
 The core functionality to process MAU data should be in this module.
 
+`collect_site_course_mau` collects the MAU for all of a site's courses at
+once. It counts the courses' active users with one grouped query and saves the
+`CourseMauMetrics` records in bulk.
+
 See figures.tasks for the Celery tasks that run MAU jobs
 """
 
 from __future__ import absolute_import
-from figures.helpers import as_course_key
-from figures.mau import get_mau_from_student_modules
+from figures.activity import monthly_active_user_counts_by_course
+from figures.helpers import as_course_key, as_date
+from figures.mau import get_mau_from_site_course
 from figures.models import CourseMauMetrics
-from figures.sites import get_student_modules_for_course_in_site
+from figures.sites import site_course_ids
 
 
 def get_all_mau_for_site_course(site, courselike, month_for):
     """
     Extract a queryset of distinct MAU user ids for the site and course
     """
-    sm_recs = get_student_modules_for_course_in_site(site,
-                                                     as_course_key(courselike))
-    mau_ids = get_mau_from_student_modules(student_modules=sm_recs,
-                                           year=month_for.year,
-                                           month=month_for.month)
+    mau_ids = get_mau_from_site_course(site=site,
+                                       course_id=as_course_key(courselike),
+                                       year=month_for.year,
+                                       month=month_for.month,
+                                       collect=True)
 
     return mau_ids
 
@@ -88,3 +93,39 @@ def collect_course_mau(site, courselike, month_for, **kwargs):
                                    overwrite=overwrite)
 
     return obj, created
+
+
+def save_site_course_mau(site, month_for, mau_by_course, overwrite=False):
+    """
+    Stores the MAU for the site's courses into the Figures `CourseMauMetrics` model
+
+    `mau_by_course` should be a dict of course id strings to MAU counts
+
+    Returns a dict with the lists of `created`, `updated` and `skipped` records
+    """
+    return CourseMauMetrics.objects.save_metrics_for_courses(site=site,
+                                                             date_for=month_for,
+                                                             mau_by_course=mau_by_course,
+                                                             overwrite=overwrite)
+
+
+def collect_site_course_mau(site, month_for, **kwargs):
+    """
+    Extracts, transforms, loads the MAU data for all the site's courses
+
+    The same records as calling `collect_course_mau` for each of the site's
+    courses, with one grouped count query for the site instead of a count
+    query per course. Courses without active users get a zero MAU
+    """
+    overwrite = kwargs.get('overwrite', False)
+    month_for = as_date(month_for)
+    course_ids = [str(course_id) for course_id in site_course_ids(site)]
+    counts = monthly_active_user_counts_by_course(site=site,
+                                                  month_for=month_for,
+                                                  course_ids=course_ids,
+                                                  collect=True)
+    mau_by_course = dict((course_id, counts.get(course_id, 0)) for course_id in course_ids)
+    return save_site_course_mau(site=site,
+                                month_for=month_for,
+                                mau_by_course=mau_by_course,
+                                overwrite=overwrite)
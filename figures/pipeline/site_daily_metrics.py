@@ -10,15 +10,15 @@ from __future__ import absolute_import
 
 from django.db.models import Sum
 
-from figures.course import Course
+from figures.activity import active_user_ids
 from figures.helpers import as_course_key, as_datetime, next_day
+from figures.log import record_rows
 from figures.mau import site_mau_1g_for_month_as_of_day
-from figures.models import CourseDailyMetrics, SiteDailyMetrics
+from figures.models import CourseDailyMetrics, CourseFirstEnrollment, SiteDailyMetrics
 from figures.sites import (
     site_course_ids,
     get_courses_for_site,
     get_users_for_site,
-    get_student_modules_for_site,
 )
 from figures.pipeline.helpers import pipeline_date_for_rule
 
@@ -61,23 +61,20 @@ def get_course_ids_enrolled_on_or_before(site, date_for):
     """Best guess to get site courses created on or before the specified date
 
     CourseOverview does not have a reliable 'created' field
-    So we need to get the first enrollment for the courses
-    Unfortunately, we need to iterate over the courses OR create a complex and
-    slow query, so our implementation is the safe brute force to iterate over
-    courses, get the first enrollment and see if that enrollment is on or before
-    the date.
-
-    We will first implement this using `figures.course.Course` as it can
-    provide the first enrollment date for a course. There is a slight overhead
-    of an extra query in that `Course`'s contructor retrieves the site for the
-    course. If this turns out to be expensive, then we can furter optimize. But
-    first, let's see if we can do this withoutg duplicating code.
+    So we need to get the first enrollment for the courses and see if that
+    enrollment is on or before the date.
+
+    The first enrollment timestamps come from the `CourseFirstEnrollment`
+    index, which is brought up to date with a single grouped query for the
+    site's courses not yet indexed. See
+    `figures.models.CourseFirstEnrollmentManager.refresh_for_site`
     """
-    found_course_ids = []
     compare_date = next_day(as_datetime(date_for))
-    for course_id in site_course_ids(site):
-        course = Course(course_id)
-        course_fe_ts = course.first_enrollment_timestamp()
+    course_ids = site_course_ids(site)
+    first_enrollments = CourseFirstEnrollment.objects.refresh_for_site(site, course_ids)
+    found_course_ids = []
+    for course_id in course_ids:
+        course_fe_ts = first_enrollments.get(str(course_id))
         if course_fe_ts and course_fe_ts < compare_date:
             found_course_ids.append(course_id)
     return found_course_ids
@@ -87,19 +84,11 @@ def get_site_active_users_for_date(site, date_for):
     '''
     Get the active users ids for the given site and date
 
-    We do this by filtering StudentModule for courses in the site, then
-    for StudentModule records filtered for the date, then we get the distinct
-    user ids
+    We get the distinct user ids for the site and date from the daily
+    learner activity table, collecting the day first if needed. See
+    `figures.activity`
     '''
-    student_modules = get_student_modules_for_site(site)
-
-    # For Ginkgo backward compatibility, Django 1.8 does not support
-    # `modified__date=<some_value>` in filters. Therefore, we need to match
-    # each date field
-    return student_modules.filter(modified__year=date_for.year,
-                                  modified__month=date_for.month,
-                                  modified__day=date_for.day).values_list(
-        'student__id', flat=True).distinct()
+    return active_user_ids(date_for, site=site, collect=True)
 
 
 def get_previous_cumulative_active_user_count(site, date_for):
@@ -158,7 +147,7 @@ class SiteDailyMetricsExtractor(object):
 
         todays_active_users = get_site_active_users_for_date(site, date_for)
         todays_active_user_count = todays_active_users.count()
-        mau = site_mau_1g_for_month_as_of_day(site, date_for)
+        mau = site_mau_1g_for_month_as_of_day(site, date_for, collect=True)
 
         data['todays_active_user_count'] = todays_active_user_count
         data['cumulative_active_user_count'] = get_previous_cumulative_active_user_count(
@@ -213,4 +202,5 @@ class SiteDailyMetricsLoader(object):
                 mau=data['mau'],
             )
         )
+        record_rows(written=1)
         return site_metrics, created
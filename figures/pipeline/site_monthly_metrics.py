@@ -3,27 +3,36 @@
 """
 
 from __future__ import absolute_import
-from datetime import datetime
-from django.db import connection
-from django.db.models import IntegerField
+from datetime import date, datetime
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import IntegerField, Max, Min
 from django.utils.timezone import utc
 from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrule, MONTHLY
 
 from figures.compat import RELEASE_LINE
+from figures.log import record_rows
 from figures.models import SiteMonthlyMetrics
 from figures.sites import get_student_modules_for_site
+from figures.time_windows import filter_month, month_window
 
 
 def _get_fill_month_raw_sql_for_month(site_ids, month_for):
     """Return a string for the raw SQL statement to get distinct student_id counts.
     """
     # this is just a separate function so it can be patched in test to acccommodate sqlite
+    # The month is a half open datetime range so MySQL can use the `modified`
+    # index. See `figures.time_windows`
+    start, end = month_window(month_for)
     return """\
     SELECT COUNT(DISTINCT student_id) from courseware_studentmodule
     where id in {}
-    and MONTH(modified) = {}
-    and YEAR(modified) = {}
-    """.format(site_ids, month_for.month, month_for.year)
+    and modified >= '{}'
+    and modified < '{}'
+    """.format(site_ids,
+               start.strftime('%Y-%m-%d %H:%M:%S'),
+               end.strftime('%Y-%m-%d %H:%M:%S'))
 
 
 def fill_month(site, month_for, student_modules=None, overwrite=False, use_raw=False):
@@ -34,8 +43,7 @@ def fill_month(site, month_for, student_modules=None, overwrite=False, use_raw=F
 
     if student_modules:
         if not use_raw:
-            month_sm = student_modules.filter(modified__year=month_for.year,
-                                              modified__month=month_for.month)
+            month_sm = filter_month(student_modules, month_for)
             mau_count = month_sm.values_list('student_id',
                                              flat=True).distinct().count()
         else:
@@ -65,6 +73,7 @@ def fill_month(site, month_for, student_modules=None, overwrite=False, use_raw=F
                                                 month=month_for.month,
                                                 active_user_count=mau_count,
                                                 overwrite=overwrite)
+    record_rows(written=1)
     return obj, created
 
 
@@ -74,3 +83,92 @@ def fill_last_month(site, overwrite=False):
     # Maybe we want to make 'last_month' a 'figures.helpers' method
     last_month = datetime.utcnow().replace(tzinfo=utc) - relativedelta(months=1)
     return fill_month(site=site, month_for=last_month, overwrite=overwrite)
+
+
+DEFAULT_MONTHLY_METRICS_BACKFILL_CHUNK_SIZE = 100000
+
+
+def monthly_metrics_backfill_chunk_size():
+    """Returns the number of StudentModule ids read per query by `fill_months`
+
+    Override by setting ``MONTHLY_METRICS_BACKFILL_CHUNK_SIZE`` in the Figures
+    settings
+    """
+    chunk_size = settings.ENV_TOKENS['FIGURES'].get('MONTHLY_METRICS_BACKFILL_CHUNK_SIZE',
+                                                    DEFAULT_MONTHLY_METRICS_BACKFILL_CHUNK_SIZE)
+    return max(1, int(chunk_size))
+
+
+def as_month(month_for):
+    """Return the first day of the month for a date or datetime
+    """
+    return date(year=month_for.year, month=month_for.month, day=1)
+
+
+def monthly_active_user_counts(student_modules, start_month, end_month, chunk_size=None):
+    """Return the distinct student counts for each month in a single pass
+
+    Returns a dict of the first day of each month from `start_month` through
+    `end_month` to the number of distinct students with StudentModule
+    records modified in the month. Months without activity have a zero count.
+
+    The StudentModule records are read once, in ranges of `chunk_size` ids,
+    so no single query returns the whole history. Each student is kept once
+    per month in memory, so memory use is the sum of the monthly active users
+    and not the number of StudentModule records
+    """
+    chunk_size = chunk_size or monthly_metrics_backfill_chunk_size()
+    start_month = as_month(start_month)
+    end_month = as_month(end_month)
+    students = dict((as_month(dt), set()) for dt in
+                    rrule(freq=MONTHLY, dtstart=start_month, until=end_month))
+    window_start = month_window(start_month)[0]
+    window_end = month_window(end_month)[1]
+    month_sm = student_modules.filter(modified__gte=window_start,
+                                      modified__lt=window_end).order_by()
+    id_range = month_sm.aggregate(min_id=Min('id'), max_id=Max('id'))
+    if id_range['min_id'] is not None:
+        for chunk_start in range(id_range['min_id'], id_range['max_id'] + 1, chunk_size):
+            rows = month_sm.filter(id__gte=chunk_start,
+                                   id__lt=chunk_start + chunk_size).values_list(
+                'student_id', 'modified')
+            for student_id, modified in rows.iterator():
+                students[date(modified.year, modified.month, 1)].add(student_id)
+    return dict((month_for, len(ids)) for month_for, ids in students.items())
+
+
+def fill_months(site, start_month, end_month, student_modules=None, overwrite=False):
+    """Fill the site monthly metrics for a range of months in a single pass
+
+    Counts the monthly active users with `monthly_active_user_counts`, then
+    creates the missing SiteMonthlyMetrics records with one bulk insert.
+    Existing records are kept unless `overwrite` is True, in which case only
+    the records with a different count are updated.
+
+    Returns a list of ``(SiteMonthlyMetrics, created)`` tuples in month order
+    """
+    if student_modules is None:
+        student_modules = get_student_modules_for_site(site)
+    counts = monthly_active_user_counts(student_modules, start_month, end_month)
+    existing = dict((obj.month_for, obj) for obj in SiteMonthlyMetrics.objects.filter(
+        site=site, month_for__in=list(counts.keys())))
+    results = []
+    new_objs = []
+    with transaction.atomic():
+        for month_for in sorted(counts.keys()):
+            obj = existing.get(month_for)
+            if obj is None:
+                obj = SiteMonthlyMetrics(site=site,
+                                         month_for=month_for,
+                                         active_user_count=counts[month_for])
+                new_objs.append(obj)
+                results.append((obj, True))
+                continue
+            if overwrite and obj.active_user_count != counts[month_for]:
+                obj.active_user_count = counts[month_for]
+                obj.save()
+                record_rows(written=1)
+            results.append((obj, False))
+        SiteMonthlyMetrics.objects.bulk_create(new_objs)
+    record_rows(written=len(new_objs))
+    return results
@@ -3,7 +3,10 @@ This module exists as a quick fix to prevent cyclical dependencies
 """
 from figures.compat import (
     chapter_grade_values,
-    course_grade_from_course_id
+    course_for_grades,
+    course_grade_from_course,
+    course_grade_from_course_id,
+    get_course_in_cache,
 )
 
 
@@ -24,16 +27,22 @@ class EnrollmentProgress(object):
     Perhaps rework this class as a convenience wrapper around the platform's
     'course_grade' structure, then get rid of metrics.LearnerCourseGrades
     """
-    def __init__(self, user, course_id, **_kwargs):
+    def __init__(self, user, course_id, course_grade=None, **_kwargs):
         """
         If figures.compat.course_grade is unable to retrieve the course blocks,
         it raises:
 
             django.core.exceptions.PermissionDenied(
                 "User does not have access to this course")
+
+        If `course_grade` is not provided, then the course is loaded from the
+        modulestore to get the learner's course grade. Use `CourseProgress` to
+        get the progress of multiple learners in the same course
         """
-        self.course_grade = course_grade_from_course_id(learner=user,
-                                                        course_id=course_id)
+        if course_grade is None:
+            course_grade = course_grade_from_course_id(learner=user,
+                                                       course_id=course_id)
+        self.course_grade = course_grade
         self.progress = self._get_progress()
 
     # Can be a class method instead of instance
@@ -98,3 +107,47 @@ class EnrollmentProgress(object):
             sections_worked=sections_worked,
             sections_possible=sections_possible,
         )
+
+
+class CourseProgress(object):
+    """
+    Gets the `EnrollmentProgress` of learners in a course
+
+    `EnrollmentProgress` loads the course from the modulestore for each learner.
+    This class loads the course and its collected block structure once, the
+    first time a learner's progress is requested, then reuses them for each
+    learner in the course.
+
+    If the course cannot be loaded, the exception is raised again for each
+    learner without trying to load the course again.
+    """
+    def __init__(self, course_id):
+        self.course_id = course_id
+        self._course = None
+        self._collected_block_structure = None
+        self._load_error = None
+
+    def _load_course(self):
+        if self._load_error:
+            raise self._load_error
+        if self._course is None:
+            try:
+                course = course_for_grades(self.course_id)
+                self._collected_block_structure = get_course_in_cache(course.id)
+            except Exception as e:
+                self._load_error = e
+                raise
+            self._course = course
+        return self._course
+
+    def enrollment_progress(self, user):
+        """Return the `EnrollmentProgress` for the learner in this course
+        """
+        course = self._load_course()
+        grade = course_grade_from_course(
+            learner=user,
+            course=course,
+            collected_block_structure=self._collected_block_structure)
+        return EnrollmentProgress(user=user,
+                                  course_id=self.course_id,
+                                  course_grade=grade)
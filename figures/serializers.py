@@ -50,6 +50,7 @@ from figures.models import (
     SiteMauMetrics,
     LearnerCourseGradeMetrics,
     PipelineError,
+    PipelineStage,
     )
 from figures.pipeline.logger import log_error
 import figures.sites
@@ -756,6 +757,32 @@ class SiteMauMetricsSerializer(serializers.ModelSerializer):
         fields = ['mau', 'date_for', 'domain']
 
 
+class PipelineStageSerializer(serializers.ModelSerializer):
+    run_name = serializers.CharField(source='run.name', default=None)
+
+    class Meta:
+        model = PipelineStage
+        fields = ['id', 'run', 'run_name', 'site', 'course_id', 'stage',
+                  'status', 'started', 'finished', 'elapsed', 'rows_read',
+                  'rows_written', 'query_count', 'query_time', 'grade_calls']
+        read_only_fields = fields
+
+
+class PipelineStageTotalsSerializer(serializers.Serializer):
+    """Serializes the ledger stage totals from `figures.pipeline.ledger.slowest`
+    """
+    key = serializers.CharField()
+    stage_count = serializers.IntegerField()
+    total_elapsed = serializers.FloatField()
+    max_elapsed = serializers.FloatField()
+    mean_elapsed = serializers.FloatField()
+    total_rows_read = serializers.IntegerField()
+    total_rows_written = serializers.IntegerField()
+    total_query_count = serializers.IntegerField()
+    total_query_time = serializers.FloatField()
+    total_grade_calls = serializers.IntegerField()
+
+
 class SiteMauLiveMetricsSerializer(serializers.Serializer):
 
     month_for = serializers.DateField()
@@ -87,6 +87,17 @@ def update_celerybeat_schedule(
             'options': {'queue': figures_tasks_queue},
             }
 
+    # The stale enrollment queue is off by default. When it is on, the queued
+    # enrollments' data are also updated every hour
+    if figures_env_tokens.get('ENABLE_STALE_ENROLLMENT_QUEUE', False):
+        celerybeat_schedule_settings['figures-stale-enrollment-data'] = {
+            'task': 'figures.tasks.update_stale_enrollment_data',
+            'schedule': crontab(
+                minute=figures_env_tokens.get('STALE_ENROLLMENT_DATA_MINUTE', 30),
+                ),
+            'options': {'queue': figures_tasks_queue},
+            }
+
     if figures_env_tokens.get('ENABLE_FIGURES_MONTHLY_METRICS', True):
         celerybeat_schedule_settings['figures-monthly-metrics'] = {
             'task': 'figures.tasks.run_figures_monthly_metrics',
@@ -0,0 +1,112 @@
+"""Signal receivers for Figures
+
+The receivers are connected in `figures.apps.FiguresConfig.ready`
+"""
+
+from __future__ import absolute_import
+import logging
+
+from django.contrib.sites.models import Site
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+import organizations
+
+from figures.cache import sites_cache
+from figures.compat import COURSE_GRADE_CHANGED, CourseOverview, StudentModule, on_commit
+from figures.models import StaleEnrollment
+from figures.pipeline.enrollment_metrics_next import stale_enrollment_queue_enabled
+
+
+logger = logging.getLogger(__name__)
+
+
+def invalidate_sites_cache(sender, **kwargs):  # pylint: disable=unused-argument
+    """Invalidate the cached site and course mappings in `figures.sites`
+
+    The cache is invalidated when the change is committed. Invalidating it
+    before then would let another process cache the old mappings again until
+    the next invalidation. On Ginkgo, it is invalidated immediately
+    """
+    if on_commit is None:
+        sites_cache.invalidate()
+    else:
+        on_commit(sites_cache.invalidate, using=kwargs.get('using'))
+
+
+def connect_sites_cache_receivers():
+    """Invalidate the sites cache when the models the mappings come from change
+
+    In multisite mode, organizations are linked to sites with the `sites` many
+    to many field in Appsembler's fork of `edx-organizations`
+    """
+    senders = [
+        organizations.models.Organization,
+        organizations.models.OrganizationCourse,
+        CourseOverview,
+        Site,
+    ]
+    for sender in senders:
+        for signal_name, signal in (('post_save', post_save),
+                                    ('post_delete', post_delete)):
+            signal.connect(invalidate_sites_cache,
+                           sender=sender,
+                           dispatch_uid='figures.sites_cache.{}.{}'.format(
+                               sender.__name__, signal_name))
+    if hasattr(organizations.models.Organization, 'sites'):
+        m2m_changed.connect(invalidate_sites_cache,
+                            sender=organizations.models.Organization.sites.through,
+                            dispatch_uid='figures.sites_cache.organization_sites')
+
+
+def queue_stale_enrollment(user_id, course_id):
+    """Add the enrollment to the stale enrollment queue, if the queue is enabled
+
+    The receivers are called in the LMS's request or task that changed the
+    enrollment. The enrollment is queued once the LMS's transaction commits,
+    so Figures never writes in the LMS's transaction, and errors are logged
+    and not raised. Django 1.8 (Ginkgo) has no `on_commit`, so there the
+    enrollment is queued immediately, in its own savepoint
+    """
+    if not stale_enrollment_queue_enabled():
+        return
+
+    def mark():
+        try:
+            StaleEnrollment.objects.mark(user_id=user_id, course_id=course_id)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Figures could not queue stale enrollment. user_id:%s, course_id:%s',
+                             user_id, course_id)
+
+    if on_commit is None:
+        mark()
+    else:
+        on_commit(mark)
+
+
+def student_module_saved(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Queue the enrollment of the saved StudentModule record
+    """
+    queue_stale_enrollment(user_id=instance.student_id, course_id=instance.course_id)
+
+
+def course_grade_changed(sender, user, course_key, **kwargs):  # pylint: disable=unused-argument
+    """Queue the enrollment whose course grade changed
+    """
+    queue_stale_enrollment(user_id=user.id, course_id=course_key)
+
+
+def connect_stale_enrollment_receivers():
+    """Queue enrollments for enrollment data update when they change
+
+    Learner activity saves StudentModule records. The course grade can also
+    change without learner activity, for example when problems are rescored or
+    grades are overridden, and the LMS then sends `COURSE_GRADE_CHANGED`.
+    StudentModule changes made with queryset updates do not send signals.
+    Backfill the enrollment data to catch those up. See `figures.models.StaleEnrollment`
+    """
+    post_save.connect(student_module_saved,
+                      sender=StudentModule,
+                      dispatch_uid='figures.stale_enrollment.student_module')
+    if COURSE_GRADE_CHANGED is not None:
+        COURSE_GRADE_CHANGED.connect(course_grade_changed,
+                                     dispatch_uid='figures.stale_enrollment.course_grade')
@@ -19,6 +19,7 @@ from django.conf import settings
 # TODO: Add exception handling
 import organizations
 
+from figures.cache import sites_cache
 from figures.compat import (
     CourseEnrollment,
     CourseOverview,
@@ -93,10 +94,16 @@ def default_site():
     return None
 
 
+def _site_cache_key(site):
+    return '{}:{}'.format('multi' if is_multisite() else 'single', site_to_id(site))
+
+
 def get_site_for_course(course_id):
     """
     Given a course, return the related site or None
 
+    Results are cached. See `figures.cache`
+
     For standalone mode, will always return the site
     For multisite mode, will return the site if there is a mapping between the
     course and the site. Otherwise `None` is returned
@@ -114,6 +121,13 @@ def get_site_for_course(course_id):
     For Figures views and serializers, this should only fail when called for
     a specific site that has mulitple orgs
     """
+    return sites_cache.get_or_set(
+        'site_for_course',
+        '{}:{}'.format('multi' if is_multisite() else 'single', str(course_id)),
+        lambda: _get_site_for_course(course_id))
+
+
+def _get_site_for_course(course_id):
     if is_multisite():
         org_courses = organizations.models.OrganizationCourse.objects.filter(
             course_id=str(course_id))
@@ -152,31 +166,31 @@ def get_organizations_for_site(site):
 def site_course_ids(site):
     """Return a list of string course ids for the site
 
-    TODO: Need to fix how this works as multisite gets a queryset and
-    standalone gets a list
+    Results are cached. See `figures.cache`
     """
+    return sites_cache.get_or_set('site_course_ids',
+                                  _site_cache_key(site),
+                                  lambda: _site_course_ids(site))
+
+
+def _site_course_ids(site):
     if is_multisite():
-        return organizations.models.OrganizationCourse.objects.filter(
-                organization__sites__in=[site]).values_list('course_id', flat=True)
+        return list(organizations.models.OrganizationCourse.objects.filter(
+                organization__sites__in=[site]).values_list('course_id', flat=True))
     else:
-        # Needs work. See about returning a queryset
         return [str(key) for key in CourseOverview.objects.all().values_list(
             'id', flat=True)]
 
 
 def get_course_keys_for_site(site):
-    """
-
-    Developer note: We could improve this function with caching
-    Question is which is the most efficient way to know cache expiry
+    """Return a list of the course keys for the site
 
-    We may also be able to reduce the queries here to also improve performance
+    Results are cached. See `figures.cache`
     """
-    if is_multisite():
-        course_ids = site_course_ids(site)
-    else:
-        course_ids = CourseOverview.objects.all().values_list('id', flat=True)
-    return [as_course_key(cid) for cid in course_ids]
+    return sites_cache.get_or_set(
+        'course_keys_for_site',
+        _site_cache_key(site),
+        lambda: [as_course_key(cid) for cid in site_course_ids(site)])
 
 
 def get_courses_for_site(site):
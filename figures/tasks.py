@@ -8,9 +8,9 @@ from __future__ import absolute_import
 import datetime
 import time
 
-import six
 import waffle
 
+from django.conf import settings
 from django.contrib.sites.models import Site
 from django.utils.timezone import utc
 
@@ -18,23 +18,41 @@ from celery import chord, group
 from celery.app import shared_task
 from celery.utils.log import get_task_logger
 
-from figures.compat import CourseEnrollment, CourseOverview
+from figures.activity import (
+    active_user_bitmaps_enabled,
+    approximate_active_users_enabled,
+    collect_daily_activity,
+    ensure_daily_activity,
+    ensure_daily_bitmaps,
+    ensure_daily_sketches,
+)
+from figures.cache import with_sites_memo
+from figures.compat import CourseEnrollment
 from figures.course import Course
 from figures.helpers import as_course_key, as_date, is_past_date, is_multisite
-from figures.log import log_exec_time
-from figures.models import EnrollmentData
+from figures.log import log_exec_time, with_query_instrumentation
+from figures.models import EnrollmentDataBackfill, StaleEnrollment
 from figures.sites import default_site, get_sites, get_sites_by_id, site_course_ids
 
-from figures.pipeline.backfill import backfill_enrollment_data_for_site
-from figures.pipeline.course_daily_metrics import CourseDailyMetricsLoader
+from figures.pipeline.backfill import (
+    backfill_enrollment_data,
+    backfill_enrollment_data_for_site,
+)
+from figures.pipeline.course_daily_metrics import (
+    BulkCourseDailyMetricsLoader,
+    CourseDailyMetricsLoader,
+    get_excluded_user_ids_by_course,
+)
 from figures.pipeline.site_daily_metrics import SiteDailyMetricsLoader
-from figures.pipeline.mau_pipeline import collect_course_mau
-from figures.pipeline.helpers import DateForCannotBeFutureError
+from figures.pipeline.mau_pipeline import collect_course_mau, collect_site_course_mau
+from figures.pipeline.helpers import DateForCannotBeFutureError, pipeline_date_for_rule
 from figures.pipeline.site_monthly_metrics import fill_last_month as fill_last_smm_month
 from figures.pipeline.enrollment_metrics_next import (
+    stale_enrollment_queue_enabled,
     update_enrollment_data_for_course,
-    stale_course_enrollments,
+    update_stale_enrollment_data_for_course,
 )
+from figures.pipeline.ledger import pipeline_run, pipeline_stage, prune_pipeline_ledger
 
 
 logger = get_task_logger(__name__)
@@ -52,11 +70,19 @@ FPM_LOG_PREFIX = 'FIGURES:PIPELINE:MONTHLY'
 
 WAFFLE_DISABLE_PIPELINE = 'figures.disable_pipeline'
 
+DEFAULT_DAILY_METRICS_COURSE_BATCH_SIZE = 20
+
 
 @shared_task
-def populate_single_cdm(course_id, date_for=None, ed_next=False, force_update=False):
+@with_sites_memo
+@with_query_instrumentation
+def populate_single_cdm(course_id, date_for=None, ed_next=False, force_update=False,
+                        excluded_user_ids=None):
     """Populates a CourseDailyMetrics record for the given date and course
 
+    `excluded_user_ids` is an optional list of the course's staff user ids,
+    precomputed by the caller for all the site's courses
+
     The calling function is responsible for error handling calls to this
     function
     """
@@ -73,13 +99,18 @@ def populate_single_cdm(course_id, date_for=None, ed_next=False, force_update=Fa
     start_time = time.time()
 
     cdm_obj, _created = CourseDailyMetricsLoader(
-        course_id).load(date_for=date_for, ed_next=ed_next, force_update=force_update)
+        course_id,
+        excluded_user_ids=excluded_user_ids).load(date_for=date_for,
+                                                  ed_next=ed_next,
+                                                  force_update=force_update)
     elapsed_time = time.time() - start_time
     logger.debug('done. Elapsed time (seconds)={}. cdm_obj={}'.format(
         elapsed_time, cdm_obj))
 
 
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
 def populate_single_sdm(site_id, date_for, force_update=False):
     """Populate a SiteDailyMetrics record
 
@@ -96,9 +127,69 @@ def populate_single_sdm(site_id, date_for, force_update=False):
         'done running populate_site_daily_metrics for site_id={}'.format(site_id))
 
 
+def load_course_daily_metrics(site, course_ids, date_for, on_course_fail,
+                              ed_next=False, force_update=False, excluded_user_ids=None):
+    """Populate the CourseDailyMetrics records for a set of the site's courses
+
+    The records are extracted and written together with
+    `BulkCourseDailyMetricsLoader`, so the number of queries does not grow
+    with the number of courses. If the bulk load fails, then we fall back to
+    populating each course with `populate_single_cdm`.
+
+    `on_course_fail` is called with the course id and the error for each
+    course that fails validation or fails its fallback load.
+
+    Returns the list of the processed course ids
+    """
+    processed = []
+    if not course_ids:
+        return processed
+    try:
+        results = BulkCourseDailyMetricsLoader(
+            site=site,
+            course_ids=course_ids,
+            excluded_user_ids=excluded_user_ids).load(date_for=date_for,
+                                                      ed_next=ed_next,
+                                                      force_update=force_update)
+    except Exception as e:  # pylint: disable=broad-except
+        msg = ('{prefix}:SITE:BULK:FAIL:load_course_daily_metrics.'
+               ' site_id:{site_id}, date_for:{date_for}. Falling back to per course'
+               ' exception:{exception}')
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                    site_id=site.id,
+                                    date_for=date_for,
+                                    exception=e))
+        for course_id in course_ids:
+            course_excluded_user_ids = None
+            if excluded_user_ids is not None:
+                course_excluded_user_ids = list(excluded_user_ids.get(str(course_id), []))
+            try:
+                populate_single_cdm(course_id=course_id,
+                                    date_for=date_for,
+                                    ed_next=ed_next,
+                                    force_update=force_update,
+                                    excluded_user_ids=course_excluded_user_ids)
+                processed.append(course_id)
+            except Exception as e:  # pylint: disable=broad-except
+                on_course_fail(course_id, e)
+    else:
+        invalid = dict((rec['course_id'], rec['error']) for rec in results['errors'])
+        for course_id in course_ids:
+            if str(course_id) in invalid:
+                on_course_fail(course_id, invalid[str(course_id)])
+            else:
+                processed.append(course_id)
+    return processed
+
+
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
 def populate_daily_metrics_for_site(site_id, date_for, ed_next=False, force_update=False):
     """Collect metrics for the given site and date
+
+    The site's CourseDailyMetrics records are loaded together. See
+    `load_course_daily_metrics`
     """
     try:
         site = Site.objects.get(id=site_id)
@@ -108,30 +199,48 @@ def populate_daily_metrics_for_site(site_id, date_for, ed_next=False, force_upda
         logger.exception(msg.format(prefix=FPD_LOG_PREFIX, site_id=site_id))
         raise e
 
-    for course_id in site_course_ids(site):
-        try:
-            if ed_next:
-                update_enrollment_data_for_course(course_id)
-
-            populate_single_cdm(course_id=course_id,
-                                date_for=date_for,
-                                ed_next=ed_next,
-                                force_update=force_update)
-        except Exception as e:  # pylint: disable=broad-except
-            msg = ('{prefix}:SITE:COURSE:FAIL:populate_daily_metrics_for_site.'
-                   ' site_id:{site_id}, date_for:{date_for}. course_id:{course_id}'
-                   ' exception:{exception}')
-            logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
-                                        site_id=site_id,
-                                        date_for=date_for,
-                                        course_id=str(course_id),
-                                        exception=e))
-    populate_single_sdm(site_id=site.id,
-                        date_for=date_for,
-                        force_update=force_update)
+    course_ids = site_course_ids(site)
+    # Retrieve the course staff for all the site's courses in one query
+    excluded_user_ids = get_excluded_user_ids_by_course(course_ids)
+
+    def log_course_fail(course_id, exception):
+        msg = ('{prefix}:SITE:COURSE:FAIL:populate_daily_metrics_for_site.'
+               ' site_id:{site_id}, date_for:{date_for}. course_id:{course_id}'
+               ' exception:{exception}')
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                    site_id=site_id,
+                                    date_for=date_for,
+                                    course_id=str(course_id),
+                                    exception=exception))
+
+    if ed_next:
+        ed_failed = []
+        for course_id in daily_enrollment_data_course_ids(course_ids):
+            try:
+                with pipeline_stage('enrollment_data', site=site, course_id=course_id):
+                    update_daily_enrollment_data(course_id)
+            except Exception as e:  # pylint: disable=broad-except
+                log_course_fail(course_id, e)
+                ed_failed.append(course_id)
+        course_ids = [course_id for course_id in course_ids if course_id not in ed_failed]
+
+    with pipeline_stage('course_daily_metrics', site=site):
+        load_course_daily_metrics(site=site,
+                                  course_ids=course_ids,
+                                  date_for=date_for,
+                                  on_course_fail=log_course_fail,
+                                  ed_next=ed_next,
+                                  force_update=force_update,
+                                  excluded_user_ids=excluded_user_ids)
+    with pipeline_stage('site_daily_metrics', site=site):
+        populate_single_sdm(site_id=site.id,
+                            date_for=date_for,
+                            force_update=force_update)
 
 
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
 def update_enrollment_data_for_site(site_id, **_kwargs):
     """Original task to collect `EnrollmentData` records
 
@@ -163,7 +272,119 @@ def update_enrollment_data_for_site(site_id, **_kwargs):
         logger.exception(msg)
 
 
+def daily_enrollment_data_course_ids(course_ids):
+    """Return the ids of the courses the daily pipeline updates enrollment data for
+
+    With the stale enrollment queue, these are the courses with queued
+    enrollments. Otherwise they are all the given courses
+    """
+    if not stale_enrollment_queue_enabled():
+        return list(course_ids)
+    queued = StaleEnrollment.objects.course_ids(course_ids)
+    return [course_id for course_id in course_ids if str(course_id) in queued]
+
+
+def update_daily_enrollment_data(course_id):
+    """Update the course's enrollment data for the daily pipeline
+
+    With the stale enrollment queue, the queued enrollments are updated.
+    Otherwise the enrollments active yesterday are
+    """
+    if stale_enrollment_queue_enabled():
+        return update_stale_enrollment_data_for_course(course_id)
+    return update_enrollment_data_for_course(course_id)
+
+
+@shared_task
+@with_sites_memo
+@with_query_instrumentation
+def update_stale_enrollment_data_for_site(site_id):
+    """Update the enrollment data of the site's queued stale enrollments
+
+    Only the site's courses with queued enrollments are processed. Errors are
+    logged for each course so that one course does not stop the others.
+    See `figures.models.StaleEnrollment`
+    """
+    site = Site.objects.get(id=site_id)
+    for course_id in daily_enrollment_data_course_ids(site_course_ids(site)):
+        try:
+            with pipeline_stage('enrollment_data', site=site, course_id=course_id):
+                update_stale_enrollment_data_for_course(course_id)
+        except Exception:  # pylint: disable=broad-except
+            msg = ('{prefix}:SITE:COURSE:FAIL:update_stale_enrollment_data_for_site.'
+                   ' site_id:{site_id}, course_id:{course_id}')
+            logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                        site_id=site_id,
+                                        course_id=str(course_id)))
+
+
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
+def update_stale_enrollment_data(site_id=None):
+    """Update the enrollment data of the queued stale enrollments
+
+    This is the micro-batch task for the stale enrollment queue. It can be
+    scheduled to run more often than the daily pipeline, so that progress data
+    is refreshed during the day. See `ENABLE_STALE_ENROLLMENT_QUEUE` in
+    `figures.settings.lms_production`. It does nothing if the queue is not
+    enabled
+    """
+    if waffle.switch_is_active(WAFFLE_DISABLE_PIPELINE):
+        logger.warning('Figures pipeline is disabled due to %s being active.',
+                       WAFFLE_DISABLE_PIPELINE)
+        return
+    if not stale_enrollment_queue_enabled():
+        return
+
+    if site_id is not None:
+        sites = get_sites_by_id((site_id, ))
+    else:
+        sites = get_sites()
+    with pipeline_run('update_stale_enrollment_data'):
+        for site in sites:
+            try:
+                update_stale_enrollment_data_for_site(site_id=site.id)
+            except Exception:  # pylint: disable=broad-except
+                msg = ('{prefix}:FAIL update_stale_enrollment_data unhandled site level'
+                       ' exception for site[{site_id}]={domain}')
+                logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                            site_id=site.id,
+                                            domain=site.domain))
+
+
+def collect_pipeline_daily_activity(date_for, force_update=False):
+    """Collect the daily learner activity for the pipeline date
+
+    This reads the day's StudentModule records once for all sites, before the
+    site pipelines aggregate over the activity. See `figures.activity`
+
+    The day's active user sketches and bitmaps are built here too if their
+    modes are enabled, including for a day collected before they were
+    enabled. Reads never build them
+
+    Errors are logged and not raised. The site pipelines collect the activity
+    themselves if it is missing
+    """
+    try:
+        activity_date_for = pipeline_date_for_rule(date_for)
+        with pipeline_stage('daily_activity'):
+            if force_update:
+                collect_daily_activity(activity_date_for)
+            else:
+                ensure_daily_activity(activity_date_for)
+            if approximate_active_users_enabled():
+                ensure_daily_sketches(activity_date_for)
+            if active_user_bitmaps_enabled():
+                ensure_daily_bitmaps(activity_date_for)
+    except Exception:  # pylint: disable=broad-except
+        msg = '{prefix}:FAIL collecting daily activity for date_for={date_for}'
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX, date_for=date_for))
+
+
+@shared_task
+@with_sites_memo
+@with_query_instrumentation
 def populate_daily_metrics(site_id=None, date_for=None, force_update=False):
     """Runs Figures daily metrics collection
 
@@ -225,6 +446,8 @@ def populate_daily_metrics(site_id=None, date_for=None, force_update=False):
                'calculated for past date {date_for}')
         logger.info(msg.format(date_for=date_for, prefix=FPD_LOG_PREFIX))
 
+    collect_pipeline_daily_activity(date_for, force_update=force_update)
+
     for i, site in enumerate(sites):
 
         msg = '{prefix}:SITE:START:{id}:{domain} - Site {i:04d} of {n:04d}'
@@ -245,10 +468,12 @@ def populate_daily_metrics(site_id=None, date_for=None, force_update=False):
                                         site_id=site.id,
                                         domain=site.domain))
 
-        # Until we implement signal triggers
         if do_update_enrollment_data:
             try:
-                update_enrollment_data_for_site(site_id=site.id)
+                if stale_enrollment_queue_enabled():
+                    update_stale_enrollment_data_for_site(site_id=site.id)
+                else:
+                    update_enrollment_data_for_site(site_id=site.id)
             except Exception:  # pylint: disable=broad-except
                 msg = ('{prefix}:FAIL figures.tasks update_enrollment_data_for_site '
                        ' unhandled exception. site[{site_id}]:{domain}')
@@ -270,6 +495,8 @@ def populate_daily_metrics(site_id=None, date_for=None, force_update=False):
 
 
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
 def populate_daily_metrics_next(site_id=None, force_update=False):
     """Next iteration to collect daily metrics for all sites in a deployment
 
@@ -283,6 +510,12 @@ def populate_daily_metrics_next(site_id=None, force_update=False):
     What's different?
 
     * Figures collects the enrollment data first, then aggregates daily data.
+    * With the stale enrollment queue enabled, only the queued enrollments'
+      data are updated. See `update_daily_enrollment_data`
+
+    The run and the time, rows and queries of each of its stages are recorded
+    in the pipeline ledger. Ledger records older than the retention period
+    are removed after the run. See `figures.pipeline.ledger`
 
     TODO: Draft up public architecture docs and reference them here
     """
@@ -292,6 +525,18 @@ def populate_daily_metrics_next(site_id=None, force_update=False):
         return
 
     date_for = datetime.datetime.utcnow().date()
+    with pipeline_run('populate_daily_metrics_next', date_for=date_for):
+        _populate_daily_metrics_next(date_for, site_id=site_id, force_update=force_update)
+    try:
+        prune_pipeline_ledger()
+    except Exception:  # pylint: disable=broad-except
+        msg = '{prefix}:FAIL prune_pipeline_ledger'
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX))
+
+
+def _populate_daily_metrics_next(date_for, site_id=None, force_update=False):
+    """Run `populate_daily_metrics_next` for the date
+    """
     if site_id is not None:
         sites = get_sites_by_id((site_id, ))
     else:
@@ -302,6 +547,9 @@ def populate_daily_metrics_next(site_id=None, force_update=False):
     logger.info(msg.format(prefix=FPD_LOG_PREFIX,
                            date_for=date_for,
                            site_count=sites_count))
+
+    collect_pipeline_daily_activity(date_for, force_update=force_update)
+
     for i, site in enumerate(sites):
         msg = '{prefix}:SITE:START:{id}:{domain} - Site {i:04d} of {n:04d}'
         logger.info(msg.format(prefix=FPD_LOG_PREFIX,
@@ -329,7 +577,9 @@ def populate_daily_metrics_next(site_id=None, force_update=False):
 
 
 @shared_task
-def backfill_enrollment_data_for_course(course_id):
+@with_sites_memo
+@with_query_instrumentation
+def backfill_enrollment_data_for_course(course_id, backfill_id=None):
     """Update EnrollmentData records for activity before "yesterday"
 
     This task function is to get `EnrollmentData` records up to date. This is
@@ -350,76 +600,244 @@ def backfill_enrollment_data_for_course(course_id):
     figures.pipeline.enrollment_metrics_next.update_enrollment_data_for_course
     ```
 
+    Progress is checkpointed in an `EnrollmentDataBackfill` record. If
+    `backfill_id` is given, that backfill is run. This is how the management
+    command runs a course's enrollment id ranges on separate workers.
+    Otherwise the course's unfinished backfill is resumed, or a new backfill
+    for all the course's enrollments is created.
+
     There is a Figures Django management command to run this task:
 
     ```
     backfill_figures_enrollment_data
     ```
     """
-    course = Course(course_id)
-    updated = []
-    for enrollment in stale_course_enrollments(course_id):
-        # `update_metrics` results are a (object, created_flag) tuple
-        updated.append(EnrollmentData.objects.update_metrics(course.site, enrollment))
+    if backfill_id:
+        backfill = EnrollmentDataBackfill.objects.get(id=backfill_id)
+    else:
+        backfill = EnrollmentDataBackfill.objects.for_range(site=Course(course_id).site,
+                                                            course_id=course_id)
+    processed_before = backfill.processed_count
+    with pipeline_run('backfill_enrollment_data_for_course', site=backfill.site):
+        backfill = backfill_enrollment_data(backfill)
 
     msg = ('figures.tasks.backfill_enrollment_data_for_course "{course_id}".'
            ' Updated {edrec_count} enrollment data records.')
-    logger.info(msg.format(course_id=course_id, edrec_count=len(updated)))
+    logger.info(msg.format(course_id=course_id,
+                           edrec_count=backfill.processed_count - processed_before))
 
 
 #
-# Daily Metrics Experimental Tasks
+# Daily Metrics Parallel Tasks
 #
 
 
+def daily_metrics_course_batch_size():
+    """Number of courses processed by each parallel daily metrics course task
+
+    Override by setting ``DAILY_METRICS_COURSE_BATCH_SIZE`` in the Figures
+    ENV_TOKENS. Smaller batches spread a site's courses across more workers.
+    Larger batches reduce the number of Celery tasks (and result backend
+    messages) per site.
+    """
+    batch_size = settings.ENV_TOKENS['FIGURES'].get(
+        'DAILY_METRICS_COURSE_BATCH_SIZE',
+        DEFAULT_DAILY_METRICS_COURSE_BATCH_SIZE)
+    return max(1, int(batch_size))
+
+
+def course_id_batches(course_ids, batch_size):
+    """Yield lists of course id strings of up to `batch_size` length
+    """
+    course_ids = [str(course_id) for course_id in course_ids]
+    for i in range(0, len(course_ids), batch_size):
+        yield course_ids[i:i + batch_size]
+
+
 @shared_task
-def experimental_populate_daily_metrics(date_for=None, force_update=False):
-    '''Experimental task to populate daily metrics
+@with_sites_memo
+@with_query_instrumentation
+def populate_cdm_for_courses(site_id, course_ids, date_for, ed_next=False, force_update=False):
+    """Populate CourseDailyMetrics records for a batch of courses in a site
+
+    This is the per course unit of work for the parallel daily pipeline. It is
+    run as a task in the chord header built by
+    `populate_daily_metrics_for_site_parallel`.
+
+    The batch's CourseDailyMetrics records are extracted and written together
+    with `BulkCourseDailyMetricsLoader`. If the bulk load fails, then we fall
+    back to populating each course with `populate_single_cdm`.
+
+    Each course is processed in its own `try/except` block. This is not only so
+    one failing course does not stop the other courses in the batch. If a task
+    in a chord header raises, then Celery does not run the chord callback, and
+    we would lose the site's SiteDailyMetrics record for the day.
+
+    Returns a dict with lists of the processed and the failed course ids
+    """
+    failed = []
+
+    def log_course_fail(course_id, exception):
+        msg = ('{prefix}:SITE:COURSE:FAIL:populate_cdm_for_courses.'
+               ' site_id:{site_id}, date_for:{date_for}. course_id:{course_id}'
+               ' exception:{exception}')
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                    site_id=site_id,
+                                    date_for=date_for,
+                                    course_id=str(course_id),
+                                    exception=exception))
+        failed.append(course_id)
+
+    if ed_next:
+        ed_failed = []
+        for course_id in daily_enrollment_data_course_ids(course_ids):
+            try:
+                update_daily_enrollment_data(course_id)
+            except Exception as e:  # pylint: disable=broad-except
+                log_course_fail(course_id, e)
+                ed_failed.append(course_id)
+        course_ids = [course_id for course_id in course_ids if course_id not in ed_failed]
+
+    processed = load_course_daily_metrics(site=Site.objects.get(id=site_id),
+                                          course_ids=course_ids,
+                                          date_for=date_for,
+                                          on_course_fail=log_course_fail,
+                                          ed_next=ed_next,
+                                          force_update=force_update)
+    return dict(processed=processed, failed=failed)
+
+
+@shared_task
+@with_sites_memo
+@with_query_instrumentation
+def populate_sdm_after_cdms(cdm_results, site_id, date_for, force_update=False):
+    """Chord callback to populate the SiteDailyMetrics record for a site
+
+    `cdm_results` is the list of dicts returned by the `populate_cdm_for_courses`
+    tasks in the chord header. Celery passes it as the first argument.
+
+    SiteDailyMetrics aggregates the site's CourseDailyMetrics records, so this
+    runs only after all the site's course tasks are done.
+    """
+    failed = [course_id for rec in cdm_results or [] for course_id in rec['failed']]
+    processed_count = sum(len(rec['processed']) for rec in cdm_results or [])
+    msg = ('{prefix}:SITE:CDM:DONE:site_id:{site_id}, date_for:{date_for},'
+           ' processed:{processed}, failed:{failed}')
+    logger.info(msg.format(prefix=FPD_LOG_PREFIX,
+                           site_id=site_id,
+                           date_for=date_for,
+                           processed=processed_count,
+                           failed=len(failed)))
+    try:
+        populate_single_sdm(site_id=site_id,
+                            date_for=date_for,
+                            force_update=force_update)
+    except Exception:  # pylint: disable=broad-except
+        msg = ('{prefix}:SITE:SDM:FAIL:populate_sdm_after_cdms.'
+               ' site_id:{site_id}, date_for:{date_for}')
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX,
+                                    site_id=site_id,
+                                    date_for=date_for))
+    return dict(site_id=site_id, failed_course_ids=failed)
+
+
+@shared_task
+@with_sites_memo
+@with_query_instrumentation
+def populate_daily_metrics_for_site_parallel(site_id, date_for, ed_next=False, force_update=False):
+    """Collect metrics for the given site and date as a Celery chord
+
+    This is the parallel counterpart to `populate_daily_metrics_for_site`.
+    Instead of looping over the site's courses, it splits the site's courses
+    into batches of `daily_metrics_course_batch_size()` courses. Each batch is
+    a `populate_cdm_for_courses` task in the chord header. The chord callback,
+    `populate_sdm_after_cdms` runs when all the site's course tasks are done.
+
+    Chords require a Celery result backend. How many course batch tasks run at
+    the same time is bounded by the workers consuming the Figures queue. See
+    `FIGURES_PIPELINE_TASKS_ROUTING_KEY` in `figures.settings.lms_production`
+    """
+    try:
+        site = Site.objects.get(id=site_id)
+    except Site.DoesNotExist as e:
+        msg = ('{prefix}:SITE:FAIL:populate_daily_metrics_for_site_parallel:site_id: '
+               '{site_id} does not exist')
+        logger.exception(msg.format(prefix=FPD_LOG_PREFIX, site_id=site_id))
+        raise e
+
+    # Task arguments need to be serializable
+    date_for = as_date(date_for).isoformat()
+    batches = course_id_batches(site_course_ids(site),
+                                daily_metrics_course_batch_size())
+    header = [populate_cdm_for_courses.s(site_id=site.id,
+                                         course_ids=batch,
+                                         date_for=date_for,
+                                         ed_next=ed_next,
+                                         force_update=force_update)
+              for batch in batches]
+    callback = populate_sdm_after_cdms.s(site_id=site.id,
+                                         date_for=date_for,
+                                         force_update=force_update)
+    if header:
+        return chord(header)(callback)
+    else:
+        # A chord with an empty header never calls its callback
+        return callback.delay([])
+
 
-    WARNING: In Ginkgo devstack, this task tends to gets stuck in the middle of
-    processing course metrics. Not all the courses get processed and the site
-    metrics doesn't get called.
+@shared_task
+@with_sites_memo
+@with_query_instrumentation
+def populate_daily_metrics_parallel(site_id=None, date_for=None, ed_next=True, force_update=False):
+    """Runs Figures daily metrics collection with a task per site and course batch
 
-    We're keeping it in the tasks so that we can continue to debug this.
-    Enabling parallel course tasks will improve the pipeline performance
+    This is the parallel mode of the daily pipeline. It can be scheduled instead
+    of `populate_daily_metrics_next` by setting the Figures `DAILY_TASK` setting
+    to `figures.tasks.populate_daily_metrics_parallel`
 
-    '''
-    def include_course(course_overview, threshold=50):
-        '''This function let's us skip over courses with many enrollments, speeding
-        up testing. Do not use for production
-        '''
-        count = CourseEnrollment.objects.filter(course_id=course_overview.id).count()
-        return False if count > threshold else True
+    Each site is processed by its own `populate_daily_metrics_for_site_parallel`
+    task. A failure for one site does not affect the other sites.
+    """
+    if waffle.switch_is_active(WAFFLE_DISABLE_PIPELINE):
+        logger.warning('Figures pipeline is disabled due to %s being active.',
+                       WAFFLE_DISABLE_PIPELINE)
+        return
 
+    today = datetime.datetime.utcnow().replace(tzinfo=utc).date()
     if date_for:
         date_for = as_date(date_for)
+        if date_for > today:
+            msg = '{prefix}:ERROR - Attempted pipeline call with future date: "{date_for}"'
+            raise DateForCannotBeFutureError(msg.format(prefix=FPD_LOG_PREFIX,
+                                                        date_for=date_for))
     else:
-        date_for = datetime.datetime.utcnow().replace(tzinfo=utc).date()
-    date_for = date_for.strftime("%Y-%m-%d")
-    logger.info(
-        'Starting task "figures.experimental_populate_daily_metrics" for date "{}"'.format(
-            date_for))
-
-    courses = CourseOverview.objects.all()
-    cdm_tasks = [
-        populate_single_cdm.s(
-            course_id=six.text_type(course.id),  # noqa: F821
-            date_for=date_for,
-            force_update=force_update) for course in courses if include_course(course)
-    ]
-    results = chord(cdm_tasks)(populate_single_sdm.s(
-        date_for=date_for, force_update=force_update))
-
-    # TODO: Are we going to update the SDM for the day if
-    # * course records were created, meaning there are data not added to the SDM
-    # * the SDM record already exists
-    # * force_update is not true
-
-    logger.info(
-        'Finished task "figures.experimental_populate_daily_metrics" for date "{}"'.format(
-            date_for))
-
-    return results
+        date_for = today
+
+    if site_id is not None:
+        sites = get_sites_by_id((site_id, ))
+    else:
+        sites = get_sites()
+    site_ids = [site.id for site in sites]
+
+    msg = '{prefix}:PARALLEL:START:date_for={date_for}, site_count={site_count}'
+    logger.info(msg.format(prefix=FPD_LOG_PREFIX,
+                           date_for=date_for,
+                           site_count=len(site_ids)))
+
+    collect_pipeline_daily_activity(date_for, force_update=force_update)
+
+    all_sites_jobs = group(
+        populate_daily_metrics_for_site_parallel.s(site_id=each_site_id,
+                                                   date_for=date_for.isoformat(),
+                                                   ed_next=ed_next,
+                                                   force_update=force_update)
+        for each_site_id in site_ids)
+    all_sites_jobs.delay()
+
+    msg = '{prefix}:PARALLEL:DISPATCHED:date_for={date_for}, site_count={site_count}'
+    logger.info(msg.format(prefix=FPD_LOG_PREFIX,
+                           date_for=date_for,
+                           site_count=len(site_ids)))
 
 
 #
@@ -428,6 +846,8 @@ def experimental_populate_daily_metrics(date_for=None, force_update=False):
 
 
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
 def populate_course_mau(site_id, course_id, month_for=None, force_update=False):
     """Populates the MAU for the given site, course, and month
     """
@@ -451,40 +871,60 @@ def populate_course_mau(site_id, course_id, month_for=None, force_update=False):
 
 
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
 def populate_mau_metrics_for_site(site_id, month_for=None, force_update=False):
     """
     Collect (save) MAU metrics for the specified site
 
-    Iterates over all courses in the site to collect MAU counts
+    Counts the MAU of all the courses in the site with one grouped query and
+    saves the course MAU records in bulk. See
+    `figures.pipeline.mau_pipeline.collect_site_course_mau`
     TODO: Decide how sites would be excluded and create filter
-    TODO: Check results of 'store_mau_metrics' to log unexpected results
     """
+    if month_for:
+        month_for = as_date(month_for)
+    else:
+        month_for = datetime.datetime.utcnow().date()
     site = Site.objects.get(id=site_id)
-    msg = 'Starting figures'
-    logger.info(msg)
-    for course_id in site_course_ids(site):
-        # 'course_id' should be string and not a CourseKey
-        # However, we cast to 'str' so that this function doesn't care whether
-        # the course identifier is a CourseKey type or a string
-        populate_course_mau(site_id=site_id,
-                            course_id=str(course_id),
-                            month_for=month_for,
-                            force_update=force_update)
+    start_time = time.time()
+    with pipeline_run('populate_mau_metrics_for_site', site=site, date_for=month_for):
+        with pipeline_stage('course_mau'):
+            results = collect_site_course_mau(site=site,
+                                              month_for=month_for,
+                                              overwrite=force_update)
+    msg = ('populate_mau_metrics_for_site site_id={} Elapsed time (seconds)={}. '
+           'created={}, updated={}, skipped={}')
+    logger.info(msg.format(site_id, time.time() - start_time,
+                           len(results['created']),
+                           len(results['updated']),
+                           len(results['skipped'])))
 
 
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
 def populate_all_mau():
     """
     Top level task to kick off MAU collection
 
     Initially, run it every day to observe monthly active user accumulation for
     the month and evaluate the results
+
+    In multisite mode, each site is collected in its own task
     """
-    for site in get_sites():
-        populate_mau_metrics_for_site(site_id=site.id, force_update=False)
+    if is_multisite():
+        all_sites_jobs = group(populate_mau_metrics_for_site.s(site_id=site.id,
+                                                               force_update=False)
+                               for site in get_sites())
+        all_sites_jobs.delay()
+    else:
+        populate_mau_metrics_for_site(site_id=default_site().id, force_update=False)
 
 
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
 def populate_monthly_metrics_for_site(site_id):
     try:
         site = Site.objects.get(id=site_id)
@@ -492,7 +932,9 @@ def populate_monthly_metrics_for_site(site_id):
             site_id, site.domain))
         msg = 'Ran populate_monthly_metrics_for_site. [{}]:{}'
         with log_exec_time(msg.format(site.id, site.domain)):
-            fill_last_smm_month(site=site)
+            with pipeline_run('populate_monthly_metrics_for_site', site=site):
+                with pipeline_stage('site_monthly_metrics'):
+                    fill_last_smm_month(site=site)
     except Site.DoesNotExist:
         msg = '{prefix}:SITE:ERROR: site_id:{site_id} Site does not exist'
         logger.error(msg.format(prefix=FPM_LOG_PREFIX, site_id=site_id))
@@ -502,6 +944,8 @@ def populate_monthly_metrics_for_site(site_id):
 
 
 @shared_task
+@with_sites_memo
+@with_query_instrumentation
 def run_figures_monthly_metrics():
     """
     Populate monthly metrics for all sites.
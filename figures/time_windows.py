@@ -0,0 +1,76 @@
+"""Half open time windows for filtering on datetime fields
+
+Figures filters `StudentModule` (and other models) on activity for a day, a
+month or a month up to and including a day. Filtering with date part lookups,
+like ``modified__year``, ``modified__month`` and ``modified__day``, makes the
+database apply a function to the column for every row. MySQL cannot use the
+index on the column for these filters, so they scan the table.
+
+This module expresses each window as a half open ``[start, end)`` range of UTC
+datetimes and filters with ``<field>__gte=start`` and ``<field>__lt=end``. The
+database can serve these range filters from the column's index. Using ``__lt``
+on midnight of the day after the window means we don't have to worry about
+fractions of a second on the last second of the window.
+
+These work on all the Django versions Figures supports, including Django 1.8
+for Ginkgo.
+"""
+
+from __future__ import absolute_import
+from datetime import datetime
+
+from django.utils.timezone import utc
+
+from figures.helpers import as_date, as_datetime, next_day
+
+
+def day_window(date_for):
+    """Return the (start, end) datetimes for the day
+    """
+    start = as_datetime(as_date(date_for))
+    return start, as_datetime(next_day(start.date()))
+
+
+def month_window(month_for):
+    """Return the (start, end) datetimes for the month of `month_for`
+
+    `month_for` can be any date or datetime in the month
+    """
+    month_for = as_date(month_for)
+    start = datetime(year=month_for.year, month=month_for.month, day=1, tzinfo=utc)
+    if month_for.month == 12:
+        end = datetime(year=month_for.year + 1, month=1, day=1, tzinfo=utc)
+    else:
+        end = datetime(year=month_for.year, month=month_for.month + 1, day=1, tzinfo=utc)
+    return start, end
+
+
+def month_as_of_day_window(date_for):
+    """Return the (start, end) datetimes from the start of the month to the end of the day
+    """
+    return month_window(date_for)[0], day_window(date_for)[1]
+
+
+def window_filter(window, field='modified'):
+    """Return the filter kwargs to match `field` values in the window
+    """
+    start, end = window
+    return {field + '__gte': start, field + '__lt': end}
+
+
+def filter_day(queryset, date_for, field='modified'):
+    """Filter the queryset to records with `field` on the day
+    """
+    return queryset.filter(**window_filter(day_window(date_for), field))
+
+
+def filter_month(queryset, month_for, field='modified'):
+    """Filter the queryset to records with `field` in the month of `month_for`
+    """
+    return queryset.filter(**window_filter(month_window(month_for), field))
+
+
+def filter_month_as_of_day(queryset, date_for, field='modified'):
+    """Filter the queryset to records with `field` in the month up to the end of the day
+    """
+    return queryset.filter(**window_filter(month_as_of_day_window(date_for), field))
@@ -59,6 +59,11 @@ router.register(
     views.SiteViewSet,
     base_name='sites')
 
+router.register(
+    r'admin/pipeline-stages',
+    views.PipelineStageViewSet,
+    base_name='pipeline-stages')
+
 # Wrappers around edx-platform models
 router.register(
     r'course-enrollments',
@@ -18,7 +18,7 @@ from rest_framework.authentication import (
     TokenAuthentication,
 )
 from rest_framework.decorators import detail_route, list_route
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
 
 from rest_framework.filters import (
@@ -37,6 +37,8 @@ except ImportError:
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
 
+from figures.cache import sites_cache
+from figures.log import instrument_queries
 from figures.compat import CourseEnrollment, CourseOverview
 from figures.filters import (
     CourseDailyMetricsFilter,
@@ -53,9 +55,11 @@ from figures.models import (
     CourseDailyMetrics,
     CourseMauMetrics,
     LearnerCourseGradeMetrics,
+    PipelineStage,
     SiteDailyMetrics,
     SiteMauMetrics,
 )
+from figures.pipeline.ledger import SLOWEST_GROUP_FIELDS, slowest
 from figures.query import site_users_enrollment_data
 from figures.serializers import (
     CourseCompletedSerializer,
@@ -67,6 +71,8 @@ from figures.serializers import (
     CourseMauLiveMetricsSerializer,
     CourseOverviewSerializer,
     EnrollmentMetricsSerializer,
+    PipelineStageSerializer,
+    PipelineStageTotalsSerializer,
     GeneralCourseDataSerializer,
     LearnerDetailsSerializer,
     LearnerMetricsSerializer,
@@ -130,7 +136,34 @@ def figures_home(request):
 # Mixins for API views
 #
 
-class CommonAuthMixin(object):
+class SitesMemoMixin(object):
+    '''Memoizes `figures.sites` lookups for the request
+
+    See `figures.cache`
+    '''
+    def dispatch(self, request, *args, **kwargs):
+        with sites_cache.memo():
+            return super(SitesMemoMixin, self).dispatch(request, *args, **kwargs)
+
+
+class QueryInstrumentationMixin(object):
+    '''Logs the database queries for the request
+
+    When query instrumentation is enabled, the query count and time are also
+    returned in a ``Server-Timing`` header. See `figures.log.instrument_queries`
+    '''
+    def dispatch(self, request, *args, **kwargs):
+        label = 'Figures API {}'.format(self.__class__.__name__)
+        with instrument_queries(label) as stats:
+            response = super(QueryInstrumentationMixin, self).dispatch(
+                request, *args, **kwargs)
+        if stats is not None:
+            response['Server-Timing'] = 'db;dur={:.1f};desc="{} queries"'.format(
+                stats.time * 1000, stats.count)
+        return response
+
+
+class CommonAuthMixin(QueryInstrumentationMixin, SitesMemoMixin):
     '''Provides a common authorization base for the Figures API views
     TODO: Consider moving this to figures.permissions
     '''
@@ -144,7 +177,7 @@ class CommonAuthMixin(object):
     )
 
 
-class StaffUserOnDefaultSiteAuthMixin(object):
+class StaffUserOnDefaultSiteAuthMixin(QueryInstrumentationMixin, SitesMemoMixin):
     '''Provides a common authorization base for the Figures API views
     TODO: Consider moving this to figures.permissions
     '''
@@ -902,3 +935,42 @@ class SiteViewSet(StaffUserOnDefaultSiteAuthMixin, viewsets.ReadOnlyModelViewSet
 
     def get_queryset(self):
         return figures.sites.get_sites()
+
+
+class PipelineStageViewSet(StaffUserOnDefaultSiteAuthMixin, viewsets.ReadOnlyModelViewSet):
+    """Provides API access to the pipeline ledger stages, slowest first
+
+    Access is restricted to global (Django instance) staff
+    """
+    model = PipelineStage
+    pagination_class = FiguresLimitOffsetPagination
+    serializer_class = PipelineStageSerializer
+
+    def get_queryset(self):
+        return PipelineStage.objects.select_related('run').order_by('-elapsed')
+
+    @list_route()
+    def slowest(self, request):
+        """Return the slowest sites, courses or stages from the ledger
+
+        Endpoint is `/figures/api/admin/pipeline-stages/slowest/`
+
+        Query parameters:
+        * `group_by`: one of 'site', 'course' or 'stage'. Defaults to 'stage'
+        * `days`: number of days back to include. Defaults to 7
+        * `limit`: maximum number of groups returned. Defaults to 20
+
+        Invalid query parameters return a 400 response
+        """
+        group_by = request.query_params.get('group_by', 'stage')
+        if group_by not in SLOWEST_GROUP_FIELDS:
+            raise ValidationError({'group_by': 'Invalid group_by "{}"'.format(group_by)})
+        try:
+            days = int(request.query_params.get('days', 7))
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError('days and limit must be integers')
+        if days < 0 or limit < 1:
+            raise ValidationError('days must not be negative and limit must be positive')
+        data = slowest(group_by=group_by, days=days, limit=limit)
+        return Response(PipelineStageTotalsSerializer(data, many=True).data)
@@ -0,0 +1,8 @@
+"""
+This module contains all general use signals.
+"""
+
+from django.dispatch import Signal
+
+# Signal that fires when a user is graded
+COURSE_GRADE_CHANGED = Signal(providing_args=["user", "course_grade", "course_key", "deadline"])
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from __future__ import absolute_import
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courseware', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studentmodule',
+            name='created',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='studentmodule',
+            name='modified',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
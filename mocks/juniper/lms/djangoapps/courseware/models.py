@@ -51,6 +51,7 @@ class StudentModule(models.Model):
     #!  )
     #! done = models.CharField(max_length=8, choices=DONE_TYPES, default='na', db_index=True)
 
-    # the production model sets 'auto_now_add=True' andn 'db_index=True'
-    created = models.DateTimeField()
-    modified = models.DateTimeField()
+    # the production model sets 'auto_now_add=True' and 'auto_now=True'. We
+    # keep the indexes so activity queries get the same plans as production
+    created = models.DateTimeField(db_index=True)
+    modified = models.DateTimeField(db_index=True)
@@ -0,0 +1,23 @@
+'''
+Mocks the edx-platform block structure API needed in Figures tests
+'''
+
+from __future__ import absolute_import
+
+
+class MockBlockStructure(object):
+    '''
+    Mock of a collected block structure
+
+    Guideline: only implement the minimum needed to simulate edx-platform for
+    the Figures unit tests
+    '''
+    def __init__(self, root_block_usage_key):
+        self.root_block_usage_key = root_block_usage_key
+
+
+def get_course_in_cache(course_key):
+    '''
+    Returns the collected block structure for the course
+    '''
+    return MockBlockStructure(course_key)
@@ -10,8 +10,10 @@ except ImportError:
     import mock
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 
 from figures.helpers import as_date
+from figures.management.commands.backfill_figures_daily_metrics import Command
 
 from tests.factories import SiteFactory
 
@@ -62,8 +64,8 @@ class TestBackfillDailyMetricsCommand(object):
                                               **expected_kwargs)
 
     @pytest.mark.parametrize('site_identifier', ['domain', 'id'])
-    def test_date_range(self, monkeypatch, site_identifier):
-        """Run command with start and end date range
+    def test_date_range_per_day(self, monkeypatch, site_identifier):
+        """Run command with start and end date range one day at a time
         """
 
         # What we pass as CLI kwargs
@@ -71,7 +73,8 @@ class TestBackfillDailyMetricsCommand(object):
             date_range=['2021-03-15', '2021-03-17'],
             skip_sdm=False,
             force_update=False,
-            logdir=None)
+            logdir=None,
+            per_day=True)
 
         # What we expect to be passed to the pipeline.bakfill function as kwargs
         expected_kwargs = dict(
@@ -91,3 +94,96 @@ class TestBackfillDailyMetricsCommand(object):
                          str(getattr(self.site, site_identifier)),
                          **cmd_kwargs)
             mock_func.assert_has_calls(expected_calls)
+
+    @pytest.mark.parametrize('skip_sdm', [False, True])
+    def test_date_range(self, skip_sdm):
+        """Run command with start and end date range in a single pass
+        """
+        mock_ret_val = dict(cdms_created=3, cdms_updated=0, cdms_skipped=0,
+                            cdm_errors=[], cdms_elapsed=1.0, sdm_elapsed=0.0)
+        with mock.patch(self.CMD_FULL_PATH +
+                        '.backfill_daily_metrics_for_site_and_date_range') as mock_func:
+            mock_func.return_value = mock_ret_val
+            call_command(self.MANAGEMENT_COMMAND,
+                         str(self.site.id),
+                         date_range=['2021-03-17', '2021-03-15'],
+                         skip_sdm=skip_sdm)
+            mock_func.assert_called_once_with(self.site,
+                                              as_date('2021-03-15'),
+                                              as_date('2021-03-17'),
+                                              process_sdm=not skip_sdm,
+                                              force_update=False)
+
+    @pytest.mark.parametrize('skip_sdm', [False, True])
+    def test_date_range_workers(self, skip_sdm):
+        """Run command with a date range across worker processes
+
+        The CDM ranges are run by `run_jobs` and the SDMs are filled afterwards
+        """
+        run = dict(results=[(None, dict(cdms_created=2, cdms_updated=1, cdms_skipped=0,
+                                        cdm_errors=[])),
+                            (None, dict(cdms_created=1, cdms_updated=0, cdms_skipped=4,
+                                        cdm_errors=[]))],
+                   errors=[], elapsed=1.0, throughput=2.0)
+        sdm_path = self.CMD_FULL_PATH + '.backfill_site_daily_metrics_for_date_range'
+        with mock.patch(self.CMD_FULL_PATH + '.run_jobs') as mock_run_jobs, \
+                mock.patch(sdm_path) as mock_sdm_func:
+            mock_run_jobs.return_value = run
+            mock_sdm_func.return_value = dict(sdms_created=3, sdms_updated=0,
+                                              sdms_skipped=0, sdm_elapsed=0.5)
+            results = Command().do_parallel_range_backfill(self.site,
+                                                           as_date('2021-03-15'),
+                                                           as_date('2021-03-17'),
+                                                           2,
+                                                           skip_sdm=skip_sdm)
+        jobs = mock_run_jobs.call_args[0][1]
+        assert jobs == [(self.site.id, '2021-03-15', '2021-03-15', False),
+                        (self.site.id, '2021-03-16', '2021-03-16', False),
+                        (self.site.id, '2021-03-17', '2021-03-17', False)]
+        assert mock_run_jobs.call_args[1]['workers'] == 2
+        assert results['cdms_created'] == 3
+        assert results['cdms_updated'] == 1
+        assert results['cdms_skipped'] == 4
+        if skip_sdm:
+            assert not mock_sdm_func.called
+        else:
+            mock_sdm_func.assert_called_once_with(self.site,
+                                                  as_date('2021-03-15'),
+                                                  as_date('2021-03-17'),
+                                                  force_update=False)
+
+    def test_date_range_workers_errors(self):
+        """The SDMs are not filled when a worker process job fails
+        """
+        run = dict(results=[], errors=[(None, 'Traceback')], elapsed=1.0, throughput=1.0)
+        sdm_path = self.CMD_FULL_PATH + '.backfill_site_daily_metrics_for_date_range'
+        with mock.patch(self.CMD_FULL_PATH + '.run_jobs') as mock_run_jobs, \
+                mock.patch(sdm_path) as mock_sdm_func:
+            mock_run_jobs.return_value = run
+            with pytest.raises(CommandError):
+                call_command(self.MANAGEMENT_COMMAND,
+                             str(self.site.id),
+                             date_range=['2021-03-15', '2021-03-17'],
+                             workers=2)
+            assert not mock_sdm_func.called
+
+    def test_date_range_per_day_workers(self):
+        """Run each day's CDMs across worker processes, then the SDMs in order
+        """
+        run = dict(results=[], errors=[], elapsed=1.0, throughput=3.0)
+        sdm_path = self.CMD_FULL_PATH + '.SiteDailyMetricsLoader'
+        with mock.patch(self.CMD_FULL_PATH + '.run_jobs') as mock_run_jobs, \
+                mock.patch(sdm_path) as mock_loader:
+            mock_run_jobs.return_value = run
+            call_command(self.MANAGEMENT_COMMAND,
+                         str(self.site.id),
+                         date_range=['2021-03-15', '2021-03-17'],
+                         per_day=True,
+                         workers=3)
+        assert mock_run_jobs.call_args[0][1] == [
+            (self.site.id, '2021-03-15', None, False),
+            (self.site.id, '2021-03-16', None, False),
+            (self.site.id, '2021-03-17', None, False)]
+        assert [kwargs['date_for'] for _args, kwargs in
+                mock_loader.return_value.load.call_args_list] == [
+            as_date('2021-03-15'), as_date('2021-03-16'), as_date('2021-03-17')]
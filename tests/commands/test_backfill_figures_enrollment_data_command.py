@@ -6,7 +6,10 @@ import mock
 
 from django.core.management import call_command
 
-from tests.factories import CourseOverviewFactory, SiteFactory
+from figures.management.parallel import run_jobs
+from figures.models import EnrollmentDataBackfill
+
+from tests.factories import CourseEnrollmentFactory, CourseOverviewFactory, SiteFactory
 
 
 @pytest.mark.django_db
@@ -31,6 +34,8 @@ class TestBackfillEnrollmentDataCommand(object):
     are provided.
     """
     TASK = 'figures.tasks.backfill_enrollment_data_for_course'
+    COMMAND_TASK = ('figures.management.commands.backfill_figures_enrollment_data.'
+                    'backfill_enrollment_data_for_course')
     MANAGEMENT_COMMAND = 'backfill_figures_enrollment_data'
 
     @pytest.mark.parametrize('domains', [
@@ -43,15 +48,13 @@ class TestBackfillEnrollmentDataCommand(object):
         sites = [SiteFactory(domain=domain) for domain in domains]
         courses = [CourseOverviewFactory() for _ in range(2)]
         course_ids = [str(obj.id) for obj in courses]
-        courses_for_sites = [course_ids for _ in range(len(domains))]
         calls = []
         for _ in range(len(sites)):
             calls += [mock.call(course_id) for course_id in course_ids]
         kwargs = {'sites': domains, 'use_celery': do_delay}
 
         with mock.patch('figures.sites.site_course_ids') as mock_site_course_ids:
-            # Build thed list of the course_ids returned for each call to `site_course_ids`
-            mock_site_course_ids.return_value = courses_for_sites
+            mock_site_course_ids.return_value = course_ids
             with mock.patch(self.TASK + delay_suffix) as mock_task:
                 call_command(self.MANAGEMENT_COMMAND, **kwargs)
                 assert mock_task.has_calls(calls)
@@ -103,3 +106,65 @@ class TestBackfillEnrollmentDataCommand(object):
         with mock.patch('builtins.open', mock.mock_open(read_data=file_contents)) as mo:
             kwargs = {'courses_file': mo.return_value}
             call_command(self.MANAGEMENT_COMMAND, **kwargs)
+
+    @pytest.mark.parametrize('shard_size, expected_backfills', [(None, 1), (2, 2)])
+    def test_backfill_records(self, shard_size, expected_backfills):
+        """Each course, or each of its enrollment id ranges, gets a backfill
+
+        Running the command again resumes the unfinished backfills
+        """
+        course_overview = CourseOverviewFactory()
+        course_id = str(course_overview.id)
+        [CourseEnrollmentFactory(course_id=course_overview.id) for _ in range(3)]
+        kwargs = {'courses': [course_id], 'use_celery': True, 'shard_size': shard_size}
+        with mock.patch(self.COMMAND_TASK) as mock_task_func:
+            call_command(self.MANAGEMENT_COMMAND, **kwargs)
+            call_command(self.MANAGEMENT_COMMAND, **kwargs)
+        backfills = EnrollmentDataBackfill.objects.filter(course_id=course_id)
+        assert backfills.count() == expected_backfills
+        calls = [mock.call(course_id, backfill_id=obj.id) for obj in backfills]
+        mock_task = mock_task_func.delay
+        assert mock_task.call_count == 2 * expected_backfills
+        mock_task.assert_has_calls(calls, any_order=True)
+
+    def test_status(self, capsys):
+        """The status option reports progress without running backfills
+        """
+        course_overview = CourseOverviewFactory()
+        course_id = str(course_overview.id)
+        EnrollmentDataBackfill.objects.create(course_id=course_id,
+                                              status=EnrollmentDataBackfill.RUNNING,
+                                              total_count=100,
+                                              processed_count=25,
+                                              elapsed=5.0)
+        with mock.patch(self.COMMAND_TASK) as mock_task:
+            call_command(self.MANAGEMENT_COMMAND, courses=[course_id], status=True)
+            assert not mock_task.called
+        out = capsys.readouterr().out
+        assert 'RUNNING: 25 of 100 enrollments, 5.0 enrollments/sec, ETA 15s' in out
+
+    def test_workers(self):
+        """The workers option runs each backfill through `run_jobs`
+
+        `run_jobs` is run in this process here, since the worker processes
+        would not share the test database
+        """
+        course_overview = CourseOverviewFactory()
+        course_id = str(course_overview.id)
+        [CourseEnrollmentFactory(course_id=course_overview.id) for _ in range(3)]
+        run_jobs_path = ('figures.management.commands.backfill_figures_enrollment_data.'
+                         'run_jobs')
+
+        def serial_run_jobs(func, jobs, workers=None, label='jobs'):
+            assert workers == 2
+            return run_jobs(func, jobs, label=label)
+
+        with mock.patch(run_jobs_path, side_effect=serial_run_jobs), \
+                mock.patch(self.COMMAND_TASK) as mock_task:
+            call_command(self.MANAGEMENT_COMMAND, courses=[course_id],
+                         shard_size=2, workers=2)
+        backfills = EnrollmentDataBackfill.objects.filter(course_id=course_id)
+        assert backfills.count() == 2
+        mock_task.assert_has_calls([mock.call(course_id, backfill_id=obj.id)
+                                    for obj in backfills], any_order=True)
+        assert not mock_task.delay.called
@@ -0,0 +1,37 @@
+"""Test Figures Django management command, 'backfill_figures_monthly_metrics'
+"""
+from __future__ import absolute_import
+import pytest
+
+try:
+    from unittest import mock
+except ImportError:
+    # for Python 2.7
+    import mock
+
+from django.core.management import call_command
+
+from tests.factories import SiteFactory
+
+
+@pytest.mark.django_db
+class TestBackfillMonthlyMetricsCommand(object):
+
+    MANAGEMENT_COMMAND = 'backfill_figures_monthly_metrics'
+    CMD_FULL_PATH = 'figures.management.commands.{}'.format(MANAGEMENT_COMMAND)
+    MOCK_PATH = CMD_FULL_PATH + '.backfill_monthly_metrics_for_site'
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+
+    @pytest.mark.parametrize('overwrite', [False, True])
+    def test_one_site(self, overwrite):
+        with mock.patch(self.MOCK_PATH) as mock_func:
+            mock_func.return_value = []
+            call_command(self.MANAGEMENT_COMMAND,
+                         site=str(self.site.id),
+                         overwrite=overwrite)
+            mock_func.assert_called_once_with(site=self.site,
+                                              overwrite=overwrite,
+                                              use_raw_sql=False)
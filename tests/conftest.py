@@ -4,6 +4,9 @@ from datetime import datetime
 import pytest
 from django.utils.timezone import utc
 from six.moves import range
+
+from figures.cache import sites_cache
+
 from tests.helpers import organizations_support_sites
 
 from tests.factories import (
@@ -24,6 +27,14 @@ if organizations_support_sites():
                                         organization=org) for user in users]
 
 
+@pytest.fixture(autouse=True)
+def clear_sites_cache():
+    """Tests roll back the database without sending signals, so the cached
+    site and course mappings are cleared for each test
+    """
+    sites_cache.invalidate()
+
+
 @pytest.fixture
 @pytest.mark.django_db
 def sm_test_data(db):
@@ -312,6 +312,24 @@ class TestSiteMetricsGettersStandalone(object):
                                                  end_date=end_date)
         assert count == len(sm_in) - 1
 
+    def test_get_active_users_for_time_period_bounds_and_courses(self):
+        start_date = datetime.date(2019, 9, 1)
+        end_date = datetime.date(2019, 9, 30)
+        sm_in = StudentModuleFactory(modified=figures.helpers.as_datetime('2019-09-01'))
+        # Late on the day before and midnight after the period
+        StudentModuleFactory(course_id=sm_in.course_id,
+                             modified=figures.helpers.as_datetime('2019-08-31 23:00'))
+        StudentModuleFactory(course_id=sm_in.course_id,
+                             modified=figures.helpers.as_datetime('2019-10-01'))
+        # Another course in the period
+        StudentModuleFactory(modified=figures.helpers.as_datetime('2019-09-15'))
+
+        count = get_active_users_for_time_period(site=self.site,
+                                                 start_date=start_date,
+                                                 end_date=end_date,
+                                                 course_ids=[sm_in.course_id])
+        assert count == 1
+
     def test_get_total_site_users_joined_for_time_period(self):
         '''
         TODO: add users who joined before and after the time period, and
@@ -0,0 +1,61 @@
+"""Tests CourseFirstEnrollment model and manager
+"""
+from __future__ import absolute_import
+import pytest
+
+from figures.helpers import as_datetime
+from figures.models import CourseFirstEnrollment
+
+from tests.factories import (
+    CourseEnrollmentFactory,
+    CourseOverviewFactory,
+    SiteFactory,
+)
+
+
+@pytest.mark.django_db
+class TestRefreshForSite(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.course_overviews = [CourseOverviewFactory() for _ in range(3)]
+        self.course_ids = [str(co.id) for co in self.course_overviews]
+        for co in self.course_overviews[:2]:
+            CourseEnrollmentFactory(course_id=co.id, created=as_datetime('2020-02-01'))
+            CourseEnrollmentFactory(course_id=co.id, created=as_datetime('2020-01-01'))
+
+    def test_indexes_first_enrollments(self, django_assert_num_queries):
+        expected = dict((course_id, as_datetime('2020-01-01'))
+                        for course_id in self.course_ids[:2])
+        # Index lookup, grouped enrollment query and insert in a savepoint
+        with django_assert_num_queries(5):
+            found = CourseFirstEnrollment.objects.refresh_for_site(self.site,
+                                                                   self.course_ids)
+        assert found == expected
+        assert CourseFirstEnrollment.objects.count() == 2
+
+        # Only the course without enrollments is queried again
+        with django_assert_num_queries(2):
+            found = CourseFirstEnrollment.objects.refresh_for_site(self.site,
+                                                                   self.course_ids)
+        assert found == expected
+
+    def test_new_course_enrollment(self):
+        CourseFirstEnrollment.objects.refresh_for_site(self.site, self.course_ids)
+        CourseEnrollmentFactory(course_id=self.course_overviews[2].id,
+                                created=as_datetime('2021-01-01'))
+        found = CourseFirstEnrollment.objects.refresh_for_site(self.site, self.course_ids)
+        assert found[self.course_ids[2]] == as_datetime('2021-01-01')
+
+    def test_rebuild(self):
+        CourseFirstEnrollment.objects.refresh_for_site(self.site, self.course_ids)
+        CourseEnrollmentFactory(course_id=self.course_overviews[0].id,
+                                created=as_datetime('2019-01-01'))
+        found = CourseFirstEnrollment.objects.refresh_for_site(self.site, self.course_ids)
+        assert found[self.course_ids[0]] == as_datetime('2020-01-01')
+        found = CourseFirstEnrollment.objects.refresh_for_site(self.site, self.course_ids,
+                                                               rebuild=True)
+        assert found[self.course_ids[0]] == as_datetime('2019-01-01')
+        assert CourseFirstEnrollment.objects.get(
+            course_id=self.course_ids[0]).first_enrollment == as_datetime('2019-01-01')
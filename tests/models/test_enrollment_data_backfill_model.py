@@ -0,0 +1,60 @@
+"""Tests EnrollmentDataBackfill model
+"""
+from __future__ import absolute_import
+import pytest
+
+from django.contrib.sites.models import Site
+
+from figures.models import EnrollmentDataBackfill
+
+
+COURSE_ID = 'course-v1:SomeOrg+SomeNum+SomeRun'
+
+
+@pytest.mark.django_db
+class TestEnrollmentDataBackfill(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = Site.objects.first()
+
+    def test_for_range_resumes_unfinished(self):
+        backfill = EnrollmentDataBackfill.objects.for_range(site=self.site,
+                                                            course_id=COURSE_ID,
+                                                            min_enrollment_id=1,
+                                                            max_enrollment_id=10)
+        assert EnrollmentDataBackfill.objects.for_range(site=self.site,
+                                                        course_id=COURSE_ID,
+                                                        min_enrollment_id=1,
+                                                        max_enrollment_id=10) == backfill
+        other_range = EnrollmentDataBackfill.objects.for_range(site=self.site,
+                                                               course_id=COURSE_ID)
+        assert other_range != backfill
+        restarted = EnrollmentDataBackfill.objects.for_range(site=self.site,
+                                                             course_id=COURSE_ID,
+                                                             min_enrollment_id=1,
+                                                             max_enrollment_id=10,
+                                                             resume=False)
+        assert restarted != backfill
+
+    def test_for_range_completed(self):
+        backfill = EnrollmentDataBackfill.objects.create(
+            site=self.site,
+            course_id=COURSE_ID,
+            status=EnrollmentDataBackfill.COMPLETED)
+        assert EnrollmentDataBackfill.objects.for_range(site=self.site,
+                                                        course_id=COURSE_ID) != backfill
+
+    @pytest.mark.parametrize('elapsed, total_count, throughput, eta', [
+        (0.0, None, None, None),
+        (0.0, 100, None, None),
+        (10.0, None, 5.0, None),
+        (10.0, 100, 5.0, 10.0),
+    ])
+    def test_throughput_and_eta(self, elapsed, total_count, throughput, eta):
+        backfill = EnrollmentDataBackfill(course_id=COURSE_ID,
+                                          processed_count=50,
+                                          total_count=total_count,
+                                          elapsed=elapsed)
+        assert backfill.throughput == throughput
+        assert backfill.eta == eta
@@ -7,9 +7,9 @@ import six
 from datetime import date
 import pytest
 
-from figures.models import MonthlyActiveEnrollment
+from figures.models import LearnerDailyActivity, MonthlyActiveEnrollment
 
-from tests.factories import MonthlyActiveEnrollmentFactory
+from tests.factories import MonthlyActiveEnrollmentFactory, SiteFactory, UserFactory
 from tests.helpers import organizations_support_sites
 from tests.conftest import make_site_data
 
@@ -120,3 +120,52 @@ def test_add_mae_with_date_for(mae_test_data):
     assert created
     assert MonthlyActiveEnrollment.objects.count() == 1
     assert obj.month_for == month_for
+
+
+@pytest.mark.django_db
+class TestAddDailyActivity(object):
+    """Tests `MonthlyActiveEnrollmentManager.add_daily_activity`
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.users = [UserFactory() for _ in range(2)]
+        self.course_id = 'course-v1:StarFleetAcademy+SFA01+2161'
+
+    def add_activity(self, date_for, users, site=None):
+        for user in users:
+            LearnerDailyActivity.objects.create(site=site or self.site,
+                                                course_id=self.course_id,
+                                                user=user,
+                                                date_for=date_for)
+
+    def test_adds_new_enrollments(self):
+        MonthlyActiveEnrollmentFactory(site=self.site,
+                                       course_id=self.course_id,
+                                       user=self.users[0],
+                                       month_for=date(2020, 3, 1),
+                                       first_active=date(2020, 3, 2))
+        self.add_activity(date(2020, 3, 5), self.users)
+        created = MonthlyActiveEnrollment.objects.add_daily_activity(date(2020, 3, 5))
+        assert created == 1
+        maes = MonthlyActiveEnrollment.objects.filter(month_for=date(2020, 3, 1))
+        assert dict(maes.values_list('user_id', 'first_active')) == {
+            self.users[0].id: date(2020, 3, 2),
+            self.users[1].id: date(2020, 3, 5),
+        }
+
+    def test_moves_first_active_back(self):
+        self.add_activity(date(2020, 3, 5), self.users[:1])
+        MonthlyActiveEnrollment.objects.add_daily_activity(date(2020, 3, 5))
+        self.add_activity(date(2020, 3, 3), self.users[:1])
+        assert MonthlyActiveEnrollment.objects.add_daily_activity(date(2020, 3, 3)) == 0
+        mae = MonthlyActiveEnrollment.objects.get()
+        assert mae.first_active == date(2020, 3, 3)
+
+    def test_skips_activity_without_site(self):
+        LearnerDailyActivity.objects.create(site=None,
+                                            course_id=self.course_id,
+                                            user=self.users[0],
+                                            date_for=date(2020, 3, 5))
+        assert MonthlyActiveEnrollment.objects.add_daily_activity(date(2020, 3, 5)) == 0
+        assert not MonthlyActiveEnrollment.objects.exists()
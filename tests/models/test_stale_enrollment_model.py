@@ -0,0 +1,49 @@
+"""Tests StaleEnrollment model
+"""
+from __future__ import absolute_import
+from datetime import datetime
+import pytest
+
+from django.utils.timezone import utc
+
+from figures.models import StaleEnrollment
+
+from tests.factories import UserFactory
+
+
+COURSE_ID = 'course-v1:SomeOrg+SomeNum+SomeRun'
+OTHER_COURSE_ID = 'course-v1:SomeOrg+OtherNum+SomeRun'
+
+
+@pytest.mark.django_db
+class TestStaleEnrollmentManager(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.user = UserFactory()
+
+    def test_mark_creates_one_record_per_enrollment(self):
+        first = datetime(2021, 3, 1, tzinfo=utc)
+        latest = datetime(2021, 3, 2, tzinfo=utc)
+        StaleEnrollment.objects.mark(self.user.id, COURSE_ID, changed=first)
+        StaleEnrollment.objects.mark(self.user.id, COURSE_ID, changed=latest)
+        StaleEnrollment.objects.mark(self.user.id, OTHER_COURSE_ID, changed=first)
+        assert StaleEnrollment.objects.count() == 2
+        assert StaleEnrollment.objects.get(course_id=COURSE_ID).changed == latest
+
+    def test_course_ids(self):
+        StaleEnrollment.objects.mark(self.user.id, COURSE_ID)
+        StaleEnrollment.objects.mark(UserFactory().id, COURSE_ID)
+        StaleEnrollment.objects.mark(self.user.id, OTHER_COURSE_ID)
+        assert StaleEnrollment.objects.course_ids() == set([COURSE_ID, OTHER_COURSE_ID])
+        assert StaleEnrollment.objects.course_ids([COURSE_ID]) == set([COURSE_ID])
+
+    def test_remove_keeps_enrollments_changed_again(self):
+        StaleEnrollment.objects.mark(self.user.id, COURSE_ID)
+        StaleEnrollment.objects.mark(self.user.id, OTHER_COURSE_ID)
+        read = list(StaleEnrollment.objects.all())
+        changed_again = datetime(2030, 1, 1, tzinfo=utc)
+        StaleEnrollment.objects.mark(self.user.id, OTHER_COURSE_ID, changed=changed_again)
+        StaleEnrollment.objects.remove(read)
+        assert list(StaleEnrollment.objects.values_list('course_id', 'changed')) == [
+            (OTHER_COURSE_ID, changed_again)]
@@ -8,18 +8,31 @@ from dateutil.rrule import rrule, MONTHLY
 from six.moves import range
 from six.moves import zip
 
+from django.contrib.sites.models import Site
 from django.db import connection
 from django.utils.timezone import utc
 
-from figures.pipeline.backfill import backfill_monthly_metrics_for_site
-from figures.models import SiteMonthlyMetrics
+from figures.compat import CourseNotFound, StudentModule
+from figures.pipeline.backfill import (
+    backfill_enrollment_data,
+    backfill_enrollment_data_for_site,
+    backfill_monthly_metrics_for_site,
+    date_ranges,
+    enrollment_id_ranges,
+)
+from figures.pipeline.enrollment_metrics_next import (
+    EnrollmentDataWriter,
+    stale_course_enrollments,
+)
+from figures.models import EnrollmentData, EnrollmentDataBackfill, SiteMonthlyMetrics
 from tests.factories import (
+    CourseEnrollmentFactory,
     CourseOverviewFactory,
     OrganizationFactory,
     OrganizationCourseFactory,
     StudentModuleFactory,
     SiteFactory)
-from tests.helpers import organizations_support_sites
+from tests.helpers import FakeException, organizations_support_sites
 
 
 if organizations_support_sites():
@@ -131,3 +144,142 @@ def test_backfill_monthly_metrics_for_site(monkeypatch, backfill_test_data, use_
         assert rec['obj'].active_user_count == check_rec['sm_count']
         assert rec['obj'].month_for.year == check_rec['month'].year
         assert rec['obj'].month_for.month == check_rec['month'].month
+
+
+@pytest.mark.django_db
+def test_backfill_enrollment_data_for_site(monkeypatch):
+    """Each course is loaded once and a missing course does not stop the others
+    """
+    site = SiteFactory()
+    course_overviews = [CourseOverviewFactory() for _ in range(3)]
+    bad_course_id = course_overviews[1].id
+    enrollments = [CourseEnrollmentFactory(course_id=co.id)
+                   for co in course_overviews for _ in range(2)]
+    loaded = []
+
+    def fake_course_for_grades(course_id):
+        loaded.append(course_id)
+        if course_id == bad_course_id:
+            raise CourseNotFound(str(course_id))
+        return CourseOverviewFactory.build(id=course_id)
+
+    monkeypatch.setattr('figures.pipeline.backfill.get_course_enrollments_for_site',
+                        lambda site: type(enrollments[0]).objects.all())
+    monkeypatch.setattr('figures.progress.course_for_grades', fake_course_for_grades)
+
+    results = backfill_enrollment_data_for_site(site)
+
+    assert sorted(loaded) == sorted(co.id for co in course_overviews)
+    assert len(results['results']) == 4
+    assert len(results['errors']) == 2
+    assert EnrollmentData.objects.count() == 4
+    assert not EnrollmentData.objects.filter(course_id=str(bad_course_id)).exists()
+
+
+@pytest.mark.django_db
+class TestBackfillEnrollmentData(object):
+    """Tests the checkpointed `backfill_enrollment_data`
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = Site.objects.first()
+        self.course_overview = CourseOverviewFactory()
+        self.enrollments = [CourseEnrollmentFactory(course_id=self.course_overview.id)
+                            for _ in range(5)]
+        for ce in self.enrollments:
+            StudentModuleFactory.from_course_enrollment(ce)
+
+    def make_backfill(self, **kwargs):
+        return EnrollmentDataBackfill.objects.for_range(site=self.site,
+                                                        course_id=str(self.course_overview.id),
+                                                        **kwargs)
+
+    def test_backfill_all(self):
+        backfill = backfill_enrollment_data(self.make_backfill(), batch_size=2)
+        assert backfill.status == EnrollmentDataBackfill.COMPLETED
+        assert backfill.processed_count == backfill.total_count == 5
+        assert backfill.last_enrollment_id == self.enrollments[-1].id
+        assert backfill.finished
+        assert EnrollmentData.objects.count() == 5
+
+    def test_resumes_from_checkpoint(self, monkeypatch):
+        """A failed backfill keeps its checkpoint and resumes from it
+        """
+        writer_add = 'figures.pipeline.backfill.EnrollmentDataWriter.add'
+        original_add = EnrollmentDataWriter.add
+
+        def failing_add(writer, ce, progress, collect_elapsed=None):
+            if ce.id == self.enrollments[2].id:
+                raise FakeException('worker restarted')
+            return original_add(writer, ce, progress, collect_elapsed=collect_elapsed)
+
+        monkeypatch.setattr(writer_add, failing_add)
+        with pytest.raises(FakeException):
+            backfill_enrollment_data(self.make_backfill(), batch_size=2)
+        backfill = self.make_backfill()
+        assert backfill.status == EnrollmentDataBackfill.FAILED
+        assert backfill.last_enrollment_id == self.enrollments[1].id
+        assert backfill.processed_count == 2
+        assert EnrollmentData.objects.count() == 2
+
+        monkeypatch.setattr(writer_add, original_add)
+        backfill = backfill_enrollment_data(backfill, batch_size=2)
+        assert backfill.status == EnrollmentDataBackfill.COMPLETED
+        assert backfill.processed_count == backfill.total_count == 5
+        assert EnrollmentData.objects.count() == 5
+        assert EnrollmentDataBackfill.objects.count() == 1
+
+    def test_reads_in_chunks(self, monkeypatch):
+        """Each batch reads at most `batch_size` enrollments
+
+        The checkpoint advances past enrollments that are not stale
+        """
+        ranges = []
+
+        def recording_stale_course_enrollments(course_id, min_enrollment_id,
+                                               max_enrollment_id):
+            ranges.append((min_enrollment_id, max_enrollment_id))
+            return stale_course_enrollments(course_id,
+                                            min_enrollment_id=min_enrollment_id,
+                                            max_enrollment_id=max_enrollment_id)
+
+        monkeypatch.setattr('figures.pipeline.backfill.stale_course_enrollments',
+                            recording_stale_course_enrollments)
+        # The last enrollment has no activity, so it is not stale
+        StudentModule.objects.filter(student=self.enrollments[-1].user).delete()
+        backfill = backfill_enrollment_data(self.make_backfill(), batch_size=2)
+        ids = [ce.id for ce in self.enrollments]
+        assert ranges == [(ids[0], ids[1] + 1), (ids[2], ids[3] + 1), (ids[4], ids[4] + 1)]
+        assert backfill.last_enrollment_id == ids[-1]
+        assert backfill.processed_count == backfill.total_count == 4
+        assert EnrollmentData.objects.count() == 4
+
+    def test_id_range(self):
+        backfill = self.make_backfill(min_enrollment_id=self.enrollments[1].id,
+                                      max_enrollment_id=self.enrollments[3].id)
+        backfill = backfill_enrollment_data(backfill)
+        assert backfill.processed_count == 2
+        assert set(EnrollmentData.objects.values_list('user_id', flat=True)) == set(
+            ce.user_id for ce in self.enrollments[1:3])
+
+    def test_enrollment_id_ranges(self):
+        first_id = self.enrollments[0].id
+        assert enrollment_id_ranges(self.course_overview.id, 2) == [
+            (first_id, first_id + 2),
+            (first_id + 2, first_id + 4),
+            (first_id + 4, first_id + 6)]
+        assert enrollment_id_ranges(CourseOverviewFactory().id, 2) == []
+
+
+@pytest.mark.parametrize('start_date, end_date, num_ranges, expected', [
+    ('2021-03-01', '2021-03-10', 3, [('2021-03-01', '2021-03-03'),
+                                     ('2021-03-04', '2021-03-06'),
+                                     ('2021-03-07', '2021-03-10')]),
+    ('2021-03-01', '2021-03-02', 4, [('2021-03-01', '2021-03-01'),
+                                     ('2021-03-02', '2021-03-02')]),
+    ('2021-03-01', '2021-03-01', 1, [('2021-03-01', '2021-03-01')]),
+    ('2021-03-02', '2021-03-01', 2, []),
+])
+def test_date_ranges(start_date, end_date, num_ranges, expected):
+    assert [(start.isoformat(), end.isoformat()) for start, end in
+            date_ranges(start_date, end_date, num_ranges)] == expected
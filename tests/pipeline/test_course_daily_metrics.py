@@ -5,6 +5,7 @@ TODO: Update this test module to test multisite environments
 
 from __future__ import absolute_import
 import datetime
+from decimal import Decimal
 import mock
 import pytest
 
@@ -20,6 +21,7 @@ import figures.sites
 
 from tests.factories import (
     CourseAccessRoleFactory,
+    CourseDailyMetricsFactory,
     CourseEnrollmentFactory,
     CourseOverviewFactory,
     GeneratedCertificateFactory,
@@ -158,6 +160,26 @@ class TestCourseDailyMetricsPipelineFunctions(object):
             course_id=str(self.course_overview.id), date_for=self.today)
         assert learners.count() == expected_count
 
+    def test_get_excluded_user_ids_by_course(self):
+        other_course_id = str(CourseOverviewFactory().id)
+        course_id = str(self.course_overview.id)
+        actual = pipeline_cdm.get_excluded_user_ids_by_course(
+            [course_id, other_course_id])
+        assert actual == {
+            course_id: set(role.user_id for role in self.course_access_roles),
+            other_course_id: set(),
+        }
+
+    def test_get_enrolled_in_exclude_admins_precomputed(self):
+        """Only the given user ids are excluded, without querying the roles
+        """
+        excluded_user_ids = set([self.course_enrollments[0].user_id])
+        learners = pipeline_cdm.get_enrolled_in_exclude_admins(
+            course_id=self.course_overview.id,
+            date_for=self.today,
+            excluded_user_ids=excluded_user_ids)
+        assert learners.count() == len(self.course_enrollments) - 1
+
     def test_get_active_learner_ids_today(self):
         """
 
@@ -176,6 +198,69 @@ class TestCourseDailyMetricsPipelineFunctions(object):
             date_for=self.today)
         assert actual == expected
 
+    @pytest.mark.parametrize('use_subquery', [True, False])
+    def test_get_days_to_complete_errors(self, monkeypatch, use_subquery):
+        """Certificates without a matching enrollment are reported
+        """
+        if not use_subquery:
+            monkeypatch.setattr(pipeline_cdm, 'Subquery', None)
+        no_ce_cert = GeneratedCertificateFactory(
+            course_id=self.course_overview.id,
+            created_date=as_datetime('2018-05-01'))
+
+        actual = pipeline_cdm.get_days_to_complete(
+            course_id=self.course_overview.id,
+            date_for=self.today)
+        assert actual['days'] == self.cert_days_to_complete
+        assert [(err['msg'], err['user_id']) for err in actual['errors']] == [
+            ('No CourseEnrollment matching user course certificate', no_ce_cert.user_id),
+        ]
+
+    def test_get_days_to_complete_totals_incremental(self):
+        """Totals for new certificates are added to the previous totals
+        """
+        since = self.generated_certificates[1].created_date
+        previous = pipeline_cdm.get_days_to_complete_totals(
+            course_id=self.course_overview.id,
+            date_for=since)
+        assert previous == dict(days_sum=30, days_count=2, error_count=0)
+
+        totals = pipeline_cdm.get_days_to_complete_totals(
+            course_id=self.course_overview.id,
+            date_for=self.today,
+            since=since,
+            previous=previous)
+        assert totals == pipeline_cdm.get_days_to_complete_totals(
+            course_id=self.course_overview.id,
+            date_for=self.today)
+        assert pipeline_cdm.calc_average_days_from_totals(
+            totals) == self.expected_avg_cert_days_to_complete
+
+    @pytest.mark.parametrize('previous_totals, expected', [
+        (dict(), dict(days_to_complete_sum=60, days_to_complete_count=3)),
+        (dict(days_to_complete_sum=100, days_to_complete_count=4),
+         dict(days_to_complete_sum=130, days_to_complete_count=5)),
+    ])
+    def test_extract_days_to_complete_from_previous_record(self,
+                                                           previous_totals,
+                                                           expected):
+        """Only certificates after a previous record with totals are added
+
+        The last certificate is the only one created after the previous record
+        """
+        previous_record = CourseDailyMetricsFactory(
+            course_id=str(self.course_overview.id),
+            date_for=self.generated_certificates[1].created_date.date(),
+            **previous_totals)
+        data = pipeline_cdm.CourseDailyMetricsExtractor().extract(
+            self.course_overview.id,
+            self.today,
+            previous_record=previous_record)
+        for key, val in expected.items():
+            assert data[key] == val
+        assert data['average_days_to_complete'] == (
+            float(expected['days_to_complete_sum']) / expected['days_to_complete_count'])
+
     def test_calc_average_days_to_complete(self):
         actual = pipeline_cdm.calc_average_days_to_complete(
             self.cert_days_to_complete)
@@ -193,6 +278,36 @@ class TestCourseDailyMetricsPipelineFunctions(object):
             date_for=self.today)
         assert actual == len(self.generated_certificates)
 
+    def test_bulk_functions_match_per_course(self):
+        """The grouped query versions return the per course values
+        """
+        other_course_id = str(CourseOverviewFactory().id)
+        course_ids = [str(self.course_overview.id), other_course_id]
+        course_id = course_ids[0]
+
+        enrolled = pipeline_cdm.bulk_get_enrolled_counts_exclude_admins(
+            course_ids, self.today)
+        assert enrolled == {
+            course_id: pipeline_cdm.get_enrolled_in_exclude_admins(
+                course_id, self.today).count(),
+            other_course_id: 0}
+
+        active = pipeline_cdm.bulk_get_active_learner_counts(course_ids, self.today)
+        assert active == {
+            course_id: pipeline_cdm.get_active_learner_ids_today(
+                course_id, self.today).count(),
+            other_course_id: 0}
+
+        completed = pipeline_cdm.bulk_get_num_learners_completed(course_ids, self.today)
+        assert completed == {
+            course_id: pipeline_cdm.get_num_learners_completed(course_id, self.today),
+            other_course_id: 0}
+
+        days = pipeline_cdm.bulk_get_days_to_complete(course_ids, self.today)
+        assert sorted(days[course_id]['days']) == sorted(
+            pipeline_cdm.get_days_to_complete(course_id, self.today)['days'])
+        assert days[other_course_id] == dict(days=[], errors=[])
+
 
 @pytest.mark.django_db
 class TestCourseDailyMetricsExtractor(object):
@@ -343,3 +458,93 @@ class TestCourseDailyMetricsLoader(object):
     @pytest.mark.skip('Implement me!')
     def test_load_force_update(self):
         pass
+
+
+@pytest.mark.django_db
+class TestBulkCourseDailyMetricsLoader(object):
+    """Checks BulkCourseDailyMetricsLoader creates and updates records together
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.course_enrollments = [CourseEnrollmentFactory() for i in range(1, 4)]
+        self.course_ids = [str(ce.course_id) for ce in self.course_enrollments]
+        self.date_for = prev_day(datetime.datetime.utcnow().date())
+
+    def test_extract(self, monkeypatch):
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            lambda **_kwargs: dict(average_progress=0.5))
+        data = pipeline_cdm.BulkCourseDailyMetricsExtractor().extract(
+            self.course_ids, self.date_for)
+        assert set(data.keys()) == set(self.course_ids)
+        for course_id in self.course_ids:
+            expected = pipeline_cdm.CourseDailyMetricsExtractor().extract(
+                course_id, self.date_for)
+            assert data[course_id] == expected
+
+    def test_load_creates_then_skips_or_updates(self, monkeypatch):
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            lambda **_kwargs: dict(average_progress=0.5))
+        loader = pipeline_cdm.BulkCourseDailyMetricsLoader(site=self.site,
+                                                           course_ids=self.course_ids,
+                                                           batch_size=2)
+        results = loader.load(date_for=self.date_for)
+        assert len(results['created']) == len(self.course_ids)
+        assert not results['updated'] and not results['skipped'] and not results['errors']
+        assert set(CourseDailyMetrics.objects.filter(
+            site=self.site, date_for=self.date_for).values_list(
+            'course_id', flat=True)) == set(self.course_ids)
+
+        results = loader.load(date_for=self.date_for)
+        assert len(results['skipped']) == len(self.course_ids)
+        assert not results['created'] and not results['updated']
+
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            lambda **_kwargs: dict(average_progress=0.25))
+        results = loader.load(date_for=self.date_for, force_update=True)
+        assert len(results['updated']) == len(self.course_ids)
+        assert CourseDailyMetrics.objects.count() == len(self.course_ids)
+        assert set(CourseDailyMetrics.objects.values_list(
+            'average_progress', flat=True)) == set([Decimal('0.25')])
+
+    def test_load_invalid_data(self, monkeypatch):
+        bad_course_id = self.course_ids[0]
+
+        def fake_progress(course_id, **_kwargs):
+            return dict(average_progress=1.01 if course_id == bad_course_id else 0.5)
+
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            fake_progress)
+        results = pipeline_cdm.BulkCourseDailyMetricsLoader(
+            site=self.site, course_ids=self.course_ids).load(date_for=self.date_for)
+        assert [rec['course_id'] for rec in results['errors']] == [bad_course_id]
+        assert 'average_progress' in results['errors'][0]['error']
+        assert not CourseDailyMetrics.objects.filter(course_id=bad_course_id).exists()
+        assert CourseDailyMetrics.objects.count() == len(self.course_ids) - 1
+
+    def test_load_adds_to_previous_totals(self, monkeypatch):
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            lambda **_kwargs: dict(average_progress=0.5))
+        with_totals, without_totals = self.course_ids[0], self.course_ids[1]
+        CourseDailyMetricsFactory(site=self.site,
+                                  course_id=with_totals,
+                                  date_for=prev_day(self.date_for),
+                                  days_to_complete_sum=40,
+                                  days_to_complete_count=4)
+        CourseDailyMetricsFactory(site=self.site,
+                                  course_id=without_totals,
+                                  date_for=prev_day(self.date_for))
+        results = pipeline_cdm.BulkCourseDailyMetricsLoader(
+            site=self.site, course_ids=self.course_ids).load(date_for=self.date_for)
+        assert len(results['created']) == len(self.course_ids)
+        cdm = CourseDailyMetrics.objects.get(course_id=with_totals, date_for=self.date_for)
+        assert (cdm.days_to_complete_sum, cdm.days_to_complete_count) == (40, 4)
+        assert cdm.average_days_to_complete == 10
+        cdm = CourseDailyMetrics.objects.get(course_id=without_totals, date_for=self.date_for)
+        assert (cdm.days_to_complete_sum, cdm.days_to_complete_count) == (0, 0)
+        assert cdm.average_days_to_complete == 0
@@ -16,7 +16,10 @@ from figures.pipeline.mau_pipeline import (
     calculate_course_mau,
     save_course_mau,
     collect_course_mau,
+    collect_site_course_mau,
 )
+from figures.models import CourseMauMetrics
+from figures.sites import site_course_ids
 
 from tests.factories import (
     SiteFactory,
@@ -193,3 +196,54 @@ class TestLoadMauData(object):
         assert obj
         assert created
         assert obj.mau == mau_data['mau']
+
+
+@pytest.mark.django_db
+class TestCollectSiteCourseMau(object):
+    """
+    Test collecting the MAU for all of a site's courses at once
+    """
+    def test_same_as_collect_course_mau(self, simple_mau_test_data):
+        our_site = simple_mau_test_data['our_site']
+        month_for = simple_mau_test_data['month_for']
+        results = collect_site_course_mau(site=our_site, month_for=month_for)
+        course_ids = [str(course_id) for course_id in site_course_ids(our_site)]
+        assert len(results['created']) == len(course_ids)
+        assert not results['updated'] and not results['skipped']
+        site_mau = dict(CourseMauMetrics.objects.filter(site=our_site).values_list(
+            'course_id', 'mau'))
+        assert set(site_mau.keys()) == set(course_ids)
+        CourseMauMetrics.objects.all().delete()
+        for course_id in course_ids:
+            obj, _created = collect_course_mau(site=our_site,
+                                               courselike=course_id,
+                                               month_for=month_for)
+            assert site_mau[course_id] == obj.mau
+        our_course = str(simple_mau_test_data['our_course'].id)
+        assert site_mau[our_course] == len(simple_mau_test_data['expected_mau_ids'])
+
+    def test_existing_records(self, simple_mau_test_data):
+        our_site = simple_mau_test_data['our_site']
+        month_for = simple_mau_test_data['month_for']
+        our_course = str(simple_mau_test_data['our_course'].id)
+        CourseMauMetrics.objects.create(site=our_site, course_id=our_course,
+                                        date_for=month_for, mau=99)
+        results = collect_site_course_mau(site=our_site, month_for=month_for)
+        assert [obj.course_id for obj in results['skipped']] == [our_course]
+        assert CourseMauMetrics.objects.get(course_id=our_course).mau == 99
+
+        results = collect_site_course_mau(site=our_site, month_for=month_for,
+                                          overwrite=True)
+        assert not results['created'] and not results['skipped']
+        assert CourseMauMetrics.objects.get(course_id=our_course).mau == len(
+            simple_mau_test_data['expected_mau_ids'])
+
+    def test_queries_do_not_grow_with_courses(self, simple_mau_test_data,
+                                              django_assert_max_num_queries):
+        our_site = simple_mau_test_data['our_site']
+        month_for = simple_mau_test_data['month_for']
+        # Collect the month's daily activity first
+        collect_site_course_mau(site=our_site, month_for=month_for)
+        CourseMauMetrics.objects.all().delete()
+        with django_assert_max_num_queries(8):
+            collect_site_course_mau(site=our_site, month_for=month_for)
@@ -0,0 +1,146 @@
+"""Tests the figures.pipeline.daily_metrics_sweep module
+
+The sweep must fill the same daily metrics records as running the daily
+loaders for each day in the range
+"""
+
+from __future__ import absolute_import
+from datetime import date, timedelta
+
+import pytest
+
+from django.contrib.sites.models import Site
+
+from figures.helpers import as_datetime
+from figures.models import CourseDailyMetrics, SiteDailyMetrics
+from figures.pipeline.backfill import (
+    backfill_daily_metrics_for_site_and_date_range,
+    courses_enrolled_on_or_before,
+)
+from figures.pipeline.course_daily_metrics import CourseDailyMetricsLoader
+from figures.pipeline.helpers import DateForCannotBeFutureError
+from figures.pipeline.site_daily_metrics import SiteDailyMetricsLoader
+
+from tests.factories import (
+    CourseAccessRoleFactory,
+    CourseEnrollmentFactory,
+    CourseOverviewFactory,
+    GeneratedCertificateFactory,
+    SiteDailyMetricsFactory,
+    StudentModuleFactory,
+    UserFactory,
+)
+
+CDM_FIELDS = ['enrollment_count', 'active_learners_today', 'average_progress',
+              'average_days_to_complete', 'num_learners_completed',
+              'days_to_complete_sum', 'days_to_complete_count']
+
+SDM_FIELDS = ['cumulative_active_user_count', 'todays_active_user_count',
+              'total_user_count', 'course_count', 'total_enrollment_count', 'mau']
+
+
+def day(n):
+    """Return the date `n` days into the test range
+    """
+    return date(2021, 3, 1) + timedelta(days=n)
+
+
+def cdm_values():
+    return dict(((str(rec.date_for), rec.course_id), [getattr(rec, key) for key in CDM_FIELDS])
+                for rec in CourseDailyMetrics.objects.all())
+
+
+def sdm_values():
+    return dict((str(rec.date_for), [getattr(rec, key) for key in SDM_FIELDS])
+                for rec in SiteDailyMetrics.objects.all())
+
+
+@pytest.mark.django_db
+class TestDailyMetricsSweep(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings):
+        settings.FEATURES['FIGURES_IS_MULTISITE'] = False
+        self.site = Site.objects.first()
+        self.start_date = day(0)
+        self.end_date = day(9)
+        self.course_overviews = [CourseOverviewFactory() for _ in range(3)]
+        staff = UserFactory(date_joined=as_datetime('2021-01-01'))
+        CourseAccessRoleFactory(user=staff, course_id=self.course_overviews[0].id,
+                                role='staff')
+        CourseEnrollmentFactory(user=staff, course_id=self.course_overviews[0].id,
+                                created=as_datetime('2021-02-01'))
+        # Enrolled before the range, during it, and one course first enrolled
+        # during the range
+        for i in range(12):
+            user = UserFactory(date_joined=as_datetime(day(i - 4)))
+            course_overview = self.course_overviews[i % 2]
+            enrolled = as_datetime(day(i - 3))
+            CourseEnrollmentFactory(user=user, course_id=course_overview.id, created=enrolled)
+            StudentModuleFactory(student=user, course_id=course_overview.id,
+                                 modified=as_datetime(day(i % 5)))
+            if i % 3 == 0:
+                GeneratedCertificateFactory(user=user, course_id=course_overview.id,
+                                            created_date=enrolled + timedelta(days=i % 4 + 1))
+        CourseEnrollmentFactory(course_id=self.course_overviews[2].id,
+                                created=as_datetime(day(6)))
+        # Certificate without an enrollment
+        GeneratedCertificateFactory(course_id=self.course_overviews[1].id,
+                                    created_date=as_datetime(day(2)))
+
+    def run_daily_loaders(self):
+        date_for = self.start_date
+        while date_for <= self.end_date:
+            for course_id in courses_enrolled_on_or_before(self.site, date_for):
+                CourseDailyMetricsLoader(course_id).load(date_for=date_for)
+            SiteDailyMetricsLoader().load(site=self.site, date_for=date_for)
+            date_for += timedelta(days=1)
+
+    def test_matches_daily_loaders(self):
+        self.run_daily_loaders()
+        expected_cdms = cdm_values()
+        expected_sdms = sdm_values()
+        assert len(expected_sdms) == 10
+        CourseDailyMetrics.objects.all().delete()
+        SiteDailyMetrics.objects.all().delete()
+
+        results = backfill_daily_metrics_for_site_and_date_range(
+            self.site, self.start_date, self.end_date)
+
+        assert results['cdms_created'] == len(expected_cdms)
+        assert results['sdms_created'] == 10
+        assert not results['cdm_errors']
+        assert cdm_values() == expected_cdms
+        assert sdm_values() == expected_sdms
+
+    def test_existing_records(self):
+        SiteDailyMetricsFactory(site=self.site, date_for=day(-1),
+                                cumulative_active_user_count=100)
+        SiteDailyMetricsFactory(site=self.site, date_for=day(3),
+                                cumulative_active_user_count=200)
+        results = backfill_daily_metrics_for_site_and_date_range(
+            self.site, self.start_date, self.end_date)
+        assert results['sdms_skipped'] == 1
+        sdms = SiteDailyMetrics.objects.filter(site=self.site)
+        assert sdms.get(date_for=day(0)).cumulative_active_user_count == 100 + 3
+        # The cumulative count continues from the existing record
+        assert sdms.get(date_for=day(4)).cumulative_active_user_count == 200 + 2
+
+        results = backfill_daily_metrics_for_site_and_date_range(
+            self.site, self.start_date, self.end_date, force_update=True)
+        assert results['cdms_created'] == 0
+        assert results['cdms_skipped'] == 0
+        assert results['cdms_updated']
+        assert results['sdms_updated'] == 10
+        assert sdms.get(date_for=day(4)).cumulative_active_user_count == 100 + 12
+
+    def test_skip_sdm(self):
+        results = backfill_daily_metrics_for_site_and_date_range(
+            self.site, self.start_date, self.end_date, process_sdm=False)
+        assert results['cdms_created']
+        assert not SiteDailyMetrics.objects.exists()
+
+    def test_future_date(self):
+        with pytest.raises(DateForCannotBeFutureError):
+            backfill_daily_metrics_for_site_and_date_range(
+                self.site, self.start_date, date.today() + timedelta(days=2))
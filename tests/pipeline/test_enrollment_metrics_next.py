@@ -4,16 +4,18 @@ These tests exercies the module, `figures.pipeline.enrollment_metrics_next`.
 
 See the module docstring for details.
 """
+from datetime import timedelta
 from decimal import Decimal
 import pytest
-from mock import patch
 
 from django.contrib.sites.models import Site
 from django.forms import DecimalField
 
-from figures.compat import CourseEnrollment
+from figures.helpers import as_datetime, utc_yesterday
+from figures.models import EnrollmentData, LearnerCourseGradeMetrics, StaleEnrollment
 from figures.pipeline.enrollment_metrics_next import (
     update_enrollment_data_for_course,
+    update_stale_enrollment_data_for_course,
     stale_course_enrollments,
     calculate_course_progress,
 )
@@ -23,7 +25,9 @@ from tests.factories import (
     CourseEnrollmentFactory,
     CourseOverviewFactory,
     EnrollmentDataFactory,
+    LearnerCourseGradeMetricsFactory,
     StudentModuleFactory,
+    UserFactory,
 )
 
 
@@ -57,23 +61,50 @@ class TestUpdateMetrics(object):
         result = update_enrollment_data_for_course(self.course_overview.id)
         assert result == []
 
-    def test_course_has_active_enrollments_for_yesterday(self):
+    @pytest.mark.parametrize('batch_size', [None, 1])
+    def test_course_has_active_enrollments_for_yesterday(self, monkeypatch, batch_size):
         """We have enrollments who were active yesterday
-        """
-        expected_ce = [CourseEnrollmentFactory(course_id=self.course_overview.id)
-                       for _ in range(2)]
-        ce = CourseEnrollment.objects.filter(course_id=self.course_overview.id)
-
-        def mock_update_metrics(site, ce):
-            return ce
 
-        with patch('figures.pipeline.enrollment_metrics_next.Course') as course_class:
-            with patch('figures.pipeline.enrollment_metrics_next.EnrollmentData.objects') as edm:
-                course_class.return_value.enrollments_active_on_date.return_value = ce
-                course_class.return_value.site = self.site
-                edm.update_metrics = mock_update_metrics
-                result = update_enrollment_data_for_course(self.course_overview.id)
-                assert set(result) == set(expected_ce)
+        One enrollment has no EnrollmentData, one has out of date EnrollmentData
+        and a LearnerCourseGradeMetrics record for the date and one has
+        EnrollmentData already collected for the date
+        """
+        date_for = utc_yesterday()
+        monkeypatch.setattr('figures.course.get_site_for_course', lambda val: self.site)
+        enrollments = [CourseEnrollmentFactory(course_id=self.course_overview.id)
+                       for _ in range(3)]
+        for ce in enrollments:
+            StudentModuleFactory.from_course_enrollment(ce,
+                                                        created=as_datetime(date_for),
+                                                        modified=as_datetime(date_for))
+        stale_ed = EnrollmentDataFactory(site=self.site,
+                                         user=enrollments[1].user,
+                                         course_id=str(self.course_overview.id),
+                                         date_for=date_for - timedelta(days=2))
+        LearnerCourseGradeMetricsFactory(site=self.site,
+                                         user=enrollments[1].user,
+                                         course_id=str(self.course_overview.id),
+                                         date_for=date_for,
+                                         points_possible=99)
+        current_ed = EnrollmentDataFactory(site=self.site,
+                                           user=enrollments[2].user,
+                                           course_id=str(self.course_overview.id),
+                                           date_for=date_for)
+
+        result = update_enrollment_data_for_course(self.course_overview.id,
+                                                   batch_size=batch_size)
+
+        created = dict((ed.user_id, is_created) for ed, is_created in result)
+        assert created == {enrollments[0].user_id: True,
+                           enrollments[1].user_id: False,
+                           enrollments[2].user_id: False}
+        assert EnrollmentData.objects.count() == 3
+        assert EnrollmentData.objects.get(id=stale_ed.id).date_for == date_for
+        assert EnrollmentData.objects.get(id=current_ed.id).modified == current_ed.modified
+        lcgms = LearnerCourseGradeMetrics.objects.filter(date_for=date_for)
+        assert set(lcgms.values_list('user_id', flat=True)) == set(
+            ce.user_id for ce in enrollments[:2])
+        assert lcgms.get(user=enrollments[1].user).points_possible != 99
 
     def test_course_is_unlinked(self, monkeypatch):
         """Function should raise `UnlinkedCourseError` if there's not a site match
@@ -95,6 +126,51 @@ class TestUpdateMetrics(object):
         assert str(excinfo.value) == expected_msg
 
 
+@pytest.mark.django_db
+class TestUpdateStaleEnrollmentData(object):
+    """Tests `update_stale_enrollment_data_for_course`
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch):
+        self.course_overview = CourseOverviewFactory()
+        self.site = Site.objects.first()
+        monkeypatch.setattr('figures.course.get_site_for_course', lambda val: self.site)
+        self.enrollments = [CourseEnrollmentFactory(course_id=self.course_overview.id)
+                            for _ in range(3)]
+
+    def test_no_queued_enrollments(self):
+        assert update_stale_enrollment_data_for_course(self.course_overview.id) == []
+        assert not EnrollmentData.objects.exists()
+
+    def test_updates_queued_enrollments(self):
+        """Only the queued enrollments are updated and they leave the queue
+
+        A queued learner who is not enrolled leaves the queue without
+        enrollment data
+        """
+        course_id = str(self.course_overview.id)
+        queued = self.enrollments[:2]
+        for ce in queued:
+            StaleEnrollment.objects.mark(ce.user_id, course_id)
+        StaleEnrollment.objects.mark(UserFactory().id, course_id)
+        StaleEnrollment.objects.mark(self.enrollments[2].user_id, 'course-v1:other+course+id')
+
+        result = update_stale_enrollment_data_for_course(self.course_overview.id)
+
+        assert set(ed.user_id for ed, created in result) == set(ce.user_id for ce in queued)
+        assert set(EnrollmentData.objects.values_list('user_id', flat=True)) == set(
+            ce.user_id for ce in queued)
+        assert set(EnrollmentData.objects.values_list('date_for', flat=True)) == {
+            utc_yesterday()}
+        assert list(StaleEnrollment.objects.values_list('course_id', flat=True)) == [
+            'course-v1:other+course+id']
+
+    def test_course_is_unlinked(self, monkeypatch):
+        monkeypatch.setattr('figures.course.get_site_for_course', lambda val: None)
+        with pytest.raises(UnlinkedCourseError):
+            update_stale_enrollment_data_for_course(self.course_overview.id)
+
+
 @pytest.mark.django_db
 class TestStaleCourseEnrollments(object):
     """Tests `stale_course_enrollments`
@@ -116,36 +192,58 @@ class TestStaleCourseEnrollments(object):
             rec = next(stale_course_enrollments(self.course_overview.id))
 
 
-    def test_no_update_needed(self, monkeypatch):
+    def test_no_update_needed(self):
         """Call to function yields no results
 
-        This test and the next one, 'test_needs_update' do "all or nothing" for
-        returning boolean values from `is_enrollment_out_of_date`. That's ok,
-        because there's test coverage specifically for this function in `test_enrollments.py`
-        So as long as this function has unit tests for its possible states, we
-        don't need to do it here.
+        Each enrollment has an EnrollmentData record dated after its last
+        StudentModule was modified
         """
-        # Need to mock/monkeypatch. Either code within 'is_enrollment_data_out_of_date'
-        # or the function itself.
-        # See test_enrollment.py::TestIsEnrollmentDataOutOfDate
-
+        date_for = utc_yesterday()
         ce_recs = [CourseEnrollmentFactory(course_id=self.course_overview.id) for _ in range(2)]
-        [StudentModuleFactory.from_course_enrollment(ce) for ce in ce_recs]
-        monkeypatch.setattr('figures.pipeline.enrollment_metrics_next.is_enrollment_data_out_of_date', lambda val: False)
+        for ce in ce_recs:
+            StudentModuleFactory.from_course_enrollment(
+                ce, modified=as_datetime(date_for - timedelta(days=1)))
+            EnrollmentDataFactory.from_course_enrollment(ce, site=self.site, date_for=date_for)
         assert not [rec for rec in stale_course_enrollments(self.course_overview.id)]
 
-    def test_needs_update(self, monkeypatch):
-        """Call to function yields two results
+    def test_needs_update(self):
+        """Call to function yields the stale enrollments
 
-        We create three enrollments and leave one enrollment without any StudentModule
+        We create four enrollments:
+        * One without EnrollmentData
+        * One with StudentModule modified on the EnrollmentData date_for
+        * One with up to date EnrollmentData
+        * One without any StudentModule
         """
-        ce = [CourseEnrollmentFactory(course_id=self.course_overview.id) for _ in range(3)]
+        date_for = utc_yesterday()
+        ce = [CourseEnrollmentFactory(course_id=self.course_overview.id) for _ in range(4)]
         StudentModuleFactory.from_course_enrollment(ce[0])
-        StudentModuleFactory.from_course_enrollment(ce[1])
-        monkeypatch.setattr('figures.pipeline.enrollment_metrics_next.is_enrollment_data_out_of_date', lambda val: True)
+        StudentModuleFactory.from_course_enrollment(ce[1], modified=as_datetime(date_for))
+        EnrollmentDataFactory.from_course_enrollment(ce[1], site=self.site, date_for=date_for)
+        StudentModuleFactory.from_course_enrollment(
+            ce[2], modified=as_datetime(date_for - timedelta(days=1)))
+        EnrollmentDataFactory.from_course_enrollment(ce[2], site=self.site, date_for=date_for)
         found = [rec for rec in stale_course_enrollments(self.course_overview.id)]
         assert set(found) == set(ce[:2])
 
+    def test_needs_update_without_subquery(self, monkeypatch):
+        """Ginkgo (Django 1.8) does not have `Subquery`, so we match in Python
+        """
+        monkeypatch.setattr('figures.pipeline.enrollment_metrics_next.Subquery', None)
+        self.test_needs_update()
+
+    def test_only_course_enrollments(self):
+        """Activity in other courses does not make the course's enrollments stale
+        """
+        date_for = utc_yesterday()
+        ce = CourseEnrollmentFactory(course_id=self.course_overview.id)
+        StudentModuleFactory.from_course_enrollment(
+            ce, modified=as_datetime(date_for - timedelta(days=1)))
+        EnrollmentDataFactory.from_course_enrollment(ce, site=self.site, date_for=date_for)
+        other_ce = CourseEnrollmentFactory(user=ce.user)
+        StudentModuleFactory.from_course_enrollment(other_ce)
+        assert not [rec for rec in stale_course_enrollments(self.course_overview.id)]
+
 
 @pytest.mark.django_db
 class TestCalculateProgress(object):
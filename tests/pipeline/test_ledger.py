@@ -0,0 +1,144 @@
+"""Tests the pipeline run ledger in figures.pipeline.ledger
+"""
+
+from __future__ import absolute_import
+from datetime import timedelta
+
+import pytest
+
+from django.contrib.sites.models import Site
+from django.utils.timezone import now
+
+from figures.log import record_grade_call, record_rows
+from figures.models import PipelineRun, PipelineStage
+from figures.pipeline.ledger import (
+    current_run,
+    pipeline_run,
+    pipeline_stage,
+    prune_pipeline_ledger,
+    slowest,
+)
+
+from tests.factories import SiteFactory
+
+
+@pytest.mark.django_db
+class TestPipelineLedger(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = Site.objects.first()
+
+    def test_run_and_stages(self):
+        with pipeline_run('test_run', site=self.site, date_for='2020-02-02') as run:
+            assert current_run() == run
+            with pipeline_stage('alpha', course_id='course-v1:Org+Num+Run'):
+                record_rows(read=10, written=4)
+                record_grade_call()
+                Site.objects.count()
+            with pipeline_stage('bravo'):
+                record_rows(written=1)
+        assert current_run() is None
+
+        run = PipelineRun.objects.get()
+        assert run.name == 'test_run'
+        assert run.status == PipelineRun.COMPLETED
+        assert str(run.date_for) == '2020-02-02'
+        assert run.elapsed is not None
+        assert run.finished
+
+        alpha = run.stages.get(stage='alpha')
+        assert alpha.site == self.site
+        assert alpha.course_id == 'course-v1:Org+Num+Run'
+        assert alpha.status == PipelineStage.COMPLETED
+        assert alpha.rows_read == 10
+        assert alpha.rows_written == 4
+        assert alpha.grade_calls == 1
+        assert alpha.query_count >= 1
+        bravo = run.stages.get(stage='bravo')
+        assert bravo.rows_written == 1
+        assert bravo.grade_calls == 0
+
+    def test_nested_stages_count_inclusively(self):
+        with pipeline_stage('outer'):
+            record_rows(read=1)
+            with pipeline_stage('inner'):
+                record_rows(read=2)
+        assert PipelineStage.objects.get(stage='outer').rows_read == 3
+        assert PipelineStage.objects.get(stage='inner').rows_read == 2
+
+    def test_stage_without_run(self):
+        record_rows(read=5)
+        with pipeline_stage('alone', site=self.site):
+            pass
+        stage = PipelineStage.objects.get()
+        assert stage.run is None
+        assert stage.rows_read == 0
+
+    def test_failure(self):
+        with pytest.raises(ValueError):
+            with pipeline_run('failing'):
+                with pipeline_stage('broken'):
+                    raise ValueError('boom')
+        assert PipelineRun.objects.get().status == PipelineRun.FAILED
+        assert PipelineStage.objects.get().status == PipelineStage.FAILED
+
+    def test_ledger_disabled(self, monkeypatch, settings):
+        monkeypatch.setitem(settings.ENV_TOKENS['FIGURES'], 'PIPELINE_LEDGER', False)
+        called = []
+        with pipeline_run('not_saved'):
+            with pipeline_stage('not_saved'):
+                called.append(True)
+        assert called
+        assert not PipelineRun.objects.exists()
+        assert not PipelineStage.objects.exists()
+
+    def test_slowest(self):
+        other_site = SiteFactory()
+        for site, stage, elapsed in [(self.site, 'alpha', 1.0),
+                                     (self.site, 'alpha', 2.0),
+                                     (other_site, 'bravo', 5.0)]:
+            with pipeline_stage(stage, site=site) as stage_obj:
+                pass
+            PipelineStage.objects.filter(id=stage_obj.id).update(elapsed=elapsed,
+                                                                 rows_read=1)
+
+        results = slowest(group_by='stage')
+        assert [rec['key'] for rec in results] == ['bravo', 'alpha']
+        assert results[1]['stage_count'] == 2
+        assert results[1]['total_elapsed'] == 3.0
+        assert results[1]['max_elapsed'] == 2.0
+        assert results[1]['total_rows_read'] == 2
+
+        results = slowest(group_by='site', site=self.site)
+        assert [rec['key'] for rec in results] == [self.site.id]
+        assert slowest(group_by='course') == []
+
+    def make_run(self, days_ago):
+        with pipeline_run('run') as run:
+            for _ in range(3):
+                with pipeline_stage('stage'):
+                    pass
+        started = now() - timedelta(days=days_ago)
+        PipelineRun.objects.filter(id=run.id).update(started=started)
+        run.stages.update(started=started)
+        return run
+
+    @pytest.mark.parametrize('batch_size', [1000, 2])
+    def test_prune(self, monkeypatch, batch_size):
+        monkeypatch.setattr('figures.pipeline.ledger.PIPELINE_LEDGER_PRUNE_BATCH_SIZE',
+                            batch_size)
+        old_run = self.make_run(days_ago=31)
+        new_run = self.make_run(days_ago=29)
+        assert prune_pipeline_ledger() == 4
+        assert list(PipelineRun.objects.all()) == [new_run]
+        assert PipelineStage.objects.count() == 3
+        assert not PipelineStage.objects.filter(run_id=old_run.id).exists()
+
+    def test_prune_retention_setting(self, monkeypatch, settings):
+        self.make_run(days_ago=10)
+        monkeypatch.setitem(settings.ENV_TOKENS['FIGURES'], 'PIPELINE_LEDGER_RETENTION_DAYS', None)
+        assert prune_pipeline_ledger() == 0
+        monkeypatch.setitem(settings.ENV_TOKENS['FIGURES'], 'PIPELINE_LEDGER_RETENTION_DAYS', 7)
+        assert prune_pipeline_ledger() == 4
+        assert not PipelineRun.objects.exists()
@@ -153,22 +153,20 @@ class TestSiteDailyMetricsPipelineFunctions(object):
             **cdm
             ) for cdm in CDM_INPUT_TEST_DATA]
 
-    def test_get_active_user_count_for_date(self, monkeypatch):
+    def test_get_active_user_count_for_date(self, settings):
+        settings.FEATURES['FIGURES_IS_MULTISITE'] = False
         assert not get_user_model().objects.count()
         assert not StudentModule.objects.count()
         modified = as_datetime(self.date_for)
+        for user in [UserFactory() for i in range(2)]:
+            StudentModuleFactory(student=user, modified=modified)
+            StudentModuleFactory(student=user, modified=modified)
+        # Not active on the date
+        StudentModuleFactory(modified=as_datetime(prev_day(self.date_for)))
 
-        def mock_student_modules_for_site(site):
-            for user in [UserFactory() for i in range(2)]:
-                StudentModuleFactory(student=user, modified=modified)
-                StudentModuleFactory(student=user, modified=modified)
-            return StudentModule.objects.all()
-
-        monkeypatch.setattr(pipeline_sdm, 'get_student_modules_for_site',
-                            mock_student_modules_for_site)
         users = pipeline_sdm.get_site_active_users_for_date(site=self.site,
                                                             date_for=self.date_for)
-        assert users.count() == get_user_model().objects.count()
+        assert users.count() == 2
 
     @pytest.mark.parametrize('prev_day_data, expected', [
         (SDM_DATA[0], 0,),
@@ -254,17 +252,15 @@ class TestSiteDailyMetricsExtractor(object):
         assert not StudentModule.objects.count()
         modified = as_datetime(self.date_for)
 
-        def mock_student_modules_for_site(site):
-            users = [UserFactory() for i in range(2)]
-            for user in users:
-                StudentModuleFactory(student=user, modified=modified)
-                StudentModuleFactory(student=user, modified=modified)
-            return StudentModule.objects.filter(student__in=users)
-
-        monkeypatch.setattr(pipeline_sdm, 'get_student_modules_for_site',
-                            mock_student_modules_for_site)
+        for user in self.users[:2]:
+            StudentModuleFactory(student=user,
+                                 course_id=self.course_overviews[0].id,
+                                 modified=modified)
+            StudentModuleFactory(student=user,
+                                 course_id=self.course_overviews[0].id,
+                                 modified=modified)
 
-        def mock_site_mau_1g_for_month_as_of_day(site, date_for):
+        def mock_site_mau_1g_for_month_as_of_day(site, date_for, **_kwargs):
             return get_user_model().objects.filter(
                 id__in=[user.id for user in self.users]).values('id')
 
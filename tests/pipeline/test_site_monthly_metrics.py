@@ -4,7 +4,7 @@ This is initial test coverage
 
 """
 from __future__ import absolute_import
-from datetime import datetime
+from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 from django.utils.timezone import utc
 from freezegun import freeze_time
@@ -12,11 +12,17 @@ import pytest
 
 from figures.compat import RELEASE_LINE, StudentModule
 from figures.models import SiteMonthlyMetrics
-from figures.pipeline.site_monthly_metrics import fill_month, fill_last_month
+from figures.pipeline.site_monthly_metrics import (
+    fill_last_month,
+    fill_month,
+    fill_months,
+    monthly_active_user_counts,
+)
 
 from tests.factories import (
     SiteFactory,
     StudentModuleFactory,
+    UserFactory,
 )
 from six.moves import range
 
@@ -106,3 +112,61 @@ def test_fill_last_month_wo_overwrite(monkeypatch, smm_test_data):
     assert obj.active_user_count == len(smm_test_data['last_month_sm'])
     assert obj.site == site
     assert obj.month_for == smm_test_data['last_month'].date()
+
+
+@pytest.mark.django_db
+class TestFillMonths(object):
+    """Tests the single pass monthly active user backfill
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.users = [UserFactory() for _ in range(4)]
+        # Students active more than once in a month count once
+        for user in self.users:
+            StudentModuleFactory(student=user, modified=datetime(2019, 11, 3, tzinfo=utc))
+            StudentModuleFactory(student=user, modified=datetime(2019, 11, 30, 23, 59, tzinfo=utc))
+        # No activity in December
+        for user in self.users[:2]:
+            StudentModuleFactory(student=user, modified=datetime(2020, 1, 1, tzinfo=utc))
+        # Outside of the months
+        StudentModuleFactory(student=self.users[3], modified=datetime(2019, 10, 31, 23, tzinfo=utc))
+        StudentModuleFactory(student=self.users[3], modified=datetime(2020, 2, 1, tzinfo=utc))
+        self.expected = {
+            date(2019, 11, 1): 4,
+            date(2019, 12, 1): 0,
+            date(2020, 1, 1): 2,
+        }
+
+    @pytest.mark.parametrize('chunk_size', [1, 3, 1000])
+    def test_monthly_active_user_counts(self, chunk_size):
+        counts = monthly_active_user_counts(StudentModule.objects.all(),
+                                            start_month=date(2019, 11, 15),
+                                            end_month=date(2020, 1, 31),
+                                            chunk_size=chunk_size)
+        assert counts == self.expected
+
+    def test_fill_months(self, django_assert_max_num_queries):
+        with django_assert_max_num_queries(6):
+            results = fill_months(site=self.site,
+                                  start_month=date(2019, 11, 1),
+                                  end_month=date(2020, 1, 1),
+                                  student_modules=StudentModule.objects.all())
+        assert [(obj.month_for, obj.active_user_count, created)
+                for obj, created in results] == [
+            (month_for, count, True) for month_for, count in sorted(self.expected.items())]
+        assert SiteMonthlyMetrics.objects.filter(site=self.site).count() == 3
+
+    @pytest.mark.parametrize('overwrite, expected_count', [(False, 99), (True, 2)])
+    def test_fill_months_existing(self, overwrite, expected_count):
+        SiteMonthlyMetrics.objects.create(site=self.site,
+                                          month_for=date(2020, 1, 1),
+                                          active_user_count=99)
+        results = fill_months(site=self.site,
+                              start_month=date(2019, 11, 1),
+                              end_month=date(2020, 1, 1),
+                              student_modules=StudentModule.objects.all(),
+                              overwrite=overwrite)
+        assert [created for _, created in results] == [True, True, False]
+        assert SiteMonthlyMetrics.objects.get(
+            site=self.site, month_for=date(2020, 1, 1)).active_user_count == expected_count
@@ -2,57 +2,79 @@
 """
 from __future__ import absolute_import
 import logging
-import mock
 import pytest
 
+from django.contrib.sites.models import Site
+
+from figures.models import EnrollmentData, EnrollmentDataBackfill
 from figures.tasks import backfill_enrollment_data_for_course
 
-from tests.factories import EnrollmentDataFactory
+from tests.factories import (
+    CourseEnrollmentFactory,
+    CourseOverviewFactory,
+    StudentModuleFactory,
+)
 
 
 @pytest.mark.django_db
 class TestBackfillEnrollmentDataForCourse(object):
 
     @pytest.fixture(autouse=True)
-    def setup(self, db):
+    def setup(self, db, monkeypatch):
         self.expected_message_template = (
             'figures.tasks.backfill_enrollment_data_for_course "{course_id}".'
             ' Updated {edrec_count} enrollment data records.')
+        self.site = Site.objects.first()
+        self.course_overview = CourseOverviewFactory()
+        self.course_id = str(self.course_overview.id)
+        monkeypatch.setattr('figures.course.get_site_for_course', lambda val: self.site)
+
+    def log_messages(self, caplog):
+        return [rec.message for rec in caplog.records
+                if rec.name == 'figures.tasks']
 
-    def test_backfill_enrollment_data_for_course_no_update(self, transactional_db,
-                                                           monkeypatch, caplog):
+    def test_backfill_enrollment_data_for_course_no_update(self, caplog):
         """
         The Celery task is a simple wrapper around the pipeline function
         """
-        course_id = 'course-v1:SomeOrg+SomeNum+SomeRun'
-
-        # The function returns a list of tuples with (object, created)
-        # ed_recs = [(EnrollmentDataFactory(), False) for _ in range(2)]
         caplog.set_level(logging.INFO)
-        func_path = 'figures.tasks.stale_course_enrollments'
-        monkeypatch.setattr(func_path, lambda course_id: [])
-        backfill_enrollment_data_for_course(course_id)
-        assert len(caplog.records) == 1
-        assert caplog.records[0].message == self.expected_message_template.format(
-            course_id=course_id,
-            edrec_count=0)
-
-    def test_backfill_enrollment_data_for_course_with_updates(self, transactional_db,
-                                                              monkeypatch, caplog):
+        backfill_enrollment_data_for_course(self.course_id)
+        assert self.log_messages(caplog) == [self.expected_message_template.format(
+            course_id=self.course_id,
+            edrec_count=0)]
+        backfill = EnrollmentDataBackfill.objects.get(course_id=self.course_id)
+        assert backfill.status == EnrollmentDataBackfill.COMPLETED
+
+    def test_backfill_enrollment_data_for_course_with_updates(self, caplog):
         """
         The Celery task is a simple wrapper around the pipeline function
         """
-        course_id = 'course-v1:SomeOrg+SomeNum+SomeRun'
-
-        # The function returns a list of tuples with (object, created)
-        ed_recs = [(EnrollmentDataFactory(), False) for _ in range(2)]
+        enrollments = [CourseEnrollmentFactory(course_id=self.course_overview.id)
+                       for _ in range(2)]
+        for ce in enrollments:
+            StudentModuleFactory.from_course_enrollment(ce)
         caplog.set_level(logging.INFO)
-        monkeypatch.setattr('figures.tasks.stale_course_enrollments', lambda course_id: ed_recs)
-        with mock.patch('figures.tasks.EnrollmentData') as mock_ed_class:
-            mock_ed_class.return_value.objects.update_metrics.return_value = ed_recs
-            backfill_enrollment_data_for_course(course_id)
-
-        assert len(caplog.records) == 1
-        assert caplog.records[0].message == self.expected_message_template.format(
-            course_id=course_id,
-            edrec_count=len(ed_recs))
+        backfill_enrollment_data_for_course(self.course_id)
+
+        assert self.log_messages(caplog) == [self.expected_message_template.format(
+            course_id=self.course_id,
+            edrec_count=len(enrollments))]
+        assert EnrollmentData.objects.count() == len(enrollments)
+
+    def test_backfill_id(self):
+        """The task runs the given backfill instead of the course's backfill
+        """
+        enrollments = [CourseEnrollmentFactory(course_id=self.course_overview.id)
+                       for _ in range(2)]
+        for ce in enrollments:
+            StudentModuleFactory.from_course_enrollment(ce)
+        backfill = EnrollmentDataBackfill.objects.for_range(
+            site=self.site,
+            course_id=self.course_id,
+            min_enrollment_id=enrollments[1].id)
+        backfill_enrollment_data_for_course(self.course_id, backfill_id=backfill.id)
+        backfill.refresh_from_db()
+        assert backfill.processed_count == 1
+        assert EnrollmentDataBackfill.objects.count() == 1
+        assert list(EnrollmentData.objects.values_list('user_id', flat=True)) == [
+            enrollments[1].user_id]
@@ -30,7 +30,9 @@ These are the functions called, the purpose and details
 2. 'populate_daily_metrics_for_site'
 
 * Gets list (queryset) of course id strings for the site
-* Iterates over each course id and calls 'populate_single_cdm' for each course
+* Loads the CourseDailyMetrics records for all the courses together with
+  'BulkCourseDailyMetricsLoader'. If the bulk load fails, calls
+  'populate_single_cdm' for each course
 * After all the CourseDailyMetrics records have been collected, calls
   'populate_single_sdm'
 
@@ -64,20 +66,31 @@ from django.contrib.sites.models import Site
 from waffle.testutils import override_switch
 
 from figures.helpers import as_date, as_datetime, is_multisite
+from figures.activity import ensure_daily_activity
 from figures.models import (CourseDailyMetrics,
-                            SiteDailyMetrics)
+                            DailyActiveUserBitmap,
+                            DailyActiveUserSketch,
+                            SiteDailyMetrics,
+                            StaleEnrollment)
 from figures.sites import default_site
 
 from figures.tasks import (FPD_LOG_PREFIX,
+                           collect_pipeline_daily_activity,
+                           course_id_batches,
                            populate_single_cdm,
                            populate_single_sdm,
+                           populate_cdm_for_courses,
                            populate_daily_metrics_for_site,
+                           populate_daily_metrics_for_site_parallel,
                            populate_daily_metrics,
-                           populate_daily_metrics_next)
+                           populate_daily_metrics_next,
+                           populate_daily_metrics_parallel,
+                           update_stale_enrollment_data)
 from tests.factories import (CourseDailyMetricsFactory,
                              CourseOverviewFactory,
                              SiteDailyMetricsFactory,
-                             SiteFactory)
+                             SiteFactory,
+                             UserFactory)
 from tests.helpers import OPENEDX_RELEASE, GINKGO, FakeException, fake_course_key
 
 
@@ -132,6 +145,17 @@ def test_enable_populate_daily_metrics(caplog, func):
         assert 'disabled' not in caplog.text
 
 
+@pytest.mark.django_db
+def test_populate_daily_metrics_next_prunes_ledger(monkeypatch):
+    calls = []
+    monkeypatch.setattr('figures.tasks._populate_daily_metrics_next',
+                        lambda date_for, **_kwargs: calls.append('run'))
+    monkeypatch.setattr('figures.tasks.prune_pipeline_ledger',
+                        lambda: calls.append('prune'))
+    populate_daily_metrics_next()
+    assert calls == ['run', 'prune']
+
+
 def test_populate_single_sdm(transactional_db, monkeypatch):
     """Test figures.tasks.populate_single_sdm
 
@@ -167,10 +191,10 @@ def test_populate_daily_metrics_for_site_basic(transactional_db,
                                                extra_params):
     site = SiteFactory()
     course_ids = [fake_course_key(i) for i in range(2)]
-    collected_course_ids = []
+    calls = []
 
     def fake_populate_single_cdm(course_id, **_kwargs):
-        collected_course_ids.append(course_id)
+        raise AssertionError('The courses are loaded in bulk')
 
     def fake_populate_single_sdm(site_id, **_kwargs):
         assert site_id == site.id
@@ -179,6 +203,8 @@ def test_populate_daily_metrics_for_site_basic(transactional_db,
         assert extra_params['ed_next']
 
     monkeypatch.setattr('figures.tasks.site_course_ids', lambda site: course_ids)
+    monkeypatch.setattr('figures.tasks.BulkCourseDailyMetricsLoader',
+                        fake_bulk_cdm_loader_class(calls=calls))
     monkeypatch.setattr('figures.tasks.populate_single_cdm',
                         fake_populate_single_cdm)
     monkeypatch.setattr('figures.tasks.populate_single_sdm',
@@ -187,7 +213,32 @@ def test_populate_daily_metrics_for_site_basic(transactional_db,
                         fake_update_enrollment_data_for_course)
 
     populate_daily_metrics_for_site(site_id=site.id, date_for=date_for, **extra_params)
-    assert set(collected_course_ids) == set(course_ids)
+    assert [call[1] for call in calls] == course_ids
+
+
+@pytest.mark.parametrize('extra_params', [{}, {'ed_next': True}])
+def test_populate_daily_metrics_for_site_bulk_validation_error(transactional_db,
+                                                               monkeypatch,
+                                                               caplog,
+                                                               extra_params):
+    """A course failing validation in the bulk load is logged
+    """
+    site = SiteFactory()
+    course_ids = [str(fake_course_key(i)) for i in range(3)]
+    bad_course_id = course_ids[1]
+    calls = []
+
+    monkeypatch.setattr('figures.tasks.site_course_ids', lambda site: course_ids)
+    monkeypatch.setattr('figures.tasks.BulkCourseDailyMetricsLoader',
+                        fake_bulk_cdm_loader_class(bad_course_id, calls))
+    monkeypatch.setattr('figures.tasks.populate_single_sdm', lambda **_kwargs: None)
+    monkeypatch.setattr('figures.tasks.update_enrollment_data_for_course',
+                        lambda course_id: None)
+
+    populate_daily_metrics_for_site(site_id=site.id, date_for='2020-12-12', **extra_params)
+
+    assert [call[1] for call in calls] == [course_ids[0], course_ids[2]]
+    assert 'course_id:{}'.format(bad_course_id) in caplog.text
 
 
 @pytest.mark.skipif(OPENEDX_RELEASE == GINKGO,
@@ -212,6 +263,8 @@ def test_populate_daily_metrics_for_site_error_on_cdm(transactional_db,
 
     monkeypatch.setattr('figures.tasks.site_course_ids',
                         lambda site: fake_course_ids)
+    monkeypatch.setattr('figures.tasks.BulkCourseDailyMetricsLoader',
+                        fake_bulk_cdm_loader_class(raises=True))
     monkeypatch.setattr('figures.tasks.populate_single_cdm',
                         fake_pop_single_cdm_fails)
     monkeypatch.setattr('figures.tasks.update_enrollment_data_for_course',
@@ -371,3 +424,289 @@ def test_populate_daily_metrics_multisite(transactional_db, monkeypatch, caplog,
         func()
 
         assert not caplog.records
+
+
+@pytest.mark.parametrize('num_course_ids, batch_size, expected_sizes', [
+    (0, 3, []),
+    (2, 3, [2]),
+    (6, 3, [3, 3]),
+    (7, 3, [3, 3, 1]),
+])
+def test_course_id_batches(num_course_ids, batch_size, expected_sizes):
+    course_ids = [fake_course_key(i) for i in range(num_course_ids)]
+    batches = list(course_id_batches(course_ids, batch_size))
+    assert [len(batch) for batch in batches] == expected_sizes
+    assert [cid for batch in batches for cid in batch] == [str(cid) for cid in course_ids]
+
+
+def fake_bulk_cdm_loader_class(bad_course_id=None, calls=None, raises=False):
+    """Build a fake `BulkCourseDailyMetricsLoader` class
+
+    `bad_course_id` is reported as failing validation. Loaded course ids are
+    appended to `calls` as `('cdm', course_id, date_for)` tuples
+    """
+    class FakeBulkCourseDailyMetricsLoader(object):
+        def __init__(self, site, course_ids, **_kwargs):
+            self.site = site
+            self.course_ids = course_ids
+
+        def load(self, date_for, **_kwargs):
+            if raises:
+                raise FakeException('Bulk hey!')
+            errors = []
+            for course_id in self.course_ids:
+                if course_id == bad_course_id:
+                    errors.append(dict(course_id=course_id, error='Hey!'))
+                elif calls is not None:
+                    calls.append(('cdm', course_id, as_date(date_for)))
+            return dict(created=[], updated=[], skipped=[], errors=errors)
+
+    return FakeBulkCourseDailyMetricsLoader
+
+
+@pytest.mark.parametrize('extra_params', [{}, {'ed_next': True}])
+def test_populate_cdm_for_courses_bulk(transactional_db,
+                                       monkeypatch,
+                                       caplog,
+                                       extra_params):
+    """Courses are loaded together and invalid courses are reported as failed
+    """
+    site = SiteFactory()
+    date_for = '2020-12-12'
+    course_ids = [str(fake_course_key(i)) for i in range(3)]
+    bad_course_id = course_ids[1]
+    calls = []
+
+    def fake_update_enrollment_data_for_course(course_id):
+        assert extra_params['ed_next']
+
+    monkeypatch.setattr('figures.tasks.BulkCourseDailyMetricsLoader',
+                        fake_bulk_cdm_loader_class(bad_course_id, calls))
+    monkeypatch.setattr('figures.tasks.update_enrollment_data_for_course',
+                        fake_update_enrollment_data_for_course)
+
+    results = populate_cdm_for_courses(site_id=site.id,
+                                       course_ids=course_ids,
+                                       date_for=date_for,
+                                       **extra_params)
+
+    assert results['processed'] == [course_ids[0], course_ids[2]]
+    assert results['failed'] == [bad_course_id]
+    assert [call[1] for call in calls] == results['processed']
+
+
+@pytest.mark.parametrize('extra_params', [{}, {'ed_next': True}])
+def test_populate_cdm_for_courses_isolates_course_failure(transactional_db,
+                                                          monkeypatch,
+                                                          caplog,
+                                                          extra_params):
+    """If the bulk load fails, each course is populated on its own
+
+    A failing course is logged and reported but does not stop the batch
+    """
+    site = SiteFactory()
+    date_for = '2020-12-12'
+    course_ids = [str(fake_course_key(i)) for i in range(3)]
+    bad_course_id = course_ids[1]
+    collected_course_ids = []
+
+    def fake_populate_single_cdm(course_id, **_kwargs):
+        if course_id == bad_course_id:
+            raise FakeException('Hey!')
+        collected_course_ids.append(course_id)
+
+    def fake_update_enrollment_data_for_course(course_id):
+        assert extra_params['ed_next']
+
+    monkeypatch.setattr('figures.tasks.BulkCourseDailyMetricsLoader',
+                        fake_bulk_cdm_loader_class(raises=True))
+    monkeypatch.setattr('figures.tasks.populate_single_cdm',
+                        fake_populate_single_cdm)
+    monkeypatch.setattr('figures.tasks.update_enrollment_data_for_course',
+                        fake_update_enrollment_data_for_course)
+
+    results = populate_cdm_for_courses(site_id=site.id,
+                                       course_ids=course_ids,
+                                       date_for=date_for,
+                                       **extra_params)
+
+    assert results['processed'] == [course_ids[0], course_ids[2]]
+    assert results['failed'] == [bad_course_id]
+    assert collected_course_ids == results['processed']
+    expected_msg = ('{prefix}:SITE:COURSE:FAIL:populate_cdm_for_courses. '
+                    'site_id:{site_id}, date_for:{date_for}. '
+                    'course_id:{course_id} exception:{exception}'
+                    ).format(prefix=FPD_LOG_PREFIX,
+                             site_id=site.id,
+                             date_for=date_for,
+                             course_id=bad_course_id,
+                             exception='Hey!')
+    assert expected_msg in [rec.message for rec in caplog.records]
+
+
+def test_populate_cdm_for_courses_enrollment_data_failure(transactional_db,
+                                                          monkeypatch):
+    """A course failing to update enrollment data is not loaded
+    """
+    site = SiteFactory()
+    course_ids = [str(fake_course_key(i)) for i in range(3)]
+    bad_course_id = course_ids[1]
+    calls = []
+
+    def fake_update_enrollment_data_for_course(course_id):
+        if course_id == bad_course_id:
+            raise FakeException('Hey!')
+
+    monkeypatch.setattr('figures.tasks.BulkCourseDailyMetricsLoader',
+                        fake_bulk_cdm_loader_class(calls=calls))
+    monkeypatch.setattr('figures.tasks.update_enrollment_data_for_course',
+                        fake_update_enrollment_data_for_course)
+
+    results = populate_cdm_for_courses(site_id=site.id,
+                                       course_ids=course_ids,
+                                       date_for='2020-12-12',
+                                       ed_next=True)
+
+    assert results['processed'] == [course_ids[0], course_ids[2]]
+    assert results['failed'] == [bad_course_id]
+    assert [call[1] for call in calls] == results['processed']
+
+
+@pytest.mark.parametrize('num_courses', [0, 1, 5])
+def test_populate_daily_metrics_for_site_parallel(transactional_db,
+                                                  monkeypatch,
+                                                  settings,
+                                                  num_courses):
+    """Each course is processed in a batch and the SDM is populated last
+
+    Test settings run Celery tasks eagerly, so the chord runs in process
+    """
+    settings.ENV_TOKENS['FIGURES']['DAILY_METRICS_COURSE_BATCH_SIZE'] = 2
+    site = SiteFactory()
+    date_for = '2020-12-12'
+    course_ids = [fake_course_key(i) for i in range(num_courses)]
+    bad_course_id = str(course_ids[0]) if course_ids else None
+    calls = []
+
+    def fake_populate_single_sdm(site_id, date_for, **_kwargs):
+        calls.append(('sdm', site_id, as_date(date_for)))
+
+    monkeypatch.setattr('figures.tasks.site_course_ids', lambda site: course_ids)
+    monkeypatch.setattr('figures.tasks.BulkCourseDailyMetricsLoader',
+                        fake_bulk_cdm_loader_class(bad_course_id, calls))
+    monkeypatch.setattr('figures.tasks.populate_single_sdm',
+                        fake_populate_single_sdm)
+
+    populate_daily_metrics_for_site_parallel(site_id=site.id, date_for=date_for)
+
+    expected_cdm_calls = [('cdm', str(cid), as_date(date_for)) for cid in course_ids[1:]]
+    assert calls == expected_cdm_calls + [('sdm', site.id, as_date(date_for))]
+    settings.ENV_TOKENS['FIGURES'].pop('DAILY_METRICS_COURSE_BATCH_SIZE')
+
+
+@pytest.mark.django_db
+def test_populate_daily_metrics_parallel_dispatches_per_site(monkeypatch):
+    """Each site gets its own site task and a failing site does not stop others
+    """
+    sites = [SiteFactory() for i in range(3)]
+    bad_site = sites[1]
+    visited_site_ids = []
+
+    def fake_populate_daily_metrics_for_site_parallel(site_id, **_kwargs):
+        visited_site_ids.append(site_id)
+        if site_id == bad_site.id:
+            raise FakeException('Hey!')
+
+    monkeypatch.setattr('figures.tasks.get_sites',
+                        lambda: Site.objects.filter(id__in=[s.id for s in sites]))
+    monkeypatch.setattr(
+        'figures.tasks.populate_daily_metrics_for_site_parallel.run',
+        fake_populate_daily_metrics_for_site_parallel)
+
+    populate_daily_metrics_parallel()
+
+    assert set(visited_site_ids) == set(site.id for site in sites)
+
+
+@pytest.mark.django_db
+def test_disable_populate_daily_metrics_parallel(caplog):
+    with override_switch('figures.disable_pipeline', active=True):
+        populate_daily_metrics_parallel()
+        assert 'disabled' in caplog.text
+
+
+def test_populate_daily_metrics_for_site_stale_enrollment_queue(transactional_db,
+                                                                monkeypatch,
+                                                                settings):
+    """With the stale enrollment queue, only courses with queued enrollments
+    have their enrollment data updated
+    """
+    monkeypatch.setitem(settings.ENV_TOKENS['FIGURES'], 'ENABLE_STALE_ENROLLMENT_QUEUE', True)
+    site = SiteFactory()
+    course_ids = [str(fake_course_key(i)) for i in range(3)]
+    StaleEnrollment.objects.mark(UserFactory().id, course_ids[1])
+    calls = []
+    updated_course_ids = []
+
+    monkeypatch.setattr('figures.tasks.site_course_ids', lambda site: course_ids)
+    monkeypatch.setattr('figures.tasks.BulkCourseDailyMetricsLoader',
+                        fake_bulk_cdm_loader_class(calls=calls))
+    monkeypatch.setattr('figures.tasks.populate_single_sdm', lambda **_kwargs: None)
+    monkeypatch.setattr('figures.tasks.update_stale_enrollment_data_for_course',
+                        updated_course_ids.append)
+
+    populate_daily_metrics_for_site(site_id=site.id, date_for='2020-12-12', ed_next=True)
+
+    assert updated_course_ids == [course_ids[1]]
+    assert [call[1] for call in calls] == course_ids
+
+
+@pytest.mark.parametrize('queue_enabled', [True, False])
+def test_update_stale_enrollment_data(transactional_db, monkeypatch, settings, caplog,
+                                      queue_enabled):
+    """The queued courses of each site are updated and a course failure is logged
+    """
+    monkeypatch.setitem(settings.ENV_TOKENS['FIGURES'],
+                        'ENABLE_STALE_ENROLLMENT_QUEUE', queue_enabled)
+    site = SiteFactory()
+    course_ids = [str(fake_course_key(i)) for i in range(3)]
+    bad_course_id = course_ids[0]
+    for course_id in course_ids[:2]:
+        StaleEnrollment.objects.mark(UserFactory().id, course_id)
+    updated_course_ids = []
+
+    def fake_update_stale_enrollment_data_for_course(course_id):
+        if course_id == bad_course_id:
+            raise FakeException('Hey!')
+        updated_course_ids.append(course_id)
+
+    monkeypatch.setattr('figures.tasks.get_sites', lambda: Site.objects.filter(id=site.id))
+    monkeypatch.setattr('figures.tasks.site_course_ids', lambda site: course_ids)
+    monkeypatch.setattr('figures.tasks.update_stale_enrollment_data_for_course',
+                        fake_update_stale_enrollment_data_for_course)
+
+    update_stale_enrollment_data()
+
+    if queue_enabled:
+        assert updated_course_ids == [course_ids[1]]
+        assert 'update_stale_enrollment_data_for_site' in caplog.text
+    else:
+        assert updated_course_ids == []
+
+
+@pytest.mark.parametrize('setting_key, model_class', [
+    ('APPROXIMATE_ACTIVE_USERS', DailyActiveUserSketch),
+    ('ACTIVE_USER_BITMAPS', DailyActiveUserBitmap),
+])
+def test_collect_pipeline_daily_activity_builds_summaries(db, monkeypatch, settings,
+                                                          setting_key, model_class):
+    """Summaries are built for a day collected before their mode was enabled
+    """
+    date_for = date(2020, 3, 1)
+    ensure_daily_activity(date_for)
+    assert not model_class.objects.exists()
+    monkeypatch.setitem(settings.ENV_TOKENS['FIGURES'], setting_key, True)
+
+    collect_pipeline_daily_activity(date_for)
+
+    assert model_class.objects.filter(date_for=date_for).exists()
@@ -16,6 +16,8 @@ from figures.models import (
     LearnerCourseGradeMetrics,
     MonthlyActiveEnrollment,
     PipelineError,
+    PipelineRun,
+    PipelineStage,
     CourseMauMetrics,
     )
 
@@ -43,6 +45,8 @@ class TestModelAdminRepresentations(object):
             (MonthlyActiveEnrollment, figures.admin.MonthlyActiveEnrollmentAdmin),
             (PipelineError, figures.admin.PipelineErrorAdmin),
             (CourseMauMetrics, figures.admin.CourseMauMetricsAdmin),
+            (PipelineRun, figures.admin.PipelineRunAdmin),
+            (PipelineStage, figures.admin.PipelineStageAdmin),
         ])
     def test_metrics_model_admin(self, model_class, model_admin_class):
         obj = model_admin_class(model_class, self.admin_site)
@@ -5,6 +5,7 @@
 from __future__ import absolute_import
 import mock
 import pytest
+from six.moves import reload_module
 
 from tests.helpers import OPENEDX_RELEASE, GINKGO
 
@@ -28,8 +29,11 @@ def test_production_settings_name(klass, expected_val):
     module = mock.Mock()
     setattr(module, 'SettingsType', klass)
     with mock.patch.dict('sys.modules', {key: module}):
-        from figures.apps import production_settings_name
-        name = production_settings_name()
+        # Django imports `figures.apps` when it loads the app, so we reload it
+        # to import the mocked `SettingsType`
+        import figures.apps
+        reload_module(figures.apps)
+        name = figures.apps.production_settings_name()
         assert name == expected_val
 
 
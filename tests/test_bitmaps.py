@@ -0,0 +1,48 @@
+"""Tests the figures.bitmaps module
+"""
+from __future__ import absolute_import
+import random
+
+import pytest
+
+from figures.bitmaps import UserBitmap, union_bitmaps
+
+
+@pytest.mark.parametrize('ids', [
+    [],
+    [0],
+    [1, 7, 8, 9, 16],
+    random.sample(range(1, 100000), 5000),
+])
+def test_from_ids(ids):
+    bitmap = UserBitmap.from_ids(ids + ids[:10])
+    assert bitmap.count() == len(ids)
+    assert list(bitmap) == sorted(ids)
+    assert all(user_id in bitmap for user_id in ids)
+
+
+def test_negative_id():
+    with pytest.raises(ValueError):
+        UserBitmap.from_ids([1, -1])
+
+
+def test_union_and_intersection():
+    first = UserBitmap.from_ids(range(0, 300))
+    second = UserBitmap.from_ids(range(200, 1000))
+    assert first | second == UserBitmap.from_ids(range(0, 1000))
+    assert union_bitmaps([first, second]).count() == 1000
+    assert (first & second).count() == 100
+    assert union_bitmaps([]).count() == 0
+
+
+@pytest.mark.parametrize('ids', [[], [0], random.sample(range(1, 100000), 500)])
+def test_serialization(ids):
+    bitmap = UserBitmap.from_ids(ids)
+    data = bitmap.to_bytes()
+    assert UserBitmap.from_bytes(data) == bitmap
+    assert UserBitmap.from_bytes(memoryview(data)) == bitmap
+
+
+def test_sparse_bitmaps_compress():
+    bitmap = UserBitmap.from_ids([10, 500000, 1000000])
+    assert len(bitmap.to_bytes()) < 1000000 // 8 // 100
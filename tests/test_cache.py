@@ -0,0 +1,154 @@
+"""Tests the figures.cache module
+"""
+from __future__ import absolute_import
+import pytest
+
+from django.contrib.sites.models import Site
+from django.core.cache import caches
+from django.db import transaction
+
+from figures.cache import FiguresCache, LRUCache, sites_cache, with_sites_memo
+from figures.compat import on_commit
+import figures.sites
+
+from tests.factories import CourseOverviewFactory
+
+
+class Counter(object):
+    """Returns `value` and counts the calls
+    """
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+class TestLRUCache(object):
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1, 60)
+        lru.set('b', 2, 60)
+        assert lru.get('a') == 1
+        lru.set('c', 3, 60)
+        assert lru.get('b') is None
+        assert lru.get('a') == 1
+        assert lru.get('c') == 3
+        assert len(lru) == 2
+
+    def test_expires(self):
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1, -1)
+        assert lru.get('a', 'missing') == 'missing'
+
+
+class TestFiguresCache(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.timeout = 60
+        self.cache = FiguresCache(namespace='test',
+                                  timeout=lambda: self.timeout,
+                                  lru_size=lambda: 10,
+                                  backend=lambda: caches['default'])
+        self.cache.invalidate()
+
+    @pytest.mark.parametrize('value', [None, 'value'])
+    def test_get_or_set(self, value):
+        compute = Counter(value)
+        assert self.cache.get_or_set('lookup', 'key', compute) == value
+        assert self.cache.get_or_set('lookup', 'key', compute) == value
+        assert compute.calls == 1
+
+    def test_shared_backend(self):
+        """Another process with the same backend gets the cached value
+        """
+        compute = Counter('value')
+        self.cache.get_or_set('lookup', 'key', compute)
+        other = FiguresCache(namespace='test',
+                             timeout=lambda: self.timeout,
+                             lru_size=lambda: 10,
+                             backend=lambda: caches['default'])
+        assert other.get_or_set('lookup', 'key', compute) == 'value'
+        assert compute.calls == 1
+        other.invalidate()
+        assert self.cache.get_or_set('lookup', 'key', compute) == 'value'
+        assert compute.calls == 2
+
+    def test_invalidate_in_memo(self):
+        compute = Counter('value')
+        with self.cache.memo():
+            self.cache.get_or_set('lookup', 'key', compute)
+            self.cache.invalidate()
+            self.cache.get_or_set('lookup', 'key', compute)
+        assert compute.calls == 2
+
+    def test_memo(self):
+        """Inside a memo scope, the backend is not used after the first lookup
+        """
+        compute = Counter('value')
+        with self.cache.memo():
+            with self.cache.memo():
+                self.cache.get_or_set('lookup', 'key', compute)
+            caches['default'].clear()
+            self.cache._lru.clear()
+            assert self.cache.get_or_set('lookup', 'key', compute) == 'value'
+        assert compute.calls == 1
+        assert self.cache._get_memo() is None
+
+    def test_disabled(self):
+        self.timeout = 0
+        compute = Counter('value')
+        self.cache.get_or_set('lookup', 'key', compute)
+        self.cache.get_or_set('lookup', 'key', compute)
+        assert compute.calls == 2
+
+
+@pytest.mark.django_db
+class TestSitesCache(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings):
+        settings.FEATURES['FIGURES_IS_MULTISITE'] = False
+        self.site = Site.objects.first()
+        self.course_overviews = [CourseOverviewFactory() for _ in range(2)]
+
+    def test_cached(self, django_assert_num_queries):
+        expected = set(str(co.id) for co in self.course_overviews)
+        assert set(figures.sites.site_course_ids(self.site)) == expected
+        with django_assert_num_queries(0):
+            assert set(figures.sites.site_course_ids(self.site)) == expected
+            keys = figures.sites.get_course_keys_for_site(self.site)
+            assert set(str(key) for key in keys) == expected
+
+    def test_invalidated_on_course_overview_change(self, transactional_db):
+        figures.sites.site_course_ids(self.site)
+        new_course = CourseOverviewFactory()
+        assert str(new_course.id) in figures.sites.site_course_ids(self.site)
+        new_course.delete()
+        assert str(new_course.id) not in figures.sites.site_course_ids(self.site)
+
+    @pytest.mark.skipif(on_commit is None,
+                        reason='Ginkgo invalidates the cache immediately')
+    def test_invalidated_on_commit(self, transactional_db):
+        """The mappings cached before the change commits are invalidated
+        """
+        figures.sites.site_course_ids(self.site)
+        with transaction.atomic():
+            new_course = CourseOverviewFactory()
+            # Another process could cache the mappings before the commit
+            assert str(new_course.id) not in figures.sites.site_course_ids(self.site)
+        assert str(new_course.id) in figures.sites.site_course_ids(self.site)
+
+    def test_with_sites_memo(self, django_assert_num_queries):
+        @with_sites_memo
+        def lookup_twice():
+            figures.sites.get_site_for_course(self.course_overviews[0].id)
+            with django_assert_num_queries(0):
+                return figures.sites.get_site_for_course(self.course_overviews[0].id)
+
+        assert lookup_twice() == self.site
+        assert sites_cache._get_memo() is None
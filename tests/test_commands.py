@@ -69,6 +69,17 @@ class TestPopulateFiguresMetricsCommand(object):
                 'no_delay': True, 'experimental': True, 'overwrite': True,
                 'date_start': '2021-06-14', 'date_end': '2021-06-14'
             }
+        ),
+        (
+            {
+                'mau': False, 'no_delay': True, 'date': '2021-06-14',
+                'experimental': True, 'force_update': True, 'workers': 4
+            },
+            'backfill_figures_daily_metrics',
+            {
+                'no_delay': True, 'experimental': True, 'overwrite': True,
+                'date_start': '2021-06-14', 'date_end': '2021-06-14', 'workers': 4
+            }
         )
     ])
     def test_correct_subtitute_commands_called(self, options, subst_command, subst_call_options):
@@ -109,3 +120,12 @@ class TestBackfillFiguresMetricsCommand(object):
             monthlycmd = 'backfill_figures_monthly_metrics'
             mock_call_cmd.assert_any_call(dailycmd, **subst_call_options)
             mock_call_cmd.assert_any_call(monthlycmd, **subst_call_options)
+
+    def test_workers_passed_to_daily_metrics(self):
+        old_pop_cmd = 'figures.management.commands.backfill_figures_metrics.call_command'
+        with mock.patch(old_pop_cmd) as mock_call_cmd:
+            call_command('backfill_figures_metrics', overwrite=True, workers=4)
+            mock_call_cmd.assert_any_call('backfill_figures_daily_metrics',
+                                          site=None, overwrite=True, workers=4)
+            mock_call_cmd.assert_any_call('backfill_figures_monthly_metrics',
+                                          site=None, overwrite=True)
@@ -177,3 +177,22 @@ def test_chapter_grade_values_invalid():
     reload(figures.compat)
     with pytest.raises(TypeError):
         figures.compat.chapter_grade_values('hello world')
+
+
+@pytest.mark.django_db
+def test_bulk_create_caps_batch_size():
+    """More rows than the database takes in one insert are split into batches
+    """
+    import datetime
+    import figures.compat
+    from figures.models import LearnerDailyActivity
+    from tests.factories import UserFactory
+    reload(figures.compat)
+    user = UserFactory()
+    first_day = datetime.date(2020, 1, 1)
+    records = [LearnerDailyActivity(course_id='course-v1:a+b+c',
+                                    user=user,
+                                    date_for=first_day + datetime.timedelta(days=i))
+               for i in range(1200)]
+    figures.compat.bulk_create(LearnerDailyActivity, records, batch_size=5000)
+    assert LearnerDailyActivity.objects.count() == 1200
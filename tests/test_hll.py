@@ -0,0 +1,84 @@
+"""Tests the figures.hll module
+"""
+from __future__ import absolute_import
+import math
+
+import pytest
+
+from figures.hll import HyperLogLog, hash64, merge_sketches
+
+
+def max_error(precision, count):
+    """Allow four standard errors
+    """
+    return 4 * 1.04 / math.sqrt(2 ** precision) * count
+
+
+@pytest.mark.parametrize('precision', [8, 12, 14])
+@pytest.mark.parametrize('count', [0, 1, 50, 1000, 50000])
+def test_count_accuracy(precision, count):
+    sketch = HyperLogLog(precision)
+    sketch.update(range(count))
+    # Adding values again does not change the estimate
+    sketch.update(range(count // 2))
+    assert abs(sketch.count() - count) <= max(max_error(precision, count), 1)
+
+
+def test_small_counts_are_exact():
+    sketch = HyperLogLog()
+    sketch.update(range(10))
+    assert sketch.count() == 10
+
+
+def test_merge_matches_union():
+    first = HyperLogLog()
+    first.update(range(0, 30000))
+    second = HyperLogLog()
+    second.update(range(20000, 50000))
+    union = HyperLogLog()
+    union.update(range(0, 50000))
+    assert first.copy().merge(second).registers == union.registers
+    assert merge_sketches([first, second]).count() == union.count()
+
+
+def test_reduce_matches_lower_precision():
+    values = range(0, 20000)
+    sketch = HyperLogLog(14)
+    sketch.update(values)
+    expected = HyperLogLog(10)
+    expected.update(values)
+    assert sketch.reduce(10).registers == expected.registers
+
+
+def test_merge_different_precisions():
+    first = HyperLogLog(14)
+    first.update(range(0, 30000))
+    second = HyperLogLog(10)
+    second.update(range(30000, 60000))
+    merged = merge_sketches([first, second])
+    assert merged.precision == 10
+    assert abs(merged.count() - 60000) <= max_error(10, 60000)
+    with pytest.raises(ValueError):
+        first.merge(second)
+
+
+def test_serialization():
+    sketch = HyperLogLog()
+    sketch.update(range(1000))
+    data = sketch.to_bytes()
+    assert len(data) < sketch.num_registers
+    assert HyperLogLog.from_bytes(data, sketch.precision).registers == sketch.registers
+    assert HyperLogLog.from_bytes(memoryview(data), sketch.precision).count() == sketch.count()
+
+
+def test_invalid_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
+    with pytest.raises(ValueError):
+        HyperLogLog(17)
+
+
+def test_hash64_spreads_bits():
+    assert hash64(1) != hash64(2)
+    assert all(0 <= hash64(value) < 2 ** 64 for value in range(100))
+    assert len(set(hash64(value) >> 60 for value in range(100))) == 16
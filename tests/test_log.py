@@ -4,7 +4,17 @@
 import logging
 import pytest
 
-from figures.log import log_exec_time
+from django.contrib.sites.models import Site
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from figures.log import (
+    QueryStats,
+    instrument_queries,
+    log_exec_time,
+    with_query_instrumentation,
+    wrap_connection,
+)
+from figures.sites import default_site
 
 
 logger = logging.getLogger(__name__)
@@ -56,3 +66,77 @@ class TestLogExecTime(object):
         with log_exec_time(my_message):
             some_func()
         assert not caplog.records
+
+
+def count_sites():
+    """Runs a query from a tests module, outside of the Figures package
+    """
+    return Site.objects.count()
+
+
+@pytest.mark.django_db
+class TestQueryInstrumentation(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch, settings):
+        self.tokens = settings.ENV_TOKENS['FIGURES']
+        monkeypatch.setitem(self.tokens, 'QUERY_INSTRUMENTATION', True)
+
+    def test_query_stats(self):
+        stats = QueryStats(threshold=0)
+        with wrap_connection(stats):
+            count_sites()
+            count_sites()
+        count_sites()
+        assert stats.count == 2
+        assert stats.time > 0
+        assert len(stats.slow_queries) == 2
+        assert 'django_site' in stats.slow_queries[0]['sql']
+
+    def test_slow_query_caller(self):
+        """The caller is the innermost function in the figures package
+        """
+        stats = QueryStats(threshold=0)
+        with wrap_connection(stats):
+            list(Site.objects.all())
+            default_site()
+        assert stats.slow_queries[0]['caller'] is None
+        assert stats.slow_queries[1]['caller'].startswith('figures.sites.')
+
+    def test_cursor_wrapping_without_execute_wrapper(self, monkeypatch):
+        """Older Django versions, like Ginkgo's, have no `execute_wrapper`
+        """
+        monkeypatch.delattr(BaseDatabaseWrapper, 'execute_wrapper')
+        outer = QueryStats()
+        inner = QueryStats()
+        with wrap_connection(outer):
+            with wrap_connection(inner):
+                count_sites()
+            count_sites()
+        count_sites()
+        assert inner.count == 1
+        assert outer.count == 2
+
+    def test_instrument_queries(self, caplog, monkeypatch):
+        caplog.set_level(logging.INFO)
+        monkeypatch.setitem(self.tokens, 'SLOW_QUERY_THRESHOLD', 0)
+        with instrument_queries('my-block') as stats:
+            count_sites()
+        assert stats.count == 1
+        messages = [rec.message for rec in caplog.records]
+        assert messages[0].startswith('my-block: 1 queries in')
+        assert messages[1].startswith('my-block: slow query')
+
+    def test_instrument_queries_disabled(self, caplog, monkeypatch):
+        caplog.set_level(logging.INFO)
+        monkeypatch.setitem(self.tokens, 'QUERY_INSTRUMENTATION', False)
+        with instrument_queries('my-block') as stats:
+            count_sites()
+        assert stats is None
+        assert not caplog.records
+
+    def test_with_query_instrumentation(self, caplog):
+        caplog.set_level(logging.INFO)
+        assert with_query_instrumentation(count_sites)() == 1
+        assert caplog.records[-1].message.startswith(
+            'tests.test_log.count_sites: 1 queries in')
@@ -1,13 +1,13 @@
 
 from __future__ import absolute_import
-from datetime import datetime
+from datetime import date, datetime
 from freezegun import freeze_time
 import pytest
 
 from django.utils.timezone import utc
 from figures.compat import StudentModule
 
-from figures.helpers import as_datetime, as_date
+from figures.helpers import as_datetime, as_date, days_in_month
 from figures.sites import (
     get_student_modules_for_site,
     get_student_modules_for_course_in_site,
@@ -16,9 +16,11 @@ from figures.mau import (
     get_mau_from_student_modules,
     get_mau_from_site_course,
     mau_1g_for_month_as_of_day,
+    retrieve_live_site_mau_data,
     site_mau_1g_for_month_as_of_day,
     store_mau_metrics,
 )
+from figures.models import LearnerDailyActivity, MonthlyActiveEnrollment
 
 from tests.factories import StudentModuleFactory
 
@@ -97,43 +99,60 @@ def test_mau_1g_for_month_as_of_day_first_day_next_month(db):
     assert set([rec['student__id'] for rec in user_ids]) == set(expected_user_ids)
 
 
-def test_site_mau_1g_for_month_as_of_day(monkeypatch):
+@pytest.mark.parametrize('collect', [False, True])
+def test_site_mau_1g_for_month_as_of_day(sm_test_data, collect):
     """Test our wrapper function, site_mau_1g_for_month_as_of_day
 
-    All we really care about is the call stack is what we expect with the args
-    we expect
+    The users active from the first of the month through "date_for" are
+    counted from StudentModule, or from the daily activity table if the
+    pipeline collects it
     """
-    expected_site = 'this is our site'
-    expected_date_for = 'this is my date'
-    expected_sm_queryset = 'this is my expected student module queryset'
-    expected_user_id_qs = 'this is my expected user id queryset'
-
-    def mock_get_student_modules_for_site(site):
-        assert site == expected_site
-        return expected_sm_queryset
-
-    def mock_mau_1g_for_month_as_of_day(sm_queryset, date_for):
-        assert date_for == expected_date_for
-        assert sm_queryset == expected_sm_queryset
-        return expected_user_id_qs
-
-    monkeypatch.setattr('figures.mau.mau_1g_for_month_as_of_day',
-                        mock_mau_1g_for_month_as_of_day)
-    monkeypatch.setattr('figures.mau.get_student_modules_for_site',
-                        mock_get_student_modules_for_site)
-
-    qs = site_mau_1g_for_month_as_of_day(site=expected_site,
-                                         date_for=expected_date_for)
-    assert qs == expected_user_id_qs
+    site = sm_test_data['site']
+    course_id = sm_test_data['course_overviews'][0].id
+    # Active after "date_for"
+    StudentModuleFactory(course_id=course_id,
+                         created=as_datetime('2019-10-11'),
+                         modified=as_datetime('2019-10-11'))
+    expected_user_ids = set(
+        get_student_modules_for_site(site).filter(
+            modified__lt=as_datetime('2019-10-11')).values_list('student_id', flat=True))
+
+    user_ids = site_mau_1g_for_month_as_of_day(site=site,
+                                               date_for=as_date('2019-10-10'),
+                                               collect=collect)
+    assert set(user_ids) == expected_user_ids
+    assert MonthlyActiveEnrollment.objects.exists() == collect
+
+
+def test_retrieve_live_site_mau_data_does_not_collect(sm_test_data):
+    """API reads count StudentModule records and never write the activity tables
+    """
+    site = sm_test_data['site']
+    with freeze_time(datetime(year=sm_test_data['year_for'],
+                              month=sm_test_data['month_for'],
+                              day=15)):
+        data = retrieve_live_site_mau_data(site)
+    assert data['count'] == get_student_modules_for_site(site).filter(
+        modified__lt=as_datetime(date(year=sm_test_data['year_for'],
+                                      month=sm_test_data['month_for'],
+                                      day=16))).values('student_id').distinct().count()
+    assert not LearnerDailyActivity.objects.exists()
+    assert not MonthlyActiveEnrollment.objects.exists()
 
 
 def test_store_mau_metrics(monkeypatch, sm_test_data):
     """
     Basic minimal test
+
+    We freeze time to the end of the month, as activity on days after today
+    is not counted
     """
-    mock_today = datetime(year=sm_test_data['year_for'],
-                          month=sm_test_data['month_for'],
-                          day=1)
+    month_start = date(year=sm_test_data['year_for'],
+                       month=sm_test_data['month_for'],
+                       day=1)
+    mock_today = datetime(year=month_start.year,
+                          month=month_start.month,
+                          day=days_in_month(month_start))
     freezer = freeze_time(mock_today)
     freezer.start()
     site = sm_test_data['site']
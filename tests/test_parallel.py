@@ -0,0 +1,33 @@
+"""Tests the figures.management.parallel module
+"""
+from __future__ import absolute_import
+
+from figures.management.parallel import run_jobs
+
+
+def square(value):
+    if value < 0:
+        raise ValueError('negative value')
+    return value * value
+
+
+def test_run_jobs_serial():
+    output = []
+    run = run_jobs(square, [(1,), (2,), (-1,), (3,)], stdout=output.append)
+    assert run['results'] == [((1,), 1), ((2,), 4), ((3,), 9)]
+    assert len(run['errors']) == 1
+    assert run['errors'][0][0] == (-1,)
+    assert 'ValueError: negative value' in run['errors'][0][1]
+    assert run['throughput'] >= 0
+    assert output[0] == '[1 of 4] finished 1'
+    assert output[-1].startswith('Processed 4 jobs in')
+
+
+def test_run_jobs_in_workers():
+    output = []
+    jobs = [(value,) for value in range(-1, 8)]
+    run = run_jobs(square, jobs, workers=3, label='squares', stdout=output.append)
+    assert sorted(run['results']) == [((value,), value * value) for value in range(8)]
+    assert [job for job, _error in run['errors']] == [(-1,)]
+    assert len([line for line in output if line.startswith('[')]) == len(jobs)
+    assert 'squares/sec' in output[-1]
@@ -0,0 +1,82 @@
+"""Tests the figures.progress module
+"""
+from __future__ import absolute_import
+import pytest
+
+from figures.compat import CourseNotFound
+from figures.progress import CourseProgress, EnrollmentProgress
+
+from tests.factories import CourseEnrollmentFactory, CourseOverviewFactory
+from tests.helpers import FakeException
+
+
+@pytest.mark.django_db
+class TestCourseProgress(object):
+    """Tests the course scoped progress batch API
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.course_overview = CourseOverviewFactory()
+        self.enrollments = [CourseEnrollmentFactory(course_id=self.course_overview.id)
+                            for _ in range(3)]
+
+    def test_course_loaded_once(self, monkeypatch):
+        loaded = []
+        block_structures = []
+
+        def fake_course_for_grades(course_id):
+            loaded.append(course_id)
+            course = type('FakeCourse', (object,), {})()
+            course.id = course_id
+            return course
+
+        def fake_get_course_in_cache(course_key):
+            block_structures.append(course_key)
+            return 'fake-block-structure'
+
+        def fake_course_grade_from_course(learner, course, collected_block_structure):
+            assert collected_block_structure == 'fake-block-structure'
+            return dict(learner=learner, course=course)
+
+        monkeypatch.setattr('figures.progress.course_for_grades',
+                            fake_course_for_grades)
+        monkeypatch.setattr('figures.progress.get_course_in_cache',
+                            fake_get_course_in_cache)
+        monkeypatch.setattr('figures.progress.course_grade_from_course',
+                            fake_course_grade_from_course)
+        monkeypatch.setattr('figures.progress.EnrollmentProgress._get_progress',
+                            lambda self: dict())
+
+        course_progress = CourseProgress(self.course_overview.id)
+        for ce in self.enrollments:
+            ep = course_progress.enrollment_progress(ce.user)
+            assert isinstance(ep, EnrollmentProgress)
+            assert ep.course_grade['learner'] == ce.user
+        assert loaded == [self.course_overview.id]
+        assert block_structures == [self.course_overview.id]
+
+    @pytest.mark.parametrize('exception', [CourseNotFound, FakeException])
+    def test_course_load_fails_once(self, monkeypatch, exception):
+        """Each learner gets the load error without reloading the course
+        """
+        load_calls = []
+
+        def fake_course_for_grades(course_id):
+            load_calls.append(course_id)
+            raise exception('Hey!')
+
+        monkeypatch.setattr('figures.progress.course_for_grades',
+                            fake_course_for_grades)
+        course_progress = CourseProgress(self.course_overview.id)
+        for ce in self.enrollments:
+            with pytest.raises(exception):
+                course_progress.enrollment_progress(ce.user)
+        assert len(load_calls) == 1
+
+    def test_with_mock_grades(self):
+        """Works with the edx-platform mocks as EnrollmentProgress does
+        """
+        course_progress = CourseProgress(self.course_overview.id)
+        ce = self.enrollments[0]
+        expected = EnrollmentProgress(user=ce.user, course_id=self.course_overview.id)
+        assert course_progress.enrollment_progress(ce.user).progress == expected.progress
@@ -171,3 +171,29 @@ class TestDailyMauPipelineSettings(object):
         assert 'FIGURES' not in self.settings.ENV_TOKENS
         plugin_settings(self.settings)
         assert self.TASK_NAME not in self.settings.CELERYBEAT_SCHEDULE
+
+
+class TestStaleEnrollmentQueueSettings(object):
+    """Tests the stale enrollment queue micro-batch task schedule
+    """
+    TASK_NAME = 'figures-stale-enrollment-data'
+    TASK_FUNC = 'figures.tasks.update_stale_enrollment_data'
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.settings = mock.Mock(
+            WEBPACK_LOADER={},
+            CELERYBEAT_SCHEDULE={},
+            FEATURES={},
+            ENV_TOKENS={},
+            CELERY_IMPORTS=[],
+        )
+
+    def test_queue_enabled(self):
+        self.settings.ENV_TOKENS['FIGURES'] = {'ENABLE_STALE_ENROLLMENT_QUEUE': True}
+        plugin_settings(self.settings)
+        assert self.settings.CELERYBEAT_SCHEDULE[self.TASK_NAME]['task'] == self.TASK_FUNC
+
+    def test_queue_not_enabled(self):
+        plugin_settings(self.settings)
+        assert self.TASK_NAME not in self.settings.CELERYBEAT_SCHEDULE
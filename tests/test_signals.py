@@ -0,0 +1,78 @@
+"""Tests the Figures signal receivers in `figures.signals`
+
+The sites cache receivers are tested in `tests/test_cache.py`
+"""
+from __future__ import absolute_import
+import pytest
+
+from django.db import transaction
+
+from openedx.core.djangoapps.signals.signals import COURSE_GRADE_CHANGED
+
+import figures.signals
+from figures.models import StaleEnrollment
+
+from tests.factories import CourseEnrollmentFactory, StudentModuleFactory
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStaleEnrollmentReceivers(object):
+    """Uses `transactional_db` so that `on_commit` callbacks run
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, transactional_db, settings, monkeypatch):
+        monkeypatch.setitem(settings.ENV_TOKENS['FIGURES'],
+                            'ENABLE_STALE_ENROLLMENT_QUEUE', True)
+        self.enrollment = CourseEnrollmentFactory()
+
+    def test_student_module_save_queues_enrollment(self):
+        sm = StudentModuleFactory.from_course_enrollment(self.enrollment)
+        sm.save()
+        assert list(StaleEnrollment.objects.values_list('user_id', 'course_id')) == [
+            (self.enrollment.user_id, str(self.enrollment.course_id))]
+
+    def test_course_grade_change_queues_enrollment(self):
+        COURSE_GRADE_CHANGED.send(sender=None,
+                                  user=self.enrollment.user,
+                                  course_grade=None,
+                                  course_key=self.enrollment.course_id,
+                                  deadline=None)
+        assert list(StaleEnrollment.objects.values_list('user_id', 'course_id')) == [
+            (self.enrollment.user_id, str(self.enrollment.course_id))]
+
+    def test_queue_not_enabled(self, settings, monkeypatch):
+        monkeypatch.setitem(settings.ENV_TOKENS['FIGURES'],
+                            'ENABLE_STALE_ENROLLMENT_QUEUE', False)
+        StudentModuleFactory.from_course_enrollment(self.enrollment)
+        assert not StaleEnrollment.objects.exists()
+
+    def test_errors_are_logged(self, monkeypatch, caplog):
+        def fail(*args, **kwargs):
+            raise Exception('Hey!')
+
+        monkeypatch.setattr(StaleEnrollment.objects, 'mark', fail)
+        StudentModuleFactory.from_course_enrollment(self.enrollment)
+        assert 'Figures could not queue stale enrollment' in caplog.text
+
+    @pytest.mark.skipif(figures.signals.on_commit is None,
+                        reason='Django 1.8 has no on_commit')
+    def test_queued_when_transaction_commits(self):
+        with transaction.atomic():
+            StudentModuleFactory.from_course_enrollment(self.enrollment)
+            assert not StaleEnrollment.objects.exists()
+        assert StaleEnrollment.objects.filter(user_id=self.enrollment.user_id).exists()
+
+    @pytest.mark.skipif(figures.signals.on_commit is None,
+                        reason='Django 1.8 has no on_commit')
+    def test_not_queued_when_transaction_rolls_back(self):
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                StudentModuleFactory.from_course_enrollment(self.enrollment)
+                raise ValueError('rollback')
+        assert not StaleEnrollment.objects.exists()
+
+    def test_queued_immediately_without_on_commit(self, monkeypatch):
+        monkeypatch.setattr(figures.signals, 'on_commit', None)
+        with transaction.atomic():
+            StudentModuleFactory.from_course_enrollment(self.enrollment)
+            assert StaleEnrollment.objects.filter(user_id=self.enrollment.user_id).exists()
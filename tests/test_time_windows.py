@@ -0,0 +1,87 @@
+"""Tests the figures.time_windows module
+"""
+from __future__ import absolute_import
+from datetime import date, datetime
+
+import pytest
+from django.utils.timezone import utc
+
+from figures.compat import StudentModule
+from figures.time_windows import (
+    day_window,
+    month_window,
+    month_as_of_day_window,
+    window_filter,
+    filter_day,
+    filter_month,
+    filter_month_as_of_day,
+)
+
+from tests.factories import StudentModuleFactory
+
+
+def utc_datetime(*args):
+    return datetime(*args, tzinfo=utc)
+
+
+@pytest.mark.parametrize('date_for', [
+    date(2020, 2, 29),
+    datetime(2020, 2, 29, 23, 59, 59),
+    '2020-02-29',
+])
+def test_day_window(date_for):
+    assert day_window(date_for) == (utc_datetime(2020, 2, 29),
+                                    utc_datetime(2020, 3, 1))
+
+
+@pytest.mark.parametrize('month_for, expected', [
+    (date(2020, 2, 15), (utc_datetime(2020, 2, 1), utc_datetime(2020, 3, 1))),
+    (date(2019, 12, 31), (utc_datetime(2019, 12, 1), utc_datetime(2020, 1, 1))),
+])
+def test_month_window(month_for, expected):
+    assert month_window(month_for) == expected
+
+
+def test_month_as_of_day_window():
+    assert month_as_of_day_window(date(2019, 12, 31)) == (utc_datetime(2019, 12, 1),
+                                                          utc_datetime(2020, 1, 1))
+
+
+def test_window_filter():
+    window = day_window(date(2020, 2, 29))
+    assert window_filter(window, 'created') == {'created__gte': window[0],
+                                                'created__lt': window[1]}
+
+
+@pytest.mark.django_db
+class TestFilters(object):
+    """Checks the window boundaries against StudentModule records
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.modified = [
+            utc_datetime(2019, 11, 30, 23, 59, 59, 999999),
+            utc_datetime(2019, 12, 1),
+            utc_datetime(2019, 12, 15, 12),
+            utc_datetime(2019, 12, 15, 23, 59, 59, 999999),
+            utc_datetime(2019, 12, 16),
+            utc_datetime(2019, 12, 31, 23, 59, 59, 999999),
+            utc_datetime(2020, 1, 1),
+        ]
+        for modified in self.modified:
+            StudentModuleFactory(created=modified, modified=modified)
+
+    def modified_values(self, queryset):
+        return sorted(queryset.values_list('modified', flat=True))
+
+    def test_filter_day(self):
+        qs = filter_day(StudentModule.objects.all(), date(2019, 12, 15))
+        assert self.modified_values(qs) == self.modified[2:4]
+
+    def test_filter_month(self):
+        qs = filter_month(StudentModule.objects.all(), date(2019, 12, 15))
+        assert self.modified_values(qs) == self.modified[1:6]
+
+    def test_filter_month_as_of_day(self):
+        qs = filter_month_as_of_day(StudentModule.objects.all(), date(2019, 12, 15))
+        assert self.modified_values(qs) == self.modified[1:4]
@@ -0,0 +1,71 @@
+"""Tests Figures PipelineStageViewSet
+"""
+
+from __future__ import absolute_import
+import pytest
+
+from rest_framework.test import APIRequestFactory
+
+from figures.models import PipelineStage
+from figures.pipeline.ledger import pipeline_stage
+from figures.views import PipelineStageViewSet
+
+from tests.views.base import BaseViewTest
+
+
+@pytest.mark.django_db
+class TestPipelineStageViewSet(BaseViewTest):
+
+    request_path = 'api/admin/pipeline-stages/'
+    view_class = PipelineStageViewSet
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        super(TestPipelineStageViewSet, self).setup(db)
+        for stage, elapsed in [('alpha', 1.0), ('bravo', 3.0), ('alpha', 4.0)]:
+            with pipeline_stage(stage, site=self.site) as stage_obj:
+                pass
+            PipelineStage.objects.filter(id=stage_obj.id).update(elapsed=elapsed)
+
+    def test_list(self, monkeypatch):
+        monkeypatch.setattr('figures.sites.is_multisite', lambda: True)
+        request = APIRequestFactory().get(self.request_path)
+        request.user = self.staff_user
+        view = self.view_class.as_view({'get': 'list'})
+        response = view(request)
+        assert response.status_code == 200
+        elapsed = [rec['elapsed'] for rec in response.data['results']]
+        assert elapsed == [4.0, 3.0, 1.0]
+
+    @pytest.mark.parametrize('query_params, expected_keys, expected_total', [
+        ('', ['alpha', 'bravo'], 5.0),
+        ('?group_by=site', None, 8.0),
+        ('?group_by=stage&limit=1', ['alpha'], 5.0),
+    ])
+    def test_slowest(self, monkeypatch, query_params, expected_keys, expected_total):
+        monkeypatch.setattr('figures.sites.is_multisite', lambda: True)
+        request = APIRequestFactory().get(
+            self.request_path + 'slowest/' + query_params)
+        request.user = self.staff_user
+        view = self.view_class.as_view({'get': 'slowest'})
+        response = view(request)
+        assert response.status_code == 200
+        keys = [rec['key'] for rec in response.data]
+        assert keys == (expected_keys or [str(self.site.id)])
+        assert response.data[0]['total_elapsed'] == expected_total
+
+    @pytest.mark.parametrize('query_params', [
+        '?group_by=user',
+        '?days=week',
+        '?limit=ten',
+        '?days=-1',
+        '?limit=0',
+    ])
+    def test_slowest_invalid_query_params(self, monkeypatch, query_params):
+        monkeypatch.setattr('figures.sites.is_multisite', lambda: True)
+        request = APIRequestFactory().get(
+            self.request_path + 'slowest/' + query_params)
+        request.user = self.staff_user
+        view = self.view_class.as_view({'get': 'slowest'})
+        response = view(request)
+        assert response.status_code == 400
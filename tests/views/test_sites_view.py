@@ -83,3 +83,22 @@ class TestSiteViewSet(BaseViewTest):
         view = self.view_class.as_view({'get': 'list'})
         response = view(request)
         assert response.status_code == 403
+
+    @pytest.mark.parametrize('instrument', [True, False])
+    def test_server_timing_header(self, monkeypatch, settings, instrument):
+        """Validates the query count and time are returned when query
+        instrumentation is enabled
+        """
+        monkeypatch.setattr('figures.sites.is_multisite', lambda: True)
+        monkeypatch.setitem(settings.ENV_TOKENS['FIGURES'],
+                            'QUERY_INSTRUMENTATION', instrument)
+        request = APIRequestFactory().get(self.request_path)
+        request.user = self.staff_user
+        view = self.view_class.as_view({'get': 'list'})
+        response = view(request)
+        assert response.status_code == 200
+        if instrument:
+            assert response['Server-Timing'].startswith('db;dur=')
+            assert 'queries"' in response['Server-Timing']
+        else:
+            assert not response.has_header('Server-Timing')